@@ -0,0 +1,245 @@
+"""
+Native asyncio data-access layer for WompBot's hot paths (asyncpg).
+
+`Database` is synchronous psycopg2 on a ThreadedConnectionPool, reached from the
+event loop via asyncio.to_thread into the 100-worker default executor. When the pool
+runs dry, `get_connection` busy-waits in that worker thread. This module provides a
+parallel async path for the highest-traffic queries so they never occupy a thread:
+pool exhaustion becomes an awaitable `pool.acquire(timeout=...)` instead of a sleeping
+worker.
+
+Only the hot methods are mirrored here (message storage, recent history). Everything
+else stays on `Database`. The layer is
+optional: if asyncpg isn't installed or the pool can't be created, `enabled` stays
+False and callers fall back to the sync `Database` methods.
+"""
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from datetime import timezone
+
+try:
+    import asyncpg
+    _HAS_ASYNCPG = True
+except ImportError:
+    asyncpg = None
+    _HAS_ASYNCPG = False
+
+logger = logging.getLogger(__name__)
+
+
+def _to_naive_utc(dt):
+    """asyncpg encodes TIMESTAMP (without time zone) columns from naive datetimes only.
+    Discord timestamps are tz-aware UTC, so normalize before binding."""
+    if dt is not None and dt.tzinfo is not None:
+        return dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+class AsyncDatabase:
+    """asyncpg connection pool exposing coroutine versions of the hot `Database` methods."""
+
+    def __init__(self):
+        self.pool = None
+        self.enabled = False
+        self.min_size = int(os.getenv('ASYNC_DB_POOL_MIN', '2'))
+        self.max_size = int(os.getenv('ASYNC_DB_POOL_MAX', '20'))
+        # How long a coroutine waits for a free pooled connection before giving up.
+        # This is the backpressure point: waiting here costs no thread.
+        self.acquire_timeout = float(os.getenv('ASYNC_DB_ACQUIRE_TIMEOUT', '10'))
+
+    async def connect(self):
+        """Create the asyncpg pool with retry. Never raises — leaves `enabled` False on failure."""
+        if os.getenv('ASYNC_DB_ENABLED', 'true').lower() != 'true':
+            logger.info("Async database path disabled (ASYNC_DB_ENABLED=false)")
+            return
+        if not _HAS_ASYNCPG:
+            logger.warning("asyncpg not installed - async database path disabled")
+            return
+
+        max_retries = 5
+        retry_delay = 5
+        for attempt in range(max_retries):
+            try:
+                self.pool = await asyncpg.create_pool(
+                    host=os.getenv('DB_HOST', 'postgres'),
+                    port=int(os.getenv('DB_PORT', '5432')),
+                    database=os.getenv('DB_NAME', 'discord_bot'),
+                    user=os.getenv('DB_USER', 'botuser'),
+                    password=os.getenv('DB_PASSWORD'),
+                    min_size=self.min_size,
+                    max_size=self.max_size,
+                    timeout=10,
+                    command_timeout=30,
+                    # Same 30s statement cap as the sync pool
+                    server_settings={'statement_timeout': '30000'},
+                )
+                self.enabled = True
+                logger.info("✅ Async database pool created (%d-%d connections)", self.min_size, self.max_size)
+                return
+            except Exception as e:
+                logger.warning("⚠️  Async database connection attempt %d/%d failed: %s", attempt + 1, max_retries, e)
+                if attempt < max_retries - 1:
+                    await asyncio.sleep(retry_delay)
+        logger.error("✗ Async database pool unavailable - falling back to sync Database")
+
+    async def close(self):
+        """Close the asyncpg pool"""
+        self.enabled = False
+        if self.pool:
+            await self.pool.close()
+            self.pool = None
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Acquire a pooled connection, awaiting (not spinning) when the pool is exhausted."""
+        async with self.pool.acquire(timeout=self.acquire_timeout) as conn:
+            yield conn
+
+    @asynccontextmanager
+    async def transaction(self):
+        """Acquire a connection and open a transaction (commit on success, rollback on error)."""
+        async with self.acquire() as conn:
+            async with conn.transaction():
+                yield conn
+
+    async def store_message(self, message, opted_out=False, content_override=None):
+        """Async version of Database.store_message (same privacy semantics)."""
+        try:
+            profile_username = str(message.author) if not opted_out else "[redacted]"
+            timestamp = _to_naive_utc(message.created_at)
+            guild_id = message.guild.id if message.guild else None
+            content = content_override if content_override is not None else message.content
+
+            async with self.transaction() as conn:
+                if not opted_out:
+                    await conn.execute("""
+                        INSERT INTO messages (message_id, user_id, username, channel_id, channel_name, content, timestamp, opted_out, guild_id)
+                        VALUES ($1, $2, $3, $4, $5, $6, $7, FALSE, $8)
+                        ON CONFLICT (message_id) DO UPDATE SET content = EXCLUDED.content
+                    """,
+                        message.id,
+                        message.author.id,
+                        profile_username,
+                        message.channel.id,
+                        message.channel.name if hasattr(message.channel, 'name') else str(message.channel.id),
+                        content,
+                        timestamp,
+                        guild_id,
+                    )
+
+                await conn.execute("""
+                    INSERT INTO user_profiles (user_id, username, total_messages, first_seen, last_seen, opted_out)
+                    VALUES ($1, $2, $3, $4, $4, $5)
+                    ON CONFLICT (user_id) DO UPDATE SET
+                        username = EXCLUDED.username,
+                        total_messages = CASE
+                            WHEN EXCLUDED.opted_out THEN user_profiles.total_messages
+                            ELSE user_profiles.total_messages + 1
+                        END,
+                        last_seen = CASE
+                            WHEN EXCLUDED.opted_out THEN user_profiles.last_seen
+                            ELSE EXCLUDED.last_seen
+                        END,
+                        opted_out = EXCLUDED.opted_out,
+                        updated_at = CURRENT_TIMESTAMP
+                """,
+                    message.author.id,
+                    profile_username,
+                    1 if not opted_out else 0,
+                    timestamp,
+                    opted_out,
+                )
+            logger.debug("Stored message %s from %s (async)", message.id, message.author.id)
+        except Exception as e:
+            logger.error("Error storing message (async): %s", e)
+
+    async def store_messages_batch(self, message_rows, profile_rows):
+        """Async version of Database.store_messages_batch.
+
+        Multi-row upserts are expressed as INSERT ... SELECT FROM unnest(array params)
+        so the whole batch is two statements regardless of size. (COPY can't carry an
+        ON CONFLICT clause, and these rows are upserts.)
+
+        Returns:
+            True on success, False on failure (the batch is rolled back)
+        """
+        try:
+            async with self.transaction() as conn:
+                if message_rows:
+                    cols = list(zip(*message_rows))
+                    await conn.execute("""
+                        INSERT INTO messages (message_id, user_id, username, channel_id, channel_name, content, timestamp, guild_id, opted_out)
+                        SELECT m.message_id, m.user_id, m.username, m.channel_id, m.channel_name, m.content, m.ts, m.guild_id, FALSE
+                        FROM unnest($1::bigint[], $2::bigint[], $3::text[], $4::bigint[], $5::text[], $6::text[], $7::timestamp[], $8::bigint[])
+                            AS m(message_id, user_id, username, channel_id, channel_name, content, ts, guild_id)
+                        ON CONFLICT (message_id) DO UPDATE SET content = EXCLUDED.content
+                    """,
+                        list(cols[0]), list(cols[1]), list(cols[2]), list(cols[3]),
+                        list(cols[4]), list(cols[5]), [_to_naive_utc(ts) for ts in cols[6]], list(cols[7]),
+                    )
+                if profile_rows:
+                    cols = list(zip(*profile_rows))
+                    await conn.execute("""
+                        INSERT INTO user_profiles (user_id, username, total_messages, first_seen, last_seen, opted_out)
+                        SELECT p.user_id, p.username, p.total_messages, p.first_seen, p.last_seen, p.opted_out
+                        FROM unnest($1::bigint[], $2::text[], $3::int[], $4::timestamp[], $5::timestamp[], $6::boolean[])
+                            AS p(user_id, username, total_messages, first_seen, last_seen, opted_out)
+                        ON CONFLICT (user_id) DO UPDATE SET
+                            username = EXCLUDED.username,
+                            total_messages = user_profiles.total_messages + EXCLUDED.total_messages,
+                            last_seen = CASE
+                                WHEN EXCLUDED.total_messages > 0 THEN GREATEST(user_profiles.last_seen, EXCLUDED.last_seen)
+                                ELSE user_profiles.last_seen
+                            END,
+                            opted_out = EXCLUDED.opted_out,
+                            updated_at = CURRENT_TIMESTAMP
+                    """,
+                        list(cols[0]), list(cols[1]), list(cols[2]),
+                        [_to_naive_utc(ts) for ts in cols[3]], [_to_naive_utc(ts) for ts in cols[4]], list(cols[5]),
+                    )
+            return True
+        except Exception as e:
+            logger.error("Error storing message batch (async, %d messages): %s", len(message_rows), e)
+            return False
+
+    async def get_recent_messages(self, channel_id, limit=10, exclude_opted_out=True, exclude_bot_id=None, user_id=None, guild_id=None):
+        """Async version of Database.get_recent_messages. Returns dicts in chronological order."""
+        try:
+            query = """
+                SELECT m.message_id, m.user_id, m.username, m.content, m.timestamp
+                FROM messages m
+                LEFT JOIN user_profiles up ON up.user_id = m.user_id
+                WHERE m.channel_id = $1
+            """
+            params = [channel_id]
+
+            # SAFETY: only hardcoded fragments are appended; values go through $n placeholders
+            if guild_id is not None:
+                params.append(guild_id)
+                query += f" AND m.guild_id = ${len(params)}"
+
+            if user_id is not None:
+                params.append(user_id)
+                query += f" AND (m.user_id = ${len(params)}"
+                if exclude_bot_id:
+                    params.append(exclude_bot_id)
+                    query += f" OR m.user_id = ${len(params)}"
+                query += ")"
+            elif exclude_bot_id:
+                params.append(exclude_bot_id)
+                query += f" AND m.user_id != ${len(params)}"
+
+            if exclude_opted_out:
+                query += " AND COALESCE(m.opted_out, FALSE) = FALSE AND COALESCE(up.opted_out, FALSE) = FALSE"
+
+            params.append(limit)
+            query += f" ORDER BY m.timestamp DESC LIMIT ${len(params)}"
+
+            async with self.acquire() as conn:
+                rows = await conn.fetch(query, *params)
+            return [dict(r) for r in reversed(rows)]
+        except Exception as e:
+            logger.error("Error fetching messages (async): %s", e)
+            return []
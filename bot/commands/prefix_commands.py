@@ -17,6 +17,8 @@ import re
 from io import BytesIO
 import time
 
+from user_card import rebuild_card
+
 logger = logging.getLogger(__name__)
 
 
@@ -99,6 +101,7 @@ def register_prefix_commands(bot, db, llm, search, help_system, tasks_dict,
                         period_start,
                         period_end
                     )
+                    await rebuild_card(db, user['user_id'])
                     results.append(f"**{user['username']}**: Profanity {analysis['profanity_score']}/10, {analysis['message_count']} messages")
 
             if results:
@@ -112,17 +112,15 @@ def register_slash_commands(bot, db, llm, claims_tracker, chat_stats, stats_viz,
             if cached:
                 results = cached
             else:
-                # Get messages
-                messages = chat_stats.get_messages_for_analysis(None, start_date, end_date, exclude_opted_out=True)
+                # Build network graph (hourly rollups; message scan while they backfill)
+                results = await asyncio.to_thread(
+                    chat_stats.get_network, interaction.guild.id, start_date, end_date
+                )
     
-                if not messages:
+                if not results:
                     await interaction.followup.send("No messages found in this time range.")
                     return
     
-                # Build network graph
-                network = chat_stats.build_network_graph(messages)
-                results = network
-    
                 # Cache results
                 chat_stats.cache_stats('network', scope, start_date, end_date, results, cache_hours=6)
     
@@ -190,15 +188,16 @@ def register_slash_commands(bot, db, llm, claims_tracker, chat_stats, stats_viz,
             if cached:
                 topics = cached
             else:
-                # Get messages
-                messages = chat_stats.get_messages_for_analysis(None, start_date, end_date, exclude_opted_out=True)
+                # Stream the window's message text (no row cap)
+                corpus = await asyncio.to_thread(chat_stats.collect_topic_corpus, start_date, end_date,
+                                                 interaction.guild.id)
     
-                if not messages:
+                if not corpus.message_count:
                     await interaction.followup.send("No messages found in this time range.")
                     return
     
                 # Extract topics
-                topics = chat_stats.extract_topics_tfidf(messages, top_n=15)
+                topics = await asyncio.to_thread(chat_stats.extract_topics_tfidf, corpus, 15)
     
                 if not topics:
                     await interaction.followup.send("Could not extract topics from messages.")
@@ -274,20 +273,16 @@ def register_slash_commands(bot, db, llm, claims_tracker, chat_stats, stats_viz,
             if cached:
                 results = cached
             else:
-                # Get messages
-                messages = chat_stats.get_messages_for_analysis(None, start_date, end_date, exclude_opted_out=True)
-    
-                # Filter by user if specified
-                if user:
-                    messages = [m for m in messages if m['user_id'] == user.id]
+                # Calculate primetime stats (hourly rollups; message scan while they backfill)
+                results = await asyncio.to_thread(
+                    chat_stats.get_primetime, interaction.guild.id, start_date, end_date,
+                    user.id if user else None
+                )
     
-                if not messages:
+                if not results:
                     await interaction.followup.send(f"No messages found for {user.display_name if user else 'server'} in this time range.")
                     return
     
-                # Calculate primetime stats
-                results = chat_stats.calculate_primetime(messages)
-    
                 # Cache results
                 chat_stats.cache_stats('primetime', scope, start_date, end_date, results, cache_hours=6)
     
@@ -388,20 +383,16 @@ def register_slash_commands(bot, db, llm, claims_tracker, chat_stats, stats_viz,
             if cached:
                 results = cached
             else:
-                # Get messages
-                messages = chat_stats.get_messages_for_analysis(None, start_date, end_date, exclude_opted_out=True)
-    
-                # Filter by user if specified
-                if user:
-                    messages = [m for m in messages if m['user_id'] == user.id]
+                # Calculate engagement (hourly rollups; message scan while they backfill)
+                results = await asyncio.to_thread(
+                    chat_stats.get_engagement, interaction.guild.id, start_date, end_date,
+                    user.id if user else None
+                )
     
-                if not messages:
+                if not results:
                     await interaction.followup.send(f"No messages found for {user.display_name if user else 'server'} in this time range.")
                     return
     
-                # Calculate engagement
-                results = chat_stats.calculate_engagement(messages)
-    
                 # Cache results
                 chat_stats.cache_stats('engagement', scope, start_date, end_date, results, cache_hours=6)
     
@@ -1,8 +1,10 @@
 """
 Cost tracking and alerting system for LLM API usage
 """
+import asyncio
 import logging
 import os
+import threading
 from datetime import datetime, timezone
 
 import discord
@@ -44,6 +46,12 @@ class CostTracker:
         self.bot = bot
         self.wompie_user_id = wompie_user_id
         self.wompie_username = 'wompie__'  # fallback only; usernames are mutable
+        # Running totals (loaded from the api_cost_totals ledger, then advanced by each
+        # recorded request) so the month total and alert check don't query per request
+        self._totals_lock = threading.Lock()
+        self._month = None
+        self._total_cost = 0.0
+        self._month_cost = 0.0
 
     def calculate_cost(self, model, input_tokens, output_tokens):
         """Calculate cost for a model's token usage"""
@@ -64,15 +72,13 @@ class CostTracker:
         output_cost = (output_tokens / 1_000_000) * pricing['output']
         total_cost = input_cost + output_cost
 
-        # Record the cost
-        self.db.record_api_cost(
+        # Record the cost (log row + ledger in one transaction)
+        if not self.db.record_api_cost(
             model, input_tokens, output_tokens, total_cost, request_type, user_id, username
-        )
+        ):
+            return {'should_alert': False, 'total_cost': 0.0}
 
-        # Get monthly total (pass start of current month to avoid full table scan)
-        now = datetime.now(timezone.utc)
-        start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        monthly_total = self.db.get_total_cost(since_timestamp=start_of_month)
+        alert_check, monthly_total = self._add_to_totals(total_cost)
 
         # Log individual request cost with breakdown
         # Only log detailed costs if username is provided (text mentions only)
@@ -80,25 +86,73 @@ class CostTracker:
             model_short = model.split('/')[-1] if '/' in model else model
             logger.info("Request Cost: $%.6f | In: $%.6f (%dtok) | Out: $%.6f (%dtok) | %s | %s | User: %s",
                         total_cost, input_cost, input_tokens, output_cost, output_tokens, model_short, request_type, username)
-            logger.info("Monthly Total: $%.4f", monthly_total)
+            if monthly_total is not None:
+                logger.info("Monthly Total: $%.4f", monthly_total)
 
         # Return alert info for async handling
-        alert_check = self.db.check_cost_alert_threshold(COST_ALERT_THRESHOLD)
+        return alert_check
+
+    def _add_to_totals(self, cost):
+        """Advance the running totals by one recorded request.
+
+        Totals are (re)loaded from the ledger on first use and at each month change; the
+        loaded figures already include this request. A threshold alert is due when the
+        request moves the all-time total across a multiple of COST_ALERT_THRESHOLD.
+
+        Returns:
+            (alert_check dict, month-to-date total or None if the ledger is unavailable)
+        """
+        month = datetime.now(timezone.utc).date().replace(day=1)
+        with self._totals_lock:
+            if self._month != month:
+                totals = self.db.get_cost_totals(month)
+                if totals is None:
+                    return {'should_alert': False, 'total_cost': 0.0}, None
+                self._total_cost, self._month_cost = totals
+                self._month = month
+            else:
+                self._total_cost += cost
+                self._month_cost += cost
+            total, month_total = self._total_cost, self._month_cost
+
+        step = COST_ALERT_THRESHOLD or 1.0
+        previous_threshold = int(max(0.0, total - cost) // step)
+        if int(total // step) > previous_threshold:
+            return {
+                'should_alert': True,
+                'threshold': int(total // step) * step,
+                'total_cost': total
+            }, month_total
+        return {'should_alert': False, 'total_cost': total}, month_total
+
+    def record_costs_background(self, model, input_tokens, output_tokens, request_type, user_id=None, username=None):
+        """Record costs from a worker thread and hand any due alert to the bot's event loop"""
+        alert_check = self.record_costs_sync(model, input_tokens, output_tokens, request_type, user_id, username)
+        if alert_check['should_alert']:
+            try:
+                asyncio.run_coroutine_threadsafe(
+                    self._send_and_record_alert(alert_check['threshold'], alert_check['total_cost']),
+                    self.bot.loop
+                )
+            except Exception as e:
+                logger.error("Could not schedule cost alert: %s", e)
         return alert_check
 
     async def record_and_check_costs(self, model, input_tokens, output_tokens, request_type, user_id=None, username=None):
         """Record API cost and check if we should send an alert"""
         # Use sync version for recording and logging
-        alert_check = self.record_costs_sync(model, input_tokens, output_tokens, request_type, user_id, username)
+        alert_check = await asyncio.to_thread(
+            self.record_costs_sync, model, input_tokens, output_tokens, request_type, user_id, username
+        )
 
         # Send alert if needed (async part)
         if alert_check['should_alert']:
-            await self.send_cost_alert(
-                alert_check['threshold'],
-                alert_check['total_cost']
-            )
-            # Record that we sent the alert
-            self.db.record_cost_alert(alert_check['threshold'], alert_check['total_cost'])
+            await self._send_and_record_alert(alert_check['threshold'], alert_check['total_cost'])
+
+    async def _send_and_record_alert(self, threshold, total_cost):
+        await self.send_cost_alert(threshold, total_cost)
+        # Record that we sent the alert
+        await asyncio.to_thread(self.db.record_cost_alert, threshold, total_cost)
 
     async def send_cost_alert(self, threshold, total_cost):
         """Send DM to wompie__ about cost threshold"""
@@ -128,8 +182,8 @@ class CostTracker:
             breakdown = self.get_cost_breakdown()
 
             embed = discord.Embed(
-                title=f"💸 Cost Alert: ${threshold}.00 Threshold Crossed",
-                description=f"**Total spending: ${total_cost:.2f}**\n\nYou've spent another $1.00 on LLM API calls.",
+                title=f"💸 Cost Alert: ${threshold:.2f} Threshold Crossed",
+                description=f"**Total spending: ${total_cost:.2f}**\n\nYou've spent another ${COST_ALERT_THRESHOLD or 1.0:.2f} on LLM API calls.",
                 color=discord.Color.red()
             )
 
@@ -162,18 +216,5 @@ class CostTracker:
             logger.error("Error sending cost alert: %s", e)
 
     def get_cost_breakdown(self):
-        """Get cost breakdown by model"""
-        try:
-            with self.db.get_connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        SELECT model, SUM(cost_usd) as total_cost
-                        FROM api_costs
-                        GROUP BY model
-                        ORDER BY total_cost DESC
-                    """)
-                    results = cur.fetchall()
-                    return {row[0]: float(row[1]) for row in results}
-        except Exception as e:
-            logger.error("Error getting cost breakdown: %s", e)
-            return {}
+        """Get cost breakdown by model (from the api_cost_totals ledger)"""
+        return self.db.get_cost_breakdown()
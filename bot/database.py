@@ -8,6 +8,8 @@ from difflib import SequenceMatcher
 from contextlib import contextmanager
 import logging
 
+from rate_limiter import RateLimiter
+
 # Get logger for this module
 logger = logging.getLogger(__name__)
 
@@ -17,6 +19,9 @@ class Database:
         self.connect()
         self.current_guild_id = None  # Track current guild context
         self.bot_user_id = None  # Store bot's user ID to exclude from rankings
+        # Token budgets / feature limits live in Redis; rate_limits and
+        # feature_rate_limits become a batched audit trail (see rate_limiter.py)
+        self.rate_limiter = RateLimiter(audit_db=self)
 
     def set_bot_user_id(self, user_id: int):
         """Set the bot's user ID to exclude from rankings (call after bot is ready)"""
@@ -204,7 +209,63 @@ class Database:
 
         except Exception as e:
             logger.error("Error storing message: %s", e)
-    
+
+    def store_messages_batch(self, message_rows, profile_rows):
+        """Store a coalesced batch of messages and profile increments in one transaction.
+
+        Used by the write-behind ingestion queue (message_ingestion.py), which has already
+        deduplicated message_ids and folded per-user counters, so each ON CONFLICT target
+        appears at most once per statement.
+
+        Args:
+            message_rows: List of (message_id, user_id, username, channel_id, channel_name,
+                content, timestamp, guild_id) tuples (opted-in messages only)
+            profile_rows: List of (user_id, username, message_count, first_seen, last_seen,
+                opted_out) tuples, one per user
+
+        Returns:
+            True on success, False on failure (the batch is rolled back)
+        """
+        try:
+            from psycopg2.extras import execute_values
+            with self.get_connection() as conn:
+                with conn.cursor() as cur:
+                    if message_rows:
+                        execute_values(
+                            cur,
+                            """
+                            INSERT INTO messages (message_id, user_id, username, channel_id, channel_name, content, timestamp, guild_id, opted_out)
+                            VALUES %s
+                            ON CONFLICT (message_id) DO UPDATE SET content = EXCLUDED.content
+                            """,
+                            message_rows,
+                            template="(%s, %s, %s, %s, %s, %s, %s, %s, FALSE)",
+                            page_size=500
+                        )
+                    if profile_rows:
+                        execute_values(
+                            cur,
+                            """
+                            INSERT INTO user_profiles (user_id, username, total_messages, first_seen, last_seen, opted_out)
+                            VALUES %s
+                            ON CONFLICT (user_id) DO UPDATE SET
+                                username = EXCLUDED.username,
+                                total_messages = user_profiles.total_messages + EXCLUDED.total_messages,
+                                last_seen = CASE
+                                    WHEN EXCLUDED.total_messages > 0 THEN GREATEST(user_profiles.last_seen, EXCLUDED.last_seen)
+                                    ELSE user_profiles.last_seen
+                                END,
+                                opted_out = EXCLUDED.opted_out,
+                                updated_at = CURRENT_TIMESTAMP
+                            """,
+                            profile_rows,
+                            page_size=500
+                        )
+            return True
+        except Exception as e:
+            logger.error("Error storing message batch (%d messages): %s", len(message_rows), e)
+            return False
+
     def get_recent_messages(self, channel_id, limit=10, exclude_opted_out=True, exclude_bot_id=None, user_id=None, guild_id=None):
         """Get recent messages from a channel for context
 
@@ -1067,53 +1128,7 @@ class Database:
         Returns:
             dict with 'allowed' (bool), 'tokens_used' (int), 'limit' (int), 'reset_seconds' (int)
         """
-        try:
-            hourly_limit = int(os.getenv('HOURLY_TOKEN_LIMIT', '10000'))
-
-            with self.get_connection() as conn:
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    # Get tokens used in the last hour
-                    cur.execute("""
-                        SELECT COALESCE(SUM(tokens_used), 0) as total_tokens,
-                               MIN(request_timestamp) as oldest_request
-                        FROM rate_limits
-                        WHERE user_id = %s
-                          AND request_timestamp >= NOW() - INTERVAL '1 hour'
-                    """, (user_id,))
-
-                    result = cur.fetchone()
-                    tokens_used = result['total_tokens']
-                    oldest_request = result['oldest_request']
-
-                    # Calculate when the limit resets
-                    if oldest_request:
-                        reset_time = oldest_request + timedelta(hours=1)
-                        reset_seconds = int((reset_time - datetime.now(timezone.utc).replace(tzinfo=None)).total_seconds())
-                        reset_seconds = max(0, reset_seconds)
-                    else:
-                        reset_seconds = 3600
-
-                    # Check if adding this request would exceed the limit
-                    would_exceed = (tokens_used + tokens_requested) > hourly_limit
-
-                    return {
-                        'allowed': not would_exceed,
-                        'tokens_used': tokens_used,
-                        'tokens_requested': tokens_requested,
-                        'limit': hourly_limit,
-                        'reset_seconds': reset_seconds
-                    }
-
-        except Exception as e:
-            logger.error("Error checking rate limit: %s", e)
-            # Fail open - allow the request if there's a database error
-            return {
-                'allowed': True,
-                'tokens_used': 0,
-                'tokens_requested': tokens_requested,
-                'limit': 10000,
-                'reset_seconds': 3600
-            }
+        return self.rate_limiter.check_tokens(user_id, tokens_requested)
 
     def check_repeated_messages(self, user_id, message_content):
         """Check if user is repeating similar messages to game the bot
@@ -1185,22 +1200,18 @@ class Database:
             }
 
     def record_token_usage(self, user_id, username, tokens_used):
-        """Record token usage for rate limiting"""
-        try:
-            with self.get_connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        INSERT INTO rate_limits (user_id, username, tokens_used)
-                        VALUES (%s, %s, %s)
-                    """, (user_id, username, tokens_used))
+        """Record token usage for rate limiting (audit row is written by the flush job)"""
+        self.rate_limiter.record_tokens(user_id, username, tokens_used)
 
-                    # Cleanup moved to daily background job (was running on every insert)
+    def record_api_cost(self, model, input_tokens, output_tokens, cost_usd, request_type, user_id=None, username=None):
+        """Record API cost for monitoring spending
 
-        except Exception as e:
-            logger.error("Error recording token usage: %s", e)
+        The request is logged to api_costs and added to the api_cost_totals ledger
+        (month / model / request type) in the same transaction.
 
-    def record_api_cost(self, model, input_tokens, output_tokens, cost_usd, request_type, user_id=None, username=None):
-        """Record API cost for monitoring spending"""
+        Returns:
+            True if recorded
+        """
         try:
             with self.get_connection() as conn:
                 with conn.cursor() as cur:
@@ -1208,34 +1219,107 @@ class Database:
                         INSERT INTO api_costs (model, input_tokens, output_tokens, cost_usd, request_type, user_id, username)
                         VALUES (%s, %s, %s, %s, %s, %s, %s)
                     """, (model, input_tokens, output_tokens, cost_usd, request_type, user_id, username))
+                    cur.execute("""
+                        INSERT INTO api_cost_totals (month, model, request_type, requests, input_tokens, output_tokens, cost_usd)
+                        VALUES (date_trunc('month', LOCALTIMESTAMP)::date, %s, %s, 1, %s, %s, %s)
+                        ON CONFLICT (month, model, request_type) DO UPDATE SET
+                            requests = api_cost_totals.requests + 1,
+                            input_tokens = api_cost_totals.input_tokens + EXCLUDED.input_tokens,
+                            output_tokens = api_cost_totals.output_tokens + EXCLUDED.output_tokens,
+                            cost_usd = api_cost_totals.cost_usd + EXCLUDED.cost_usd
+                    """, (model, request_type or '', input_tokens, output_tokens, cost_usd))
+            return True
         except Exception as e:
             logger.error("Error recording API cost: %s", e)
+            return False
 
     def get_total_cost(self, since_timestamp=None):
-        """Get total API costs, optionally since a specific timestamp"""
+        """Get total API costs, optionally since a specific timestamp
+
+        All-time and since-start-of-month totals come from the api_cost_totals ledger;
+        any other start time sums the api_costs log.
+        """
         try:
             with self.get_connection() as conn:
                 with conn.cursor() as cur:
-                    if since_timestamp:
+                    if since_timestamp is None:
                         cur.execute("""
                             SELECT COALESCE(SUM(cost_usd), 0) as total_cost
-                            FROM api_costs
-                            WHERE timestamp >= %s
-                        """, (since_timestamp,))
+                            FROM api_cost_totals
+                        """)
+                    elif since_timestamp.replace(day=1, hour=0, minute=0, second=0, microsecond=0) == since_timestamp:
+                        cur.execute("""
+                            SELECT COALESCE(SUM(cost_usd), 0) as total_cost
+                            FROM api_cost_totals
+                            WHERE month >= %s
+                        """, (since_timestamp.date(),))
                     else:
                         cur.execute("""
                             SELECT COALESCE(SUM(cost_usd), 0) as total_cost
                             FROM api_costs
-                        """)
+                            WHERE timestamp >= %s
+                        """, (since_timestamp,))
                     result = cur.fetchone()
                     return float(result[0]) if result else 0.0
         except Exception as e:
             logger.error("Error getting total cost: %s", e)
             return 0.0
 
+    def get_cost_totals(self, month):
+        """All-time and month-to-date API cost from the ledger
+
+        Args:
+            month: First day of the month (date)
+
+        Returns:
+            (total_cost, month_cost) floats, or None on error
+        """
+        try:
+            with self.get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        SELECT COALESCE(SUM(cost_usd), 0),
+                               COALESCE(SUM(cost_usd) FILTER (WHERE month = %s), 0)
+                        FROM api_cost_totals
+                    """, (month,))
+                    total, month_total = cur.fetchone()
+                    return float(total), float(month_total)
+        except Exception as e:
+            logger.error("Error getting cost totals: %s", e)
+            return None
+
+    def get_cost_breakdown(self, since_month=None):
+        """Cost per model from the ledger, highest first
+
+        Args:
+            since_month: Optional first month (date) to include; all time if None
+
+        Returns:
+            dict of model -> cost in USD
+        """
+        try:
+            with self.get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        SELECT model, SUM(cost_usd) as total_cost
+                        FROM api_cost_totals
+                        WHERE %s::date IS NULL OR month >= %s::date
+                        GROUP BY model
+                        ORDER BY total_cost DESC
+                    """, (since_month, since_month))
+                    return {row[0]: float(row[1]) for row in cur.fetchall()}
+        except Exception as e:
+            logger.error("Error getting cost breakdown: %s", e)
+            return {}
+
     def check_cost_alert_threshold(self, threshold_usd):
-        """Check if we've crossed a cost threshold that hasn't been alerted yet"""
+        """Check if we've crossed a cost threshold that hasn't been alerted yet
+
+        Thresholds are multiples of threshold_usd ($1 by default). CostTracker detects
+        crossings from each request's delta; this is the ledger-backed full check.
+        """
         try:
+            step = threshold_usd or 1.0
             with self.get_connection() as conn:
                 with conn.cursor() as cur:
                     # Get last alerted threshold
@@ -1246,22 +1330,18 @@ class Database:
                     result = cur.fetchone()
                     last_threshold = float(result[0]) if result and result[0] else 0.0
 
-                    # Get total cost
-                    total_cost = self.get_total_cost()
+            total_cost = self.get_total_cost()
+            current_threshold = int(total_cost // step) * step
 
-                    # Calculate which $1 thresholds have been crossed
-                    current_threshold_floor = int(total_cost)
-                    last_threshold_floor = int(last_threshold)
+            # If we've crossed a new threshold
+            if current_threshold > last_threshold:
+                return {
+                    'should_alert': True,
+                    'threshold': current_threshold,
+                    'total_cost': total_cost
+                }
 
-                    # If we've crossed a new $1 threshold
-                    if current_threshold_floor > last_threshold_floor:
-                        return {
-                            'should_alert': True,
-                            'threshold': current_threshold_floor,
-                            'total_cost': total_cost
-                        }
-
-                    return {'should_alert': False, 'total_cost': total_cost}
+            return {'should_alert': False, 'total_cost': total_cost}
 
         except Exception as e:
             logger.error("Error checking cost alert threshold: %s", e)
@@ -1293,88 +1373,14 @@ class Database:
         Returns:
             dict with 'allowed' (bool), 'reason' (str), 'wait_seconds' (int)
         """
-        try:
-            with self.get_connection() as conn:
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    # Check cooldown
-                    if cooldown_seconds:
-                        cur.execute("""
-                            SELECT MAX(request_timestamp) as last_request
-                            FROM feature_rate_limits
-                            WHERE user_id = %s AND feature_type = %s
-                              AND request_timestamp >= NOW() - INTERVAL '1 second' * %s
-                        """, (user_id, feature_type, cooldown_seconds))
-
-                        result = cur.fetchone()
-                        if result and result['last_request']:
-                            last_request = result['last_request']
-                            elapsed = (datetime.now(timezone.utc).replace(tzinfo=None) - last_request).total_seconds()
-                            wait_time = max(0, cooldown_seconds - elapsed)
-
-                            if wait_time > 0:
-                                return {
-                                    'allowed': False,
-                                    'reason': 'cooldown',
-                                    'wait_seconds': int(wait_time)
-                                }
-
-                    # Check hourly limit
-                    if hourly_limit:
-                        cur.execute("""
-                            SELECT COUNT(*) as count
-                            FROM feature_rate_limits
-                            WHERE user_id = %s AND feature_type = %s
-                              AND request_timestamp >= NOW() - INTERVAL '1 hour'
-                        """, (user_id, feature_type))
-
-                        result = cur.fetchone()
-                        if result['count'] >= hourly_limit:
-                            return {
-                                'allowed': False,
-                                'reason': 'hourly_limit',
-                                'count': result['count'],
-                                'limit': hourly_limit
-                            }
-
-                    # Check daily limit
-                    if daily_limit:
-                        cur.execute("""
-                            SELECT COUNT(*) as count
-                            FROM feature_rate_limits
-                            WHERE user_id = %s AND feature_type = %s
-                              AND request_timestamp >= NOW() - INTERVAL '24 hours'
-                        """, (user_id, feature_type))
-
-                        result = cur.fetchone()
-                        if result['count'] >= daily_limit:
-                            return {
-                                'allowed': False,
-                                'reason': 'daily_limit',
-                                'count': result['count'],
-                                'limit': daily_limit
-                            }
-
-                    # All checks passed
-                    return {'allowed': True}
-
-        except Exception as e:
-            logger.error("Error checking feature rate limit: %s", e)
-            # Fail open
-            return {'allowed': True}
+        return self.rate_limiter.check_feature(
+            user_id, feature_type, cooldown_seconds=cooldown_seconds,
+            hourly_limit=hourly_limit, daily_limit=daily_limit
+        )
 
     def record_feature_usage(self, user_id, feature_type):
-        """Record usage of a rate-limited feature"""
-        try:
-            with self.get_connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        INSERT INTO feature_rate_limits (user_id, feature_type)
-                        VALUES (%s, %s)
-                    """, (user_id, feature_type))
-                    # Note: cleanup of old records moved to periodic background job
-                    # (was running DELETE on every insert, wasting ~20ms per call)
-        except Exception as e:
-            logger.error("Error recording feature usage: %s", e)
+        """Record usage of a rate-limited feature (audit row is written by the flush job)"""
+        self.rate_limiter.record_feature(user_id, feature_type)
 
     def cleanup_feature_rate_limits(self):
         """Clean up old rate limit records (called periodically by background job)"""
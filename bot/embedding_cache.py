@@ -0,0 +1,107 @@
+"""
+Two-level cache for OpenAI embeddings, keyed by model + normalized-text hash.
+
+The same text is embedded repeatedly: a message is queued for storage embedding and
+then used as a mention query, and people repeat identical questions. Every repeat used
+to be an OpenAI round-trip on the mention critical path.
+
+Level 1 is an in-process LRU of float32 arrays (no I/O at all). Level 2 is Redis, with
+vectors packed as raw little-endian float32 bytes (~6 KB for 1536 dims, versus ~30 KB
+as a JSON list) so they are shared across restarts. Lookups and writes are batched:
+one MGET / one pipeline per call. If Redis is unavailable only L1 is used.
+"""
+import hashlib
+import logging
+import os
+import re
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_text(text: str, max_chars: int = 8000) -> str:
+    """Canonical form that is both embedded and hashed: trimmed, whitespace collapsed,
+    truncated to the embedding input limit."""
+    return _WHITESPACE.sub(' ', text).strip()[:max_chars]
+
+
+def cache_key(model: str, normalized: str) -> str:
+    digest = hashlib.sha256(normalized.encode('utf-8')).hexdigest()[:32]
+    return f"emb:{model}:{digest}"
+
+
+def pack_embedding(vector) -> bytes:
+    return np.asarray(vector, dtype='<f4').tobytes()
+
+
+def unpack_embedding(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype='<f4')
+
+
+class EmbeddingCache:
+    """L1 (process LRU) + L2 (Redis, binary) embedding cache with hit-rate stats."""
+
+    def __init__(self, redis_cache=None):
+        self.redis = redis_cache
+        self.l1_size = int(os.getenv('EMBEDDING_CACHE_L1_SIZE', '2048'))
+        self.ttl = int(os.getenv('EMBEDDING_CACHE_TTL', str(7 * 86400)))
+        self._l1 = OrderedDict()  # key -> np.ndarray (float32, read-only)
+        self.stats = {'l1_hits': 0, 'l2_hits': 0, 'misses': 0}
+
+    def _l1_put(self, key, vector):
+        self._l1[key] = vector
+        self._l1.move_to_end(key)
+        while len(self._l1) > self.l1_size:
+            self._l1.popitem(last=False)
+
+    async def get_many(self, keys: List[str]) -> List[Optional[np.ndarray]]:
+        """Look up keys in L1, then the L1 misses in Redis with a single MGET."""
+        results = [None] * len(keys)
+        l2_lookup = []
+        for i, key in enumerate(keys):
+            vector = self._l1.get(key)
+            if vector is not None:
+                self._l1.move_to_end(key)
+                results[i] = vector
+                self.stats['l1_hits'] += 1
+            else:
+                l2_lookup.append(i)
+
+        if l2_lookup and self.redis is not None and self.redis.enabled:
+            packed = await self.redis.amget_bytes([keys[i] for i in l2_lookup])
+            for i, data in zip(l2_lookup, packed):
+                if data:
+                    vector = unpack_embedding(data)
+                    results[i] = vector
+                    self._l1_put(keys[i], vector)
+                    self.stats['l2_hits'] += 1
+
+        self.stats['misses'] += sum(1 for r in results if r is None)
+        return results
+
+    async def put_many(self, items: dict):
+        """Store {key: vector} in L1 and (one pipeline) in Redis."""
+        if not items:
+            return
+        packed = {}
+        for key, vector in items.items():
+            array = np.asarray(vector, dtype=np.float32)
+            array.setflags(write=False)
+            self._l1_put(key, array)
+            packed[key] = pack_embedding(array)
+        if self.redis is not None and self.redis.enabled:
+            await self.redis.aset_many_bytes(packed, self.ttl)
+
+    def get_stats(self):
+        lookups = self.stats['l1_hits'] + self.stats['l2_hits'] + self.stats['misses']
+        hits = self.stats['l1_hits'] + self.stats['l2_hits']
+        return {
+            **self.stats,
+            'l1_entries': len(self._l1),
+            'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+        }
@@ -0,0 +1,61 @@
+"""
+Embedding ingestion policy.
+
+Decides which queued messages are worth a vector. "lol", emoji-only lines, bare links
+and the bot's own replies took up embedding spend and HNSW index space, and they crowded
+real matches out of semantic search. A message is skipped when, after removing links,
+mentions and custom emoji:
+- it has fewer than EMBED_MIN_TOKENS words, or
+- its word distribution has less than EMBED_MIN_ENTROPY bits of Shannon entropy
+  ("ha ha ha ha", "no no no way"), or
+- it was written by the bot, unless EMBED_BOT_MESSAGES=true.
+
+content_hash() identifies normalized content, so a message repeating text that is
+already embedded in the same channel can be represented by the existing vector.
+"""
+import hashlib
+import math
+import os
+import re
+from collections import Counter
+from typing import Optional
+
+from embedding_cache import normalize_text
+
+# Links, user/role/channel mentions and custom emoji: no retrievable meaning on their own
+_NOISE = re.compile(r"https?://\S+|<a?:\w+:\d+>|<[@#][!&]?\d+>")
+_WORD = re.compile(r"[^\W_]+")
+
+
+def token_entropy(tokens) -> float:
+    """Shannon entropy (bits) of the token distribution."""
+    total = len(tokens)
+    if total == 0:
+        return 0.0
+    return -sum((n / total) * math.log2(n / total) for n in Counter(tokens).values())
+
+
+def content_hash(content: str) -> bytes:
+    """16-byte hash of case- and whitespace-normalized content."""
+    return hashlib.blake2b(normalize_text(content).casefold().encode('utf-8'), digest_size=16).digest()
+
+
+class EmbeddingPolicy:
+    """Skip rules for the embedding queue (see module docstring)."""
+
+    def __init__(self):
+        self.min_tokens = int(os.getenv('EMBED_MIN_TOKENS', '3'))
+        self.min_entropy = float(os.getenv('EMBED_MIN_ENTROPY', '1.0'))
+        self.embed_bot_messages = os.getenv('EMBED_BOT_MESSAGES', 'false').lower() == 'true'
+        self.bot_user_id = None  # set once the bot is ready
+
+    def skip_reason(self, content: str, user_id: Optional[int] = None) -> Optional[str]:
+        """Why a message shouldn't be embedded ('bot', 'short', 'repetitive'), or None."""
+        if not self.embed_bot_messages and self.bot_user_id is not None and user_id == self.bot_user_id:
+            return 'bot'
+        tokens = _WORD.findall(_NOISE.sub(' ', content or '').lower())
+        if len(tokens) < self.min_tokens:
+            return 'short'
+        if token_entropy(tokens) < self.min_entropy:
+            return 'repetitive'
+        return None
@@ -4,17 +4,225 @@ Provides network graphs, topic trends, primetime analysis, and engagement metric
 """
 
 import logging
+import os
 import re
 from datetime import datetime, timedelta
 from collections import Counter, defaultdict
-from typing import List, Dict, Optional, Tuple
+from typing import Iterator, List, Dict, Optional, Tuple
 import json
 
+import numpy as np
+
+from features.stats_rollups import StatsRollups
+from features.topic_model import GuildTopicModels, TermMatrix
+
 logger = logging.getLogger(__name__)
 
+_MENTION = re.compile(r'<@!?(\d+)>')
+_MAX_USER_ID = (1 << 63) - 1
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _as_columns(messages) -> 'MessageColumns':
+    return messages if isinstance(messages, MessageColumns) else MessageColumns.from_messages(messages)
+
+
+def _as_corpus(messages) -> 'TopicCorpus':
+    if isinstance(messages, TopicCorpus):
+        return messages
+    corpus = TopicCorpus()
+    corpus.add(messages)
+    return corpus
+
+
+def _ordered_counts(values: np.ndarray) -> Dict[int, int]:
+    """Counts per value, keyed in first-seen order (like a Counter filled in a loop)."""
+    if not len(values):
+        return {}
+    uniques, first, counts = np.unique(values, return_index=True, return_counts=True)
+    order = np.argsort(first)
+    return dict(zip(uniques[order].tolist(), counts[order].tolist()))
+
+
+class MessageColumns:
+    """Columnar view of a message window for the vectorized stats.
+
+    Build it once per window and pass it to calculate_primetime, calculate_engagement and
+    build_network_graph in place of the message list. `get_message_columns` fills it
+    straight from the database (timestamps as epoch microseconds, mention ids parsed in
+    SQL, no message text); `from_messages` converts already-fetched row dicts.
+    """
+
+    def __init__(self, user_ids, channel_ids, micros, lengths, usernames,
+                 mention_msg, mention_targets):
+        self.size = len(usernames)
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.channel_ids = np.asarray(channel_ids, dtype=np.int64)
+        self.micros = np.asarray(micros, dtype=np.int64)
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.usernames = usernames
+
+        # Hour of day / weekday (0=Monday; 1970-01-01 was a Thursday)
+        hours_since_epoch = self.micros // 3_600_000_000
+        self.hours = hours_since_epoch % 24
+        self.weekdays = (hours_since_epoch // 24 + 3) % 7
+
+        # Mentions in message order: owning message, rank within it, mentioned user id
+        self.mention_msg = np.asarray(mention_msg, dtype=np.int64)
+        self.mention_targets = np.asarray(mention_targets, dtype=np.int64)
+        self.mention_counts = np.bincount(self.mention_msg, minlength=self.size)
+        first_of_msg = np.cumsum(self.mention_counts) - self.mention_counts
+        self.mention_pos = np.arange(len(self.mention_msg)) - first_of_msg[self.mention_msg]
+
+    @classmethod
+    def from_messages(cls, messages: List[dict]) -> 'MessageColumns':
+        """Columns from message dicts (user_id, username, channel_id, timestamp, content)."""
+        n = len(messages)
+        contents = [m.get('content') or '' for m in messages]
+        lengths = np.fromiter((len(c) for c in contents), dtype=np.int64, count=n)
+
+        # One regex scan over the joined text; map match offsets back to messages
+        starts = np.cumsum(lengths + 1) - (lengths + 1)
+        positions = []
+        targets = []
+        for match in _MENTION.finditer('\n'.join(contents)):
+            target = int(match.group(1))
+            if target <= _MAX_USER_ID:
+                positions.append(match.start())
+                targets.append(target)
+        mention_msg = np.searchsorted(starts, np.array(positions, dtype=np.int64), side='right') - 1
+
+        return cls(
+            np.fromiter((m['user_id'] for m in messages), dtype=np.int64, count=n),
+            np.fromiter((m['channel_id'] for m in messages), dtype=np.int64, count=n),
+            np.fromiter(((m['timestamp'] - _EPOCH) // _MICROSECOND for m in messages), dtype=np.int64, count=n),
+            lengths,
+            [m['username'] for m in messages],
+            mention_msg,
+            targets,
+        )
+
+    @classmethod
+    def from_rows(cls, rows) -> 'MessageColumns':
+        """Columns from (user_id, username, channel_id, epoch_micros, length, [mention ids]) rows."""
+        n = len(rows)
+        mention_msg = []
+        targets = []
+        for i, row in enumerate(rows):
+            if row[5]:
+                for mentioned in row[5]:
+                    target = int(mentioned)
+                    if target <= _MAX_USER_ID:
+                        mention_msg.append(i)
+                        targets.append(target)
+
+        def column(index):
+            return np.fromiter((row[index] for row in rows), dtype=np.int64, count=n)
+
+        # One string object per distinct username, not one per row
+        names = {}
+        usernames = [names.setdefault(row[1], row[1]) for row in rows]
+
+        return cls(column(0), column(2), column(3), column(4),
+                   usernames, mention_msg, targets)
+
+    @classmethod
+    def concat(cls, parts: List['MessageColumns']) -> 'MessageColumns':
+        """Join consecutive windows (e.g. streamed batches) into one, in order."""
+        if not parts:
+            return cls.from_rows([])
+        if len(parts) == 1:
+            return parts[0]
+        offsets = np.cumsum([0] + [part.size for part in parts[:-1]])
+        usernames = []
+        for part in parts:
+            usernames.extend(part.usernames)
+        return cls(
+            np.concatenate([part.user_ids for part in parts]),
+            np.concatenate([part.channel_ids for part in parts]),
+            np.concatenate([part.micros for part in parts]),
+            np.concatenate([part.lengths for part in parts]),
+            usernames,
+            np.concatenate([part.mention_msg + offset for part, offset in zip(parts, offsets)]),
+            np.concatenate([part.mention_targets for part in parts]),
+        )
+
+
+class TopicCorpus:
+    """Cleaned message text for the TF-IDF topic and expertise extractors.
+
+    Fed batch by batch through `add`, so a window can be streamed from the database
+    without holding its message rows: only the cleaned text of messages long enough to
+    count, its timestamp and author, and per-user length/link counters are kept. Pass it
+    to extract_topics_tfidf or compute_user_topic_expertise in place of the message list.
+    The texts are tokenized once (`matrix`) and every topic query scores a subset of rows.
+    """
+
+    def __init__(self):
+        self.message_count = 0
+        self.texts = []
+        self.timestamps = []
+        self.authors = []      # user_id when the message counts toward expertise, else None
+        self.user_stats = {}   # user_id -> [messages, total_length, messages_with_links]
+        self.guild_ids = set()
+        self.matrix: Optional[TermMatrix] = None
+        # Set on since() subsets: score these rows of the parent's matrix
+        self.parent: Optional['TopicCorpus'] = None
+        self.rows: Optional[np.ndarray] = None
+
+    @property
+    def guild_id(self) -> Optional[int]:
+        """The guild every message came from, or None if unknown or mixed."""
+        return next(iter(self.guild_ids)) if len(self.guild_ids) == 1 else None
+
+    def add(self, messages) -> None:
+        """Fold in message dicts (user_id, content, timestamp, guild_id)."""
+        self.matrix = None
+        for msg in messages:
+            self.message_count += 1
+            self.guild_ids.add(msg.get('guild_id'))
+            raw = msg.get('content') or ''
+            expert_eligible = len(raw.strip()) > 10
+            if expert_eligible:
+                stats = self.user_stats.setdefault(msg['user_id'], [0, 0, 0])
+                stats[0] += 1
+                stats[1] += len(raw)
+                stats[2] += 'http' in raw
+            if not raw:
+                continue
+            cleaned = ChatStatistics._clean_message_for_topics(raw)
+            # Skip messages that are too short after cleaning (< 3 real words)
+            if len(cleaned.split()) >= 3:
+                self.texts.append(cleaned)
+                self.timestamps.append(msg.get('timestamp'))
+                self.authors.append(msg['user_id'] if expert_eligible else None)
+
+    def since(self, cutoff: datetime) -> 'TopicCorpus':
+        """Texts from `cutoff` on, for topics over a shorter window (no expertise counters)."""
+        subset = TopicCorpus()
+        subset.parent = self
+        rows = []
+        for row, (text, timestamp) in enumerate(zip(self.texts, self.timestamps)):
+            if timestamp is not None and timestamp >= cutoff:
+                rows.append(row)
+                subset.texts.append(text)
+                subset.timestamps.append(timestamp)
+                subset.authors.append(None)
+        subset.rows = np.array(rows, dtype=np.int64)
+        subset.message_count = len(subset.texts)
+        subset.guild_ids = set(self.guild_ids)
+        return subset
+
+
 class ChatStatistics:
     def __init__(self, db):
         self.db = db
+        self.rollups = StatsRollups(db)  # Hourly aggregates behind primetime/engagement/network
+        # Per-guild document frequencies for topic IDF (refreshed by update_topic_models)
+        self.topic_models = GuildTopicModels(db, self._CHAT_STOPWORDS, self._clean_message_for_topics)
+        # Rows per server-side cursor fetch when streaming a window
+        self.stream_batch_size = max(int(os.getenv('STATS_STREAM_BATCH_SIZE', '5000')), 100)
 
     def parse_date_range(self, date_input: str) -> Tuple[Optional[datetime], Optional[datetime]]:
         """
@@ -97,7 +305,7 @@ class ChatStatistics:
 
     def get_messages_for_analysis(self, channel_id: Optional[int], start_date: datetime,
                                   end_date: datetime, exclude_opted_out: bool = True,
-                                  max_messages: int = 50000,
+                                  max_messages: Optional[int] = 50000,
                                   guild_id: Optional[int] = None) -> List[dict]:
         """Get messages for analysis, excluding opted-out users
 
@@ -106,45 +314,131 @@ class ChatStatistics:
             start_date: Start of date range
             end_date: End of date range
             exclude_opted_out: Whether to exclude opted-out users
-            max_messages: Maximum number of messages to return (default 50000)
+            max_messages: Maximum number of messages to return (default 50000, None = no cap)
             guild_id: Optional guild ID to filter by
         """
         try:
-            with self.db.get_connection() as conn:
-                with conn.cursor() as cur:
-                    query = """
-                        SELECT m.message_id, m.user_id, m.username, m.content,
-                               m.timestamp, m.channel_id, m.guild_id
-                        FROM messages m
-                        LEFT JOIN user_profiles up ON up.user_id = m.user_id
-                        WHERE m.timestamp BETWEEN %s AND %s
-                    """
-                    params = [start_date, end_date]
-
-                    if exclude_opted_out:
-                        query += " AND COALESCE(m.opted_out, FALSE) = FALSE AND COALESCE(up.opted_out, FALSE) = FALSE"
-
-                    if channel_id:
-                        query += " AND m.channel_id = %s"
-                        params.append(channel_id)
-
-                    if guild_id:
-                        query += " AND m.guild_id = %s"
-                        params.append(guild_id)
-
-                    query += " ORDER BY m.timestamp ASC LIMIT %s"
-                    params.append(max_messages)
-
-                    cur.execute(query, params)
-
-                    columns = [desc[0] for desc in cur.description]
-                    results = cur.fetchall()
-
-                    return [dict(zip(columns, row)) for row in results]
+            return [
+                msg
+                for batch in self.iter_message_batches(channel_id, start_date, end_date,
+                                                       exclude_opted_out=exclude_opted_out,
+                                                       max_messages=max_messages, guild_id=guild_id)
+                for msg in batch
+            ]
         except Exception as e:
             logger.error("Error fetching messages: %s", e)
             return []
 
+    def iter_message_batches(self, channel_id: Optional[int], start_date: datetime,
+                             end_date: datetime, exclude_opted_out: bool = True,
+                             max_messages: Optional[int] = None,
+                             guild_id: Optional[int] = None) -> Iterator[List[dict]]:
+        """Stream the rows of get_messages_for_analysis as lists of dicts.
+
+        Uses a server-side (named) cursor, so only one batch of STATS_STREAM_BATCH_SIZE
+        rows is in memory at a time and a window needs no row cap. The pooled connection
+        is held until the generator is exhausted or closed; errors propagate to the caller.
+        """
+        query = """
+            SELECT m.message_id, m.user_id, m.username, m.content,
+                   m.timestamp, m.channel_id, m.guild_id
+            FROM messages m
+            LEFT JOIN user_profiles up ON up.user_id = m.user_id
+            WHERE m.timestamp BETWEEN %s AND %s
+        """
+        params = [start_date, end_date]
+
+        if exclude_opted_out:
+            query += " AND COALESCE(m.opted_out, FALSE) = FALSE AND COALESCE(up.opted_out, FALSE) = FALSE"
+
+        if channel_id:
+            query += " AND m.channel_id = %s"
+            params.append(channel_id)
+
+        if guild_id:
+            query += " AND m.guild_id = %s"
+            params.append(guild_id)
+
+        query += " ORDER BY m.timestamp ASC"
+        if max_messages:
+            query += " LIMIT %s"
+            params.append(max_messages)
+
+        for rows, columns in self._stream(query, params, 'chat_stats_messages'):
+            yield [dict(zip(columns, row)) for row in rows]
+
+    def _stream(self, query: str, params: list, cursor_name: str):
+        """Run a query on a named cursor, yielding (rows, column names) per batch."""
+        with self.db.get_connection() as conn:
+            with conn.cursor(name=cursor_name) as cur:
+                # fetchmany() on a named cursor is one FETCH FORWARD round trip per batch
+                cur.itersize = self.stream_batch_size
+                cur.execute(query, params)
+                while True:
+                    rows = cur.fetchmany(self.stream_batch_size)
+                    if not rows:
+                        break
+                    yield rows, [desc[0] for desc in cur.description]
+
+    def collect_topic_corpus(self, start_date: datetime, end_date: datetime,
+                             guild_id: Optional[int] = None,
+                             channel_id: Optional[int] = None) -> TopicCorpus:
+        """Stream a whole window (opted-out users excluded) into a TopicCorpus."""
+        corpus = TopicCorpus()
+        try:
+            for batch in self.iter_message_batches(channel_id, start_date, end_date,
+                                                   exclude_opted_out=True, guild_id=guild_id):
+                corpus.add(batch)
+        except Exception as e:
+            logger.error("Error streaming messages for topics: %s", e)
+            return TopicCorpus()
+        return corpus
+
+    def get_message_columns(self, start_date: datetime, end_date: datetime,
+                            guild_id: Optional[int] = None, user_id: Optional[int] = None,
+                            max_messages: Optional[int] = None) -> MessageColumns:
+        """Fetch a window as MessageColumns for primetime/engagement/network.
+
+        Same rows and order as get_messages_for_analysis (opted-out users excluded), but
+        the database returns epoch microseconds, text length and mentioned ids instead of
+        the message text, so nothing has to be converted per row in Python. Rows are
+        streamed and converted batch by batch; there is no cap unless `max_messages` is set.
+        """
+        try:
+            query = r"""
+                SELECT m.user_id, m.username, m.channel_id,
+                       (EXTRACT(EPOCH FROM m.timestamp) * 1000000)::bigint,
+                       COALESCE(length(m.content), 0),
+                       ARRAY(SELECT (regexp_matches(m.content, '<@!?(\d+)>', 'g'))[1])
+                FROM messages m
+                LEFT JOIN user_profiles up ON up.user_id = m.user_id
+                WHERE m.timestamp BETWEEN %s AND %s
+                  AND COALESCE(m.opted_out, FALSE) = FALSE
+                  AND COALESCE(up.opted_out, FALSE) = FALSE
+            """
+            params = [start_date, end_date]
+
+            if guild_id:
+                query += " AND m.guild_id = %s"
+                params.append(guild_id)
+
+            if user_id:
+                query += " AND m.user_id = %s"
+                params.append(user_id)
+
+            query += " ORDER BY m.timestamp ASC"
+            if max_messages:
+                query += " LIMIT %s"
+                params.append(max_messages)
+
+            return MessageColumns.concat([
+                MessageColumns.from_rows(rows)
+                for rows, _ in self._stream(query, params, 'chat_stats_columns')
+            ])
+        except Exception as e:
+            logger.error("Error fetching message columns: %s", e)
+            return MessageColumns.from_rows([])
+
     # Words that are common in Discord chat but carry no topic meaning
     _CHAT_STOPWORDS = {
         # English stopwords
@@ -208,101 +502,40 @@ class ChatStatistics:
         text = re.sub(r'\s+', ' ', text).strip()
         return text
 
-    def extract_topics_tfidf(self, messages: List[dict], top_n: int = 20) -> List[dict]:
+    def extract_topics_tfidf(self, messages, top_n: int = 20,
+                             guild_id: Optional[int] = None) -> List[dict]:
         """
         Extract trending topics using TF-IDF (keyword extraction).
 
+        IDF weights come from the guild's persisted document frequencies once it has
+        enough history (see features/topic_model.py), otherwise from the messages given.
+
         Args:
-            messages: List of message dicts with 'content' field
+            messages: List of message dicts with 'content' field (or a TopicCorpus)
             top_n: Number of top keywords to return
+            guild_id: Guild whose document frequencies to use (default: the messages' guild)
 
         Returns:
             List of {keyword, score, count} dicts
         """
         try:
-            from sklearn.feature_extraction.text import TfidfVectorizer
-
-            # Clean messages: strip Discord noise, skip very short messages
-            texts = []
-            for msg in messages:
-                raw = msg.get('content', '')
-                if not raw:
-                    continue
-                cleaned = self._clean_message_for_topics(raw)
-                # Skip messages that are too short after cleaning (< 3 real words)
-                if len(cleaned.split()) >= 3:
-                    texts.append(cleaned)
-
-            if len(texts) < 3:
-                return []
-
-            # Adaptive min_df: at least 2, but lower when few messages
-            adaptive_min_df = 2 if len(texts) >= 20 else 1
-
-            # TF-IDF vectorizer
-            vectorizer_kwargs = dict(
-                max_features=top_n * 3,
-                stop_words=list(self._CHAT_STOPWORDS),
-                ngram_range=(1, 2),
-                min_df=adaptive_min_df,
-                max_df=0.8,
-                # Allow alphanumeric words (2+ chars) so terms like "F1", "GT3" aren't lost
-                token_pattern=r'(?u)\b\w[\w]+\b',
-            )
-
-            vectorizer = TfidfVectorizer(**vectorizer_kwargs)
-
-            try:
-                tfidf_matrix = vectorizer.fit_transform(texts)
-            except ValueError as err:
-                if "After pruning, no terms remain" in str(err):
-                    fallback_kwargs = dict(vectorizer_kwargs)
-                    fallback_kwargs.update({'min_df': 1, 'max_df': 1.0})
-                    vectorizer = TfidfVectorizer(**fallback_kwargs)
-                    tfidf_matrix = vectorizer.fit_transform(texts)
-                else:
-                    raise
-
-            feature_names = vectorizer.get_feature_names_out()
-            avg_scores = tfidf_matrix.mean(axis=0).A1
-
-            # Count actual document occurrences (how many messages mention the term)
-            # Use the binary occurrence matrix for accurate doc-frequency counts
-            binary_matrix = (tfidf_matrix > 0).astype(int)
-            doc_counts = binary_matrix.sum(axis=0).A1
-
-            # Build topic list, filtering out pure-number tokens and single chars
-            topics = []
-            for idx, score in enumerate(avg_scores):
-                keyword = feature_names[idx]
-
-                # Skip pure numbers (years, IDs, etc.) unless they look meaningful
-                if keyword.isdigit():
-                    continue
-                # Skip very short words that slipped through
-                if len(keyword) <= 2 and ' ' not in keyword:
-                    continue
-
-                doc_count = int(doc_counts[idx])
-
-                topics.append({
-                    'keyword': keyword,
-                    'score': float(score),
-                    'count': doc_count,  # Number of messages mentioning this topic
-                })
-
-            # Sort by score and return top_n
-            topics.sort(key=lambda x: x['score'], reverse=True)
-            return topics[:top_n]
-
-        except ImportError:
-            logger.error("scikit-learn not installed. Install with: pip install scikit-learn")
-            return []
+            corpus = _as_corpus(messages)
+            matrix, rows = self._corpus_matrix(corpus)
+            return matrix.topics(rows, top_n, self.topic_models.get(guild_id or corpus.guild_id))
         except Exception as e:
             logger.error("Error extracting topics: %s", e, exc_info=True)
             return []
 
-    def compute_user_topic_expertise(self, messages: List[dict], guild_id: int,
+    def _corpus_matrix(self, corpus: TopicCorpus) -> Tuple[TermMatrix, Optional[np.ndarray]]:
+        """The corpus' document-term matrix (built once) and the rows it covers."""
+        if corpus.parent is not None:
+            matrix, _ = self._corpus_matrix(corpus.parent)
+            return matrix, corpus.rows
+        if corpus.matrix is None:
+            corpus.matrix = TermMatrix(corpus.texts, self._CHAT_STOPWORDS)
+        return corpus.matrix, None
+
+    def compute_user_topic_expertise(self, messages, guild_id: int,
                                       min_messages: int = 5, top_n: int = 10) -> list:
         """Compute per-user topic expertise from messages.
 
@@ -310,7 +543,7 @@ class ChatStatistics:
         and computes a quality score based on message length and diversity.
 
         Args:
-            messages: List of message dicts with user_id, username, content
+            messages: List of message dicts with user_id, username, content (or a TopicCorpus)
             guild_id: Guild ID for the results
             min_messages: Minimum messages required per user to compute expertise
             top_n: Number of top topics per user
@@ -318,30 +551,34 @@ class ChatStatistics:
         Returns:
             List of (user_id, guild_id, topic, message_count, quality_score) tuples
         """
-        from collections import defaultdict
+        corpus = _as_corpus(messages)
+        matrix, _ = self._corpus_matrix(corpus)
+        doc_freqs = self.topic_models.get(guild_id)
 
-        # Group messages by user
-        user_messages = defaultdict(list)
-        for msg in messages:
-            if msg.get('content') and len(msg['content'].strip()) > 10:
-                user_messages[msg['user_id']].append(msg)
+        # Group texts by user (only messages over 10 characters count toward expertise)
+        user_rows = defaultdict(list)
+        for row, author in enumerate(corpus.authors):
+            if author is not None:
+                user_rows[author].append(row)
 
         results = []
 
-        for user_id, msgs in user_messages.items():
-            if len(msgs) < min_messages:
+        for user_id, (message_count, total_length, has_links) in corpus.user_stats.items():
+            if message_count < min_messages:
                 continue
 
-            # Extract topics for this user's messages
-            topics = self.extract_topics_tfidf(msgs, top_n=top_n)
+            # Score this user's rows of the shared matrix
+            try:
+                topics = matrix.topics(user_rows.get(user_id, []), top_n, doc_freqs)
+            except Exception as e:
+                logger.error("Error extracting topics for user %s: %s", user_id, e)
+                continue
             if not topics:
                 continue
 
             # Compute quality metrics for this user's messages
-            total_length = sum(len(m.get('content', '')) for m in msgs)
-            avg_length = total_length / len(msgs) if msgs else 0
-            has_links = sum(1 for m in msgs if 'http' in m.get('content', ''))
-            link_ratio = has_links / len(msgs) if msgs else 0
+            avg_length = total_length / message_count
+            link_ratio = has_links / message_count
 
             for topic_info in topics:
                 keyword = topic_info['keyword']
@@ -412,10 +649,24 @@ class ChatStatistics:
         if len(segments) < 2:
             return {'transitions': [], 'topic_changers': [], 'segment_count': len(segments), 'top_topics': []}
 
-        # Extract dominant topic per segment
-        segment_topics = []
+        # Extract dominant topic per segment: tokenize every segment once, then score
+        # each segment's rows of the shared matrix
+        corpus = TopicCorpus()
+        bounds = []
         for seg in segments:
-            topics = self.extract_topics_tfidf(seg, top_n=3)
+            first = len(corpus.texts)
+            corpus.add(seg)
+            bounds.append((first, len(corpus.texts)))
+        matrix, _ = self._corpus_matrix(corpus)
+        doc_freqs = self.topic_models.get(corpus.guild_id)
+
+        segment_topics = []
+        for seg, (first, last) in zip(segments, bounds):
+            try:
+                topics = matrix.topics(np.arange(first, last), 3, doc_freqs)
+            except Exception as e:
+                logger.error("Error extracting segment topics: %s", e)
+                topics = []
             if topics:
                 # Use top keyword as segment topic
                 segment_topics.append({
@@ -449,12 +700,18 @@ class ChatStatistics:
             'top_topics': list(all_topics)
         }
 
-    def build_network_graph(self, messages: List[dict], exclude_from_ranking: bool = True) -> dict:
+    def build_network_graph(self, messages, exclude_from_ranking: bool = True) -> dict:
         """
         Build interaction network graph from messages
 
+        Edges come from @mentions (weight 1) and conversation proximity: each message links
+        its author to the authors of the previous 3 messages when they're in the same
+        channel (weight 0.5). Computed with array group-bys over MessageColumns; node and
+        edge order match a networkx DiGraph built message by message.
+
         Args:
             messages: List of message dicts with user_id, username, content, channel_id
+                (or a MessageColumns for the same window)
             exclude_from_ranking: If True, excludes bot from top rankings (default True)
 
         Returns:
@@ -465,45 +722,76 @@ class ChatStatistics:
             }
         """
         try:
-            import networkx as nx
+            cols = _as_columns(messages)
+            n = cols.size
+            if not n:
+                return {'edges': [], 'nodes': {}, 'bot_stats': None}
 
-            G = nx.DiGraph()
-            user_messages = Counter()
             bot_user_id = self.db.bot_user_id if exclude_from_ranking else None
-
-            # Build graph from message sequence (proximity-based connections)
-            for i, msg in enumerate(messages):
-                user_id = msg['user_id']
-                username = msg['username']
-                user_messages[user_id] += 1
-
-                # Add node if not exists
-                if not G.has_node(user_id):
-                    G.add_node(user_id, username=username)
-
-                # Check for @mentions in content
-                mentions = re.findall(r'<@!?(\d+)>', msg.get('content', ''))
-                for mentioned_id in mentions:
-                    mentioned_id_int = int(mentioned_id)
-                    if G.has_edge(user_id, mentioned_id_int):
-                        G[user_id][mentioned_id_int]['weight'] += 1
-                    else:
-                        G.add_edge(user_id, mentioned_id_int, weight=1)
-
-                # Conversation proximity: connect to previous messengers in same channel
-                # (last 3 messages in same channel)
-                lookback = min(i, 3)
-                for j in range(i - lookback, i):
-                    if j >= 0 and messages[j]['channel_id'] == msg['channel_id']:
-                        prev_user = messages[j]['user_id']
-                        if prev_user != user_id:
-                            if G.has_edge(user_id, prev_user):
-                                G[user_id][prev_user]['weight'] += 0.5
-                            else:
-                                G.add_edge(user_id, prev_user, weight=0.5)
+            msg_index = np.arange(n)
+
+            # "Events" in processing order (message index, then position within the message):
+            # the author, then each mention, then each proximity link
+            mention_src = cols.user_ids[cols.mention_msg]
+            src_parts = [mention_src]
+            dst_parts = [cols.mention_targets]
+            weight_parts = [np.ones(len(cols.mention_targets))]
+            msg_parts = [cols.mention_msg]
+            sub_parts = [1 + cols.mention_pos]
+            for back in (3, 2, 1):  # previous messages, oldest first
+                cur = msg_index[back:]
+                prev = cur - back
+                linked = (cols.channel_ids[cur] == cols.channel_ids[prev]) & \
+                         (cols.user_ids[cur] != cols.user_ids[prev])
+                cur, prev = cur[linked], prev[linked]
+                src_parts.append(cols.user_ids[cur])
+                dst_parts.append(cols.user_ids[prev])
+                weight_parts.append(np.full(len(cur), 0.5))
+                msg_parts.append(cur)
+                sub_parts.append(1 + cols.mention_counts[cur] + (3 - back))
+            edge_src = np.concatenate(src_parts)
+            edge_dst = np.concatenate(dst_parts)
+            edge_weight = np.concatenate(weight_parts)
+            edge_order = np.lexsort((np.concatenate(sub_parts), np.concatenate(msg_parts)))
+            edge_src, edge_dst, edge_weight = edge_src[edge_order], edge_dst[edge_order], edge_weight[edge_order]
+
+            # Nodes in first-seen order: authors, then mention targets, by message
+            node_events = np.concatenate([cols.user_ids, cols.mention_targets])
+            node_event_order = np.lexsort((
+                np.concatenate([np.zeros(n, dtype=np.int64), 1 + cols.mention_pos]),
+                np.concatenate([msg_index, cols.mention_msg]),
+            ))
+            node_events = node_events[node_event_order]
+            node_ids, first_event = np.unique(node_events, return_index=True)
+            node_ids = node_ids[np.argsort(first_event)]
+            # Graph username comes from the node's first event, only if that was a message it sent
+            first_source = node_event_order[np.sort(first_event)]  # < n: authored message index
+            first_is_author = first_source < n
+
+            sorter = np.argsort(node_ids)
+            def codes(ids):
+                return sorter[np.searchsorted(node_ids, ids, sorter=sorter)]
+
+            num_nodes = len(node_ids)
+            message_counts = np.bincount(codes(cols.user_ids), minlength=num_nodes)
+
+            # Coalesce edge events per (source, target) pair, keeping creation order
+            src_codes = codes(edge_src)
+            dst_codes = codes(edge_dst)
+            pairs = src_codes * num_nodes + dst_codes
+            unique_pairs, first_seen, inverse = np.unique(pairs, return_index=True, return_inverse=True)
+            pair_weights = np.bincount(inverse, weights=edge_weight, minlength=len(unique_pairs))
+            pair_src = unique_pairs // num_nodes
+            pair_dst = unique_pairs % num_nodes
+            # networkx yields edges grouped by source node (node order), then by creation
+            order = np.lexsort((first_seen, pair_src))
+            pair_src, pair_dst, pair_weights = pair_src[order], pair_dst[order], pair_weights[order]
+
+            degree = (np.bincount(pair_src, minlength=num_nodes) +
+                      np.bincount(pair_dst, minlength=num_nodes))
 
             # Fetch usernames from user_profiles table (preserves usernames even if user left)
-            user_ids = list(G.nodes())
+            node_list = node_ids.tolist()
             username_map = {}
 
             try:
@@ -513,7 +801,7 @@ class ChatStatistics:
                             SELECT user_id, username
                             FROM user_profiles
                             WHERE user_id = ANY(%s)
-                        """, (user_ids,))
+                        """, (node_list,))
 
                         for user_id, username in cur.fetchall():
                             username_map[user_id] = username
@@ -523,14 +811,16 @@ class ChatStatistics:
             # Calculate metrics
             nodes = {}
             bot_stats = None
-            for node in G.nodes():
-                degree = G.degree(node)
+            degree_list = degree.tolist()
+            message_list = message_counts.tolist()
+            for code, node in enumerate(node_list):
+                graph_username = cols.usernames[first_source[code]] if first_is_author[code] else None
                 # Prioritize: 1) user_profiles username, 2) graph username, 3) fallback to User ID
-                username = username_map.get(node) or G.nodes[node].get('username') or f'User {node}'
+                username = username_map.get(node) or graph_username or f'User {node}'
                 node_data = {
                     'username': username,
-                    'degree': degree,
-                    'messages': user_messages[node]
+                    'degree': degree_list[code],
+                    'messages': message_list[code]
                 }
 
                 # Separate bot stats from main rankings
@@ -540,7 +830,7 @@ class ChatStatistics:
                     nodes[node] = node_data
 
             # Get edges with weights
-            edges = [(u, v, d['weight']) for u, v, d in G.edges(data=True)]
+            edges = list(zip(node_ids[pair_src].tolist(), node_ids[pair_dst].tolist(), pair_weights.tolist()))
 
             return {
                 'edges': edges,
@@ -548,19 +838,17 @@ class ChatStatistics:
                 'bot_stats': bot_stats  # Tracked separately, not in rankings
             }
 
-        except ImportError:
-            logger.error("networkx not installed. Install with: pip install networkx")
-            return {'edges': [], 'nodes': {}, 'bot_stats': None}
         except Exception as e:
-            logger.error("Error building network graph: %s", e)
-            import traceback
-            traceback.print_exc()
+            logger.error("Error building network graph: %s", e, exc_info=True)
             return {'edges': [], 'nodes': {}, 'bot_stats': None}
 
-    def calculate_primetime(self, messages: List[dict]) -> dict:
+    def calculate_primetime(self, messages) -> dict:
         """
         Calculate activity patterns (hourly heatmap, day of week breakdown)
 
+        Args:
+            messages: List of message dicts with timestamp (or a MessageColumns)
+
         Returns:
             {
                 'hourly': {0: count, 1: count, ...},
@@ -569,31 +857,28 @@ class ChatStatistics:
                 'peak_day': int
             }
         """
-        hourly = Counter()
-        daily = Counter()
-
-        for msg in messages:
-            timestamp = msg['timestamp']
-            hourly[timestamp.hour] += 1
-            daily[timestamp.weekday()] += 1
+        cols = _as_columns(messages)
+        hourly = _ordered_counts(cols.hours)
+        daily = _ordered_counts(cols.weekdays)
 
-        peak_hour = hourly.most_common(1)[0][0] if hourly else 0
-        peak_day = daily.most_common(1)[0][0] if daily else 0
+        # Ties go to the value seen first (as Counter.most_common does)
+        peak_hour = max(hourly, key=hourly.get) if hourly else 0
+        peak_day = max(daily, key=daily.get) if daily else 0
 
         return {
-            'hourly': dict(hourly),
-            'daily': dict(daily),
+            'hourly': hourly,
+            'daily': daily,
             'peak_hour': peak_hour,
             'peak_day': peak_day,
-            'total_messages': len(messages)
+            'total_messages': cols.size
         }
 
-    def calculate_engagement(self, messages: List[dict], exclude_from_ranking: bool = True) -> dict:
+    def calculate_engagement(self, messages, exclude_from_ranking: bool = True) -> dict:
         """
         Calculate engagement metrics
 
         Args:
-            messages: List of message dicts
+            messages: List of message dicts (or a MessageColumns for the same window)
             exclude_from_ranking: If True, excludes bot from top_responders ranking
 
         Returns:
@@ -607,36 +892,85 @@ class ChatStatistics:
             }
         """
         bot_user_id = self.db.bot_user_id if exclude_from_ranking else None
-
-        total_length = sum(len(msg.get('content', '')) for msg in messages)
-        unique_users = len(set(msg['user_id'] for msg in messages if not (bot_user_id and msg['user_id'] == bot_user_id)))
-
-        # Calculate conversation threads (messages within 5 minutes)
-        user_responses = Counter()
+        cols = _as_columns(messages)
+        total_messages = cols.size
+
+        total_length = int(cols.lengths.sum())
+        humans = cols.user_ids[cols.user_ids != bot_user_id] if bot_user_id else cols.user_ids
+        unique_users = len(np.unique(humans))
+
+        # Calculate conversation threads: same channel, different user, within 5 minutes
+        # of the previous message = likely response
+        responses = np.flatnonzero(
+            (cols.channel_ids[1:] == cols.channel_ids[:-1]) &
+            (cols.user_ids[1:] != cols.user_ids[:-1]) &
+            (np.diff(cols.micros) < 300 * 1_000_000)
+        ) + 1
         bot_responses = 0
-        for i in range(1, len(messages)):
-            current = messages[i]
-            previous = messages[i-1]
-
-            # If same channel, different user, within 5 minutes = likely response
-            if (current['channel_id'] == previous['channel_id'] and
-                current['user_id'] != previous['user_id'] and
-                (current['timestamp'] - previous['timestamp']).total_seconds() < 300):
-                # Track bot responses separately
-                if bot_user_id and current['user_id'] == bot_user_id:
-                    bot_responses += 1
-                else:
-                    user_responses[current['username']] += 1
+        if bot_user_id:
+            is_bot = cols.user_ids[responses] == bot_user_id
+            bot_responses = int(is_bot.sum())
+            responses = responses[~is_bot]
+
+        # Count by username; Counter.most_common order (count, then first response)
+        user_responses = {}
+        for i in responses.tolist():
+            username = cols.usernames[i]
+            user_responses[username] = user_responses.get(username, 0) + 1
+        top_responders = sorted(user_responses.items(), key=lambda item: item[1], reverse=True)[:10]
 
         return {
-            'avg_message_length': total_length / len(messages) if messages else 0,
-            'total_messages': len(messages),
+            'avg_message_length': total_length / total_messages if total_messages else 0,
+            'total_messages': total_messages,
             'unique_users': unique_users,
-            'avg_messages_per_user': len(messages) / unique_users if unique_users > 0 else 0,
-            'top_responders': user_responses.most_common(10),
+            'avg_messages_per_user': total_messages / unique_users if unique_users > 0 else 0,
+            'top_responders': top_responders,
             'bot_responses': bot_responses if bot_user_id else None  # Tracked separately
         }
 
+    # ===== Server stats: hourly rollups, with a message scan as fallback =====
+
+    def _rollups_usable(self) -> bool:
+        try:
+            return self.rollups.is_current()
+        except Exception as e:
+            logger.warning("Stats rollups check failed: %s", e)
+            return False
+
+    def get_primetime(self, guild_id: int, start_date: datetime, end_date: datetime,
+                      user_id: Optional[int] = None) -> Optional[dict]:
+        """Primetime for a guild (optionally one user). None if there were no messages."""
+        if self._rollups_usable():
+            try:
+                return self.rollups.primetime(guild_id, start_date, end_date, user_id)
+            except Exception as e:
+                logger.warning("Primetime from rollups failed, scanning messages: %s", e)
+        columns = self.get_message_columns(start_date, end_date, guild_id=guild_id, user_id=user_id)
+        return self.calculate_primetime(columns) if columns.size else None
+
+    def get_engagement(self, guild_id: int, start_date: datetime, end_date: datetime,
+                       user_id: Optional[int] = None) -> Optional[dict]:
+        """Engagement for a guild (optionally one user). None if there were no messages."""
+        if self._rollups_usable():
+            try:
+                return self.rollups.engagement(guild_id, start_date, end_date, user_id,
+                                               bot_user_id=self.db.bot_user_id)
+            except Exception as e:
+                logger.warning("Engagement from rollups failed, scanning messages: %s", e)
+        columns = self.get_message_columns(start_date, end_date, guild_id=guild_id, user_id=user_id)
+        return self.calculate_engagement(columns) if columns.size else None
+
+    def get_network(self, guild_id: int, start_date: datetime, end_date: datetime) -> Optional[dict]:
+        """Interaction network for a guild. None if there were no messages."""
+        if self._rollups_usable():
+            try:
+                return self.rollups.network(guild_id, start_date, end_date,
+                                            bot_user_id=self.db.bot_user_id)
+            except Exception as e:
+                logger.warning("Network from rollups failed, scanning messages: %s", e)
+        columns = self.get_message_columns(start_date, end_date, guild_id=guild_id)
+        return self.build_network_graph(columns) if columns.size else None
+
     def format_as_discord_table(self, headers: List[str], rows: List[List[str]]) -> str:
         """
         Format data as Discord markdown table
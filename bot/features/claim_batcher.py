@@ -0,0 +1,128 @@
+"""
+Cross-channel micro-batching for claim verification.
+
+Candidates that survive the free tiers (pre-filter, classifier, per-user cooldown) used to
+cost one LLM call each, and every call repeated the same long instruction block. The
+batcher holds candidates from every channel for a short window (CLAIM_BATCH_WINDOW_MS)
+and sends them as one JSON-array prompt, up to CLAIM_BATCH_SIZE per call. Each caller
+awaits its own verdict, so the hot-take/contradiction routing in
+`_background_claim_analysis` is unchanged.
+
+At low traffic the window closes with a single candidate, which goes through the
+original single-message prompt. A failed call resolves its candidates as "not a claim"
+(claim tracking is best-effort) and never blocks later batches.
+"""
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ClaimBatcher:
+    """Coalesces claim-analysis requests into batched LLM calls."""
+
+    def __init__(self, analyze_batch):
+        """
+        Args:
+            analyze_batch: Coroutine function taking a list of messages and returning a
+                list of verdicts aligned with it (ClaimsTracker.analyze_candidates)
+        """
+        self.analyze_batch = analyze_batch
+        self.enabled = os.getenv('CLAIM_BATCH_ENABLED', 'true').lower() == 'true'
+        self.window = float(os.getenv('CLAIM_BATCH_WINDOW_MS', '1500')) / 1000
+        self.max_batch = max(1, int(os.getenv('CLAIM_BATCH_SIZE', '20')))
+        self.max_in_flight = max(1, int(os.getenv('CLAIM_BATCH_MAX_IN_FLIGHT', '4')))
+
+        self._pending = []  # (message, future, monotonic time queued)
+        self._timer = None
+        self._semaphore = None
+        self._tasks = set()
+
+        self.stats = {
+            'candidates': 0,
+            'llm_calls': 0,
+            'single_calls': 0,
+            'failed_calls': 0,
+            'max_batch_size': 0,
+            'total_wait_ms': 0.0,
+        }
+
+    async def submit(self, message):
+        """Queue a screened candidate and wait for its verdict.
+
+        Returns:
+            Claim dict if the LLM found a trackable claim, else None
+        """
+        self.stats['candidates'] += 1
+        if not self.enabled:
+            self.stats['llm_calls'] += 1
+            self.stats['single_calls'] += 1
+            results = await self.analyze_batch([message])
+            return results[0]
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((message, future, time.monotonic()))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        # Keep a strong reference until done so the task isn't garbage-collected mid-call
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        messages = [message for message, _, _ in batch]
+        results = [None] * len(batch)
+        async with self._semaphore:
+            now = time.monotonic()
+            self.stats['llm_calls'] += 1
+            if len(batch) == 1:
+                self.stats['single_calls'] += 1
+            self.stats['max_batch_size'] = max(self.stats['max_batch_size'], len(batch))
+            self.stats['total_wait_ms'] += sum(now - queued for _, _, queued in batch) * 1000
+            try:
+                verdicts = await self.analyze_batch(messages)
+                if len(verdicts) == len(batch):
+                    results = verdicts
+                else:
+                    logger.warning("Claim batch returned %d verdicts for %d messages", len(verdicts), len(batch))
+                    self.stats['failed_calls'] += 1
+            except Exception as e:
+                self.stats['failed_calls'] += 1
+                logger.warning("Claim batch of %d failed: %s", len(batch), e)
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def stop(self):
+        """Send whatever is pending and wait for in-flight batches. Safe to call more than once."""
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def get_stats(self):
+        """Batch sizes and queueing delay (for the health endpoint)."""
+        calls = self.stats['llm_calls']
+        candidates = self.stats['candidates']
+        return {
+            **self.stats,
+            'pending': len(self._pending),
+            'in_flight': len(self._tasks),
+            'avg_batch_size': round(candidates / calls, 1) if calls else 0,
+            'avg_wait_ms': round(self.stats['total_wait_ms'] / candidates, 1) if candidates else 0.0,
+        }
@@ -0,0 +1,159 @@
+"""
+Claim Classifier - the middle tier of claim detection
+Stage 1: ClaimDetector keyword/pattern pre-filter (free, broad)
+Stage 2: this local classifier (free, microseconds)
+Stage 3: LLM verification (paid, only for high-probability candidates)
+
+The regex pre-filter is tuned for recall, so on an active server most of what it passes
+is rejected by the LLM. This is a logistic regression over hashed word unigrams/bigrams,
+trained from the LLM's own verdicts: messages it accepted are rows in `claims`, and
+messages it judged not trackable are `claim_verdicts` rows with is_trackable false.
+Candidates this classifier or the per-user cooldown kept from the LLM have no verdict
+and are never used as labels.
+
+The decision threshold is calibrated on a held-out split to keep
+CLAIM_CLASSIFIER_TARGET_RECALL of the LLM-accepted claims, so it mostly drops the
+obvious rejects. Until there is enough labelled data the classifier stays untrained and
+everything the pre-filter passes goes to the LLM as before.
+"""
+
+import logging
+import os
+import re
+import time
+import zlib
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"[a-z0-9']+")
+
+
+def hashed_features(text: str, bits: int) -> np.ndarray:
+    """Sorted unique feature indices for `text` (binary bag of unigrams + bigrams).
+
+    crc32 rather than hash() so indices are stable across processes.
+    """
+    tokens = _TOKEN.findall(text.lower())
+    grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    grams.append(f"__len{min(len(tokens) // 5, 8)}")
+    if any(ch.isdigit() for ch in text):
+        grams.append("__digit")
+    mask = (1 << bits) - 1
+    return np.unique(np.fromiter((zlib.crc32(g.encode('utf-8')) & mask for g in grams), dtype=np.int64))
+
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+
+class ClaimClassifier:
+    """Hashed-feature logistic regression with a recall-calibrated threshold."""
+
+    def __init__(self):
+        self.bits = int(os.getenv('CLAIM_CLASSIFIER_BITS', '18'))
+        self.target_recall = float(os.getenv('CLAIM_CLASSIFIER_TARGET_RECALL', '0.9'))
+        self.min_examples = int(os.getenv('CLAIM_CLASSIFIER_MIN_EXAMPLES', '30'))
+        self.epochs = int(os.getenv('CLAIM_CLASSIFIER_EPOCHS', '8'))
+
+        # (weights, bias, threshold), swapped in as one tuple so scoring never sees a half-trained model
+        self._model = None
+        self.trained_at = None
+        self.metrics = {}
+
+    @property
+    def ready(self):
+        return self._model is not None
+
+    @property
+    def threshold(self):
+        return self._model[2] if self._model else None
+
+    def predict_proba(self, text: str):
+        """Probability that the LLM would call `text` a trackable claim (None if untrained)."""
+        model = self._model
+        if model is None:
+            return None
+        weights, bias, _ = model
+        idx = hashed_features(text, self.bits)
+        return float(_sigmoid(weights[idx].sum() + bias))
+
+    def should_forward(self, text: str):
+        """(forward?, probability). Always forwards while untrained."""
+        model = self._model
+        if model is None:
+            return True, None
+        probability = self.predict_proba(text)
+        return probability >= model[2], probability
+
+    def _fit(self, rows, labels):
+        """SGD logistic regression with class balancing and light L2."""
+        weights = np.zeros(1 << self.bits, dtype=np.float64)
+        bias = 0.0
+        positives = float(labels.sum())
+        negatives = float(len(labels) - positives)
+        # Balance the classes so the (usually many more) negatives don't swamp the claims
+        sample_weight = np.where(labels == 1, negatives / max(positives, 1.0), 1.0)
+        sample_weight *= len(labels) / sample_weight.sum()
+        rng = np.random.default_rng(0)
+        l2 = 1e-4
+        for epoch in range(self.epochs):
+            lr = 0.5 / (1 + epoch)
+            for i in rng.permutation(len(rows)):
+                idx = rows[i]
+                p = _sigmoid(weights[idx].sum() + bias)
+                grad = (p - labels[i]) * sample_weight[i]
+                weights[idx] -= lr * (grad + l2 * weights[idx])
+                bias -= lr * grad
+        return weights, bias
+
+    def _scores(self, weights, bias, rows):
+        return np.array([_sigmoid(weights[idx].sum() + bias) for idx in rows])
+
+    def train(self, texts, labels):
+        """Train from (text, 0/1 label) pairs. Blocking (run in a worker thread).
+
+        Returns:
+            Metrics dict, or None if there isn't enough labelled data yet.
+        """
+        labels = np.asarray(labels, dtype=np.float64)
+        positives = int(labels.sum())
+        negatives = len(labels) - positives
+        if positives < self.min_examples or negatives < self.min_examples:
+            logger.info("Claim classifier: not enough labels yet (%d positive / %d negative)", positives, negatives)
+            return None
+
+        started = time.monotonic()
+        rows = [hashed_features(t, self.bits) for t in texts]
+
+        # Calibrate the threshold on a held-out 20% (stratified), then refit on everything
+        rng = np.random.default_rng(1)
+        holdout = np.zeros(len(labels), dtype=bool)
+        for cls in (0.0, 1.0):
+            members = np.flatnonzero(labels == cls)
+            holdout[rng.choice(members, size=max(1, len(members) // 5), replace=False)] = True
+        train_idx = np.flatnonzero(~holdout)
+        weights, bias = self._fit([rows[i] for i in train_idx], labels[train_idx])
+        scores = self._scores(weights, bias, [rows[i] for i in np.flatnonzero(holdout)])
+        held_labels = labels[holdout]
+        pos_scores = scores[held_labels == 1]
+        threshold = float(np.quantile(pos_scores, 1.0 - self.target_recall))
+
+        forwarded = scores >= threshold
+        recall = float(forwarded[held_labels == 1].mean())
+        negatives_forwarded = float(forwarded[held_labels == 0].mean())
+
+        weights, bias = self._fit(rows, labels)
+        self._model = (weights.astype(np.float32), float(bias), threshold)
+        self.trained_at = time.time()
+        self.metrics = {
+            'positives': positives,
+            'negatives': negatives,
+            'threshold': round(threshold, 3),
+            'holdout_recall': round(recall, 3),
+            'holdout_negatives_forwarded': round(negatives_forwarded, 3),
+            'train_seconds': round(time.monotonic() - started, 2),
+        }
+        logger.info("Claim classifier trained: %s", self.metrics)
+        return self.metrics
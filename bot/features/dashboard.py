@@ -4,11 +4,14 @@ Generates server-wide analytics: activity trends, top users, topics,
 engagement metrics, and claim/debate activity using Plotly charts.
 """
 
+from collections import Counter
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from io import BytesIO
 import logging
 
+from features.chat_stats import MessageColumns, TopicCorpus
+
 logger = logging.getLogger(__name__)
 
 
@@ -39,36 +42,48 @@ class ServerDashboard:
         if cached:
             return cached
 
-        # Fetch messages for analysis (filtered at DB layer)
-        guild_messages = self.chat_stats.get_messages_for_analysis(
-            None, start_date, end_date, exclude_opted_out=True, guild_id=guild_id
-        )
+        # Stream the window (filtered at DB layer) and keep only what each metric needs:
+        # per-day counts, message columns and cleaned topic text
+        day_counts = Counter()
+        column_parts = []
+        corpus = TopicCorpus()
+        try:
+            for batch in self.chat_stats.iter_message_batches(
+                None, start_date, end_date, exclude_opted_out=True, guild_id=guild_id
+            ):
+                day_counts.update(msg['timestamp'].strftime('%m/%d') for msg in batch if msg.get('timestamp'))
+                column_parts.append(MessageColumns.from_messages(batch))
+                corpus.add(batch)
+        except Exception as e:
+            logger.error("Error streaming dashboard messages: %s", e)
+            return None
 
-        if not guild_messages:
+        if not corpus.message_count:
             return None
 
         result = {
             'guild_id': guild_id,
             'days': days,
-            'total_messages': len(guild_messages),
+            'total_messages': corpus.message_count,
         }
 
         # 1. Activity trend (messages per day)
-        result['activity_trend'] = self._compute_activity_trend(guild_messages, start_date, days)
+        result['activity_trend'] = self._compute_activity_trend(day_counts, start_date, days)
 
         # 2. Top users by message count
         result['top_users'] = self._compute_top_users(guild_id, days)
 
         # 3. Topic trends
-        topics = self.chat_stats.extract_topics_tfidf(guild_messages, top_n=10)
+        topics = self.chat_stats.extract_topics_tfidf(corpus, top_n=10)
         result['topics'] = {t['keyword']: t['count'] for t in topics} if topics else {}
 
-        # 4. Primetime (hourly activity)
-        primetime = self.chat_stats.calculate_primetime(guild_messages)
+        # 4. Primetime (hourly activity) - both from one columnar view of the window
+        columns = MessageColumns.concat(column_parts)
+        primetime = self.chat_stats.calculate_primetime(columns)
         result['primetime'] = primetime
 
         # 5. Engagement metrics
-        engagement = self.chat_stats.calculate_engagement(guild_messages)
+        engagement = self.chat_stats.calculate_engagement(columns)
         result['engagement'] = engagement
 
         # 6. Claim and debate activity
@@ -82,17 +97,8 @@ class ServerDashboard:
 
         return result
 
-    def _compute_activity_trend(self, messages: List[dict], start_date: datetime, days: int) -> Dict:
-        """Compute daily message counts over the period."""
-        from collections import Counter
-
-        day_counts = Counter()
-        for msg in messages:
-            ts = msg.get('timestamp')
-            if ts:
-                day_key = ts.strftime('%m/%d')
-                day_counts[day_key] += 1
-
+    def _compute_activity_trend(self, day_counts: Counter, start_date: datetime, days: int) -> Dict:
+        """Compute daily message counts over the period from per-day ('%m/%d') counts."""
         # Build ordered list for the full date range
         labels = []
         values = []
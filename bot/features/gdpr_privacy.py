@@ -12,6 +12,9 @@ from typing import Optional, Dict, List
 import psycopg2.extras
 from cachetools import TTLCache
 
+from redis_cache import get_cache
+from user_card import card_key
+
 logger = logging.getLogger(__name__)
 
 
@@ -456,6 +459,7 @@ class GDPRPrivacyManager:
                         # Delete hot takes (through claims cascade)
                         # Delete claims (hot_takes will cascade)
                         cur.execute("DELETE FROM claims WHERE user_id = %s", (user_id,))
+                        cur.execute("DELETE FROM claim_verdicts WHERE user_id = %s", (user_id,))
 
                         # Delete quotes
                         cur.execute("DELETE FROM quotes WHERE user_id = %s", (user_id,))
@@ -469,6 +473,11 @@ class GDPRPrivacyManager:
                         # Delete messages
                         cur.execute("DELETE FROM messages WHERE user_id = %s", (user_id,))
 
+                        # Delete hourly stats rollups (activity and interaction edges)
+                        cur.execute("DELETE FROM message_rollups_hourly WHERE user_id = %s", (user_id,))
+                        cur.execute("DELETE FROM interaction_rollups_hourly WHERE source_user_id = %s OR target_user_id = %s",
+                                  (user_id, user_id))
+
                         # Delete iRacing link
                         cur.execute("DELETE FROM iracing_links WHERE discord_user_id = %s", (user_id,))
 
@@ -495,6 +504,9 @@ class GDPRPrivacyManager:
                     if user_id in self._consent_cache:
                         del self._consent_cache[user_id]
 
+                    # Drop the pre-rendered context card (profile, behavior, facts)
+                    get_cache().delete(card_key(user_id))
+
                     logger.info("User %s data %s", user_id, "anonymized" if anonymize_only else "deleted")
 
             self.log_audit_action(user_id, 'data_deletion_completed',
@@ -566,6 +578,9 @@ class GDPRPrivacyManager:
                     if user_id in self._consent_cache:
                         del self._consent_cache[user_id]
 
+                    # Drop the pre-rendered context card (profile, behavior, facts)
+                    get_cache().delete(card_key(user_id))
+
                     self.log_audit_action(user_id, 'data_deletion_scheduled',
                                         f"Scheduled for {scheduled_date.isoformat()}")
 
@@ -252,7 +252,7 @@ class GitHubMonitor:
                 # Cache check
                 repo_key = f'{watch["repo_full_name"]}:{watch["watch_type"]}'
                 cache_key = f"gh:{hashlib.sha256(repo_key.encode()).hexdigest()[:16]}"
-                if self.cache and self.cache.get(cache_key):
+                if self.cache and await self.cache.aget(cache_key):
                     continue
 
                 new_events = []
@@ -272,7 +272,7 @@ class GitHubMonitor:
 
                 # Cache for 5 minutes
                 if self.cache:
-                    self.cache.set(cache_key, 'checked', ttl=300)
+                    await self.cache.aset(cache_key, 'checked', ttl=300)
 
                 if new_events:
                     # Limit to 3 events per check
@@ -9,7 +9,9 @@ from datetime import datetime, timedelta
 from typing import Dict, Optional, List
 import json
 import logging
+import os
 from iracing_client import iRacingClient
+from single_flight import get_flight
 from features.iracing_meta import MetaAnalyzer
 
 logger = logging.getLogger(__name__)
@@ -29,6 +31,10 @@ class iRacingIntegration:
         self._cache = {}
         self._cache_expiry = {}
         self._cache_max = 512  # cap to avoid unbounded growth over long uptimes
+        # Concurrent misses for one key share a single API fetch, and expired entries keep
+        # serving for a grace period while one background refresh replaces them
+        self._flight = get_flight('iracing')
+        self._stale_grace = timedelta(minutes=int(os.getenv('IRACING_CACHE_STALE_MINUTES', '60')))
 
         # Asset caches with logo URLs
         self._cars_cache = None
@@ -59,9 +65,9 @@ class iRacingIntegration:
         return datetime.now() < self._cache_expiry[key]
 
     def _evict_cache(self):
-        """Drop expired entries; if still at capacity, drop the soonest-to-expire ones."""
+        """Drop entries past their stale grace; if still at capacity, drop the soonest-to-expire ones."""
         now = datetime.now()
-        for k in [k for k, exp in self._cache_expiry.items() if exp < now]:
+        for k in [k for k, exp in self._cache_expiry.items() if exp + self._stale_grace < now]:
             self._cache.pop(k, None)
             self._cache_expiry.pop(k, None)
         while len(self._cache) >= self._cache_max and self._cache_expiry:
@@ -76,13 +82,22 @@ class iRacingIntegration:
         self._cache[key] = data
         self._cache_expiry[key] = datetime.now() + timedelta(minutes=ttl_minutes)
 
-    def _get_cache(self, key: str):
-        """Get cached data if valid; evict stale entries on access."""
-        if self._is_cache_valid(key):
-            return self._cache.get(key)
-        self._cache.pop(key, None)
-        self._cache_expiry.pop(key, None)
-        return None
+    async def _cached(self, key: str, fetch):
+        """Serve `key` from the cache, fetching at most once per key at a time.
+
+        A fresh entry is returned as-is. An expired entry within the stale grace is
+        returned immediately while `fetch` refreshes it in the background. Otherwise all
+        concurrent callers await one `fetch`, which stores what is worth caching itself
+        via _set_cache.
+        """
+        expiry = self._cache_expiry.get(key)
+        if expiry is not None:
+            if datetime.now() < expiry:
+                return self._cache.get(key)
+            if datetime.now() < expiry + self._stale_grace:
+                self._flight.refresh(key, fetch)
+                return self._cache.get(key)
+        return await self._flight.do(key, fetch)
 
     async def get_current_series(self) -> List[Dict]:
         """
@@ -91,22 +106,22 @@ class iRacingIntegration:
         Returns cached data if available to avoid API spam.
         """
         cache_key = 'current_series'
-        cached = self._get_cache(cache_key)
-        if cached:
-            return cached
 
-        try:
-            client = await self._get_client()
-            series = await client.get_current_series()
+        async def fetch():
+            try:
+                client = await self._get_client()
+                series = await client.get_current_series()
 
-            if series:
-                self._set_cache(cache_key, series, ttl_minutes=60)  # Cache for 1 hour
-                return series
-            return []
+                if series:
+                    self._set_cache(cache_key, series, ttl_minutes=60)  # Cache for 1 hour
+                    return series
+                return []
 
-        except Exception as e:
-            logger.error("Error getting series: %s", e)
-            return []
+            except Exception as e:
+                logger.error("Error getting series: %s", e)
+                return []
+
+        return await self._cached(cache_key, fetch)
 
     async def get_upcoming_schedule(self, series_name: Optional[str] = None, hours: int = 24) -> List[Dict]:
         """
@@ -213,30 +228,28 @@ class iRacingIntegration:
         """
         cache_key = f'profile_{cust_id}'
 
-        cached = self._get_cache(cache_key)
-        if cached:
-            logger.debug("Using cached profile for %s", cust_id)
-            return cached
-
-        try:
-            logger.debug("Fetching fresh profile data for cust_id %s", cust_id)
-            client = await self._get_client()
-            profile = await client.get_member_info(cust_id)
+        async def fetch():
+            try:
+                logger.debug("Fetching fresh profile data for cust_id %s", cust_id)
+                client = await self._get_client()
+                profile = await client.get_member_info(cust_id)
 
-            if profile:
-                # Verify we got the right customer's data
-                returned_id = profile.get('cust_id')
-                if returned_id and int(returned_id) != cust_id:
-                    logger.error("Requested profile for %s but API returned %s", cust_id, returned_id)
-                    return None
+                if profile:
+                    # Verify we got the right customer's data
+                    returned_id = profile.get('cust_id')
+                    if returned_id and int(returned_id) != cust_id:
+                        logger.error("Requested profile for %s but API returned %s", cust_id, returned_id)
+                        return None
+
+                    self._set_cache(cache_key, profile, ttl_minutes=30)
+                    return profile
+                return None
 
-                self._set_cache(cache_key, profile, ttl_minutes=30)
-                return profile
-            return None
+            except Exception as e:
+                logger.error("Error getting profile: %s", e)
+                return None
 
-        except Exception as e:
-            logger.error("Error getting profile: %s", e)
-            return None
+        return await self._cached(cache_key, fetch)
 
     async def get_driver_recent_races(self, cust_id: int, limit: int = 10) -> List[Dict]:
         """
@@ -270,22 +283,22 @@ class iRacingIntegration:
             Career stats dict
         """
         cache_key = f'career_{cust_id}'
-        cached = self._get_cache(cache_key)
-        if cached:
-            return cached
 
-        try:
-            client = await self._get_client()
-            stats = await client.get_member_career_stats(cust_id)
+        async def fetch():
+            try:
+                client = await self._get_client()
+                stats = await client.get_member_career_stats(cust_id)
 
-            if stats:
-                self._set_cache(cache_key, stats, ttl_minutes=60)
-                return stats
-            return None
+                if stats:
+                    self._set_cache(cache_key, stats, ttl_minutes=60)
+                    return stats
+                return None
 
-        except Exception as e:
-            logger.error("Error getting career stats: %s", e)
-            return None
+            except Exception as e:
+                logger.error("Error getting career stats: %s", e)
+                return None
+
+        return await self._cached(cache_key, fetch)
 
     async def link_discord_to_iracing(self, discord_user_id: int, iracing_cust_id: int, iracing_name: str) -> bool:
         """
@@ -1094,84 +1107,83 @@ class iRacingIntegration:
         """
         logger.debug("Fetching schedule for series_id=%s, season_id=%s", series_id, season_id)
         cache_key = f'schedule_{series_id}_{season_id}'
-        cached = self._get_cache(cache_key)
-        if cached:
-            logger.debug("Schedule cache hit for series %s, season %s: %d entries", series_id, season_id, len(cached))
-            return cached
 
-        try:
-            client = await self._get_client()
-
-            # Try race guide endpoint first for detailed historical data
+        async def fetch():
             try:
-                race_sessions = await client.get_series_race_schedule(season_id)
-                logger.debug("Race guide returned %d sessions", len(race_sessions) if race_sessions else 0)
-            except Exception as e:
-                logger.warning("Race guide lookup failed for season %s: %s", season_id, e)
-                race_sessions = None
-
-            if race_sessions:
-                filtered_sessions = [s for s in race_sessions if s.get('series_id') == series_id and s.get('season_id') == season_id]
-                if filtered_sessions:
-                    logger.debug("Race guide sessions after filtering: %d", len(filtered_sessions))
-                    enriched = await self._enrich_schedule_entries(filtered_sessions)
-                    if enriched and len(enriched) >= 12 and all(e.get('track_name') != 'Unknown Track' for e in enriched):
-                        self._set_cache(cache_key, enriched, ttl_minutes=60)
-                        return enriched
+                client = await self._get_client()
+
+                # Try race guide endpoint first for detailed historical data
+                try:
+                    race_sessions = await client.get_series_race_schedule(season_id)
+                    logger.debug("Race guide returned %d sessions", len(race_sessions) if race_sessions else 0)
+                except Exception as e:
+                    logger.warning("Race guide lookup failed for season %s: %s", season_id, e)
+                    race_sessions = None
+
+                if race_sessions:
+                    filtered_sessions = [s for s in race_sessions if s.get('series_id') == series_id and s.get('season_id') == season_id]
+                    if filtered_sessions:
+                        logger.debug("Race guide sessions after filtering: %d", len(filtered_sessions))
+                        enriched = await self._enrich_schedule_entries(filtered_sessions)
+                        if enriched and len(enriched) >= 12 and all(e.get('track_name') != 'Unknown Track' for e in enriched):
+                            self._set_cache(cache_key, enriched, ttl_minutes=60)
+                            return enriched
+                        else:
+                            logger.debug("Race guide returned %d usable weeks; falling back to season schedules", len(enriched) if enriched else 0)
                     else:
-                        logger.debug("Race guide returned %d usable weeks; falling back to season schedules", len(enriched) if enriched else 0)
-                else:
-                    logger.debug("Race guide returned no sessions for requested series/season")
+                        logger.debug("Race guide returned no sessions for requested series/season")
 
-            logger.debug("Getting series seasons data")
-            all_seasons = await client.get_series_seasons()
+                logger.debug("Getting series seasons data")
+                all_seasons = await client.get_series_seasons()
 
-            if not all_seasons:
-                logger.warning("No seasons data returned")
-                return []
+                if not all_seasons:
+                    logger.warning("No seasons data returned")
+                    return []
 
-            # Find the matching season
-            target_season = None
-            for season in all_seasons:
-                if season.get('season_id') == season_id:
-                    target_season = season
-                    break
+                # Find the matching season
+                target_season = None
+                for season in all_seasons:
+                    if season.get('season_id') == season_id:
+                        target_season = season
+                        break
 
-            if not target_season:
-                logger.warning("Season %s not found in seasons data", season_id)
-                return []
+                if not target_season:
+                    logger.warning("Season %s not found in seasons data", season_id)
+                    return []
 
-            # Extract schedules from the season
-            schedules = target_season.get('schedules', [])
-            logger.debug("Found %d schedule entries for season %s", len(schedules), season_id)
-            if schedules:
-                logger.debug("Season schedule sample: %s", schedules[0])
-
-            filtered_schedules: List[Dict] = []
-            for schedule_entry in schedules:
-                schedule_series_id = schedule_entry.get('series_id') or schedule_entry.get('seriesid')
-                if isinstance(schedule_series_id, str) and schedule_series_id.isdigit():
-                    schedule_series_id = int(schedule_series_id)
-
-                if schedule_series_id == series_id:
-                    filtered_schedules.append(schedule_entry)
-
-            if filtered_schedules:
-                logger.debug("Filtered to %d schedule entries for series %s", len(filtered_schedules), series_id)
-            elif schedules:
-                logger.debug("No schedule entries matched series_id %s; using all %d entries", series_id, len(schedules))
-                filtered_schedules = schedules
-
-            if filtered_schedules:
-                enriched = await self._enrich_schedule_entries(filtered_schedules)
-                self._set_cache(cache_key, enriched, ttl_minutes=60)
-                return enriched
+                # Extract schedules from the season
+                schedules = target_season.get('schedules', [])
+                logger.debug("Found %d schedule entries for season %s", len(schedules), season_id)
+                if schedules:
+                    logger.debug("Season schedule sample: %s", schedules[0])
 
-            return []
+                filtered_schedules: List[Dict] = []
+                for schedule_entry in schedules:
+                    schedule_series_id = schedule_entry.get('series_id') or schedule_entry.get('seriesid')
+                    if isinstance(schedule_series_id, str) and schedule_series_id.isdigit():
+                        schedule_series_id = int(schedule_series_id)
 
-        except Exception as e:
-            logger.error("Error getting series schedule: %s", e, exc_info=True)
-            return []
+                    if schedule_series_id == series_id:
+                        filtered_schedules.append(schedule_entry)
+
+                if filtered_schedules:
+                    logger.debug("Filtered to %d schedule entries for series %s", len(filtered_schedules), series_id)
+                elif schedules:
+                    logger.debug("No schedule entries matched series_id %s; using all %d entries", series_id, len(schedules))
+                    filtered_schedules = schedules
+
+                if filtered_schedules:
+                    enriched = await self._enrich_schedule_entries(filtered_schedules)
+                    self._set_cache(cache_key, enriched, ttl_minutes=60)
+                    return enriched
+
+                return []
+
+            except Exception as e:
+                logger.error("Error getting series schedule: %s", e, exc_info=True)
+                return []
+
+        return await self._cached(cache_key, fetch)
 
     async def get_race_times(self, series_id: int, season_id: int, race_week_num: Optional[int] = None) -> Optional[List[Dict]]:
         """
@@ -14,6 +14,7 @@ Performance optimizations:
 - Max 50 subsession fetches per analysis (statistically sufficient)
 - Early termination when all cars have enough data points
 - Weather extracted from first session only (same per week)
+- Concurrent requests for one series/week share a single analysis (single_flight.py)
 """
 
 import asyncio
@@ -23,6 +24,8 @@ from datetime import datetime, timedelta, timezone
 import statistics
 from cachetools import TTLCache
 
+from single_flight import get_flight
+
 logger = logging.getLogger(__name__)
 
 # Minimum data points per car before we consider the sample statistically sufficient
@@ -50,6 +53,7 @@ class MetaAnalyzer:
         self._cache = TTLCache(maxsize=50, ttl=604800)
         # Subsession data cache: individual subsession results, 24h TTL, max 200 entries
         self._subsession_cache = TTLCache(maxsize=200, ttl=86400)
+        self._flight = get_flight('iracing_meta')
 
     def _get_cache_key(self, series_id: int, season_id: int, week_num: int, track_id: Optional[int] = None) -> str:
         """Generate cache key for meta data"""
@@ -89,6 +93,16 @@ class MetaAnalyzer:
             logger.debug("Using in-memory cached meta data for %s", cache_key)
             return self._cache[cache_key]
 
+        # Concurrent requests for the same series/week share one analysis (and one
+        # subsession fan-out against the iRacing API)
+        return await self._flight.do(
+            cache_key,
+            lambda: self._analyze_series(cache_key, series_id, season_id, week_num, max_results, track_id)
+        )
+
+    async def _analyze_series(self, cache_key: str, series_id: int, season_id: int, week_num: int,
+                              max_results: Optional[int], track_id: Optional[int]) -> Optional[Dict]:
+        """Fetch and analyze race results for get_meta_for_series, caching the result"""
         log_msg = f"Fetching race results for series {series_id}, season {season_id}, week {week_num}"
         if track_id:
             log_msg += f", track {track_id}"
@@ -124,7 +124,7 @@ class JeopardyGame:
                 first_value=point_values[0]
             )
 
-            response = await self.llm.simple_completion(
+            response = await self.llm.asimple_completion(
                 prompt=prompt,
                 system_prompt="You are a Jeopardy game board generator. Return only valid JSON, no extra text.",
                 max_tokens=2000
@@ -191,7 +191,7 @@ class RSSMonitor:
                 cache_key = f"rss:{hashlib.sha256(feed_row['feed_url'].encode()).hexdigest()[:16]}"
                 cached = None
                 if self.cache:
-                    cached = self.cache.get(cache_key)
+                    cached = await self.cache.aget(cache_key)
 
                 if not cached:
                     feed = await asyncio.to_thread(feedparser.parse, feed_row['feed_url'])
@@ -201,7 +201,7 @@ class RSSMonitor:
 
                     # Cache for 5 minutes
                     if self.cache:
-                        self.cache.set(cache_key, 'checked', ttl=300)
+                        await self.cache.aset(cache_key, 'checked', ttl=300)
                 else:
                     continue  # Skip if recently checked
 
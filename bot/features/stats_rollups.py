@@ -0,0 +1,384 @@
+"""
+Incremental hourly rollups behind server chat statistics.
+
+Primetime, engagement and the interaction network are all counts: messages per hour,
+characters per user, "X replied to / mentioned Y" edges. Computing them used to mean
+pulling every message in the window (up to 50,000 rows with content) into Python, for
+every guild and window, every hour. StatsRollups keeps those counts in two tables keyed by
+(guild, hour, channel/user), maintained by a watermark job:
+
+- update() reads messages past `rollup_state.last_message_id` in id order, folds them into
+  per-hour counters with fold_messages() and upserts the increments in the same
+  transaction that advances the watermark, so each message is counted exactly once.
+  Reply edges and response counts look back at each channel's last few messages; those
+  tails are kept in memory between runs and re-seeded from the table after a restart.
+- primetime()/engagement()/network() answer a guild + date range with a GROUP BY over
+  the rollups and return the same shapes as the ChatStatistics.calculate_* methods.
+
+Rollups are hour-granular (a range starts at the top of its first hour) and trail ingestion
+by the settle delay plus the job interval. Users who opt out later are excluded at read
+time, as get_messages_for_analysis does, and their rows are removed on data deletion.
+"""
+
+import logging
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_MENTION = re.compile(r'<@!?(\d+)>')
+
+# Same constants as the message-scan implementations in chat_stats.py
+REPLY_LOOKBACK = 3          # previous messages in a channel that count as "replied to"
+RESPONSE_WINDOW = 300       # seconds: a different user answering within this is a response
+REPLY_EDGE_WEIGHT = 0.5     # network weight of a reply edge (a mention is 1)
+
+
+def fold_messages(rows, tails: Dict[int, list], lookback: int = REPLY_LOOKBACK,
+                  response_window: int = RESPONSE_WINDOW) -> Tuple[dict, dict]:
+    """Fold messages into hourly activity and interaction counters.
+
+    Args:
+        rows: (guild_id, channel_id, user_id, timestamp, content) tuples in posting order
+        tails: {channel_id: [(user_id, timestamp), ...]} last `lookback` messages per
+            channel before `rows`; updated in place so the next batch continues from it
+        lookback: Previous messages in the channel a message is linked to
+        response_window: Max seconds between messages for a response
+
+    Returns:
+        (activity, edges):
+            activity: {(guild_id, hour, channel_id, user_id): [messages, chars, responses]}
+            edges: {(guild_id, hour, source_user_id, target_user_id): [mentions, replies]}
+    """
+    activity = {}
+    edges = {}
+    for guild_id, channel_id, user_id, timestamp, content in rows:
+        content = content or ''
+        hour = timestamp.replace(minute=0, second=0, microsecond=0)
+
+        counts = activity.get((guild_id, hour, channel_id, user_id))
+        if counts is None:
+            counts = activity[(guild_id, hour, channel_id, user_id)] = [0, 0, 0]
+        counts[0] += 1
+        counts[1] += len(content)
+
+        tail = tails.setdefault(channel_id, [])
+        if tail:
+            prev_user, prev_time = tail[-1]
+            if prev_user != user_id and (timestamp - prev_time).total_seconds() < response_window:
+                counts[2] += 1
+
+        for mentioned in _MENTION.findall(content):
+            edge = edges.setdefault((guild_id, hour, user_id, int(mentioned)), [0, 0])
+            edge[0] += 1
+        for prev_user, _ in tail:
+            if prev_user != user_id:
+                edge = edges.setdefault((guild_id, hour, user_id, prev_user), [0, 0])
+                edge[1] += 1
+
+        tail.append((user_id, timestamp))
+        if len(tail) > lookback:
+            del tail[:-lookback]
+    return activity, edges
+
+
+class StatsRollups:
+    """Maintains and queries the hourly message/interaction rollup tables."""
+
+    STATE_NAME = 'messages'
+
+    def __init__(self, db):
+        self.db = db
+        self.enabled = os.getenv('STATS_ROLLUPS_ENABLED', 'true').lower() == 'true'
+        self.chunk_size = int(os.getenv('STATS_ROLLUP_CHUNK_SIZE', '20000'))
+        self.max_chunks = int(os.getenv('STATS_ROLLUP_MAX_CHUNKS', '25'))
+        # Leave freshly inserted rows alone for a bit so a slow transaction holding a lower
+        # id can't commit behind the watermark
+        self.settle_seconds = int(os.getenv('STATS_ROLLUP_SETTLE_SECONDS', '60'))
+        # Rollups older than this (job stalled) are not trusted for reads
+        self.max_lag = timedelta(minutes=int(os.getenv('STATS_ROLLUP_MAX_LAG_MINUTES', '90')))
+
+        self._tails = {}
+        self._tails_watermark = None
+
+    # ===== Maintenance =====
+
+    def update(self) -> int:
+        """Fold new messages into the rollups. Blocking (run in a worker thread).
+
+        Returns:
+            Number of messages folded in this run
+        """
+        if not self.enabled:
+            return 0
+        total = 0
+        for _ in range(self.max_chunks):
+            try:
+                processed, caught_up = self._update_chunk()
+            except Exception:
+                # The transaction rolled back, so the in-memory tails are ahead of the table
+                self._tails = {}
+                self._tails_watermark = None
+                raise
+            total += processed
+            if caught_up:
+                break
+        return total
+
+    def _update_chunk(self) -> Tuple[int, bool]:
+        from psycopg2.extras import execute_values
+
+        with self.db.get_connection() as conn:
+            with conn.cursor() as cur:
+                # Row lock serializes concurrent runs (e.g. two bot instances)
+                cur.execute("""
+                    INSERT INTO rollup_state (name) VALUES (%s) ON CONFLICT (name) DO NOTHING
+                """, (self.STATE_NAME,))
+                cur.execute("SELECT last_message_id FROM rollup_state WHERE name = %s FOR UPDATE",
+                            (self.STATE_NAME,))
+                watermark = cur.fetchone()[0]
+                if watermark != self._tails_watermark:
+                    self._tails = {}
+
+                cur.execute("""
+                    SELECT id, guild_id, channel_id, user_id, timestamp, content,
+                           COALESCE(opted_out, FALSE)
+                    FROM messages
+                    WHERE id > %s
+                      AND created_at < NOW() - make_interval(secs => %s)
+                    ORDER BY id
+                    LIMIT %s
+                """, (watermark, self.settle_seconds, self.chunk_size))
+                rows = cur.fetchall()
+
+                if not rows:
+                    cur.execute("""
+                        UPDATE rollup_state SET caught_up_at = NOW(), updated_at = NOW()
+                        WHERE name = %s
+                    """, (self.STATE_NAME,))
+                    self._tails_watermark = watermark
+                    return 0, True
+
+                messages = [
+                    (guild_id, channel_id, user_id, timestamp, content)
+                    for _, guild_id, channel_id, user_id, timestamp, content, opted_out in rows
+                    if guild_id is not None and not opted_out
+                ]
+                unseeded = list({m[1] for m in messages if m[1] not in self._tails})
+                if unseeded:
+                    self._seed_tails(cur, unseeded, watermark)
+
+                activity, edges = fold_messages(messages, self._tails)
+
+                if activity:
+                    execute_values(cur, """
+                        INSERT INTO message_rollups_hourly
+                            (guild_id, hour, channel_id, user_id, message_count, char_count, response_count)
+                        VALUES %s
+                        ON CONFLICT (guild_id, hour, channel_id, user_id) DO UPDATE SET
+                            message_count = message_rollups_hourly.message_count + EXCLUDED.message_count,
+                            char_count = message_rollups_hourly.char_count + EXCLUDED.char_count,
+                            response_count = message_rollups_hourly.response_count + EXCLUDED.response_count
+                    """, [key + tuple(counts) for key, counts in sorted(activity.items())], page_size=1000)
+                if edges:
+                    execute_values(cur, """
+                        INSERT INTO interaction_rollups_hourly
+                            (guild_id, hour, source_user_id, target_user_id, mention_count, reply_count)
+                        VALUES %s
+                        ON CONFLICT (guild_id, hour, source_user_id, target_user_id) DO UPDATE SET
+                            mention_count = interaction_rollups_hourly.mention_count + EXCLUDED.mention_count,
+                            reply_count = interaction_rollups_hourly.reply_count + EXCLUDED.reply_count
+                    """, [key + tuple(counts) for key, counts in sorted(edges.items())], page_size=1000)
+
+                new_watermark = rows[-1][0]
+                caught_up = len(rows) < self.chunk_size
+                cur.execute("""
+                    UPDATE rollup_state
+                    SET last_message_id = %s,
+                        updated_at = NOW(),
+                        caught_up_at = CASE WHEN %s THEN NOW() ELSE caught_up_at END
+                    WHERE name = %s
+                """, (new_watermark, caught_up, self.STATE_NAME))
+
+        self._tails_watermark = new_watermark
+        logger.debug("Folded %d messages into stats rollups (watermark %d)", len(rows), new_watermark)
+        return len(rows), caught_up
+
+    def _seed_tails(self, cur, channel_ids: List[int], watermark: int):
+        """Load each channel's last few already-rolled-up messages (after a restart)."""
+        cur.execute("""
+            SELECT c.channel_id, p.user_id, p.timestamp
+            FROM unnest(%s::bigint[]) AS c(channel_id)
+            CROSS JOIN LATERAL (
+                SELECT m.user_id, m.timestamp
+                FROM messages m
+                WHERE m.channel_id = c.channel_id
+                  AND m.id <= %s
+                  AND COALESCE(m.opted_out, FALSE) = FALSE
+                ORDER BY m.timestamp DESC
+                LIMIT %s
+            ) p
+            ORDER BY c.channel_id, p.timestamp
+        """, (channel_ids, watermark, REPLY_LOOKBACK))
+        for channel_id in channel_ids:
+            self._tails[channel_id] = []
+        for channel_id, user_id, timestamp in cur.fetchall():
+            self._tails[channel_id].append((user_id, timestamp))
+
+    def is_current(self) -> bool:
+        """True when the rollups have caught up recently enough to answer reads."""
+        if not self.enabled:
+            return False
+        try:
+            with self.db.get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT caught_up_at FROM rollup_state WHERE name = %s",
+                                (self.STATE_NAME,))
+                    row = cur.fetchone()
+        except Exception as e:
+            logger.debug("Stats rollups unavailable: %s", e)
+            return False
+        return bool(row and row[0] and datetime.now(timezone.utc) - row[0] < self.max_lag)
+
+    # ===== Reads =====
+
+    def _user_totals(self, cur, guild_id, start_date, end_date, user_id=None):
+        """Per-user (messages, chars, responses) over the range, opted-out users excluded."""
+        query = """
+            SELECT r.user_id, SUM(r.message_count), SUM(r.char_count), SUM(r.response_count)
+            FROM message_rollups_hourly r
+            LEFT JOIN user_profiles up ON up.user_id = r.user_id
+            WHERE r.guild_id = %s
+              AND r.hour >= date_trunc('hour', %s::timestamp)
+              AND r.hour <= %s
+              AND COALESCE(up.opted_out, FALSE) = FALSE
+        """
+        params = [guild_id, start_date, end_date]
+        if user_id:
+            query += " AND r.user_id = %s"
+            params.append(user_id)
+        cur.execute(query + " GROUP BY r.user_id", params)
+        return {row[0]: (int(row[1]), int(row[2]), int(row[3])) for row in cur.fetchall()}
+
+    def _usernames(self, cur, user_ids):
+        if not user_ids:
+            return {}
+        cur.execute("SELECT user_id, username FROM user_profiles WHERE user_id = ANY(%s)",
+                    (list(user_ids),))
+        return dict(cur.fetchall())
+
+    def primetime(self, guild_id: int, start_date: datetime, end_date: datetime,
+                  user_id: Optional[int] = None) -> Optional[dict]:
+        """Same shape as ChatStatistics.calculate_primetime, or None if there's no activity."""
+        query = """
+            SELECT EXTRACT(HOUR FROM r.hour)::int, (EXTRACT(ISODOW FROM r.hour)::int - 1),
+                   SUM(r.message_count)
+            FROM message_rollups_hourly r
+            LEFT JOIN user_profiles up ON up.user_id = r.user_id
+            WHERE r.guild_id = %s
+              AND r.hour >= date_trunc('hour', %s::timestamp)
+              AND r.hour <= %s
+              AND COALESCE(up.opted_out, FALSE) = FALSE
+        """
+        params = [guild_id, start_date, end_date]
+        if user_id:
+            query += " AND r.user_id = %s"
+            params.append(user_id)
+        with self.db.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(query + " GROUP BY 1, 2", params)
+                rows = cur.fetchall()
+
+        hourly = {}
+        daily = {}
+        for hour, weekday, count in rows:
+            hourly[hour] = hourly.get(hour, 0) + int(count)
+            daily[weekday] = daily.get(weekday, 0) + int(count)
+        if not hourly:
+            return None
+        return {
+            'hourly': hourly,
+            'daily': daily,
+            'peak_hour': max(hourly, key=hourly.get),
+            'peak_day': max(daily, key=daily.get),
+            'total_messages': sum(hourly.values()),
+        }
+
+    def engagement(self, guild_id: int, start_date: datetime, end_date: datetime,
+                   user_id: Optional[int] = None, bot_user_id: Optional[int] = None) -> Optional[dict]:
+        """Same shape as ChatStatistics.calculate_engagement, or None if there's no activity."""
+        with self.db.get_connection() as conn:
+            with conn.cursor() as cur:
+                totals = self._user_totals(cur, guild_id, start_date, end_date, user_id)
+                if not totals:
+                    return None
+                responders = [
+                    (uid, t[2]) for uid, t in totals.items()
+                    if t[2] > 0 and not (bot_user_id and uid == bot_user_id)
+                ]
+                responders.sort(key=lambda item: item[1], reverse=True)
+                responders = responders[:10]
+                names = self._usernames(cur, [uid for uid, _ in responders])
+
+        total_messages = sum(t[0] for t in totals.values())
+        total_chars = sum(t[1] for t in totals.values())
+        unique_users = len([uid for uid in totals if not (bot_user_id and uid == bot_user_id)])
+        return {
+            'avg_message_length': total_chars / total_messages if total_messages else 0,
+            'total_messages': total_messages,
+            'unique_users': unique_users,
+            'avg_messages_per_user': total_messages / unique_users if unique_users > 0 else 0,
+            'top_responders': [(names.get(uid) or f'User {uid}', count) for uid, count in responders],
+            'bot_responses': totals.get(bot_user_id, (0, 0, 0))[2] if bot_user_id else None,
+        }
+
+    def network(self, guild_id: int, start_date: datetime, end_date: datetime,
+                bot_user_id: Optional[int] = None) -> Optional[dict]:
+        """Same shape as ChatStatistics.build_network_graph, or None if there's no activity."""
+        with self.db.get_connection() as conn:
+            with conn.cursor() as cur:
+                totals = self._user_totals(cur, guild_id, start_date, end_date)
+                if not totals:
+                    return None
+                cur.execute("""
+                    SELECT e.source_user_id, e.target_user_id,
+                           SUM(e.mention_count) + %s * SUM(e.reply_count)
+                    FROM interaction_rollups_hourly e
+                    LEFT JOIN user_profiles sp ON sp.user_id = e.source_user_id
+                    LEFT JOIN user_profiles tp ON tp.user_id = e.target_user_id
+                    WHERE e.guild_id = %s
+                      AND e.hour >= date_trunc('hour', %s::timestamp)
+                      AND e.hour <= %s
+                      AND COALESCE(sp.opted_out, FALSE) = FALSE
+                      AND COALESCE(tp.opted_out, FALSE) = FALSE
+                    GROUP BY e.source_user_id, e.target_user_id
+                """, (REPLY_EDGE_WEIGHT, guild_id, start_date, end_date))
+                edges = [(src, dst, float(weight)) for src, dst, weight in cur.fetchall()]
+
+                node_ids = set(totals)
+                for src, dst, _ in edges:
+                    node_ids.add(src)
+                    node_ids.add(dst)
+                names = self._usernames(cur, node_ids)
+
+        # DiGraph degree: in-edges + out-edges (a self-mention counts twice)
+        degree = dict.fromkeys(node_ids, 0)
+        for src, dst, _ in edges:
+            degree[src] += 1
+            degree[dst] += 1
+
+        nodes = {}
+        bot_stats = None
+        for node in node_ids:
+            node_data = {
+                'username': names.get(node) or f'User {node}',
+                'degree': degree[node],
+                'messages': totals.get(node, (0, 0, 0))[0],
+            }
+            if bot_user_id and node == bot_user_id:
+                bot_stats = {'user_id': node, **node_data}
+            else:
+                nodes[node] = node_data
+        return {'edges': edges, 'nodes': nodes, 'bot_stats': bot_stats}
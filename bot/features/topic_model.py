@@ -0,0 +1,350 @@
+"""
+Persistent per-guild topic model behind TF-IDF topic extraction.
+
+extract_topics_tfidf used to fit a fresh scikit-learn TfidfVectorizer (unigrams + bigrams)
+on every call, and analyze_conversation_flow / compute_user_topic_expertise called it once
+per conversation segment or per user - hundreds of fits for one request. The work is now
+split in two:
+
+- TermMatrix tokenizes a window once (same analyzer as the old vectorizer: lowercase,
+  2+ character word tokens, stopwords dropped, then bigrams) into sparse document-term
+  counts. topics() scores any subset of its rows - a segment, one user's messages, the
+  last 7 days - with array indexing, reproducing the old vectorizer's min_df / max_df /
+  max_features pruning, l2-normalised TF-IDF and mean-score ranking.
+- GuildTopicModels keeps a hashed document-frequency table per guild (TOPIC_MODEL_FEATURES
+  buckets indexed by crc32 of the term), folded in incrementally by a watermark job and
+  stored compressed in topic_models. Once a guild has TOPIC_MODEL_MIN_DOCUMENTS documents
+  its IDF weights come from the whole history instead of the window being scored.
+
+The table holds only hashed counts (no text, no user ids). Opted-out users' messages are
+never folded in; data deleted later stays counted, but cannot be recovered from it.
+"""
+
+import logging
+import os
+import re
+import time
+import zlib
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Same token pattern as the old TfidfVectorizer: alphanumeric words of 2+ characters,
+# so terms like "F1", "GT3" aren't lost
+_TOKEN = re.compile(r'(?u)\b\w[\w]+\b')
+
+
+def analyze(text: str, stop_words) -> List[str]:
+    """Unigrams and bigrams of a cleaned message (bigrams span removed stopwords)."""
+    tokens = [t for t in _TOKEN.findall(text.lower()) if t not in stop_words]
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def smooth_idf(n_docs, doc_freq) -> np.ndarray:
+    """ln((1 + n) / (1 + df)) + 1, as TfidfVectorizer(smooth_idf=True)."""
+    return np.log((1.0 + n_docs) / (1.0 + np.asarray(doc_freq, dtype=np.float64))) + 1.0
+
+
+class TermMatrix:
+    """Sparse (CSR-style) document-term counts for a list of cleaned texts."""
+
+    def __init__(self, texts: Iterable[str], stop_words):
+        vocabulary = {}
+        indptr = [0]
+        indices = []
+        counts = []
+        for text in texts:
+            for term, count in Counter(analyze(text, stop_words)).items():
+                indices.append(vocabulary.setdefault(term, len(vocabulary)))
+                counts.append(count)
+            indptr.append(len(indices))
+        self.terms = list(vocabulary)
+        self.indptr = np.array(indptr, dtype=np.int64)
+        self.indices = np.array(indices, dtype=np.int64)
+        self.counts = np.array(counts, dtype=np.float64)
+        self.n_docs = len(indptr) - 1
+        self._hashes = {}
+
+    def term_hashes(self, n_features: int) -> np.ndarray:
+        """Bucket of each vocabulary term in a hashed table of `n_features`."""
+        hashes = self._hashes.get(n_features)
+        if hashes is None:
+            hashes = np.fromiter((term_bucket(t, n_features) for t in self.terms),
+                                 dtype=np.int64, count=len(self.terms))
+            self._hashes[n_features] = hashes
+        return hashes
+
+    def _entries(self, rows) -> Tuple[int, np.ndarray, np.ndarray]:
+        """(row count, local row of each entry, entry positions) for a row selection."""
+        if rows is None:
+            return self.n_docs, np.repeat(np.arange(self.n_docs), np.diff(self.indptr)), \
+                np.arange(len(self.indices))
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        local = np.repeat(np.arange(len(rows)), lengths)
+        positions = np.arange(int(lengths.sum())) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        return len(rows), local, positions
+
+    def topics(self, rows=None, top_n: int = 20,
+               doc_freqs: Optional['HashedDocumentFrequencies'] = None) -> List[dict]:
+        """Top keywords over some rows (all when None): [{keyword, score, count}, ...].
+
+        Args:
+            rows: Row indices to score (a window, segment or one user's messages)
+            top_n: Number of keywords to return
+            doc_freqs: Guild document frequencies for IDF; the selected rows' own
+                document frequencies are used when None (as a fresh fit would)
+        """
+        n, local, positions = self._entries(rows)
+        if n < 3:
+            return []
+        term_ids = self.indices[positions]
+        term_counts = self.counts[positions]
+        vocab_size = len(self.terms)
+        window_df = np.bincount(term_ids, minlength=vocab_size)
+        term_totals = np.bincount(term_ids, weights=term_counts, minlength=vocab_size)
+
+        # Adaptive min_df (at least 2, lower when few messages), max_df 80%, and if that
+        # prunes everything, keep all terms
+        min_df = 2 if n >= 20 else 1
+        kept = np.flatnonzero((window_df >= min_df) & (window_df <= 0.8 * n))
+        if not kept.size:
+            kept = np.flatnonzero(window_df >= 1)
+        if not kept.size:
+            return []
+
+        # max_features: most frequent terms (alphabetical among ties), then feature order
+        alphabetical = sorted(kept.tolist(), key=self.terms.__getitem__)
+        by_frequency = sorted(alphabetical, key=lambda t: -term_totals[t])[:top_n * 3]
+        selected = np.array(sorted(by_frequency, key=self.terms.__getitem__), dtype=np.int64)
+
+        if doc_freqs is not None:
+            idf = doc_freqs.idf(self.term_hashes(doc_freqs.n_features)[selected],
+                                window_df[selected], n)
+        else:
+            idf = smooth_idf(n, window_df[selected])
+
+        # l2-normalised TF-IDF rows over the selected features, averaged over all rows
+        column = np.full(vocab_size, -1, dtype=np.int64)
+        column[selected] = np.arange(len(selected))
+        entry_columns = column[term_ids]
+        keep = entry_columns >= 0
+        entry_columns = entry_columns[keep]
+        entry_rows = local[keep]
+        weights = term_counts[keep] * idf[entry_columns]
+        norms = np.sqrt(np.bincount(entry_rows, weights=weights * weights, minlength=n))
+        weights = weights / norms[entry_rows]
+        avg_scores = np.bincount(entry_columns, weights=weights, minlength=len(selected)) / n
+        doc_counts = np.bincount(entry_columns, minlength=len(selected))
+
+        # Build topic list, filtering out pure-number tokens and single chars
+        topics = []
+        for idx, term_id in enumerate(selected.tolist()):
+            keyword = self.terms[term_id]
+            # Skip pure numbers (years, IDs, etc.)
+            if keyword.isdigit():
+                continue
+            # Skip very short words that slipped through
+            if len(keyword) <= 2 and ' ' not in keyword:
+                continue
+            topics.append({
+                'keyword': keyword,
+                'score': float(avg_scores[idx]),
+                'count': int(doc_counts[idx]),  # Number of messages mentioning this topic
+            })
+
+        topics.sort(key=lambda x: x['score'], reverse=True)
+        return topics[:top_n]
+
+
+def term_bucket(term: str, n_features: int) -> int:
+    """Stable (process-independent) hash bucket of a term."""
+    return zlib.crc32(term.encode('utf-8')) % n_features
+
+
+class HashedDocumentFrequencies:
+    """Document counts per hashed term bucket, folded in one batch of documents at a time."""
+
+    def __init__(self, n_features: int, doc_freq: Optional[np.ndarray] = None, doc_count: int = 0):
+        self.n_features = n_features
+        self.doc_freq = doc_freq if doc_freq is not None else np.zeros(n_features, dtype=np.int64)
+        self.doc_count = doc_count
+
+    def add(self, matrix: TermMatrix) -> None:
+        """Count each document once per bucket its terms hash to."""
+        if not matrix.n_docs:
+            return
+        rows = np.repeat(np.arange(matrix.n_docs), np.diff(matrix.indptr))
+        buckets = matrix.term_hashes(self.n_features)[matrix.indices]
+        doc_buckets = np.unique(rows * self.n_features + buckets) % self.n_features
+        self.doc_freq += np.bincount(doc_buckets, minlength=self.n_features)
+        self.doc_count += matrix.n_docs
+
+    def idf(self, buckets: np.ndarray, window_df: np.ndarray, window_docs: int) -> np.ndarray:
+        """Smoothed IDF; never below what the scored window alone implies (unfolded messages)."""
+        doc_freq = np.maximum(self.doc_freq[buckets], window_df)
+        return smooth_idf(max(self.doc_count, window_docs), doc_freq)
+
+    def to_bytes(self) -> bytes:
+        return zlib.compress(self.doc_freq.astype('<i4').tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes, n_features: int, doc_count: int) -> 'HashedDocumentFrequencies':
+        doc_freq = np.frombuffer(zlib.decompress(bytes(data)), dtype='<i4').astype(np.int64)
+        return cls(n_features, doc_freq, doc_count)
+
+
+class GuildTopicModels:
+    """Maintains the per-guild document-frequency tables and serves them for scoring."""
+
+    STATE_NAME = 'topic_models'
+
+    def __init__(self, db, stop_words, clean: Callable[[str], str]):
+        self.db = db
+        self.stop_words = stop_words
+        self.clean = clean
+        self.enabled = os.getenv('TOPIC_MODEL_ENABLED', 'true').lower() == 'true'
+        self.n_features = int(os.getenv('TOPIC_MODEL_FEATURES', str(1 << 18)))
+        self.min_documents = int(os.getenv('TOPIC_MODEL_MIN_DOCUMENTS', '500'))
+        self.chunk_size = int(os.getenv('TOPIC_MODEL_CHUNK_SIZE', '20000'))
+        self.max_chunks = int(os.getenv('TOPIC_MODEL_MAX_CHUNKS', '10'))
+        self.cache_seconds = int(os.getenv('TOPIC_MODEL_CACHE_SECONDS', '900'))
+        # Same settle delay as the stats rollups: don't pass a row a slow transaction may precede
+        self.settle_seconds = int(os.getenv('STATS_ROLLUP_SETTLE_SECONDS', '60'))
+        self._cache: Dict[int, Tuple[float, Optional[HashedDocumentFrequencies]]] = {}
+
+    # ===== Maintenance =====
+
+    def update(self) -> int:
+        """Fold new messages into the guild tables. Blocking (run in a worker thread).
+
+        Returns:
+            Number of messages read in this run
+        """
+        if not self.enabled:
+            return 0
+        total = 0
+        for _ in range(self.max_chunks):
+            processed, caught_up = self._update_chunk()
+            total += processed
+            if caught_up:
+                break
+        return total
+
+    def _update_chunk(self) -> Tuple[int, bool]:
+        with self.db.get_connection() as conn:
+            with conn.cursor() as cur:
+                # Row lock serializes concurrent runs (e.g. two bot instances)
+                cur.execute("""
+                    INSERT INTO rollup_state (name) VALUES (%s) ON CONFLICT (name) DO NOTHING
+                """, (self.STATE_NAME,))
+                cur.execute("SELECT last_message_id FROM rollup_state WHERE name = %s FOR UPDATE",
+                            (self.STATE_NAME,))
+                watermark = cur.fetchone()[0]
+
+                cur.execute("""
+                    SELECT m.id, m.guild_id, m.content
+                    FROM messages m
+                    LEFT JOIN user_profiles up ON up.user_id = m.user_id
+                    WHERE m.id > %s
+                      AND m.created_at < NOW() - make_interval(secs => %s)
+                      AND m.guild_id IS NOT NULL
+                      AND COALESCE(m.opted_out, FALSE) = FALSE
+                      AND COALESCE(up.opted_out, FALSE) = FALSE
+                    ORDER BY m.id
+                    LIMIT %s
+                """, (watermark, self.settle_seconds, self.chunk_size))
+                rows = cur.fetchall()
+
+                if not rows:
+                    cur.execute("""
+                        UPDATE rollup_state SET caught_up_at = NOW(), updated_at = NOW()
+                        WHERE name = %s
+                    """, (self.STATE_NAME,))
+                    return 0, True
+
+                texts_by_guild = {}
+                for _, guild_id, content in rows:
+                    if not content:
+                        continue
+                    cleaned = self.clean(content)
+                    # Same documents as topic extraction: 3+ real words after cleaning
+                    if len(cleaned.split()) >= 3:
+                        texts_by_guild.setdefault(guild_id, []).append(cleaned)
+
+                updated = {}
+                for guild_id, texts in texts_by_guild.items():
+                    model = self._load(cur, guild_id, for_update=True) or \
+                        HashedDocumentFrequencies(self.n_features)
+                    model.add(TermMatrix(texts, self.stop_words))
+                    cur.execute("""
+                        INSERT INTO topic_models (guild_id, n_features, doc_count, doc_freq, updated_at)
+                        VALUES (%s, %s, %s, %s, NOW())
+                        ON CONFLICT (guild_id) DO UPDATE SET
+                            n_features = EXCLUDED.n_features,
+                            doc_count = EXCLUDED.doc_count,
+                            doc_freq = EXCLUDED.doc_freq,
+                            updated_at = NOW()
+                    """, (guild_id, model.n_features, model.doc_count, model.to_bytes()))
+                    updated[guild_id] = model
+
+                new_watermark = rows[-1][0]
+                caught_up = len(rows) < self.chunk_size
+                cur.execute("""
+                    UPDATE rollup_state
+                    SET last_message_id = %s,
+                        updated_at = NOW(),
+                        caught_up_at = CASE WHEN %s THEN NOW() ELSE caught_up_at END
+                    WHERE name = %s
+                """, (new_watermark, caught_up, self.STATE_NAME))
+
+        # Committed: serve the new counts without waiting for the cache to expire
+        now = time.monotonic()
+        for guild_id, model in updated.items():
+            self._cache[guild_id] = (now, self._usable(model))
+        logger.debug("Folded %d messages into topic models (watermark %d)", len(rows), new_watermark)
+        return len(rows), caught_up
+
+    def _load(self, cur, guild_id: int, for_update: bool = False) -> Optional[HashedDocumentFrequencies]:
+        cur.execute(
+            "SELECT n_features, doc_count, doc_freq FROM topic_models WHERE guild_id = %s"
+            + (" FOR UPDATE" if for_update else ""),
+            (guild_id,)
+        )
+        row = cur.fetchone()
+        if not row:
+            return None
+        n_features, doc_count, doc_freq = row
+        if n_features != self.n_features:
+            # TOPIC_MODEL_FEATURES changed: the old buckets don't line up, start over
+            logger.info("Topic model for guild %s has %s features (want %s); resetting",
+                        guild_id, n_features, self.n_features)
+            return None
+        return HashedDocumentFrequencies.from_bytes(doc_freq, n_features, doc_count)
+
+    # ===== Reads =====
+
+    def _usable(self, model: Optional[HashedDocumentFrequencies]) -> Optional[HashedDocumentFrequencies]:
+        return model if model is not None and model.doc_count >= self.min_documents else None
+
+    def get(self, guild_id: Optional[int]) -> Optional[HashedDocumentFrequencies]:
+        """Document frequencies for a guild, or None (disabled, unknown or still too small)."""
+        if not self.enabled or not guild_id:
+            return None
+        cached = self._cache.get(guild_id)
+        if cached and time.monotonic() - cached[0] < self.cache_seconds:
+            return cached[1]
+        try:
+            with self.db.get_connection() as conn:
+                with conn.cursor() as cur:
+                    model = self._usable(self._load(cur, guild_id))
+        except Exception as e:
+            logger.debug("Topic model for guild %s unavailable: %s", guild_id, e)
+            model = None
+        self._cache[guild_id] = (time.monotonic(), model)
+        return model
+
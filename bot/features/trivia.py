@@ -328,8 +328,7 @@ Generate {count} questions now:"""
         prompt = self._build_generation_prompt(topic, difficulty, count)
 
         # Call LLM with low temperature for consistency
-        response = await asyncio.to_thread(
-            self.llm.generate_response,
+        response = await self.llm.agenerate_response(
             prompt,
             [],          # conversation_history
             None,        # user_context
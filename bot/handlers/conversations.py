@@ -30,6 +30,9 @@ from tool_executor import ToolExecutor
 from media_processor import get_media_processor
 from redis_cache import get_cache
 from constants import SELF_CONTAINED_TOOLS
+import user_card
+from handlers.streaming import ProgressiveReply
+from resilience import ProviderUnavailable
 
 # Rotating search status messages
 SEARCH_STATUS_MESSAGES = [
@@ -280,7 +283,7 @@ async def _run_agent_loop(initial_response, tools, llm, tool_executor, message,
         except Exception:
             pass
 
-        msg = await asyncio.to_thread(llm.chat_raw, messages, tools, model, max_tokens)
+        msg = await llm.achat_raw(messages, tools, model, max_tokens)
         next_calls = msg.get("tool_calls")
         if not next_calls:
             final_text = (msg.get("content") or "").strip()
@@ -291,7 +294,7 @@ async def _run_agent_loop(initial_response, tools, llm, tool_executor, message,
     else:
         # Hit the step cap — force a final answer with tools disabled
         logger.info("Agent loop hit max steps (%d); forcing final answer", max_steps)
-        msg = await asyncio.to_thread(llm.chat_raw, messages, None, model, max_tokens)
+        msg = await llm.achat_raw(messages, None, model, max_tokens)
         final_text = (msg.get("content") or "").strip()
 
     return final_text, all_images
@@ -392,8 +395,7 @@ async def _synthesize_tool_response(tool_results, tool_names, original_content,
                 "to the user's question."
             )
 
-        response = await asyncio.to_thread(
-            llm.generate_response,
+        response = await llm.agenerate_response(
             follow_up_prompt,
             conversation_history,
             user_context,
@@ -620,11 +622,23 @@ async def generate_leaderboard_response(channel, stat_type, days, db, llm):
 
 async def handle_bot_mention(message, opted_out, bot, db, llm, cost_tracker, search=None,
                              self_knowledge=None, rag=None, wolfram=None, weather=None,
-                             iracing_manager=None, reminder_system=None):
+                             iracing_manager=None, reminder_system=None, async_db=None,
+                             message_ingestion=None):
     """Handle when bot is mentioned/tagged"""
+
+    def _store_edited_placeholder(msg, content):
+        # Route through the ingestion queue when present so the final text is written
+        # after (never before) the queued placeholder row for the same message_id.
+        if message_ingestion is not None:
+            message_ingestion.submit(msg, False, content)
+        else:
+            asyncio.create_task(asyncio.to_thread(db.store_message, msg, False, content))
+
     logger.info("handle_bot_mention called for %s in #%s", message.author, getattr(message.channel, 'name', 'DM'))
     # Track placeholder message for cleanup on error
     placeholder_msg = None
+    # Progressive renderer when the response is streamed into the placeholder
+    reply = None
     # Track channel lock for cleanup
     channel_lock = None
     lock_acquired = False  # only release the semaphore if we actually acquired it
@@ -1076,10 +1090,15 @@ async def handle_bot_mention(message, opted_out, bot, db, llm, cost_tracker, sea
         is_thread = isinstance(message.channel, discord.Thread) and message.channel.parent
 
         # Launch all independent DB queries in parallel
-        history_task = asyncio.to_thread(
-            db.get_recent_messages, message.channel.id,
-            limit=context_window, exclude_opted_out=True, guild_id=guild_id
-        )
+        if async_db is not None and async_db.enabled:
+            history_task = async_db.get_recent_messages(
+                message.channel.id, limit=context_window, exclude_opted_out=True, guild_id=guild_id
+            )
+        else:
+            history_task = asyncio.to_thread(
+                db.get_recent_messages, message.channel.id,
+                limit=context_window, exclude_opted_out=True, guild_id=guild_id
+            )
 
         thread_task = None
         if is_thread:
@@ -1139,38 +1158,36 @@ async def handle_bot_mention(message, opted_out, bot, db, llm, cost_tracker, sea
             # Launch all independent context queries concurrently instead of sequentially
             # This saves 200-500ms by overlapping DB/Redis/API calls
 
-            # 1. User context (cached 1hr in Redis)
+            # 1+2. Pre-rendered user context card (profile, behavior and facts, see
+            # user_card.py) and server personality, looked up together in one MGET; only
+            # the misses go to the database
+            _cache = get_cache()
+            sid = message.guild.id if message.guild else None
+            card_cache_key = user_card.card_key(message.author.id)
+            pers_cache_key = f"personality:{sid}"
+            cached_card, cached_pers = await _cache.amget([card_cache_key, pers_cache_key])
+
             async def _get_user_ctx():
                 if opted_out:
                     return None
-                _cache = get_cache()
-                ctx_cache_key = f"user_ctx:{message.author.id}"
-                ctx = _cache.get(ctx_cache_key)
-                if ctx is None:
-                    ctx = await asyncio.to_thread(db.get_user_context, message.author.id)
-                    if ctx:
-                        _cache.set(ctx_cache_key, ctx, ttl=3600)
-                return ctx
-
-            # 2. Server personality (cached 1hr in Redis)
+                card = await user_card.get_card(db, message.author.id, cached_card)
+                return {'card': card} if card else None
+
             async def _get_personality():
-                sid = message.guild.id if message.guild else None
                 if not sid:
                     return 'default'
-                _cache = get_cache()
-                pers_cache_key = f"personality:{sid}"
-                pers = _cache.get(pers_cache_key)
+                pers = cached_pers
                 if pers is None:
                     pers = await asyncio.to_thread(db.get_server_personality, sid)
-                    _cache.set(pers_cache_key, pers or 'default', ttl=3600)
+                    await _cache.aset(pers_cache_key, pers or 'default', ttl=3600)
                 return pers or 'default'
 
-            # 3. RAG context
+            # 3. RAG context (the user's facts are already on their card)
             async def _get_rag():
                 if not rag:
                     return None
                 return await rag.get_relevant_context(
-                    content, message.channel.id, message.author.id, limit=3
+                    content, message.channel.id, None, limit=3
                 )
 
             # 4. Self-knowledge check (fast, local)
@@ -1216,26 +1233,50 @@ async def handle_bot_mention(message, opted_out, bot, db, llm, cost_tracker, sea
             # LLM from generating charts for knowledge questions like "what is a write down"
             tools_for_request = _select_tools_for_message(content)
 
-            response = await asyncio.to_thread(
-                llm.generate_response,
-                content,
-                conversation_history,
-                user_context,
-                context_for_llm,
-                rag_context,
-                0,
-                bot.user.id,
-                message.author.id if is_text_mention else None,
-                str(message.author) if is_text_mention else None,
-                None,  # max_tokens (use default)
-                personality,  # personality setting
-                tools_for_request,  # Intent-filtered tools (viz only when explicitly requested)
-                image_urls if image_urls else None,  # Direct image URLs
-                base64_images if base64_images else None,  # Processed frames (GIFs, YouTube thumbnails)
-            )
+            if placeholder_msg and os.getenv('LLM_STREAMING', 'true').lower() == 'true':
+                # Stream tokens into the placeholder so long answers don't look hung
+                reply = ProgressiveReply(placeholder_msg)
+                loop = asyncio.get_running_loop()
+                response = await llm.agenerate_response_stream(
+                    content,
+                    conversation_history,
+                    user_context=user_context,
+                    search_results=context_for_llm,
+                    rag_context=rag_context,
+                    bot_user_id=bot.user.id,
+                    user_id=message.author.id if is_text_mention else None,
+                    username=str(message.author) if is_text_mention else None,
+                    personality=personality,
+                    tools=tools_for_request,
+                    images=image_urls if image_urls else None,
+                    base64_images=base64_images if base64_images else None,
+                    on_delta=lambda piece: loop.call_soon_threadsafe(reply.feed, piece),
+                )
+                await reply.close()
+            else:
+                response = await llm.agenerate_response(
+                    content,
+                    conversation_history,
+                    user_context,
+                    context_for_llm,
+                    rag_context,
+                    0,
+                    bot.user.id,
+                    message.author.id if is_text_mention else None,
+                    str(message.author) if is_text_mention else None,
+                    None,  # max_tokens (use default)
+                    personality,  # personality setting
+                    tools_for_request,  # Intent-filtered tools (viz only when explicitly requested)
+                    image_urls if image_urls else None,  # Direct image URLs
+                    base64_images if base64_images else None,  # Processed frames (GIFs, YouTube thumbnails)
+                )
 
             # Check if LLM wants to use tools
             if isinstance(response, dict) and response.get("type") == "tool_calls":
+                # Any streamed preamble is replaced by tool status/output
+                if reply is not None:
+                    await reply.abandon()
+                    reply = None
                 # Determine what kind of tools are being called
                 tool_names = [tc.get("function", {}).get("name", "") for tc in response["tool_calls"]]
                 has_search = "web_search" in tool_names
@@ -1308,6 +1349,9 @@ async def handle_bot_mention(message, opted_out, bot, db, llm, cost_tracker, sea
 
             # Check if LLM says it needs more info (skip if we used bot docs or response is None)
             if response is not None and search and not bot_docs and not search_results and llm.detect_needs_search_from_response(response):
+                if reply is not None:
+                    await reply.abandon()
+                    reply = None
                 if not placeholder_msg:
                     placeholder_msg = await message.channel.send("🔍 Let me search for that...")
                 else:
@@ -1325,8 +1369,7 @@ async def handle_bot_mention(message, opted_out, bot, db, llm, cost_tracker, sea
                 # Update context (bot docs take priority over search)
                 context_for_llm = bot_docs or search_results
 
-                response = await asyncio.to_thread(
-                    llm.generate_response,
+                response = await llm.agenerate_response(
                     content,
                     conversation_history,
                     user_context,
@@ -1407,14 +1450,18 @@ async def handle_bot_mention(message, opted_out, bot, db, llm, cost_tracker, sea
                 logger.info("Final response prepared (%d chars)", len(response))
 
             # Send or edit response
-            if response is not None and placeholder_msg:
+            if response is not None and placeholder_msg and reply is not None and reply.started:
+                # Streamed: settle the placeholder + follow-ups on the final text
+                shown = await reply.finish(response)
+                for shown_msg, shown_text in shown:
+                    _store_edited_placeholder(shown_msg, shown_text)
+                logger.info("Streamed response finalized across %d message(s)", len(shown))
+            elif response is not None and placeholder_msg:
                 logger.debug("Editing search message with final response")
                 if len(response) > 2000:
                     await placeholder_msg.edit(content=response[:2000])
                     # Fire-and-forget: store in DB without blocking
-                    asyncio.create_task(asyncio.to_thread(
-                        db.store_message, placeholder_msg, False, response[:2000]
-                    ))
+                    _store_edited_placeholder(placeholder_msg, response[:2000])
                     remaining = response[2000:]
                     chunks = [remaining[i:i+2000] for i in range(0, len(remaining), 2000)]
                     for chunk in chunks:
@@ -1423,9 +1470,7 @@ async def handle_bot_mention(message, opted_out, bot, db, llm, cost_tracker, sea
                     logger.info("Search message edited, sent %d additional chunks", len(chunks))
                 else:
                     await placeholder_msg.edit(content=response)
-                    asyncio.create_task(asyncio.to_thread(
-                        db.store_message, placeholder_msg, False, response
-                    ))
+                    _store_edited_placeholder(placeholder_msg, response)
                     logger.info("Search message edited")
             elif response is not None:
                 logger.debug("Sending final response as new message")
@@ -1449,16 +1494,28 @@ async def handle_bot_mention(message, opted_out, bot, db, llm, cost_tracker, sea
             ))
 
     except Exception as e:
-        logger.error("Error handling message: %s", e, exc_info=True)
+        if isinstance(e, ProviderUnavailable):
+            # Circuit breaker fast-fail: no stack trace, tell the user what's going on
+            logger.warning("Mention fast-failed: %s", e)
+        else:
+            logger.error("Error handling message: %s", e, exc_info=True)
 
         # Clean up orphaned placeholder message if it exists
+        if reply is not None:
+            try:
+                await reply.abandon()
+            except Exception:
+                pass
         if placeholder_msg:
             try:
                 await placeholder_msg.delete()
             except Exception:
                 pass  # Ignore deletion errors (message may already be gone)
 
-        await message.channel.send("Something went wrong processing your request. Please try again.")
+        if isinstance(e, ProviderUnavailable):
+            await message.channel.send(e.user_message)
+        else:
+            await message.channel.send("Something went wrong processing your request. Please try again.")
     finally:
         # Release channel semaphore slot to allow next request. Only release if we actually
         # acquired it — releasing an un-acquired asyncio.Semaphore silently over-releases and
@@ -23,7 +23,7 @@ def register_events(bot, db, privacy_manager, claims_tracker, debate_scorekeeper
                     tasks_dict, search, self_knowledge, wolfram=None, weather=None,
                     series_cache=None, trivia=None, reminder_system=None,
                     who_said_it=None, devils_advocate=None, jeopardy=None,
-                    iracing_viz=None):
+                    iracing_viz=None, async_db=None, message_ingestion=None):
     """
     Register all Discord event handlers with the bot.
 
@@ -46,12 +46,24 @@ def register_events(bot, db, privacy_manager, claims_tracker, debate_scorekeeper
         search: Web search engine for fact-checking
         self_knowledge: Bot documentation system
         series_cache: Dict for iRacing series autocomplete cache (mutable ref)
+        async_db: Optional AsyncDatabase (asyncpg) for hot-path queries; falls back to db
+        message_ingestion: Optional MessageIngestionQueue for batched message storage
     """
 
     # Import handle_bot_mention from conversations module
     # We'll set this up when that module is created
     handle_bot_mention_func = None
 
+    def _store_message_task(message, opted_out):
+        """Fire-and-forget message storage: batched write-behind queue when available,
+        else a per-message write on the native async pool or a worker thread."""
+        if message_ingestion is not None:
+            message_ingestion.submit(message, opted_out)
+            return None
+        if async_db is not None and async_db.enabled:
+            return asyncio.create_task(async_db.store_message(message, opted_out))
+        return asyncio.create_task(asyncio.to_thread(db.store_message, message, opted_out))
+
     @bot.event
     async def on_ready():
         logger.info("WompBot logged in as %s", bot.user)
@@ -119,6 +131,18 @@ def register_events(bot, db, privacy_manager, claims_tracker, debate_scorekeeper
                 tasks_dict['precompute_stats'].start()
                 logger.info("Background stats pre-computation enabled (runs every hour)")
 
+            if 'update_stats_rollups' in tasks_dict and not tasks_dict['update_stats_rollups'].is_running():
+                tasks_dict['update_stats_rollups'].start()
+                logger.info("Stats rollup maintenance enabled (runs every 10 minutes)")
+
+            if 'update_topic_models' in tasks_dict and not tasks_dict['update_topic_models'].is_running():
+                tasks_dict['update_topic_models'].start()
+                logger.info("Topic model maintenance enabled (runs every 30 minutes)")
+
+            if 'flush_rate_limit_audit' in tasks_dict and not tasks_dict['flush_rate_limit_audit'].is_running():
+                tasks_dict['flush_rate_limit_audit'].start()
+                logger.info("Rate limit audit flush enabled (runs every 30 seconds)")
+
             if 'check_reminders' in tasks_dict and not tasks_dict['check_reminders'].is_running():
                 tasks_dict['check_reminders'].start()
                 logger.info("Reminder checking enabled (runs every minute)")
@@ -135,6 +159,10 @@ def register_events(bot, db, privacy_manager, claims_tracker, debate_scorekeeper
                 tasks_dict['process_embeddings'].start()
                 logger.info("RAG embedding processing enabled (runs every 5 minutes)")
 
+            if rag.enabled and 'update_channel_summaries' in tasks_dict and not tasks_dict['update_channel_summaries'].is_running():
+                tasks_dict['update_channel_summaries'].start()
+                logger.info("Rolling channel summaries enabled (runs every 15 minutes)")
+
             if iracing and 'update_iracing_popularity' in tasks_dict and not tasks_dict['update_iracing_popularity'].is_running():
                 tasks_dict['update_iracing_popularity'].start()
                 logger.info("iRacing popularity updates enabled (runs weekly)")
@@ -200,7 +228,9 @@ def register_events(bot, db, privacy_manager, claims_tracker, debate_scorekeeper
 
     async def _background_claim_analysis(message, claims_tracker, hot_takes_tracker, wompie_username):
         """Run claim analysis + hot take detection in background (fire-and-forget).
-        This avoids blocking the message pipeline with LLM calls for every message."""
+        This avoids blocking the message pipeline with LLM calls for every message.
+        Candidates from all channels share batched LLM calls (ClaimsTracker.batcher);
+        each task waits for its own verdict and routes it below."""
         try:
             claim_data = await claims_tracker.analyze_message_for_claim(message)
             if claim_data:
@@ -235,14 +265,14 @@ def register_events(bot, db, privacy_manager, claims_tracker, debate_scorekeeper
         # Check GDPR opt-out status (users are opted-in by default - legitimate interest basis)
         # Bot's own messages are always stored for conversation context
         if message.author == bot.user:
-            asyncio.create_task(asyncio.to_thread(db.store_message, message, False))
+            _store_message_task(message, False)
             return  # Don't respond to own messages (prevent infinite loops)
 
         consent_status = await asyncio.to_thread(privacy_manager.get_consent_status, message.author.id)
         opted_out = consent_status.get('consent_withdrawn', False) if consent_status else False
 
         # Store user messages (fire-and-forget to not block message processing)
-        asyncio.create_task(asyncio.to_thread(db.store_message, message, opted_out))
+        _store_message_task(message, opted_out)
 
         # Track messages for active debates
         if debate_scorekeeper.is_debate_active(message.channel.id):
@@ -498,7 +528,9 @@ def register_events(bot, db, privacy_manager, claims_tracker, debate_scorekeeper
             await handle_bot_mention(message, opted_out, bot, db, llm, cost_tracker,
                                     search=search, self_knowledge=self_knowledge, rag=rag,
                                     wolfram=wolfram, weather=weather,
-                                    iracing_manager=iracing, reminder_system=reminder_system)
+                                    iracing_manager=iracing, reminder_system=reminder_system,
+                                    async_db=async_db,
+                                    message_ingestion=message_ingestion)
             # Don't process as command if we already handled it as bot mention
             return
 
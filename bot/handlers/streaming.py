@@ -0,0 +1,150 @@
+"""
+Progressive rendering of streamed LLM output into Discord messages.
+
+handle_bot_mention posts a placeholder and then streams the completion into it
+(LLMClient.agenerate_response_stream). ProgressiveReply coalesces the incoming deltas
+and edits the placeholder at a throttled cadence. Discord allows roughly five edits per
+five seconds per channel and discord.py silently waits out 429s, so a slow edit is
+treated as a rate-limit signal and the interval backs off. Text past the 2000-char limit
+rolls over into follow-up messages, split at paragraph/line/word boundaries so earlier
+messages stop changing once they are full.
+"""
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+DISCORD_MESSAGE_LIMIT = 2000
+_CURSOR = " ▌"
+
+
+def split_for_discord(text, limit=DISCORD_MESSAGE_LIMIT):
+    """Split text into <= limit-char chunks, preferring paragraph, line, then word breaks.
+
+    Greedy from the start, so a chunk's content depends only on the text before its end:
+    once a chunk is full it stays the same as more text is appended.
+    """
+    chunks = []
+    while len(text) > limit:
+        window = text[:limit]
+        cut = -1
+        for sep in ("\n\n", "\n", " "):
+            cut = window.rfind(sep)
+            if cut > limit // 2:
+                cut += len(sep)
+                break
+        if cut <= limit // 2:
+            cut = limit
+        chunks.append(text[:cut])
+        text = text[cut:]
+    chunks.append(text)
+    return chunks
+
+
+class ProgressiveReply:
+    """Render a growing response into a placeholder message plus follow-ups."""
+
+    def __init__(self, placeholder):
+        self.messages = [placeholder]
+        self._rendered = [placeholder.content if hasattr(placeholder, 'content') else None]
+        self._parts = []
+        self.base_interval = float(os.getenv('LLM_STREAM_EDIT_INTERVAL', '1.2'))
+        self.max_interval = float(os.getenv('LLM_STREAM_MAX_EDIT_INTERVAL', '5'))
+        self.interval = self.base_interval
+        self._dirty = asyncio.Event()
+        self._task = None
+        self._closed = False
+        self.edits = 0
+
+    @property
+    def started(self):
+        """True once any streamed text has been shown."""
+        return self.edits > 0
+
+    def feed(self, piece):
+        """Append a streamed fragment. Must be called on the event loop."""
+        if self._closed or not piece:
+            return
+        self._parts.append(piece)
+        self._dirty.set()
+        if self._task is None:
+            self._task = asyncio.create_task(self._pump())
+
+    async def _pump(self):
+        last_edit = 0.0
+        while not self._closed:
+            await self._dirty.wait()
+            # Coalesce deltas until the edit interval has elapsed
+            wait = self.interval - (time.monotonic() - last_edit)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            if self._closed:
+                break
+            self._dirty.clear()
+            started = time.monotonic()
+            try:
+                await self._render("".join(self._parts), final=False)
+                self.edits += 1
+            except Exception as e:
+                logger.debug("Progressive edit failed: %s", e)
+            took = time.monotonic() - started
+            if took > self.interval:
+                self.interval = min(self.interval * 2, self.max_interval)
+            elif self.interval > self.base_interval:
+                self.interval = max(self.base_interval, self.interval * 0.8)
+            last_edit = time.monotonic()
+
+    async def _render(self, text, final):
+        chunks = [c for c in split_for_discord(text) if c.strip()] or ["..."]
+        if not final:
+            # Show a cursor on the message still being written, if it fits
+            if len(chunks[-1]) + len(_CURSOR) <= DISCORD_MESSAGE_LIMIT:
+                chunks[-1] += _CURSOR
+        for i, chunk in enumerate(chunks):
+            if i < len(self.messages):
+                if self._rendered[i] != chunk:
+                    await self.messages[i].edit(content=chunk)
+                    self._rendered[i] = chunk
+            else:
+                self.messages.append(await self.messages[0].channel.send(chunk))
+                self._rendered.append(chunk)
+        if final:
+            # Final text can be shorter than the streamed text (e.g. mention restoration)
+            while len(self.messages) > len(chunks):
+                extra = self.messages.pop()
+                self._rendered.pop()
+                await extra.delete()
+        return chunks
+
+    async def close(self):
+        """Stop progressive edits (waits for an in-flight edit to finish)."""
+        self._closed = True
+        self._dirty.set()
+        if self._task is not None:
+            try:
+                await self._task
+            except Exception as e:
+                logger.debug("Progressive edit task error: %s", e)
+
+    async def finish(self, final_text):
+        """Render the final text across the placeholder and follow-ups.
+
+        Returns:
+            List of (message, content) pairs as finally shown, for storage.
+        """
+        await self.close()
+        chunks = await self._render(final_text, final=True)
+        return list(zip(self.messages, chunks))
+
+    async def abandon(self):
+        """Stop and delete any follow-ups (the caller takes over the placeholder)."""
+        await self.close()
+        for extra in self.messages[1:]:
+            try:
+                await extra.delete()
+            except Exception:
+                pass
+        del self.messages[1:]
+        del self._rendered[1:]
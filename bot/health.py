@@ -22,8 +22,12 @@ def _db_ping(db):
             cur.fetchone()
 
 
-def make_health_starter(bot, db, port: int = 8080):
-    """Return an async `start()` that launches the /health server on the bot's loop."""
+def make_health_starter(bot, db, port: int = 8080, stats=None):
+    """Return an async `start()` that launches the /health server on the bot's loop.
+
+    `stats` is an optional {name: callable} map; each callable's dict is included in the
+    healthy response (e.g. message ingestion queue depth and flush latency).
+    """
 
     async def health(_request):
         if not bot.is_ready():
@@ -33,7 +37,13 @@ def make_health_starter(bot, db, port: int = 8080):
         except Exception as e:
             logger.warning("Health check DB ping failed: %s", e)
             return web.json_response({"status": "unhealthy", "db": "down"}, status=503)
-        return web.json_response({"status": "ok", "guilds": len(bot.guilds)})
+        payload = {"status": "ok", "guilds": len(bot.guilds)}
+        for name, provider in (stats or {}).items():
+            try:
+                payload[name] = provider()
+            except Exception as e:
+                logger.warning("Health stats provider %s failed: %s", name, e)
+        return web.json_response(payload)
 
     async def start():
         app = web.Application()
@@ -13,6 +13,8 @@ import json
 import logging
 import time
 
+from resilience import ProviderUnavailable, get_provider
+
 try:
     from tenacity import (
         retry,
@@ -61,6 +63,7 @@ class iRacingClient:
         self._next_request_time = 0.0
         self._min_rate_limit_backoff = 0.75
         self._use_tenacity = HAS_TENACITY
+        self._provider = get_provider('iracing', display_name='The iRacing API', latency_target=10)
         if not HAS_TENACITY:
             logger.warning("tenacity not installed, falling back to legacy retry logic")
 
@@ -268,64 +271,69 @@ class iRacingClient:
             if self.access_token:
                 request_headers['Authorization'] = f'Bearer {self.access_token}'
 
-            async with session.get(url, params=params, headers=request_headers) as response:
-                status = response.status
-                headers = dict(response.headers)
-
-                if endpoint in ["/data/member/info", "/data/member/get"]:
-                    logger.debug("Actual URL: %s", response.url)
-                if 'x-ratelimit-remaining' in headers:
-                    remaining = headers.get('x-ratelimit-remaining')
-                    if remaining is not None and remaining.isdigit() and int(remaining) < 10:
-                        logger.warning("iRacing API rate limit low: %s remaining", remaining)
-
-                if status == 200:
-                    self._next_request_time = time.monotonic()
-                    data = await response.json()
-                    if isinstance(data, dict) and 'link' in data:
-                        async with session.get(data['link']) as link_response:
-                            if link_response.status == 200:
-                                return await link_response.json()
-                            logger.error("Failed to fetch cached data: %d", link_response.status)
-                            return None
-                    return data
-
-                if status == 401:
+            # Auth refreshes aren't provider failures; 429/5xx/timeouts are
+            with self._provider.guard(ignore=(iRacingAuthExpiredError,)) as call:
+                async with session.get(url, params=params, headers=request_headers) as response:
+                    status = response.status
+                    headers = dict(response.headers)
+
+                    if endpoint in ["/data/member/info", "/data/member/get"]:
+                        logger.debug("Actual URL: %s", response.url)
+                    if 'x-ratelimit-remaining' in headers:
+                        remaining = headers.get('x-ratelimit-remaining')
+                        if remaining is not None and remaining.isdigit() and int(remaining) < 10:
+                            logger.warning("iRacing API rate limit low: %s remaining", remaining)
+
+                    if status == 200:
+                        self._next_request_time = time.monotonic()
+                        data = await response.json()
+                        if isinstance(data, dict) and 'link' in data:
+                            async with session.get(data['link']) as link_response:
+                                if link_response.status == 200:
+                                    return await link_response.json()
+                                logger.error("Failed to fetch cached data: %d", link_response.status)
+                                return None
+                        return data
+
+                    if status == 401:
+                        try:
+                            response_payload = await response.text()
+                        except Exception:
+                            response_payload = None
+                        self._next_request_time = time.monotonic()
+                        logger.warning("Session expired (401), re-authenticating...")
+                        await self.authenticate()
+                        raise iRacingAuthExpiredError()
+
+                    if status == 429:
+                        retry_after_header = headers.get('retry-after')
+                        try:
+                            retry_delay = float(retry_after_header) if retry_after_header else self._min_rate_limit_backoff * 2
+                        except (TypeError, ValueError):
+                            retry_delay = self._min_rate_limit_backoff * 2
+                        self._next_request_time = time.monotonic() + retry_delay
+                        logger.warning("Rate limited by iRacing API, retry after %.2fs", retry_delay)
+                        raise iRacingRateLimitError(retry_after=retry_delay)
+
+                    if status == 503:
+                        logger.error("iRacing API is in maintenance")
+                        call.failed()
+                        return None
+
+                    # Non-retryable error
+                    response_payload = None
                     try:
                         response_payload = await response.text()
                     except Exception:
-                        response_payload = None
-                    self._next_request_time = time.monotonic()
-                    logger.warning("Session expired (401), re-authenticating...")
-                    await self.authenticate()
-                    raise iRacingAuthExpiredError()
-
-                if status == 429:
-                    retry_after_header = headers.get('retry-after')
-                    try:
-                        retry_delay = float(retry_after_header) if retry_after_header else self._min_rate_limit_backoff * 2
-                    except (TypeError, ValueError):
-                        retry_delay = self._min_rate_limit_backoff * 2
-                    self._next_request_time = time.monotonic() + retry_delay
-                    logger.warning("Rate limited by iRacing API, retry after %.2fs", retry_delay)
-                    raise iRacingRateLimitError(retry_after=retry_delay)
-
-                if status == 503:
-                    logger.error("iRacing API is in maintenance")
+                        pass
+                    logger.error("iRacing API error %d: %s", status, endpoint)
+                    if status >= 500:
+                        call.failed()
+                    if response_payload:
+                        snippet = response_payload[:200].replace("\n", " ")
+                        logger.error("Response snippet: %s", snippet)
                     return None
 
-                # Non-retryable error
-                response_payload = None
-                try:
-                    response_payload = await response.text()
-                except Exception:
-                    pass
-                logger.error("iRacing API error %d: %s", status, endpoint)
-                if response_payload:
-                    snippet = response_payload[:200].replace("\n", " ")
-                    logger.error("Response snippet: %s", snippet)
-                return None
-
     async def _get(self, endpoint: str, params: Optional[Dict] = None) -> Optional[Dict]:
         """
         Make GET request to iRacing API with automatic retry.
@@ -369,6 +377,9 @@ class iRacingClient:
 
         try:
             return await _do_request()
+        except ProviderUnavailable as e:
+            logger.warning("Skipping iRacing API call to %s: %s", endpoint, e)
+            return None
         except (iRacingRateLimitError, iRacingAuthExpiredError):
             logger.error("Failed to fetch %s after multiple attempts", endpoint)
             return None
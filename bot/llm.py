@@ -1,23 +1,16 @@
+import asyncio
+import importlib.util
+import json
 import logging
 import os
 import re
 import threading
-import time
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 from compression import ConversationCompressor
-
-try:
-    from tenacity import (
-        retry,
-        stop_after_attempt,
-        wait_exponential,
-        retry_if_exception,
-        before_sleep_log,
-    )
-    _HAS_TENACITY = True
-except ImportError:
-    _HAS_TENACITY = False
+from prompt_builder import count_tokens, format_user_context, trim_count
+from resilience import FAILURE_STATUSES, ProviderUnavailable, get_provider
 
 try:
     import tiktoken
@@ -30,6 +23,11 @@ except ImportError:
 logger = logging.getLogger(__name__)
 
 
+def _estimate_tokens(text):
+    """Output token estimate when the provider reports no usage (tiktoken, else ~4 chars/token)."""
+    return len(_tiktoken_encoding.encode(text)) if _HAS_TIKTOKEN else len(text) // 4
+
+
 class _TransientAPIError(Exception):
     """Wrapper for transient OpenRouter errors (429, 502, 503) that should be retried."""
     def __init__(self, status_code: int, body: str = ""):
@@ -38,9 +36,18 @@ class _TransientAPIError(Exception):
         super().__init__(f"Transient API error {status_code}")
 
 
-def _is_transient_api_error(exc: BaseException) -> bool:
-    """Check if an exception is a retryable transient API error."""
-    return isinstance(exc, _TransientAPIError)
+_TRANSIENT_STATUS = (429, 502, 503)
+
+
+def _retry_wait(retry_after, attempt: int) -> int:
+    """Seconds to wait before retry `attempt` (1-based): the server's Retry-After when
+    given, else exponential backoff (2, 4, 8...) capped at 10s."""
+    if retry_after:
+        try:
+            return min(int(retry_after), 60)
+        except ValueError:
+            return 5 * attempt
+    return min(2 ** attempt, 10)
 
 
 def _get_text_content(content):
@@ -80,12 +87,33 @@ class LLMClient:
         # Initialize conversation compressor for token reduction
         self.compressor = ConversationCompressor()
 
-        # Reusable HTTP session for connection pooling (avoids redundant TCP+TLS handshakes)
+        # Blocking session for the batch analytics helpers (analyze_user_behavior, classify_questions)
         self.session = requests.Session()
         self.session.headers.update({
             "Content-Type": "application/json"
         })
 
+        # Async transport (see _get_http): one shared keep-alive pool for every chat call
+        self.request_timeout = float(os.getenv('LLM_REQUEST_TIMEOUT', '55'))
+        self.connect_timeout = float(os.getenv('LLM_CONNECT_TIMEOUT', '5'))
+        self.max_connections = int(os.getenv('LLM_HTTP_MAX_CONNECTIONS', '100'))
+        self._io_loop = None
+        self._io_lock = threading.Lock()
+        self._http = None
+        # Cost-ledger writes run here, off the I/O loop; bounded so a burst of calls queues
+        # writes instead of spawning a thread per call
+        self._cost_writer = ThreadPoolExecutor(
+            max_workers=int(os.getenv('LLM_COST_WRITER_THREADS', '2')),
+            thread_name_prefix="llm-cost",
+        )
+        # Circuit breaker + adaptive concurrency limit for OpenRouter (see resilience.py)
+        self.provider = get_provider(
+            'openrouter',
+            display_name='The AI service',
+            latency_target=float(os.getenv('LLM_LATENCY_TARGET', '45')),
+            max_concurrency=self.max_connections,
+        )
+
         # Load system prompts from files (cache all personalities)
         self.system_prompt_default = self._load_system_prompt('default')
         self.system_prompt_feyd = self._load_system_prompt('feyd')
@@ -188,11 +216,152 @@ RULES:
 
 Be useful and real. That's the balance."""
 
-    def simple_completion(self, prompt: str, max_tokens: int = 500, temperature: float = 0.3, model: str = None, cost_request_type: str = "simple_completion", system_prompt: str = None) -> str:
+    # ------------------------------------------------------------------
+    # Async transport
+    #
+    # All chat-completion traffic goes through one httpx.AsyncClient (keep-alive pool,
+    # HTTP/2 multiplexing when `h2` is installed) owned by a small dedicated event loop
+    # thread. Async callers on the bot loop await it without holding an executor thread
+    # for the model latency; the sync methods are thin wrappers that block on the same
+    # loop, so both share a single connection pool.
+    # ------------------------------------------------------------------
+
+    def _get_io_loop(self):
+        """Start (once) the background event loop that owns the async HTTP client."""
+        with self._io_lock:
+            if self._io_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-io", daemon=True).start()
+                self._io_loop = loop
+            return self._io_loop
+
+    async def _on_io_loop(self, coro):
+        """Await `coro` on the LLM I/O loop from any event loop (cancellation propagates)."""
+        loop = self._get_io_loop()
+        if asyncio.get_running_loop() is loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+    def _run_sync(self, coro):
+        """Run `coro` on the LLM I/O loop and block the calling thread until it finishes."""
+        loop = self._get_io_loop()
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            coro.close()
+            raise RuntimeError("Blocking LLMClient call from the LLM I/O loop would deadlock")
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    def _get_http(self):
+        """Shared httpx.AsyncClient, created lazily on the I/O loop."""
+        if self._http is None:
+            import httpx
+            http2 = importlib.util.find_spec("h2") is not None
+            self._http = httpx.AsyncClient(
+                http2=http2,
+                timeout=httpx.Timeout(self.request_timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=20,
+                    keepalive_expiry=60,
+                ),
+                headers={"Content-Type": "application/json"},
+            )
+            logger.info("LLM HTTP client ready (HTTP/%s, max %d connections)", "2" if http2 else "1.1", self.max_connections)
+        return self._http
+
+    async def _apost_with_retry(self, headers, payload, timeout=None, stream=False, max_retries=3):
+        """POST to the chat endpoint, retrying transient errors (429, 502, 503) with
+        Retry-After / exponential backoff.
+
+        Raises _TransientAPIError once retries are exhausted, httpx.HTTPStatusError for
+        other error statuses, and ProviderUnavailable (without calling out) while the
+        OpenRouter circuit breaker is open. With stream=True the caller must
+        `await response.aclose()`.
+        """
+        import httpx
+        client = self._get_http()
+        request_timeout = (
+            httpx.Timeout(timeout, connect=self.connect_timeout) if timeout else httpx.USE_CLIENT_DEFAULT
+        )
+
+        for attempt in range(max_retries + 1):
+            request = client.build_request(
+                "POST", self.base_url, headers=headers, json=payload, timeout=request_timeout
+            )
+            with self.provider.guard() as call:
+                response = await client.send(request, stream=stream)
+                if response.status_code in FAILURE_STATUSES:
+                    call.failed()
+            if response.status_code not in _TRANSIENT_STATUS:
+                break
+
+            await response.aread()
+            await response.aclose()
+            if attempt >= max_retries:
+                logger.error("API returned %d after %d retries", response.status_code, max_retries)
+                raise _TransientAPIError(response.status_code, response.text[:200])
+
+            wait_time = _retry_wait(response.headers.get('Retry-After'), attempt + 1)
+            logger.warning("API returned %d. Waiting %ds (attempt %d/%d)", response.status_code, wait_time, attempt + 1, max_retries)
+            await asyncio.sleep(wait_time)
+
+        if response.status_code >= 400:
+            await response.aread()
+            await response.aclose()
+            # Log full error server-side only — never expose to users
+            logger.error("LLM HTTP error %d (response logged at debug level)", response.status_code)
+            logger.debug("LLM error body: %s", response.text[:500])
+            response.raise_for_status()
+        return response
+
+    def _record_costs_background(self, model, input_tokens, output_tokens, request_type, user_id=None, username=None):
+        """Record costs on the shared cost-writer pool (the DB write must not block the I/O loop).
+
+        Threshold alerts detected there are scheduled back onto the bot's event loop.
+        """
+        if not self.cost_tracker or input_tokens <= 0:
+            return
+        try:
+            self._cost_writer.submit(
+                self.cost_tracker.record_costs_background,
+                model, input_tokens, output_tokens, request_type, user_id, username,
+            )
+        except Exception as e:
+            logger.warning("Error tracking costs for %s: %s", request_type, e)
+
+    async def aclose(self):
+        """Close the shared HTTP pool and stop the I/O loop (bot shutdown)."""
+        loop = self._io_loop
+        if loop is None:
+            return
+
+        async def _shutdown():
+            if self._http is not None:
+                await self._http.aclose()
+                self._http = None
+
+        try:
+            await self._on_io_loop(_shutdown())
+        except Exception as e:
+            logger.warning("Error closing LLM HTTP client: %s", e)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            self._io_loop = None
+
+    def simple_completion(self, prompt: str, max_tokens: int = 500, temperature: float = 0.3, model: str = None, cost_request_type: str = "simple_completion", system_prompt: str = None, timeout: float = None) -> str:
+        """Blocking wrapper around asimple_completion (for code running in worker threads)."""
+        return self._run_sync(self._asimple_completion(
+            prompt, max_tokens, temperature, model, cost_request_type, system_prompt, timeout
+        ))
+
+    async def asimple_completion(self, prompt: str, max_tokens: int = 500, temperature: float = 0.3, model: str = None, cost_request_type: str = "simple_completion", system_prompt: str = None, timeout: float = None) -> str:
         """
         Simple prompt->response completion for internal use (claims, fact_check, etc.).
         Centralizes the OpenRouter API call pattern so other modules don't duplicate it.
-        Retries on transient errors (429/502/503) with exponential backoff via tenacity.
+        Retries on transient errors (429/502/503) with exponential backoff.
 
         Args:
             prompt: The prompt text
@@ -201,10 +370,16 @@ Be useful and real. That's the balance."""
             model: Model to use (defaults to self.model)
             cost_request_type: Label for cost tracking
             system_prompt: Optional system prompt to prepend
+            timeout: Optional per-request read timeout in seconds (defaults to LLM_REQUEST_TIMEOUT)
 
         Returns:
             The response text, or empty string on error
         """
+        return await self._on_io_loop(self._asimple_completion(
+            prompt, max_tokens, temperature, model, cost_request_type, system_prompt, timeout
+        ))
+
+    async def _asimple_completion(self, prompt, max_tokens, temperature, model, cost_request_type, system_prompt, timeout):
         model_to_use = model or self.model
 
         headers = {
@@ -225,26 +400,22 @@ Be useful and real. That's the balance."""
         }
 
         try:
-            response = self._simple_completion_with_retry(headers, payload)
+            response = await self._apost_with_retry(headers, payload, timeout=timeout)
 
             result = response.json()
             response_text = result["choices"][0]["message"].get("content", "")
 
             # Track costs if cost tracker is available
             usage = result.get("usage", {})
-            input_tokens = usage.get("prompt_tokens", 0)
-            output_tokens = usage.get("completion_tokens", 0)
-
-            if self.cost_tracker and input_tokens > 0:
-                try:
-                    self.cost_tracker.record_costs_sync(
-                        model_to_use, input_tokens, output_tokens, cost_request_type
-                    )
-                except Exception as e:
-                    logger.warning("Error tracking costs for simple_completion: %s", e)
+            self._record_costs_background(
+                model_to_use, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0), cost_request_type
+            )
 
             return response_text
 
+        except ProviderUnavailable as e:
+            logger.warning("simple_completion skipped: %s", e)
+            return ""
         except _TransientAPIError as e:
             logger.error("simple_completion transient error after retries: %d", e.status_code)
             return ""
@@ -252,40 +423,6 @@ Be useful and real. That's the balance."""
             logger.error("simple_completion error: %s: %s", type(e).__name__, e)
             return ""
 
-    def _simple_completion_request(self, headers, payload):
-        """Make a single simple_completion HTTP request, raising _TransientAPIError for retryable status codes."""
-        response = self.session.post(self.base_url, headers=headers, json=payload, timeout=(5, 55))
-        if response.status_code in (429, 502, 503):
-            logger.warning("simple_completion got %d, will retry", response.status_code)
-            raise _TransientAPIError(response.status_code, response.text[:200] if hasattr(response, 'text') else '')
-        response.raise_for_status()
-        return response
-
-    def _simple_completion_with_retry(self, headers, payload):
-        """Wrap _simple_completion_request with tenacity retry (fallback to manual loop)."""
-        if _HAS_TENACITY:
-            # Build retrying wrapper dynamically (tenacity decorators need to be applied at call time
-            # since `self` is needed for logging)
-            retrying = retry(
-                stop=stop_after_attempt(4),
-                wait=wait_exponential(multiplier=1, min=1, max=10),
-                retry=retry_if_exception(_is_transient_api_error),
-                before_sleep=before_sleep_log(logger, logging.WARNING),
-                reraise=True,
-            )
-            return retrying(self._simple_completion_request)(headers, payload)
-        else:
-            # Fallback: manual retry loop (same logic, no tenacity)
-            for attempt in range(4):
-                try:
-                    return self._simple_completion_request(headers, payload)
-                except _TransientAPIError:
-                    if attempt >= 3:
-                        raise
-                    wait = min(2 ** (attempt + 1), 10)
-                    logger.warning("simple_completion retry %d/%d, waiting %ds", attempt + 1, 3, wait)
-                    time.sleep(wait)
-
     def should_search(self, message_content, conversation_context):
         """Determine if web search is needed - only for genuine factual queries
         that the LLM likely cannot answer from its training data alone."""
@@ -401,12 +538,19 @@ Be useful and real. That's the balance."""
     
     MAX_HISTORY_CHARS = int(os.getenv('MAX_HISTORY_CHARS', '50000'))  # Increased - was 6000
 
-    def chat_raw(self, messages, tools=None, model=None, max_tokens=None, temperature=0.7):
+    def chat_raw(self, messages, tools=None, model=None, max_tokens=None, temperature=0.7, timeout=None):
+        """Blocking wrapper around achat_raw."""
+        return self._run_sync(self._achat_raw(messages, tools, model, max_tokens, temperature, timeout))
+
+    async def achat_raw(self, messages, tools=None, model=None, max_tokens=None, temperature=0.7, timeout=None):
         """Single chat-completion call over an EXPLICIT message list, returning the raw
         assistant message dict ({'content': str, 'tool_calls': [...]}). Used by the agent
         loop to continue a tool-use conversation with role:'tool' results threaded in.
         Reuses the same OpenRouter endpoint + transient-error retry as generate_response.
         """
+        return await self._on_io_loop(self._achat_raw(messages, tools, model, max_tokens, temperature, timeout))
+
+    async def _achat_raw(self, messages, tools, model, max_tokens, temperature, timeout):
         model = model or self.model
         if max_tokens is None:
             max_tokens = int(os.getenv('MAX_TOKENS_PER_REQUEST', '1000'))
@@ -424,36 +568,18 @@ Be useful and real. That's the balance."""
             payload["tools"] = tools
             payload["tool_choice"] = "auto"
 
-        max_transient_retries = 3
-        transient_retry = 0
-        response = None
-        while transient_retry <= max_transient_retries:
-            response = self.session.post(self.base_url, headers=headers, json=payload, timeout=(5, 55))
-            if response.status_code in (429, 502, 503):
-                transient_retry += 1
-                if transient_retry > max_transient_retries:
-                    raise requests.HTTPError(f"API error {response.status_code} after retries", response=response)
-                time.sleep(2 ** transient_retry)
-                continue
-            break
-        response.raise_for_status()
+        response = await self._apost_with_retry(headers, payload, timeout=timeout)
         result = response.json()
         message = result["choices"][0]["message"]
 
         usage = result.get("usage", {})
-        if self.cost_tracker and usage.get("prompt_tokens"):
-            try:
-                threading.Thread(
-                    target=self.cost_tracker.record_costs_sync,
-                    args=(model, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0), 'agent_loop', None, None),
-                    daemon=True,
-                ).start()
-            except Exception as e:
-                logger.warning("Error tracking agent-loop costs: %s", e)
+        self._record_costs_background(
+            model, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0), 'agent_loop'
+        )
 
         return message
 
-    def generate_response(
+    def _build_chat_payload(
         self,
         user_message,
         conversation_history,
@@ -462,25 +588,17 @@ Be useful and real. That's the balance."""
         rag_context=None,
         retry_count=0,
         bot_user_id=None,
-        user_id=None,
-        username=None,
         max_tokens=None,
         personality='default',
         tools=None,
         images=None,
         base64_images=None,
     ):
-        """Generate response using OpenRouter with automatic retry on empty responses
+        """Assemble the chat-completions payload for generate_response / generate_response_stream.
 
-        Args:
-            max_tokens: Optional override for max tokens (defaults to MAX_TOKENS_PER_REQUEST env var or 1000)
-            rag_context: RAG-retrieved context (semantic matches, facts, summaries)
-            personality: 'default', 'bogan', or 'concise' - determines system prompt personality
-            tools: List of tool definitions for function calling (enables LLM to call tools)
-            images: List of image URLs to include in the message (for vision models)
-            base64_images: List of base64-encoded images (for processed GIF frames, YouTube thumbnails)
+        Returns:
+            (payload, model_to_use, estimated_tokens)
         """
-
         # Select appropriate system prompt based on personality
         if personality == 'bogan':
             system_prompt = self.system_prompt_bogan
@@ -491,380 +609,494 @@ Be useful and real. That's the balance."""
         else:
             system_prompt = self.system_prompt_default
 
-        try:
-            messages = [{"role": "system", "content": system_prompt}]
-
-            profile = None
-            behavior = None
-            if user_context:
-                profile = user_context.get("profile")
-                behavior = user_context.get("behavior")
-
-            # Build comprehensive user context if available
+        profile = None
+        behavior = None
+        card = None
+        if user_context:
+            profile = user_context.get("profile")
+            behavior = user_context.get("behavior")
+            card = user_context.get("card")  # pre-rendered, see user_card.py
+
+        # Build comprehensive user context if available (stable per user, so it stays
+        # in the cacheable prefix with the system prompt)
+        if card:
+            system_tokens = count_tokens(system_prompt) + card["tokens"]
+            system_prompt += card["text"]
+        else:
             if profile and behavior:
-                username = profile.get("username") or profile.get("user_id", "Unknown user")
-                context_note = f"\n\n## HISTORICAL USER CONTEXT for {username}:\n"
-                context_note += "Use this to understand their communication style, personality, and typical behavior.\n\n"
-
-                # Communication patterns
-                context_note += f"**Communication Style:**\n"
-                if behavior.get('conversation_style'):
-                    context_note += f"- Style: {behavior.get('conversation_style')}\n"
-                if behavior.get('tone_analysis'):
-                    context_note += f"- Typical Tone: {behavior.get('tone_analysis')}\n"
-                if behavior.get('profanity_score') is not None:
-                    context_note += f"- Profanity level: {behavior.get('profanity_score', 0)}/10\n"
-
-                # Honesty and behavior patterns
-                if behavior.get('honesty_patterns'):
-                    context_note += f"\n**Behavioral Patterns:**\n"
-                    context_note += f"- {behavior.get('honesty_patterns')}\n"
-
-                # Activity level
-                if behavior.get('message_count'):
-                    context_note += f"\n**Activity:**\n"
-                    context_note += f"- Message count in recent period: {behavior.get('message_count')}\n"
-
-                # Analysis period context
-                if behavior.get('analysis_period_start') and behavior.get('analysis_period_end'):
-                    context_note += f"- Analysis period: {behavior.get('analysis_period_start')} to {behavior.get('analysis_period_end')}\n"
-
-                messages[0]["content"] += context_note
-
-            # Add RAG-retrieved context (semantic search, facts, summaries)
-            if rag_context:
-                rag_note = "\n\n## RELEVANT HISTORICAL CONTEXT (RAG):\n"
-
-                # User facts (compact knowledge)
-                if rag_context.get('user_facts'):
-                    rag_note += "**Known Facts About User:**\n"
-                    for fact in rag_context['user_facts'][:5]:  # Top 5 facts
-                        confidence = fact.get('confidence', 0.8)
-                        rag_note += f"- {fact['fact']} (confidence: {confidence:.0%})\n"
-                    rag_note += "\n"
-
-                # Recent conversation summary
-                if rag_context.get('recent_summary'):
-                    rag_note += f"**Recent Conversation Summary:**\n{rag_context['recent_summary']}\n\n"
-
-                # Semantically relevant past messages
-                if rag_context.get('semantic_matches'):
-                    rag_note += "**Relevant Past Conversations:**\n"
-                    for match in rag_context['semantic_matches'][:3]:  # Top 3 matches
-                        timestamp = match['timestamp'].strftime('%Y-%m-%d')
-                        similarity = match.get('similarity', 0)
-                        rag_note += f"- [{timestamp}, {similarity:.0%} relevant] {match['username']}: {match['content'][:100]}...\n"
-
-                messages[0]["content"] += rag_note
-
-            # Add conversation history with optional compression
-            history_window = int(os.getenv('CONTEXT_WINDOW_MESSAGES', '50'))  # Increased from 6 due to compression
-            recent_messages = conversation_history[-history_window:]
-
-            if self.compressor.is_enabled() and len(recent_messages) >= 10:
-                # Use compression for longer conversations
-                compressed_history = self.compressor.compress_history(
-                    recent_messages,
-                    keep_recent=8,  # Keep last 8 messages verbatim for better context
-                    bot_user_id=bot_user_id  # Pass bot ID to identify bot messages
-                )
-                # Add as a single user message block with clear instruction
-                history_intro = """[CONVERSATION HISTORY - READ CAREFULLY]
+                system_prompt += format_user_context(profile, behavior)
+            system_tokens = count_tokens(system_prompt)
+        messages = [{"role": "system", "content": system_prompt}]
+
+        # RAG-retrieved context (semantic search, facts, summaries) changes with every
+        # query, so it goes in the latest message rather than the system prompt
+        rag_note = ""
+        if rag_context:
+            # User facts (compact knowledge)
+            if rag_context.get('user_facts'):
+                rag_note += "**Known Facts About User:**\n"
+                for fact in rag_context['user_facts'][:5]:  # Top 5 facts
+                    confidence = fact.get('confidence', 0.8)
+                    rag_note += f"- {fact['fact']} (confidence: {confidence:.0%})\n"
+                rag_note += "\n"
+
+            # Rolling channel summaries (last week, then recent days and hours)
+            if rag_context.get('recent_summary'):
+                rag_note += f"**Earlier In This Channel (summaries, oldest first):**\n{rag_context['recent_summary']}\n\n"
+
+            # Semantically relevant past messages
+            if rag_context.get('semantic_matches'):
+                rag_note += "**Relevant Past Conversations:**\n"
+                for match in rag_context['semantic_matches'][:3]:  # Top 3 matches
+                    timestamp = match['timestamp'].strftime('%Y-%m-%d')
+                    similarity = match.get('similarity', 0)
+                    rag_note += f"- [{timestamp}, {similarity:.0%} relevant] {match['username']}: {match['content'][:100]}...\n"
+
+            if rag_note:
+                rag_note = f"[RELEVANT HISTORICAL CONTEXT (RAG) - background, not part of the conversation:]\n{rag_note}\n"
+
+        # Add conversation history with optional compression
+        history_window = int(os.getenv('CONTEXT_WINDOW_MESSAGES', '50'))  # Increased from 6 due to compression
+        if rag_context and rag_context.get('recent_summary'):
+            # The rolling summaries cover older history, so fewer raw messages are sent
+            history_window = min(history_window, int(os.getenv('SUMMARY_HISTORY_MESSAGES', '20')))
+        recent_messages = conversation_history[-history_window:]
+        history = []      # droppable history messages, oldest first
+        history_ids = []  # their message_ids (token count cache keys)
+
+        if self.compressor.is_enabled() and len(recent_messages) >= 10:
+            # Use compression for longer conversations
+            compressed_history = self.compressor.compress_history(
+                recent_messages,
+                keep_recent=8,  # Keep last 8 messages verbatim for better context
+                bot_user_id=bot_user_id  # Pass bot ID to identify bot messages
+            )
+            # Add as a single user message block with clear instruction
+            history_intro = """[CONVERSATION HISTORY - READ CAREFULLY]
 Messages marked [YOU/WompBot] are YOUR previous responses - things YOU said.
 Messages marked [Username] are what USERS said to you.
 Use this history to maintain conversation continuity and remember what was discussed.
 
 """
-                messages.append({"role": "user", "content": f"{history_intro}{compressed_history}"})
-            else:
-                # Fallback to standard message-by-message format for short conversations
-                # This preserves proper assistant/user role assignments
-                if recent_messages:
-                    # Add header explaining the history format
-                    messages.append({"role": "user", "content": "[CONVERSATION HISTORY - The following messages show the recent conversation. Your previous responses appear as 'assistant' messages.]"})
-
-                for msg in recent_messages:
-                    if not msg.get("content"):
-                        continue
+            history.append({"role": "user", "content": f"{history_intro}{compressed_history}"})
+            history_ids.append(None)
+        else:
+            # Fallback to standard message-by-message format for short conversations
+            # This preserves proper assistant/user role assignments
+            if recent_messages:
+                # Add header explaining the history format
+                messages.append({"role": "user", "content": "[CONVERSATION HISTORY - The following messages show the recent conversation. Your previous responses appear as 'assistant' messages.]"})
+
+            for msg in recent_messages:
+                if not msg.get("content"):
+                    continue
+
+                role = "user"
+                msg_user_id = msg.get("user_id")
+                if bot_user_id is not None and msg_user_id == bot_user_id:
+                    role = "assistant"
 
-                    role = "user"
-                    msg_user_id = msg.get("user_id")
-                    if bot_user_id is not None and msg_user_id == bot_user_id:
-                        role = "assistant"
-
-                    if role == "assistant":
-                        content = msg["content"]
-                    else:
-                        display_name = msg.get("username", "User")
-                        content = f"{display_name}: {msg['content']}"
-                    messages.append({"role": role, "content": content})
-
-            # Add search results to user message with conversational framing
-            if search_results:
-                user_message_with_context = f"""[LATEST MESSAGE - respond to this, but consider the conversation history above]
+                if role == "assistant":
+                    content = msg["content"]
+                else:
+                    display_name = msg.get("username", "User")
+                    content = f"{display_name}: {msg['content']}"
+                history.append({"role": role, "content": content})
+                history_ids.append(msg.get("message_id"))
+
+        # Add search results to user message with conversational framing
+        if search_results:
+            user_message_with_context = f"""{rag_note}[LATEST MESSAGE - respond to this, but consider the conversation history above]
 {user_message}
 
 [Web search results - use naturally in your response:]
 {search_results}"""
-            else:
-                # Frame the message to remind LLM to consider full context
-                user_message_with_context = f"[LATEST MESSAGE - respond to this, but consider the conversation history above]\n{user_message}"
-
-            # Build user message content - use array format if images are included
-            has_images = (images and len(images) > 0) or (base64_images and len(base64_images) > 0)
-
-            if has_images:
-                # Vision model format: array of content objects
-                content_parts = [{"type": "text", "text": user_message_with_context}]
-
-                # Add image URLs (detail:low reduces token cost from ~thousands to ~85 tokens per image)
-                if images:
-                    for img_url in images:
-                        content_parts.append({
-                            "type": "image_url",
-                            "image_url": {"url": img_url, "detail": "low"}
-                        })
-
-                # Add base64-encoded images (GIF frames, YouTube thumbnails, etc.)
-                if base64_images:
-                    for b64_img in base64_images:
-                        content_parts.append({
-                            "type": "image_url",
-                            "image_url": {"url": f"data:image/jpeg;base64,{b64_img}", "detail": "low"}
-                        })
-
-                messages.append({"role": "user", "content": content_parts})
-                url_count = len(images) if images else 0
-                b64_count = len(base64_images) if base64_images else 0
-                logger.info("Including %d image URL(s) and %d processed frame(s) in message", url_count, b64_count)
-            else:
-                messages.append({"role": "user", "content": user_message_with_context})
-
-            # Enforce context token limits to prevent excessive usage
-            max_context_tokens = int(os.getenv('MAX_CONTEXT_TOKENS', '4000'))
-
-            # Helper to get content length (handles both string and array content)
-            def get_content_len(content):
-                if isinstance(content, str):
-                    return len(content)
-                elif isinstance(content, list):
-                    # For array content, sum text parts only (images counted separately)
-                    return sum(len(part.get("text", "")) for part in content if part.get("type") == "text")
-                return 0
-
-            # Estimate tokens using tiktoken if available, else ~1 token per 4 chars
-            # Add ~170 tokens per image (OpenAI low-detail default)
-            image_token_estimate = (len(images or []) + len(base64_images or [])) * 170
-
-            if _HAS_TIKTOKEN:
-                # Pre-compute per-message token counts to avoid re-encoding entire array in loop
-                msg_token_counts = []
-                for entry in messages:
-                    text = _get_text_content(entry["content"])
-                    msg_token_counts.append(len(_tiktoken_encoding.encode(text)) if text else 0)
-                estimated_tokens = sum(msg_token_counts) + image_token_estimate
-            else:
-                msg_token_counts = [get_content_len(entry["content"]) // 4 for entry in messages]
-                estimated_tokens = sum(msg_token_counts) + image_token_estimate
-
-            total_chars = sum(get_content_len(entry["content"]) for entry in messages)
-
-            # Truncate old messages if we exceed token limit
-            # Use pre-computed per-message counts — subtract instead of re-encoding
-            messages_removed = 0
-            while estimated_tokens > max_context_tokens and len(messages) > 3:
-                removed_msg = messages.pop(1)  # Remove oldest message after system prompt
-                removed_tokens = msg_token_counts.pop(1)
-                removed_chars = get_content_len(removed_msg["content"])
-                estimated_tokens -= removed_tokens
-                total_chars -= removed_chars
-                messages_removed += 1
-
-            if messages_removed > 0:
-                logger.warning("Context truncated: removed %d old messages (now ~%d tokens)", messages_removed, estimated_tokens)
-                # Insert truncation notice and its token count to keep arrays in sync
-                truncation_note = f"[Note: {messages_removed} earlier messages were omitted for brevity. The conversation started before the history shown below.]"
-                messages.insert(1, {"role": "user", "content": truncation_note})
-                truncation_tokens = len(_tiktoken_encoding.encode(truncation_note)) if _HAS_TIKTOKEN else len(truncation_note) // 4
-                msg_token_counts.insert(1, truncation_tokens)
-                estimated_tokens += truncation_tokens
-
-            # Also enforce character limit as fallback (using same delta approach)
-            while total_chars > self.MAX_HISTORY_CHARS and len(messages) > 3:
-                removed = messages.pop(1)
-                removed_chars = get_content_len(removed["content"])
-                total_chars -= removed_chars
-                if len(msg_token_counts) > 1:
-                    removed_tokens = msg_token_counts.pop(1)
-                    estimated_tokens -= removed_tokens
-
-            retry_text = f" (retry {retry_count + 1}/3)" if retry_count > 0 else ""
-            logger.info("Sending to %s%s", self.model, retry_text)
-            logger.info("Messages in context: %d", len(messages))
-            logger.info("Estimated tokens: ~%d", estimated_tokens)
-            # Debug: Log last few messages to verify history is included
-            if len(messages) > 1:
-                logger.debug("Recent context messages:")
-                for i, msg in enumerate(messages[-4:]):  # Show last 4 messages
-                    role = msg['role']
-                    content_text = _get_text_content(msg['content'])
-                    content_preview = content_text[:80].replace('\n', ' ') if content_text else "[image]"
-                    logger.debug("[%d] %s: %s...", i, role, content_preview)
+        else:
+            # Frame the message to remind LLM to consider full context
+            user_message_with_context = f"{rag_note}[LATEST MESSAGE - respond to this, but consider the conversation history above]\n{user_message}"
+
+        # Build user message content - use array format if images are included
+        has_images = (images and len(images) > 0) or (base64_images and len(base64_images) > 0)
+
+        if has_images:
+            # Vision model format: array of content objects
+            content_parts = [{"type": "text", "text": user_message_with_context}]
+
+            # Add image URLs (detail:low reduces token cost from ~thousands to ~85 tokens per image)
+            if images:
+                for img_url in images:
+                    content_parts.append({
+                        "type": "image_url",
+                        "image_url": {"url": img_url, "detail": "low"}
+                    })
+
+            # Add base64-encoded images (GIF frames, YouTube thumbnails, etc.)
+            if base64_images:
+                for b64_img in base64_images:
+                    content_parts.append({
+                        "type": "image_url",
+                        "image_url": {"url": f"data:image/jpeg;base64,{b64_img}", "detail": "low"}
+                    })
+
+            latest = {"role": "user", "content": content_parts}
+            url_count = len(images) if images else 0
+            b64_count = len(base64_images) if base64_images else 0
+            logger.info("Including %d image URL(s) and %d processed frame(s) in message", url_count, b64_count)
+        else:
+            latest = {"role": "user", "content": user_message_with_context}
+
+        # Enforce context token limits to prevent excessive usage
+        max_context_tokens = int(os.getenv('MAX_CONTEXT_TOKENS', '4000'))
+
+        # Helper to get content length (handles both string and array content)
+        def get_content_len(content):
+            if isinstance(content, str):
+                return len(content)
+            elif isinstance(content, list):
+                # For array content, sum text parts only (images counted separately)
+                return sum(len(part.get("text", "")) for part in content if part.get("type") == "text")
+            return 0
+
+        # Estimate tokens (cached per message, see prompt_builder.py)
+        # Add ~170 tokens per image (OpenAI low-detail default)
+        image_token_estimate = (len(images or []) + len(base64_images or [])) * 170
+        fixed = messages + [latest]
+        fixed_tokens = system_tokens + image_token_estimate + sum(
+            count_tokens(_get_text_content(entry["content"])) for entry in fixed[1:]
+        )
+        fixed_chars = sum(get_content_len(entry["content"]) for entry in fixed)
+        history_tokens = [count_tokens(entry["content"], message_id) for entry, message_id in zip(history, history_ids)]
+        history_chars = [len(entry["content"]) for entry in history]
+
+        # Drop the oldest history messages if we exceed the token or character limit
+        messages_removed = trim_count(
+            history_tokens, history_chars, fixed_tokens, fixed_chars,
+            max_context_tokens, self.MAX_HISTORY_CHARS,
+        )
+        estimated_tokens = fixed_tokens + sum(history_tokens[messages_removed:])
+
+        if messages_removed > 0:
+            logger.warning("Context truncated: removed %d old messages (now ~%d tokens)", messages_removed, estimated_tokens)
+            truncation_note = f"[Note: {messages_removed} earlier messages were omitted for brevity. The conversation started before the history shown below.]"
+            messages.append({"role": "user", "content": truncation_note})
+            estimated_tokens += count_tokens(truncation_note)
+
+        messages.extend(history[messages_removed:])
+        messages.append(latest)
+
+        retry_text = f" (retry {retry_count + 1}/3)" if retry_count > 0 else ""
+        logger.info("Sending to %s%s", self.model, retry_text)
+        logger.info("Messages in context: %d", len(messages))
+        logger.info("Estimated tokens: ~%d", estimated_tokens)
+        # Debug: Log last few messages to verify history is included
+        if len(messages) > 1:
+            logger.debug("Recent context messages:")
+            for i, msg in enumerate(messages[-4:]):  # Show last 4 messages
+                role = msg['role']
+                content_text = _get_text_content(msg['content'])
+                content_preview = content_text[:80].replace('\n', ' ') if content_text else "[image]"
+                logger.debug("[%d] %s: %s...", i, role, content_preview)
+
+        # Use provided max_tokens or fall back to environment variable
+        if max_tokens is None:
+            max_tokens = int(os.getenv('MAX_TOKENS_PER_REQUEST', '1000'))
 
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
-            }
+        # Use vision model for image analysis (text-only models can't see images)
+        model_to_use = self.vision_model if has_images else self.model
+        if has_images and model_to_use != self.model:
+            logger.info("Switching to vision model: %s", model_to_use)
 
-            # Use provided max_tokens or fall back to environment variable
-            if max_tokens is None:
-                max_tokens = int(os.getenv('MAX_TOKENS_PER_REQUEST', '1000'))
+        payload = {
+            "model": model_to_use,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": 0.7,
+        }
 
-            # Use vision model for image analysis (text-only models can't see images)
-            model_to_use = self.vision_model if has_images else self.model
-            if has_images and model_to_use != self.model:
-                logger.info("Switching to vision model: %s", model_to_use)
+        # Add tools if provided (for function calling)
+        if tools:
+            payload["tools"] = tools
+            payload["tool_choice"] = "auto"  # Let LLM decide when to use tools
 
-            payload = {
-                "model": model_to_use,
-                "messages": messages,
-                "max_tokens": max_tokens,
-                "temperature": 0.7,
-            }
+        return payload, model_to_use, estimated_tokens
 
-            # Add tools if provided (for function calling)
-            if tools:
-                payload["tools"] = tools
-                payload["tool_choice"] = "auto"  # Let LLM decide when to use tools
-
-            # Make API request with transient error handling (429, 502, 503)
-            max_transient_retries = 3
-            transient_retry = 0
-            response = None
-
-            while transient_retry <= max_transient_retries:
-                response = self.session.post(self.base_url, headers=headers, json=payload, timeout=(5, 55))
-
-                # Handle transient errors (429 rate limit, 502/503 gateway errors)
-                if response.status_code in (429, 502, 503):
-                    transient_retry += 1
-                    if transient_retry > max_transient_retries:
-                        logger.error("API returned %d after %d retries", response.status_code, max_transient_retries)
-                        raise requests.HTTPError(f"API error {response.status_code} after {max_transient_retries} retries", response=response)
-
-                    # Check for Retry-After header (primarily for 429)
-                    retry_after = response.headers.get('Retry-After')
-                    if retry_after:
-                        try:
-                            wait_time = int(retry_after)
-                        except ValueError:
-                            wait_time = 5 * transient_retry  # Exponential backoff
-                    else:
-                        # Exponential backoff: 2, 4, 8 seconds
-                        wait_time = 2 ** transient_retry
-
-                    logger.warning("API returned %d. Waiting %ds (attempt %d/%d)", response.status_code, wait_time, transient_retry, max_transient_retries)
-                    time.sleep(wait_time)
-                    continue
+    def generate_response(
+        self,
+        user_message,
+        conversation_history,
+        user_context=None,
+        search_results=None,
+        rag_context=None,
+        retry_count=0,
+        bot_user_id=None,
+        user_id=None,
+        username=None,
+        max_tokens=None,
+        personality='default',
+        tools=None,
+        images=None,
+        base64_images=None,
+        timeout=None,
+    ):
+        """Blocking wrapper around agenerate_response (same arguments)."""
+        return self._run_sync(self._agenerate_response(
+            user_message, conversation_history, user_context, search_results, rag_context,
+            retry_count, bot_user_id, user_id, username, max_tokens, personality, tools,
+            images, base64_images, timeout,
+        ))
+
+    async def agenerate_response(
+        self,
+        user_message,
+        conversation_history,
+        user_context=None,
+        search_results=None,
+        rag_context=None,
+        retry_count=0,
+        bot_user_id=None,
+        user_id=None,
+        username=None,
+        max_tokens=None,
+        personality='default',
+        tools=None,
+        images=None,
+        base64_images=None,
+        timeout=None,
+    ):
+        """Generate response using OpenRouter with automatic retry on empty responses
 
-                # Not a transient error, break out of retry loop
-                break
+        Args:
+            max_tokens: Optional override for max tokens (defaults to MAX_TOKENS_PER_REQUEST env var or 1000)
+            rag_context: RAG-retrieved context (semantic matches, facts, summaries)
+            personality: 'default', 'bogan', or 'concise' - determines system prompt personality
+            tools: List of tool definitions for function calling (enables LLM to call tools)
+            images: List of image URLs to include in the message (for vision models)
+            base64_images: List of base64-encoded images (for processed GIF frames, YouTube thumbnails)
+            timeout: Optional per-request read timeout in seconds (defaults to LLM_REQUEST_TIMEOUT)
+
+        Returns:
+            The response text, a tool_calls dict, or None after 3 failed attempts
 
+        Raises:
+            ProviderUnavailable: OpenRouter's circuit breaker is open (no request is made)
+        """
+        return await self._on_io_loop(self._agenerate_response(
+            user_message, conversation_history, user_context, search_results, rag_context,
+            retry_count, bot_user_id, user_id, username, max_tokens, personality, tools,
+            images, base64_images, timeout,
+        ))
+
+    async def _agenerate_response(
+        self, user_message, conversation_history, user_context, search_results, rag_context,
+        retry_count, bot_user_id, user_id, username, max_tokens, personality, tools,
+        images, base64_images, timeout,
+    ):
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+
+        for attempt in range(retry_count, 3):
             try:
-                response.raise_for_status()
-            except requests.HTTPError as http_err:
-                # Log full error server-side only — never expose to users
-                logger.error("LLM HTTP error %d (response logged at debug level)", response.status_code)
-                logger.debug("LLM error body: %s", response.text[:500] if hasattr(response, "text") else "no body")
-                raise http_err
+                # Prompt assembly can run LLMLingua compression (CPU-bound), keep it off the loop
+                payload, model_to_use, estimated_tokens = await asyncio.to_thread(
+                    self._build_chat_payload,
+                    user_message, conversation_history, user_context, search_results, rag_context,
+                    attempt, bot_user_id=bot_user_id, max_tokens=max_tokens,
+                    personality=personality, tools=tools, images=images, base64_images=base64_images,
+                )
+                messages = payload["messages"]
+
+                # Make API request with transient error handling (429, 502, 503)
+                response = await self._apost_with_retry(headers, payload, timeout=timeout)
+
+                result = response.json()
+                message = result["choices"][0]["message"]
+                response_text = message.get("content", "")
+
+                # Check if LLM wants to call a tool
+                tool_calls = message.get("tool_calls")
+                if tool_calls:
+                    logger.info("LLM requested %d tool call(s)", len(tool_calls))
+                    for i, tc in enumerate(tool_calls):
+                        logger.debug("Tool call [%d]: %s", i, tc)
+                    # Return tool calls for execution
+                    return {
+                        "type": "tool_calls",
+                        "tool_calls": tool_calls,
+                        "response_text": response_text,  # May be empty if only tool calls
+                        "messages": messages,            # full message list, for the agent loop to continue
+                        "model": model_to_use,
+                        "max_tokens": payload["max_tokens"],
+                    }
 
-            result = response.json()
-            message = result["choices"][0]["message"]
-            response_text = message.get("content", "")
+                # Extract token usage for cost tracking
+                usage = result.get("usage", {})
+                input_tokens = usage.get("prompt_tokens", 0)
+                output_tokens = usage.get("completion_tokens", 0)
+
+                logger.info("LLM response length: %d chars (tokens: %d in / %d out)", len(response_text or ""), input_tokens, output_tokens)
+
+                # Record costs in background thread (don't block response)
+                self._record_costs_background(model_to_use, input_tokens, output_tokens, 'chat', user_id, username)
+
+                if response_text and response_text.strip():
+                    return response_text
+
+                logger.warning("Empty response from LLM. Full result: %s", result)
+                if attempt < 2:
+                    logger.info("Retrying in 0.5 seconds...")
+                    await asyncio.sleep(0.5)  # Just enough to avoid hammering
+            except ProviderUnavailable:
+                # Breaker open / overloaded: fail fast so the caller can tell the user
+                raise
+            except Exception as e:
+                logger.error("LLM error: %s: %s", type(e).__name__, e)
+                if attempt < 2:
+                    logger.info("Retrying in 2 seconds due to error...")
+                    await asyncio.sleep(2)
+
+        logger.error("Failed after %d attempts", 3 - retry_count)
+        return None
+
+    def generate_response_stream(self, *args, **kwargs):
+        """Blocking wrapper around agenerate_response_stream (same arguments)."""
+        return self._run_sync(self._agenerate_response_stream(*args, **kwargs))
+
+    async def agenerate_response_stream(self, *args, **kwargs):
+        """Streaming (SSE) variant of agenerate_response.
+
+        `on_delta(text)` is called for each content fragment as it arrives, so the caller
+        can render the answer progressively. It runs on the LLM I/O loop thread, so callers
+        hand fragments back to their own loop with `loop.call_soon_threadsafe`. Returns what
+        agenerate_response returns: the full text, a tool_calls dict, or None. Token usage
+        is taken from the final chunk (tiktoken estimate if the provider omits it) and
+        recorded when the stream ends. If the stream fails before any text was emitted,
+        this falls back to the non-streaming path.
+        """
+        return await self._on_io_loop(self._agenerate_response_stream(*args, **kwargs))
+
+    async def _agenerate_response_stream(
+        self,
+        user_message,
+        conversation_history,
+        user_context=None,
+        search_results=None,
+        rag_context=None,
+        bot_user_id=None,
+        user_id=None,
+        username=None,
+        max_tokens=None,
+        personality='default',
+        tools=None,
+        images=None,
+        base64_images=None,
+        on_delta=None,
+        timeout=None,
+    ):
+        text_parts = []
+        fallback_args = (user_message, conversation_history, user_context, search_results, rag_context)
+        fallback_rest = (bot_user_id, user_id, username, max_tokens, personality, tools, images, base64_images, timeout)
+        try:
+            payload, model_to_use, estimated_tokens = await asyncio.to_thread(
+                self._build_chat_payload,
+                user_message, conversation_history, user_context, search_results, rag_context,
+                0, bot_user_id=bot_user_id, max_tokens=max_tokens,
+                personality=personality, tools=tools, images=images, base64_images=base64_images,
+            )
+            payload["stream"] = True
+            # Ask for token usage in the final chunk so costs can still be recorded
+            payload["stream_options"] = {"include_usage": True}
+
+            headers = {
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json",
+                "Accept": "text/event-stream",
+            }
+
+            tool_calls = {}  # index -> accumulated tool call
+            usage = None
+            response = await self._apost_with_retry(headers, payload, timeout=timeout, stream=True)
+            try:
+                async for line in response.aiter_lines():
+                    # Blank lines separate events; ':' lines are keep-alive comments
+                    # (OpenRouter sends ": OPENROUTER PROCESSING" while the model warms up)
+                    if not line or line.startswith(":") or not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    if chunk.get("error"):
+                        raise RuntimeError(f"Stream error: {chunk['error']}")
+                    if chunk.get("usage"):
+                        usage = chunk["usage"]
+                    for choice in chunk.get("choices") or []:
+                        delta = choice.get("delta") or {}
+                        piece = delta.get("content")
+                        if piece:
+                            text_parts.append(piece)
+                            if on_delta:
+                                try:
+                                    on_delta(piece)
+                                except Exception as e:
+                                    logger.debug("on_delta callback error: %s", e)
+                        for tc in delta.get("tool_calls") or []:
+                            slot = tool_calls.setdefault(tc.get("index", 0), {
+                                "id": None, "type": "function", "function": {"name": "", "arguments": ""}
+                            })
+                            if tc.get("id"):
+                                slot["id"] = tc["id"]
+                            fn = tc.get("function") or {}
+                            slot["function"]["name"] += fn.get("name") or ""
+                            slot["function"]["arguments"] += fn.get("arguments") or ""
+            finally:
+                await response.aclose()
+
+            response_text = "".join(text_parts)
 
-            # Check if LLM wants to call a tool
-            tool_calls = message.get("tool_calls")
             if tool_calls:
-                logger.info("LLM requested %d tool call(s)", len(tool_calls))
-                for i, tc in enumerate(tool_calls):
-                    logger.debug("Tool call [%d]: %s", i, tc)
-                # Return tool calls for execution
+                calls = [tool_calls[i] for i in sorted(tool_calls)]
+                logger.info("LLM requested %d tool call(s) (streamed)", len(calls))
                 return {
                     "type": "tool_calls",
-                    "tool_calls": tool_calls,
-                    "response_text": response_text,  # May be empty if only tool calls
-                    "messages": messages,            # full message list, for the agent loop to continue
+                    "tool_calls": calls,
+                    "response_text": response_text,
+                    "messages": payload["messages"],
                     "model": model_to_use,
-                    "max_tokens": max_tokens,
+                    "max_tokens": payload["max_tokens"],
                 }
 
-            # Extract token usage for cost tracking
-            usage = result.get("usage", {})
-            input_tokens = usage.get("prompt_tokens", 0)
-            output_tokens = usage.get("completion_tokens", 0)
+            usage = usage or {}
+            input_tokens = usage.get("prompt_tokens") or estimated_tokens
+            output_tokens = usage.get("completion_tokens")
+            if output_tokens is None:
+                output_tokens = _estimate_tokens(response_text)
 
-            logger.info("LLM response length: %d chars (tokens: %d in / %d out)", len(response_text), input_tokens, output_tokens)
+            logger.info("LLM streamed response length: %d chars (tokens: %d in / %d out)", len(response_text), input_tokens, output_tokens)
 
             # Record costs in background thread (don't block response)
-            if self.cost_tracker and input_tokens > 0:
-                try:
-                    threading.Thread(
-                        target=self.cost_tracker.record_costs_sync,
-                        args=(model_to_use, input_tokens, output_tokens, 'chat', user_id, username),
-                        daemon=True
-                    ).start()
-                except Exception as e:
-                    logger.warning("Error tracking costs: %s", e)
-
-            if not response_text or len(response_text.strip()) == 0:
-                logger.warning("Empty response from LLM. Full result: %s", result)
-                if retry_count < 2:
-                    logger.info("Retrying in 0.5 seconds...")
-                    time.sleep(0.5)  # Reduced from 2s — just enough to avoid hammering
-                    return self.generate_response(
-                        user_message,
-                        conversation_history,
-                        user_context,
-                        search_results,
-                        rag_context,
-                        retry_count + 1,
-                        bot_user_id=bot_user_id,
-                        user_id=user_id,
-                        username=username,
-                        max_tokens=max_tokens,
-                        personality=personality,
-                        tools=tools,
-                        images=images,
-                        base64_images=base64_images,
-                    )
-                else:
-                    logger.error("Failed after %d attempts", retry_count + 1)
-                    return None
+            self._record_costs_background(model_to_use, input_tokens, output_tokens, 'chat', user_id, username)
+
+            if not response_text.strip():
+                logger.warning("Empty streamed response; retrying without streaming")
+                return await self._agenerate_response(*fallback_args, 1, *fallback_rest)
 
             return response_text
+        except ProviderUnavailable:
+            raise
         except Exception as e:
-            logger.error("LLM error: %s: %s", type(e).__name__, e)
-            if retry_count < 2:
-                logger.info("Retrying in 2 seconds due to error...")
-                time.sleep(2)
-                return self.generate_response(
-                    user_message,
-                    conversation_history,
-                    user_context,
-                    search_results,
-                    rag_context,
-                    retry_count + 1,
-                    bot_user_id=bot_user_id,
-                    user_id=user_id,
-                    username=username,
-                    max_tokens=max_tokens,
-                    personality=personality,
-                    tools=tools,
-                    images=images,
-                    base64_images=base64_images,
+            if text_parts:
+                # Part of the answer is already on screen; keep what arrived (and was billed)
+                logger.error("LLM stream interrupted after %d chars: %s: %s", sum(map(len, text_parts)), type(e).__name__, e)
+                partial = "".join(text_parts)
+                self._record_costs_background(
+                    model_to_use, estimated_tokens, _estimate_tokens(partial), 'chat', user_id, username
                 )
-            return None
-    
+                return partial
+            logger.warning("LLM stream failed (%s: %s); falling back to non-streaming", type(e).__name__, e)
+            return await self._agenerate_response(*fallback_args, 0, *fallback_rest)
+
     def analyze_user_behavior(self, messages):
         """Analyze user behavior patterns from message history"""
         if not messages:
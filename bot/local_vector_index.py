@@ -0,0 +1,266 @@
+"""
+In-process vector index tier for hot channels.
+
+Most useful RAG context is recent, and a brute-force cosine scan over a few hundred
+thousand normalized float32 vectors is a single BLAS matrix-vector product (milliseconds,
+GIL released). This module keeps one NumPy matrix per channel holding the last
+LOCAL_VECTOR_INDEX_DAYS of message embeddings (plus the little metadata semantic_search
+returns), so RAGSystem.semantic_search can answer recent-history queries without a
+pgvector round-trip and only go to the database for older history.
+
+A channel shard is authoritative for messages newer than its `covered_since`: it is
+loaded from the database (lazily on first search, or by the warm-start loader) and then
+kept current by RAGSystem.process_embedding_queue. Channels that aren't resident are
+simply answered by pgvector. Memory is capped (LOCAL_VECTOR_INDEX_MAX_MB); whole channels
+are evicted least-recently-used first, and each shard is dropped and reloaded after
+LOCAL_VECTOR_INDEX_REFRESH_HOURS so deleted/redacted messages don't linger.
+
+Thread-safe: searches run in worker threads while updates come from the event loop.
+Appends only write past a shard's published row count and compaction swaps in new
+arrays, so a search can work on a snapshot taken under the lock without holding it.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _epoch(dt):
+    """Naive timestamps in this codebase are UTC."""
+    if dt is None:
+        return 0.0
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+class _ChannelShard:
+    """Embeddings + metadata for one channel, stored in preallocated growable arrays."""
+
+    def __init__(self, channel_id, dim, capacity, covered_since):
+        self.channel_id = channel_id
+        self.dim = dim
+        self.count = 0
+        self.vectors = np.empty((capacity, dim), dtype=np.float32)
+        self.message_ids = np.empty(capacity, dtype=np.int64)
+        self.user_ids = np.empty(capacity, dtype=np.int64)
+        self.guild_ids = np.empty(capacity, dtype=np.int64)
+        self.timestamps = np.empty(capacity, dtype=np.float64)
+        self.meta = []  # [(username, content, timestamp datetime)] aligned with rows
+        self.ids = set()
+        self.covered_since = covered_since
+        self.loaded_at = time.monotonic()
+        self.meta_bytes = 0
+
+    @property
+    def capacity(self):
+        return self.vectors.shape[0]
+
+    @property
+    def nbytes(self):
+        arrays = (self.vectors, self.message_ids, self.user_ids, self.guild_ids, self.timestamps)
+        return sum(a.nbytes for a in arrays) + self.meta_bytes
+
+    def _resize(self, keep_idx, capacity):
+        """Swap in freshly allocated arrays holding rows `keep_idx` (never mutates in place)."""
+        n = len(keep_idx)
+        vectors = np.empty((capacity, self.dim), dtype=np.float32)
+        vectors[:n] = self.vectors[keep_idx]
+        message_ids = np.empty(capacity, dtype=np.int64)
+        message_ids[:n] = self.message_ids[keep_idx]
+        user_ids = np.empty(capacity, dtype=np.int64)
+        user_ids[:n] = self.user_ids[keep_idx]
+        guild_ids = np.empty(capacity, dtype=np.int64)
+        guild_ids[:n] = self.guild_ids[keep_idx]
+        timestamps = np.empty(capacity, dtype=np.float64)
+        timestamps[:n] = self.timestamps[keep_idx]
+        meta = [self.meta[i] for i in keep_idx]
+
+        self.vectors, self.message_ids, self.user_ids = vectors, message_ids, user_ids
+        self.guild_ids, self.timestamps, self.meta = guild_ids, timestamps, meta
+        self.ids = set(int(m) for m in message_ids[:n])
+        self.meta_bytes = sum(len(m[1] or '') + len(m[0] or '') for m in meta)
+        self.count = n
+
+    def append(self, rows, window_start, max_rows):
+        """Append new rows; compact (drop out-of-window / oldest rows) or grow when full."""
+        rows = [r for r in rows if r['message_id'] not in self.ids]
+        if not rows:
+            return 0
+        needed = self.count + len(rows)
+        if needed > self.capacity:
+            live = np.arange(self.count)
+            in_window = live[self.timestamps[:self.count] >= window_start]
+            overflow = len(in_window) + len(rows) - max_rows
+            if overflow > 0:
+                newest = np.argsort(self.timestamps[in_window], kind='stable')[overflow:]
+                in_window = np.sort(in_window[newest])
+            capacity = max(min(max_rows, 2 * (len(in_window) + len(rows))), len(in_window) + len(rows))
+            self._resize(in_window, capacity)
+
+        n = self.count
+        for i, r in enumerate(rows[:self.capacity - n]):
+            vec = np.asarray(r['embedding'], dtype=np.float32)
+            norm = float(np.linalg.norm(vec))
+            self.vectors[n + i] = vec / norm if norm else vec
+            self.message_ids[n + i] = r['message_id']
+            self.user_ids[n + i] = r.get('user_id') or 0
+            self.guild_ids[n + i] = r.get('guild_id') or 0
+            self.timestamps[n + i] = _epoch(r.get('timestamp'))
+            self.meta.append((r.get('username'), r.get('content'), r.get('timestamp')))
+            self.ids.add(r['message_id'])
+            self.meta_bytes += len(r.get('content') or '') + len(r.get('username') or '')
+        added = min(len(rows), self.capacity - n)
+        # Publish the new rows last so concurrent searches only ever see complete rows
+        self.count = n + added
+        return added
+
+
+class LocalVectorIndex:
+    """LRU-managed set of per-channel embedding matrices with brute-force cosine top-k."""
+
+    def __init__(self):
+        self.window_days = int(os.getenv('LOCAL_VECTOR_INDEX_DAYS', '14'))
+        self.max_bytes = int(float(os.getenv('LOCAL_VECTOR_INDEX_MAX_MB', '512')) * 1024 * 1024)
+        self.max_per_channel = int(os.getenv('LOCAL_VECTOR_INDEX_MAX_PER_CHANNEL', '50000'))
+        self.refresh_seconds = float(os.getenv('LOCAL_VECTOR_INDEX_REFRESH_HOURS', '6')) * 3600
+        self.warm_channels = int(os.getenv('LOCAL_VECTOR_INDEX_WARM_CHANNELS', '20'))
+
+        self._shards = OrderedDict()  # channel_id -> _ChannelShard, least recently used first
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'loads': 0, 'evictions': 0, 'added': 0}
+
+    def window_start(self):
+        return time.time() - self.window_days * 86400
+
+    def is_resident(self, channel_id):
+        with self._lock:
+            shard = self._shards.get(channel_id)
+            return shard is not None and time.monotonic() - shard.loaded_at < self.refresh_seconds
+
+    def load_channel(self, channel_id, rows, covered_since):
+        """Install a channel shard from database rows (dicts with message_id, user_id,
+        guild_id, username, content, timestamp, embedding). Replaces any existing shard."""
+        dim = len(rows[0]['embedding']) if rows else 1
+        shard = _ChannelShard(channel_id, dim, max(len(rows), 64), covered_since)
+        if rows:
+            shard.append(rows, self.window_start(), self.max_per_channel)
+        with self._lock:
+            self._shards[channel_id] = shard
+            self._shards.move_to_end(channel_id)
+            self.stats['loads'] += 1
+            self._enforce_memory_locked()
+
+    def add(self, rows):
+        """Feed freshly embedded messages. Only channels already resident are updated:
+        a cold channel gets a full load (with history) on its first search instead."""
+        by_channel = {}
+        for r in rows:
+            by_channel.setdefault(r.get('channel_id'), []).append(r)
+        added = 0
+        with self._lock:
+            for channel_id, channel_rows in by_channel.items():
+                shard = self._shards.get(channel_id)
+                if shard is None:
+                    continue
+                if shard.count == 0 and shard.dim != len(channel_rows[0]['embedding']):
+                    shard = _ChannelShard(channel_id, len(channel_rows[0]['embedding']), 64, shard.covered_since)
+                    self._shards[channel_id] = shard
+                added += shard.append(channel_rows, self.window_start(), self.max_per_channel)
+            self.stats['added'] += added
+            if added:
+                self._enforce_memory_locked()
+        return added
+
+    def _enforce_memory_locked(self):
+        total = sum(s.nbytes for s in self._shards.values())
+        while total > self.max_bytes and len(self._shards) > 1:
+            channel_id, shard = self._shards.popitem(last=False)
+            total -= shard.nbytes
+            self.stats['evictions'] += 1
+            logger.debug("Local vector index evicted channel %s (%d vectors)", channel_id, shard.count)
+
+    def search(self, query_embedding, channel_id, limit, user_id=None, guild_id=None,
+               since=None, min_similarity=None):
+        """Cosine top-k within one resident channel.
+
+        Returns:
+            (results, covered_since) where results are dicts shaped like semantic_search rows
+            (nearest first), or None if the channel isn't resident (caller uses pgvector).
+        """
+        with self._lock:
+            shard = self._shards.get(channel_id)
+            if shard is None or time.monotonic() - shard.loaded_at >= self.refresh_seconds:
+                if shard is not None:
+                    del self._shards[channel_id]
+                self.stats['misses'] += 1
+                return None
+            self._shards.move_to_end(channel_id)
+            self.stats['hits'] += 1
+            # Snapshot: rows [0, n) are immutable until compaction swaps in new arrays
+            n = shard.count
+            vectors, message_ids, user_ids = shard.vectors, shard.message_ids, shard.user_ids
+            guild_ids, timestamps, meta = shard.guild_ids, shard.timestamps, shard.meta
+            # Rows age out of the window over time, so coverage starts at the later of the two
+            covered_from = max(_epoch(shard.covered_since), self.window_start())
+        covered_since = datetime.fromtimestamp(covered_from, timezone.utc).replace(tzinfo=None)
+
+        if n == 0 or len(query_embedding) != vectors.shape[1]:
+            return [], covered_since
+
+        q = np.asarray(query_embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(q))
+        if norm:
+            q = q / norm
+        sims = vectors[:n] @ q
+
+        mask = timestamps[:n] >= max(covered_from, _epoch(since) if since else 0.0)
+        if user_id:
+            mask &= user_ids[:n] == user_id
+        if guild_id:
+            mask &= guild_ids[:n] == guild_id
+        if min_similarity is not None:
+            mask &= sims >= min_similarity
+        candidates = np.flatnonzero(mask)
+        if len(candidates) == 0:
+            return [], covered_since
+
+        if len(candidates) > limit:
+            top = np.argpartition(-sims[candidates], limit - 1)[:limit]
+            candidates = candidates[top]
+        candidates = candidates[np.argsort(-sims[candidates], kind='stable')]
+
+        results = []
+        for i in candidates:
+            username, content, ts = meta[i]
+            results.append({
+                'message_id': int(message_ids[i]),
+                'user_id': int(user_ids[i]),
+                'username': username,
+                'content': content,
+                'timestamp': ts,
+                'similarity': float(sims[i]),
+            })
+        return results, covered_since
+
+    def clear(self):
+        """Drop every shard (e.g. after GDPR deletions); channels reload on next search."""
+        with self._lock:
+            self._shards.clear()
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return {
+                **self.stats,
+                'channels': len(self._shards),
+                'vectors': sum(s.count for s in self._shards.values()),
+                'memory_mb': round(sum(s.nbytes for s in self._shards.values()) / (1024 * 1024), 1),
+                'hit_rate': round(self.stats['hits'] / lookups, 3) if lookups else 0.0,
+            }
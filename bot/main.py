@@ -20,8 +20,15 @@ setup_logging(
 logger = get_logger(__name__)
 
 from database import Database
+from async_database import AsyncDatabase
+from message_ingestion import MessageIngestionQueue
 from db_migrations import run_migrations
 from health import make_health_starter
+import resilience
+import prompt_builder
+import single_flight
+import tool_cache
+import user_card
 from llm import LLMClient
 from cost_tracker import CostTracker
 from search import SearchEngine
@@ -71,14 +78,46 @@ db = Database()
 # Apply any pending schema migrations (idempotent; safe on fresh and existing DBs)
 run_migrations(db)
 
+# Native async (asyncpg) pool for hot-path queries; the pool must be created on the
+# bot's event loop, so it connects in setup_hook. Falls back to `db` when unavailable.
+async_db = AsyncDatabase()
+# Write-behind queue that batches on_message storage into multi-row upserts
+message_ingestion = MessageIngestionQueue(db, async_db)
+
 # Start a /health endpoint (bot ready + DB SELECT 1) via setup_hook for container health checks
-_start_health = make_health_starter(bot, db, port=int(os.getenv('HEALTH_PORT', '8080')))
+_health_stats = {
+    'message_ingestion': message_ingestion.get_stats,
+    'providers': resilience.get_stats,
+    'rate_limits': db.rate_limiter.get_stats,
+    'single_flight': single_flight.get_stats,
+    'tool_cache': tool_cache.get_stats,
+    'prompt_cache': prompt_builder.get_stats,
+    'user_cards': user_card.get_stats,
+}
+_start_health = make_health_starter(
+    bot, db, port=int(os.getenv('HEALTH_PORT', '8080')),
+    stats=_health_stats,
+)
+
 _orig_setup_hook = bot.setup_hook
 async def _setup_hook():
     await _orig_setup_hook()
     await _start_health()
+    await async_db.connect()
+    message_ingestion.start()
 bot.setup_hook = _setup_hook
 
+_orig_close = bot.close
+async def _close():
+    await message_ingestion.stop()  # flush pending messages while the pools are still open
+    await claims_tracker.batcher.stop()  # send queued claim candidates before the LLM client closes
+    await asyncio.to_thread(db.rate_limiter.flush_audit)  # write queued rate limit audit rows
+    await async_db.close()
+    await cache.aclose()
+    await llm.aclose()
+    await _orig_close()
+bot.close = _close
+
 cache = get_cache()  # Redis cache for faster access to hot data
 cost_tracker = None  # Will be initialized in on_ready when bot is available
 llm = LLMClient(cost_tracker=None)  # Cost tracker will be set in on_ready
@@ -99,9 +138,11 @@ except Exception as e:
     weather = None
     logger.warning(f"Weather API not configured: {e}")
 rag = RAGSystem(db, llm)  # RAG system for semantic search and intelligent context
+_health_stats['rag'] = rag.get_cache_stats
 
 # Setup feature modules
 claims_tracker = ClaimsTracker(db, llm)
+_health_stats['claims'] = claims_tracker.get_stats
 fact_checker = FactChecker(db, llm, search)
 chat_stats = ChatStatistics(db)
 hot_takes_tracker = HotTakesTracker(db, llm)
@@ -238,6 +279,8 @@ logger.info("Registering event handlers...")
 register_events(
     bot=bot,
     db=db,
+    async_db=async_db,
+    message_ingestion=message_ingestion,
     privacy_manager=privacy_manager,
     claims_tracker=claims_tracker,
     debate_scorekeeper=debate_scorekeeper,
@@ -347,10 +390,12 @@ if __name__ == "__main__":
         logger.error("DISCORD_TOKEN not found in environment variables!")
         exit(1)
 
-    # Set larger thread pool for asyncio.to_thread() calls
-    # Default is ~40, but LLM calls hold threads for 5-60 seconds each
+    # Thread pool for asyncio.to_thread() calls (sync DB, search/API clients).
+    # LLM calls are async on a shared connection pool and no longer hold a thread each.
     loop = asyncio.get_event_loop()
-    loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(max_workers=100))
+    loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(
+        max_workers=int(os.getenv('BOT_EXECUTOR_WORKERS', '40'))
+    ))
 
     logger.info("Starting WompBot...")
     bot.run(token)
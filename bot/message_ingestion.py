@@ -0,0 +1,253 @@
+"""
+Write-behind message ingestion for on_message.
+
+Every stored message used to be its own fire-and-forget task doing two round-trips
+(messages upsert + user_profiles upsert) in a dedicated transaction. During raids or busy
+race nights that was the largest source of DB load and worker-thread churn.
+
+`MessageIngestionQueue` instead converts each message to a plain row at enqueue time,
+lets rows accumulate for a few milliseconds, and flushes them as one transaction: a
+single multi-row messages upsert plus one user_profiles upsert per *user* in the batch
+(counter increments are folded in memory). Ordering is preserved because there is a
+single writer, so a later content override for a message_id always wins over the
+placeholder stored before it.
+
+The queue is bounded. If it fills (DB stalled), new rows are written directly through the
+old per-message path instead of being buffered, so memory stays capped and nothing is
+dropped. `stop()` drains and flushes whatever is pending on shutdown.
+"""
+import asyncio
+import logging
+import os
+import time
+
+from async_database import _to_naive_utc
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()  # sentinel: flush what's collected and exit the worker
+
+
+def message_row(message, opted_out=False, content_override=None):
+    """Snapshot the fields `store_message` persists so the queue never holds discord objects.
+
+    Returns:
+        (message_id, user_id, username, channel_id, channel_name, content, timestamp,
+         guild_id, opted_out) tuple
+    """
+    channel = message.channel
+    return (
+        message.id,
+        message.author.id,
+        str(message.author) if not opted_out else "[redacted]",
+        channel.id,
+        channel.name if hasattr(channel, 'name') else str(channel.id),
+        content_override if content_override is not None else message.content,
+        _to_naive_utc(message.created_at),
+        message.guild.id if message.guild else None,
+        bool(opted_out),
+    )
+
+
+def coalesce_rows(rows):
+    """Fold queued rows into one messages upsert batch and one profile row per user.
+
+    Applying the result is equivalent to applying each row through `store_message` in
+    order: the last content for a message_id wins, opted-out rows store no message,
+    total_messages grows by the number of opted-in rows, last_seen tracks the newest
+    opted-in row, and username/opted_out come from the user's last row.
+
+    Returns:
+        (message_rows, profile_rows), each sorted by primary key so concurrent writers
+        lock rows in a consistent order
+    """
+    messages = {}
+    profiles = {}
+    for (message_id, user_id, username, channel_id, channel_name,
+         content, timestamp, guild_id, opted_out) in rows:
+        if not opted_out:
+            messages[message_id] = (message_id, user_id, username, channel_id,
+                                    channel_name, content, timestamp, guild_id)
+
+        p = profiles.get(user_id)
+        if p is None:
+            # [username, count, first_seen, last_seen (opted-in), latest_any, opted_out]
+            p = profiles[user_id] = [username, 0, timestamp, None, timestamp, opted_out]
+        p[0] = username
+        p[5] = opted_out
+        if timestamp is not None:
+            if p[2] is None or timestamp < p[2]:
+                p[2] = timestamp
+            if p[4] is None or timestamp > p[4]:
+                p[4] = timestamp
+        if not opted_out:
+            p[1] += 1
+            if timestamp is not None and (p[3] is None or timestamp > p[3]):
+                p[3] = timestamp
+
+    message_rows = [messages[k] for k in sorted(messages)]
+    profile_rows = [
+        (user_id, p[0], p[1], p[2], p[3] if p[3] is not None else p[4], p[5])
+        for user_id, p in sorted(profiles.items())
+    ]
+    return message_rows, profile_rows
+
+
+class MessageIngestionQueue:
+    """Bounded write-behind queue that batches message storage into multi-row upserts."""
+
+    def __init__(self, db, async_db=None):
+        self.db = db
+        self.async_db = async_db
+        self.max_batch = int(os.getenv('MESSAGE_INGEST_BATCH_SIZE', '200'))
+        self.flush_interval = float(os.getenv('MESSAGE_INGEST_FLUSH_MS', '50')) / 1000
+        self.max_queue = int(os.getenv('MESSAGE_INGEST_MAX_QUEUE', '10000'))
+        self.enabled = os.getenv('MESSAGE_INGEST_ENABLED', 'true').lower() == 'true'
+
+        self._queue = None
+        self._worker = None
+        self._overflow_tasks = set()
+
+        self.stats = {
+            'enqueued': 0,
+            'flushed_rows': 0,
+            'batches': 0,
+            'failed_rows': 0,
+            'overflow': 0,
+            'max_depth': 0,
+            'last_batch_size': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'total_flush_ms': 0.0,
+        }
+
+    def start(self):
+        """Start the flush worker. Must be called from the running event loop."""
+        if not self.enabled or self._worker is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._worker = asyncio.create_task(self._run())
+        logger.info("Message ingestion queue started (batch=%d, window=%.0fms, max=%d)",
+                    self.max_batch, self.flush_interval * 1000, self.max_queue)
+
+    def submit(self, message, opted_out=False, content_override=None):
+        """Queue a message for storage. Never blocks; never raises."""
+        if self._worker is None:
+            self._store_direct(message, opted_out, content_override)
+            return
+        try:
+            row = message_row(message, opted_out, content_override)
+            self._queue.put_nowait(row)
+            self.stats['enqueued'] += 1
+            depth = self._queue.qsize()
+            if depth > self.stats['max_depth']:
+                self.stats['max_depth'] = depth
+        except asyncio.QueueFull:
+            # Backpressure: don't grow memory, fall back to the per-message write.
+            self.stats['overflow'] += 1
+            if self.stats['overflow'] % 100 == 1:
+                logger.warning("Message ingestion queue full (%d); writing directly", self.max_queue)
+            self._store_direct(message, opted_out, content_override)
+        except Exception as e:
+            logger.error("Error queueing message %s: %s", getattr(message, 'id', '?'), e)
+
+    def _store_direct(self, message, opted_out, content_override):
+        """Per-message write (pre-queue behaviour): async pool when available, else a worker thread."""
+        if self.async_db is not None and self.async_db.enabled:
+            coro = self.async_db.store_message(message, opted_out, content_override)
+        else:
+            coro = asyncio.to_thread(self.db.store_message, message, opted_out, content_override)
+        task = asyncio.create_task(coro)
+        # Keep a strong reference until done so the task isn't garbage-collected mid-write
+        self._overflow_tasks.add(task)
+        task.add_done_callback(self._overflow_tasks.discard)
+
+    async def _run(self):
+        """Collect rows for up to `flush_interval` (or `max_batch` rows), then flush."""
+        stopping = False
+        while not stopping:
+            row = await self._queue.get()
+            if row is _STOP:
+                return
+            batch = [row]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch:
+                try:
+                    row = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        row = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if row is _STOP:
+                    stopping = True
+                    break
+                batch.append(row)
+            try:
+                await self._flush(batch)
+            except Exception as e:
+                # Never let one flush kill the worker
+                self.stats['failed_rows'] += len(batch)
+                logger.error("Error flushing message batch: %s", e)
+
+    async def _write_batch(self, rows):
+        message_rows, profile_rows = coalesce_rows(rows)
+        if self.async_db is not None and self.async_db.enabled:
+            return await self.async_db.store_messages_batch(message_rows, profile_rows)
+        return await asyncio.to_thread(self.db.store_messages_batch, message_rows, profile_rows)
+
+    async def _flush(self, batch):
+        started = time.perf_counter()
+        ok = await self._write_batch(batch)
+        if not ok and len(batch) > 1:
+            # One bad row shouldn't sink the whole batch: retry row by row
+            logger.warning("Message batch of %d failed; retrying rows individually", len(batch))
+            failed = 0
+            for row in batch:
+                if not await self._write_batch([row]):
+                    failed += 1
+            self.stats['failed_rows'] += failed
+        elif not ok:
+            self.stats['failed_rows'] += 1
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.stats['batches'] += 1
+        self.stats['flushed_rows'] += len(batch)
+        self.stats['last_batch_size'] = len(batch)
+        self.stats['last_flush_ms'] = elapsed_ms
+        self.stats['total_flush_ms'] += elapsed_ms
+        if elapsed_ms > self.stats['max_flush_ms']:
+            self.stats['max_flush_ms'] = elapsed_ms
+        logger.debug("Flushed %d messages in %.1fms (queue depth %d)",
+                     len(batch), elapsed_ms, self._queue.qsize())
+
+    async def stop(self):
+        """Flush everything still queued, then stop the worker. Safe to call more than once."""
+        worker, self._worker = self._worker, None
+        if worker is None:
+            return
+        pending = self._queue.qsize()
+        # Rows already queued are ahead of the sentinel, so the worker drains them first.
+        # (put() waits for space if the queue is full; new submits go direct meanwhile.)
+        await self._queue.put(_STOP)
+        try:
+            await worker
+        except Exception as e:
+            logger.error("Message ingestion worker error: %s", e)
+        if self._overflow_tasks:
+            await asyncio.gather(*self._overflow_tasks, return_exceptions=True)
+        logger.info("Message ingestion queue stopped (%d pending rows flushed)", pending)
+
+    def get_stats(self):
+        """Queue depth and flush latency metrics."""
+        batches = self.stats['batches']
+        return {
+            **self.stats,
+            'depth': self._queue.qsize() if self._queue is not None else 0,
+            'running': self._worker is not None,
+            'avg_batch_size': round(self.stats['flushed_rows'] / batches, 1) if batches else 0,
+            'avg_flush_ms': round(self.stats['total_flush_ms'] / batches, 2) if batches else 0.0,
+        }
@@ -0,0 +1,79 @@
+-- HNSW vector index + denormalized filter columns for RAGSystem.semantic_search
+--
+-- semantic_search filters by channel / user / age. Those columns used to live only on
+-- `messages`, so a filtered ANN query had to join before it could filter: Postgres either
+-- skipped the vector index (exact scan over every embedding) or post-filtered a fixed
+-- ivfflat candidate list down to too few rows. Copying the filter columns onto
+-- message_embeddings lets the planner apply them inside the index scan (or pick a b-tree
+-- when the filter is very selective), and HNSW gives good recall without the ivfflat
+-- "lists built on an empty table" problem.
+--
+-- Idempotent: safe to re-run.
+
+-- Index builds and the backfill can exceed the pool's 30s statement cap on large tables
+SET LOCAL statement_timeout = 0;
+
+-- HNSW needs pgvector >= 0.5, iterative index scans >= 0.8. Databases created on an older
+-- image keep the old extension version until updated; don't block the migration if we
+-- lack the privilege.
+DO $$
+BEGIN
+    ALTER EXTENSION vector UPDATE;
+EXCEPTION WHEN OTHERS THEN
+    RAISE NOTICE 'Could not update pgvector extension: %', SQLERRM;
+END $$;
+
+ALTER TABLE message_embeddings ADD COLUMN IF NOT EXISTS channel_id BIGINT;
+ALTER TABLE message_embeddings ADD COLUMN IF NOT EXISTS guild_id BIGINT;
+ALTER TABLE message_embeddings ADD COLUMN IF NOT EXISTS user_id BIGINT;
+ALTER TABLE message_embeddings ADD COLUMN IF NOT EXISTS "timestamp" TIMESTAMP;
+
+-- Backfill existing rows
+UPDATE message_embeddings me
+SET channel_id = m.channel_id,
+    guild_id = m.guild_id,
+    user_id = m.user_id,
+    "timestamp" = m.timestamp
+FROM messages m
+WHERE m.message_id = me.message_id
+  AND me.channel_id IS NULL;
+
+-- Keep the copies filled on every write path (queue processor, single upserts, backfills)
+CREATE OR REPLACE FUNCTION fill_message_embedding_filters()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.channel_id IS NULL OR NEW."timestamp" IS NULL THEN
+        SELECT m.channel_id, m.guild_id, m.user_id, m.timestamp
+        INTO NEW.channel_id, NEW.guild_id, NEW.user_id, NEW."timestamp"
+        FROM messages m
+        WHERE m.message_id = NEW.message_id;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS fill_message_embedding_filters_trigger ON message_embeddings;
+CREATE TRIGGER fill_message_embedding_filters_trigger
+    BEFORE INSERT ON message_embeddings
+    FOR EACH ROW
+    EXECUTE FUNCTION fill_message_embedding_filters();
+
+-- B-tree paths for selective filters (a quiet channel or a single user): the planner can
+-- fetch the few matching rows and rank them exactly instead of walking the graph
+CREATE INDEX IF NOT EXISTS idx_message_embeddings_channel_ts ON message_embeddings(channel_id, "timestamp" DESC);
+CREATE INDEX IF NOT EXISTS idx_message_embeddings_user_ts ON message_embeddings(user_id, "timestamp" DESC);
+CREATE INDEX IF NOT EXISTS idx_message_embeddings_guild_ts ON message_embeddings(guild_id, "timestamp" DESC);
+
+-- Replace ivfflat with HNSW. Only drop the old index once the new one exists, so a
+-- pgvector too old for HNSW leaves search working as before.
+DO $$
+BEGIN
+    CREATE INDEX IF NOT EXISTS message_embeddings_hnsw_idx
+        ON message_embeddings USING hnsw (embedding vector_cosine_ops)
+        WITH (m = 16, ef_construction = 64);
+    DROP INDEX IF EXISTS message_embeddings_vector_idx;
+EXCEPTION WHEN OTHERS THEN
+    RAISE NOTICE 'HNSW index not created (pgvector too old?): %', SQLERRM;
+END $$;
+
+ANALYZE message_embeddings;
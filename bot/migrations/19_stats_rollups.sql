@@ -0,0 +1,49 @@
+-- Hourly message-analytics rollups for ChatStatistics (features/stats_rollups.py)
+--
+-- precompute_stats and the /stats_* commands used to pull up to 50,000 full message rows
+-- into Python for every guild and window just to count them. These tables hold the same
+-- counts per hour, maintained incrementally by the update_stats_rollups job, so primetime,
+-- engagement and the interaction network become small aggregate queries.
+--
+-- Idempotent: safe to re-run.
+
+-- Per hour / guild / channel / user activity
+CREATE TABLE IF NOT EXISTS message_rollups_hourly (
+    hour TIMESTAMP NOT NULL,
+    guild_id BIGINT NOT NULL,
+    channel_id BIGINT NOT NULL,
+    user_id BIGINT NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    char_count BIGINT NOT NULL DEFAULT 0,
+    -- Messages answering someone else in the same channel within 5 minutes
+    response_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (guild_id, hour, channel_id, user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_message_rollups_user_hour
+ON message_rollups_hourly (user_id, hour);
+
+-- Per hour / guild interaction edges (source user -> target user)
+CREATE TABLE IF NOT EXISTS interaction_rollups_hourly (
+    hour TIMESTAMP NOT NULL,
+    guild_id BIGINT NOT NULL,
+    source_user_id BIGINT NOT NULL,
+    target_user_id BIGINT NOT NULL,
+    mention_count INTEGER NOT NULL DEFAULT 0,
+    -- Messages posted right after the target's in the same channel (last 3 messages)
+    reply_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (guild_id, hour, source_user_id, target_user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_interaction_rollups_target
+ON interaction_rollups_hourly (target_user_id);
+
+-- Watermark: highest messages.id folded into the rollups
+CREATE TABLE IF NOT EXISTS rollup_state (
+    name TEXT PRIMARY KEY,
+    last_message_id BIGINT NOT NULL DEFAULT 0,
+    caught_up_at TIMESTAMP WITH TIME ZONE,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+INSERT INTO rollup_state (name) VALUES ('messages') ON CONFLICT (name) DO NOTHING;
@@ -0,0 +1,20 @@
+-- Per-guild hashed document frequencies for topic extraction (features/topic_model.py)
+--
+-- extract_topics_tfidf used to refit a TF-IDF vectorizer for every window, conversation
+-- segment and user. The update_topic_models job folds each new message into its guild's
+-- document-frequency table instead, so scoring a window is a lookup. doc_freq is a
+-- zlib-compressed little-endian int32 array with n_features buckets (crc32 of the term);
+-- it holds counts only, no text or user ids. The job's watermark lives in rollup_state.
+--
+-- Idempotent: safe to re-run.
+
+CREATE TABLE IF NOT EXISTS topic_models (
+    guild_id BIGINT PRIMARY KEY,
+    n_features INTEGER NOT NULL,
+    -- Documents (messages with 3+ words after cleaning) folded in so far
+    doc_count BIGINT NOT NULL DEFAULT 0,
+    doc_freq BYTEA NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+INSERT INTO rollup_state (name) VALUES ('topic_models') ON CONFLICT (name) DO NOTHING;
@@ -0,0 +1,29 @@
+-- Running LLM cost totals per month / model / request type (cost_tracker.py)
+--
+-- Every LLM call inserted into api_costs and then summed the table twice: once for the
+-- month-to-date total and once, unfiltered, over all history for the $1 alert check.
+-- Database.record_api_cost now also upserts the call into this ledger in the same
+-- transaction, so monthly totals, the all-time total and the per-model breakdown read a
+-- few rows instead of scanning api_costs, which stays as the per-request log.
+-- request_type is '' when the call had none (NULLs cannot be part of the key).
+--
+-- Idempotent: safe to re-run. The backfill only runs while the ledger is empty.
+
+CREATE TABLE IF NOT EXISTS api_cost_totals (
+    month DATE NOT NULL,
+    model VARCHAR(255) NOT NULL,
+    request_type VARCHAR(50) NOT NULL DEFAULT '',
+    requests BIGINT NOT NULL DEFAULT 0,
+    input_tokens BIGINT NOT NULL DEFAULT 0,
+    output_tokens BIGINT NOT NULL DEFAULT 0,
+    cost_usd NUMERIC(16, 6) NOT NULL DEFAULT 0,
+    PRIMARY KEY (month, model, request_type)
+);
+
+INSERT INTO api_cost_totals (month, model, request_type, requests, input_tokens, output_tokens, cost_usd)
+SELECT date_trunc('month', timestamp)::date, model, COALESCE(request_type, ''),
+       COUNT(*), SUM(input_tokens), SUM(output_tokens), SUM(cost_usd)
+FROM api_costs
+WHERE timestamp IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM api_cost_totals)
+GROUP BY 1, 2, 3;
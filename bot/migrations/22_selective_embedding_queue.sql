@@ -0,0 +1,38 @@
+-- Selective, deduplicating embedding ingestion (RAGSystem.process_embedding_queue)
+--
+-- The queue trigger used to queue every non-empty message, including emoji-only and
+-- punctuation-only lines that carry nothing to retrieve. It now requires at least one
+-- letter or digit. The processor applies the finer policy (embedding_policy.py) on top.
+--
+-- content_hash identifies a message's normalized content. A message whose content is
+-- already embedded in the same channel is represented by that row instead of adding a
+-- duplicate vector to the table and the HNSW index.
+--
+-- Idempotent: safe to re-run.
+
+SET LOCAL statement_timeout = 0;
+
+ALTER TABLE message_embeddings ADD COLUMN IF NOT EXISTS content_hash BYTEA;
+
+CREATE INDEX IF NOT EXISTS idx_message_embeddings_channel_hash
+    ON message_embeddings(channel_id, content_hash)
+    WHERE content_hash IS NOT NULL;
+
+CREATE OR REPLACE FUNCTION queue_message_for_embedding()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- Only queue messages with something to embed (at least one letter or digit)
+    IF NEW.content IS NOT NULL AND NEW.content ~ '[[:alnum:]]' THEN
+        INSERT INTO embedding_queue (message_id, priority)
+        VALUES (NEW.message_id, 5)
+        ON CONFLICT (message_id) DO NOTHING;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Drop queued rows the trigger would no longer queue
+DELETE FROM embedding_queue eq
+USING messages m
+WHERE m.message_id = eq.message_id
+  AND (m.content IS NULL OR m.content !~ '[[:alnum:]]');
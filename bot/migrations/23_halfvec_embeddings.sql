@@ -0,0 +1,44 @@
+-- Compact embedding storage (EMBEDDING_STORAGE=halfvec|binary, see rag.py)
+--
+-- Full float32 vectors take ~6 KB per message (1536 dims) before index overhead, more
+-- than the messages themselves. halfvec stores the same 1536 dimensions in half
+-- precision, which halves the table and the HNSW index. Cosine rankings barely move
+-- (measure with `python -m bot.scripts.embedding_recall`). The binary-quantized
+-- expression index is 1 bit per dimension; in binary mode it supplies candidates that are
+-- re-ranked by exact halfvec distance.
+--
+-- The columns and indexes stay empty until EMBEDDING_STORAGE selects a compact mode. The
+-- embedding job then moves existing rows from `embedding` to `embedding_half` in
+-- batches, and back again if the mode is reverted to `vector`.
+--
+-- Needs pgvector >= 0.7 (halfvec, binary_quantize). Older versions keep the float32
+-- layout and the bot stays on EMBEDDING_STORAGE=vector.
+--
+-- Idempotent: safe to re-run.
+
+SET LOCAL statement_timeout = 0;
+
+DO $$
+BEGIN
+    ALTER TABLE message_embeddings ADD COLUMN IF NOT EXISTS embedding_half halfvec(1536);
+
+    CREATE INDEX IF NOT EXISTS message_embeddings_half_hnsw_idx
+        ON message_embeddings USING hnsw (embedding_half halfvec_cosine_ops)
+        WITH (m = 16, ef_construction = 64);
+
+    CREATE INDEX IF NOT EXISTS message_embeddings_binary_hnsw_idx
+        ON message_embeddings USING hnsw ((binary_quantize(embedding_half)::bit(1536)) bit_hamming_ops)
+        WITH (m = 16, ef_construction = 64);
+
+    -- Rows still in halfvec after reverting to EMBEDDING_STORAGE=vector
+    CREATE INDEX IF NOT EXISTS idx_message_embeddings_half_rows
+        ON message_embeddings(id)
+        WHERE embedding_half IS NOT NULL;
+EXCEPTION WHEN OTHERS THEN
+    RAISE NOTICE 'Compact embedding storage unavailable (pgvector < 0.7?): %', SQLERRM;
+END $$;
+
+-- Rows still in float32 after switching to a compact mode
+CREATE INDEX IF NOT EXISTS idx_message_embeddings_float_rows
+    ON message_embeddings(id)
+    WHERE embedding IS NOT NULL;
@@ -0,0 +1,31 @@
+-- Rolling hour/day/week channel summaries (rolling_summary.py)
+--
+-- conversation_summaries held one summary per explicit time range and nothing kept it
+-- filled. channel_summaries is maintained incrementally by the update_channel_summaries
+-- job. New messages are folded into their hour's summary, finished hours into their day,
+-- and finished days into their week. get_relevant_context reads the newest rows as a
+-- layered digest.
+--
+-- covered_until: the newest message (hour) or child period end (day, week) folded in.
+-- rolled_up: the row has been folded into its parent period. Rolled-up hours and days
+-- are left out of the digest and pruned after a while.
+--
+-- Idempotent: safe to re-run.
+
+CREATE TABLE IF NOT EXISTS channel_summaries (
+    channel_id BIGINT NOT NULL,
+    granularity TEXT NOT NULL CHECK (granularity IN ('hour', 'day', 'week')),
+    period_start TIMESTAMP NOT NULL,
+    summary TEXT NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    covered_until TIMESTAMP NOT NULL,
+    rolled_up BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (channel_id, granularity, period_start)
+);
+
+-- Finished periods waiting to be folded into their parent
+CREATE INDEX IF NOT EXISTS idx_channel_summaries_pending_rollup
+    ON channel_summaries(granularity, period_start)
+    WHERE NOT rolled_up;
@@ -0,0 +1,25 @@
+-- LLM claim verdicts (ClaimsTracker.analyze_candidates)
+--
+-- The local claim classifier used to take its negatives from messages that passed the
+-- keyword pre-filter but never became claims. That set includes candidates the
+-- classifier itself rejected or the per-user cooldown skipped, which never reached the
+-- LLM, so retraining fed the classifier its own rejections. Every candidate the LLM
+-- actually judged now gets a row here, and training reads its labels from this table.
+--
+-- user_id is kept so GDPR deletion can remove a user's verdicts.
+--
+-- Idempotent: safe to re-run.
+
+CREATE TABLE IF NOT EXISTS claim_verdicts (
+    message_id BIGINT PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    is_trackable BOOLEAN NOT NULL,
+    judged_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Newest verdicts first for training
+CREATE INDEX IF NOT EXISTS idx_claim_verdicts_judged_at
+    ON claim_verdicts(judged_at DESC);
+
+CREATE INDEX IF NOT EXISTS idx_claim_verdicts_user
+    ON claim_verdicts(user_id);
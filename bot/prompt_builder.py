@@ -0,0 +1,168 @@
+"""
+Prompt assembly helpers for LLMClient._build_chat_payload.
+
+Every mention used to rebuild the prompt from scratch: the user-context block was
+re-formatted, and each history message was re-encoded with tiktoken to check the
+context budget. On long channels that is dozens of encodes per call in the worker
+threads, for messages that were already counted on the previous mention.
+
+- count_tokens() caches the count per rendered message, keyed by message_id and a
+  hash of the content, so an edited message is counted again. The system prompt is
+  counted once per personality.
+- format_user_context() is memoized on the profile/behavior fields it renders.
+- trim_count() uses prefix sums over the cached counts to find how many of the oldest
+  history messages to drop, instead of popping them one at a time.
+
+_build_chat_payload puts content that changes with every query (RAG context, search
+results) in the final message, after the system prompt, the user context and the
+history. Consecutive calls then share the longest possible prefix, which
+provider-side prompt caching can reuse.
+"""
+import functools
+import hashlib
+import os
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from itertools import accumulate
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except ImportError:
+    _encoding = None
+
+
+class TokenCounter:
+    """Bounded LRU of token counts by (message_id, content hash)."""
+
+    def __init__(self, encoding=None, max_entries=None):
+        self.encoding = encoding
+        self.max_entries = max_entries or int(os.getenv('PROMPT_TOKEN_CACHE_SIZE', '20000'))
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def count(self, text, message_id=None) -> int:
+        """Token count of `text` (~1 token per 4 chars without tiktoken)."""
+        if not text:
+            return 0
+        if self.encoding is None:
+            return len(text) // 4
+
+        key = (message_id, hashlib.blake2b(text.encode(), digest_size=16).digest())
+        with self._lock:
+            count = self._counts.get(key)
+            if count is not None:
+                self._counts.move_to_end(key)
+                self.hits += 1
+                return count
+
+        # Encode outside the lock: concurrent prompt builds shouldn't serialize on it
+        count = len(self.encoding.encode(text))
+        with self._lock:
+            self.misses += 1
+            self._counts[key] = count
+            while len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+        return count
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._counts),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+_counter = TokenCounter(_encoding)
+
+
+def count_tokens(text, message_id=None) -> int:
+    """Cached token count for prompt text (see TokenCounter)."""
+    return _counter.count(text, message_id)
+
+
+_BEHAVIOR_FIELDS = (
+    'conversation_style', 'tone_analysis', 'profanity_score', 'honesty_patterns',
+    'message_count', 'analysis_period_start', 'analysis_period_end',
+)
+
+
+def format_user_context(profile, behavior) -> str:
+    """The HISTORICAL USER CONTEXT block appended to the system prompt."""
+    username = profile.get("username") or profile.get("user_id", "Unknown user")
+    fields = tuple(behavior.get(name) for name in _BEHAVIOR_FIELDS)
+    try:
+        return _format_user_context(username, fields)
+    except TypeError:  # unhashable field value: format without memoizing
+        return _format_user_context.__wrapped__(username, fields)
+
+
+@functools.lru_cache(maxsize=1024)
+def _format_user_context(username, fields) -> str:
+    style, tone, profanity, honesty, message_count, period_start, period_end = fields
+
+    context_note = f"\n\n## HISTORICAL USER CONTEXT for {username}:\n"
+    context_note += "Use this to understand their communication style, personality, and typical behavior.\n\n"
+
+    # Communication patterns
+    context_note += "**Communication Style:**\n"
+    if style:
+        context_note += f"- Style: {style}\n"
+    if tone:
+        context_note += f"- Typical Tone: {tone}\n"
+    if profanity is not None:
+        context_note += f"- Profanity level: {profanity}/10\n"
+
+    # Honesty and behavior patterns
+    if honesty:
+        context_note += "\n**Behavioral Patterns:**\n"
+        context_note += f"- {honesty}\n"
+
+    # Activity level
+    if message_count:
+        context_note += "\n**Activity:**\n"
+        context_note += f"- Message count in recent period: {message_count}\n"
+
+    # Analysis period context
+    if period_start and period_end:
+        context_note += f"- Analysis period: {period_start} to {period_end}\n"
+
+    return context_note
+
+
+def trim_count(history_tokens, history_chars, fixed_tokens, fixed_chars,
+               max_tokens, max_chars, keep=1) -> int:
+    """Number of oldest history messages to drop so the prompt fits both budgets.
+
+    Args:
+        history_tokens / history_chars: Per-message sizes, oldest first
+        fixed_tokens / fixed_chars: Size of everything that is never dropped
+        max_tokens / max_chars: Budgets for the whole prompt
+        keep: Minimum number of history messages to keep (the budget may be exceeded)
+    """
+    droppable = len(history_tokens) - keep
+    if droppable <= 0:
+        return 0
+    token_prefix = list(accumulate(history_tokens, initial=0))
+    char_prefix = list(accumulate(history_chars, initial=0))
+    # Dropping k messages removes prefix[k]; find the smallest k that removes enough
+    drop = max(
+        bisect_left(token_prefix, fixed_tokens + token_prefix[-1] - max_tokens),
+        bisect_left(char_prefix, fixed_chars + char_prefix[-1] - max_chars),
+    )
+    return min(drop, droppable)
+
+
+def get_stats():
+    """Token count and user-context cache counters (for /health)."""
+    info = _format_user_context.cache_info()
+    return {
+        'token_counts': _counter.get_stats(),
+        'user_context': {'hits': info.hits, 'misses': info.misses, 'entries': info.currsize},
+    }
@@ -9,13 +9,27 @@ import logging
 from typing import List, Dict, Optional, Tuple
 from datetime import datetime, timedelta
 import openai
+import psycopg2
 from pgvector.psycopg2 import register_vector
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 import numpy as np
 
+from embedding_cache import EmbeddingCache, cache_key, normalize_text
+from embedding_policy import EmbeddingPolicy, content_hash
+from local_vector_index import LocalVectorIndex
+from redis_cache import get_cache
+from rolling_summary import RollingSummaries, fetch_digest
+from user_card import rebuild_card
+
 logger = logging.getLogger(__name__)
 
 
+def _discard_result(task):
+    """Done-callback for abandoned retrieval legs: consume the outcome so it isn't logged as unretrieved."""
+    if not task.cancelled():
+        task.exception()
+
+
 class RAGSystem:
     """Handles embeddings, semantic search, and intelligent context retrieval"""
 
@@ -30,6 +44,12 @@ class RAGSystem:
         self.db = database
         self.llm = llm_client
 
+        # Optional in-process vector tier answering recent-history searches for hot channels
+        self.local_index = None
+        self._local_loading = set()
+        if os.getenv('LOCAL_VECTOR_INDEX_ENABLED', 'false').lower() == 'true':
+            self.local_index = LocalVectorIndex()
+
         # Get OpenAI API key from environment
         self.openai_api_key = os.getenv('OPENAI_API_KEY')
         if not self.openai_api_key:
@@ -52,12 +72,41 @@ class RAGSystem:
         self.embedding_dimension = 1536  # text-embedding-3-small dimension
         self.max_embedding_batch_size = 200  # Increased for dedicated server (was 100)
         self.similarity_threshold = float(os.getenv('RAG_SIMILARITY_THRESHOLD', '0.55'))
+        # HNSW candidate list size; widened up to the max when filters/threshold leave too few hits
+        self.hnsw_ef_search = int(os.getenv('RAG_HNSW_EF_SEARCH', '40'))
+        self.hnsw_ef_search_max = int(os.getenv('RAG_HNSW_EF_SEARCH_MAX', '400'))
+        self.search_overfetch = int(os.getenv('RAG_SEARCH_OVERFETCH', '3'))
+        self._vector_caps = None  # probed lazily (see _get_vector_search_caps)
+        # Vector layout: float32 `embedding`, or halfvec `embedding_half` searched directly
+        # or through its binary-quantized index with a halfvec re-rank (migration 23)
+        self.embedding_storage = os.getenv('EMBEDDING_STORAGE', 'vector').lower()
+        if self.embedding_storage not in ('vector', 'halfvec', 'binary'):
+            logger.warning("Unknown EMBEDDING_STORAGE=%s, using vector", self.embedding_storage)
+            self.embedding_storage = 'vector'
+        self.binary_rerank_factor = int(os.getenv('RAG_BINARY_RERANK_FACTOR', '4'))
+        self.storage_convert_rows = int(os.getenv('EMBED_CONVERT_ROWS', '20000'))
+        self._storage_pending = True  # rows may still be in the other layout
+        self.storage_stats = {'converted': 0}
+        # Overall latency budget for get_relevant_context; slower legs are left out
+        self.context_budget = float(os.getenv('RAG_CONTEXT_BUDGET', '2.5'))
+        self.context_stats = {'requests': 0, 'partial': 0, 'search_timeouts': 0, 'lookup_timeouts': 0}
+        # Embedding ingestion: skip rules and backlog-aware batch sizes (see drain_embedding_queue)
+        self.embedding_policy = EmbeddingPolicy()
+        self.embed_batch_size = int(os.getenv('EMBED_BATCH_SIZE', '100'))
+        self.embed_batch_max = int(os.getenv('EMBED_BATCH_MAX', '1000'))
+        self.embed_drain_rounds = int(os.getenv('EMBED_DRAIN_ROUNDS', '5'))
+        self.ingest_stats = {'embedded': 0, 'failed': 0, 'deduplicated': 0,
+                             'skipped_bot': 0, 'skipped_short': 0, 'skipped_repetitive': 0}
+        # L1 process LRU + L2 Redis cache of embeddings keyed by model + text hash
+        self.embedding_cache = EmbeddingCache(get_cache())
+        # Incremental hour/day/week channel summaries (see rolling_summary.py)
+        self.summaries = RollingSummaries(database, llm_client)
 
         logger.info("RAG system initialized (model: %s)", self.embedding_model)
 
     async def generate_embedding(self, text: str) -> Optional[List[float]]:
         """
-        Generate embedding for a single text using OpenAI
+        Generate embedding for a single text using OpenAI (cache-first)
 
         Args:
             text: Text to embed
@@ -68,14 +117,22 @@ class RAGSystem:
         if not self.enabled or not text or len(text.strip()) == 0:
             return None
 
+        normalized = normalize_text(text)
+        key = cache_key(self.embedding_model, normalized)
+        cached = (await self.embedding_cache.get_many([key]))[0]
+        if cached is not None:
+            return cached.tolist()
+
         try:
             # Run in thread to avoid blocking
             response = await asyncio.to_thread(
                 self.client.embeddings.create,
-                input=text[:8000],  # Limit to 8000 chars to avoid token limits
+                input=normalized,
                 model=self.embedding_model
             )
-            return response.data[0].embedding
+            embedding = response.data[0].embedding
+            await self.embedding_cache.put_many({key: embedding})
+            return embedding
         except Exception as e:
             logger.error("Error generating embedding: %s", e)
             return None
@@ -84,6 +141,9 @@ class RAGSystem:
         """
         Generate embeddings for multiple texts
 
+        Identical texts (after normalization) are embedded once, and texts already in the
+        embedding cache aren't sent to the API at all.
+
         Args:
             texts: List of texts to embed
 
@@ -93,17 +153,32 @@ class RAGSystem:
         if not self.enabled or not texts:
             return [None] * len(texts)
 
-        # Filter empty texts
-        valid_texts = [(i, text[:8000]) for i, text in enumerate(texts) if text and len(text.strip()) > 0]
-        if not valid_texts:
+        # Filter empty texts; group indices by cache key (content-hash dedup)
+        indices_by_key = {}
+        text_by_key = {}
+        for i, text in enumerate(texts):
+            if text and len(text.strip()) > 0:
+                normalized = normalize_text(text)
+                key = cache_key(self.embedding_model, normalized)
+                indices_by_key.setdefault(key, []).append(i)
+                text_by_key[key] = normalized
+        if not indices_by_key:
             return [None] * len(texts)
 
-        # Process in batches
         embeddings = [None] * len(texts)
+        keys = list(indices_by_key)
+        cached = await self.embedding_cache.get_many(keys)
+        for key, vector in zip(keys, cached):
+            if vector is not None:
+                as_list = vector.tolist()
+                for i in indices_by_key[key]:
+                    embeddings[i] = as_list
+        missing = [key for key, vector in zip(keys, cached) if vector is None]
 
-        for batch_start in range(0, len(valid_texts), self.max_embedding_batch_size):
-            batch = valid_texts[batch_start:batch_start + self.max_embedding_batch_size]
-            batch_texts = [text for _, text in batch]
+        # Process in batches
+        for batch_start in range(0, len(missing), self.max_embedding_batch_size):
+            batch_keys = missing[batch_start:batch_start + self.max_embedding_batch_size]
+            batch_texts = [text_by_key[key] for key in batch_keys]
 
             try:
                 response = await asyncio.to_thread(
@@ -113,14 +188,37 @@ class RAGSystem:
                 )
 
                 # Map embeddings back to original indices
-                for (original_idx, _), embedding_data in zip(batch, response.data):
-                    embeddings[original_idx] = embedding_data.embedding
+                fresh = {}
+                for key, embedding_data in zip(batch_keys, response.data):
+                    fresh[key] = embedding_data.embedding
+                    for i in indices_by_key[key]:
+                        embeddings[i] = embedding_data.embedding
+                await self.embedding_cache.put_many(fresh)
 
             except Exception as e:
                 logger.error("Error generating embeddings batch: %s", e)
 
         return embeddings
 
+    def get_cache_stats(self) -> Dict:
+        """Hit-rate stats for the embedding cache and the local vector tier."""
+        if not self.enabled:
+            return {'enabled': False}
+        stats = {
+            'embedding_cache': self.embedding_cache.get_stats(),
+            'context': dict(self.context_stats),
+            'ingestion': dict(self.ingest_stats),
+            'summaries': dict(self.summaries.stats),
+            'storage': {
+                'mode': (self._vector_caps or {}).get('storage', self.embedding_storage),
+                'converting': self._storage_pending,
+                **self.storage_stats,
+            },
+        }
+        if self.local_index is not None:
+            stats['local_index'] = self.local_index.get_stats()
+        return stats
+
     async def store_message_embedding(self, message_id: int, embedding: List[float]) -> bool:
         """
         Store embedding for a message
@@ -133,16 +231,17 @@ class RAGSystem:
             True if successful
         """
         try:
+            column, cleared = self._embedding_columns()
             with self.db.get_connection() as conn:
                 register_vector(conn)
                 with conn.cursor() as cur:
-                    cur.execute("""
-                        INSERT INTO message_embeddings (message_id, embedding)
+                    cur.execute(f"""
+                        INSERT INTO message_embeddings (message_id, {column})
                         VALUES (%s, %s)
                         ON CONFLICT (message_id) DO UPDATE
-                        SET embedding = EXCLUDED.embedding,
+                        SET {column} = EXCLUDED.{column},{cleared}
                             updated_at = CURRENT_TIMESTAMP
-                    """, (message_id, embedding))
+                    """, (message_id, np.asarray(embedding, dtype=np.float32)))
                     conn.commit()
             return True
         except Exception as e:
@@ -152,105 +251,517 @@ class RAGSystem:
     async def process_embedding_queue(self, limit: int = 50) -> int:
         """
         Process pending messages in embedding queue.
-        Uses batched DB operations to reduce connection churn.
+
+        Messages the ingestion policy skips (see embedding_policy.py) and repeats of
+        content already embedded in the same channel leave the queue without a new
+        vector. The rest are embedded in one API batch and written with one multi-row
+        upsert, in the same transaction that removes them from the queue.
 
         Args:
             limit: Maximum number of messages to process
 
+        Returns:
+            Number of embeddings generated
+        """
+        return (await self._process_embedding_batch(limit))[1]
+
+    async def drain_embedding_queue(self) -> int:
+        """Process the queue with a batch size scaled to its depth.
+
+        A shallow queue is handled in one EMBED_BATCH_SIZE batch. A deep one (e.g. after
+        downtime) gets batches of up to EMBED_BATCH_MAX, repeated while they come back
+        full, for at most EMBED_DRAIN_ROUNDS batches per run.
+
         Returns:
             Number of embeddings generated
         """
         if not self.enabled:
             return 0
 
+        cap = self.embed_batch_max * self.embed_drain_rounds
         try:
-            # Get messages needing embeddings
-            with self.db.get_connection() as conn:
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            depth = await asyncio.to_thread(self._embedding_queue_depth, cap)
+        except Exception as e:
+            logger.error("Error reading embedding queue depth: %s", e)
+            return 0
+        if depth == 0:
+            return 0
+
+        limit = min(self.embed_batch_max, max(self.embed_batch_size, depth))
+        total = 0
+        for _ in range(self.embed_drain_rounds):
+            fetched, embedded = await self._process_embedding_batch(limit)
+            total += embedded
+            if fetched < limit:
+                break
+        if depth > self.embed_batch_size:
+            logger.info("Embedding backlog of %s%d drained with batches of %d (%d embedded)",
+                        ">=" if depth >= cap else "", depth, limit, total)
+        return total
+
+    def _embedding_queue_depth(self, cap: int) -> int:
+        """Pending queue rows, counted up to `cap` (worker thread)."""
+        with self.db.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT COUNT(*) FROM (
+                        SELECT 1 FROM embedding_queue WHERE attempts < 3 LIMIT %s
+                    ) pending
+                """, (cap,))
+                return cur.fetchone()[0]
+
+    def _fetch_embedding_queue(self, limit: int) -> List[Dict]:
+        """Oldest, highest-priority queue rows with their message fields (worker thread)."""
+        with self.db.get_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("""
+                    SELECT eq.id, eq.message_id, m.content, m.channel_id, m.guild_id,
+                           m.user_id, m.username, m.timestamp
+                    FROM embedding_queue eq
+                    JOIN messages m ON m.message_id = eq.message_id
+                    WHERE eq.attempts < 3
+                    ORDER BY eq.priority ASC, eq.created_at ASC
+                    LIMIT %s
+                """, (limit,))
+                return cur.fetchall()
+
+    def _embedded_hashes(self, pairs: List[Tuple[int, bytes]]) -> set:
+        """Which (channel_id, content_hash) pairs are already embedded (worker thread).
+
+        Looked up as exact pairs so each one is an idx_message_embeddings_channel_hash probe.
+        """
+        with self.db.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT channel_id, content_hash
+                    FROM message_embeddings
+                    WHERE content_hash IS NOT NULL
+                      AND (channel_id, content_hash) IN (
+                          SELECT * FROM unnest(%s::bigint[], %s::bytea[])
+                      )
+                """, ([channel_id for channel_id, _ in pairs], [psycopg2.Binary(h) for _, h in pairs]))
+                return {(channel_id, bytes(h)) for channel_id, h in cur.fetchall()}
+
+    def _store_embeddings(self, rows, done_queue_ids, failed_queue_ids):
+        """Upsert embeddings, drop finished queue rows and bump failures in one transaction (worker thread).
+
+        Args:
+            rows: [(message_id, embedding, content_hash)]
+            done_queue_ids: Queue rows to delete (embedded, skipped or duplicate)
+            failed_queue_ids: Queue rows whose embedding failed
+        """
+        column, cleared = self._embedding_columns()
+        with self.db.get_connection() as conn:
+            register_vector(conn)
+            with conn.cursor() as cur:
+                if rows:
+                    execute_values(cur, f"""
+                        INSERT INTO message_embeddings (message_id, {column}, content_hash)
+                        VALUES %s
+                        ON CONFLICT (message_id) DO UPDATE
+                        SET {column} = EXCLUDED.{column},{cleared}
+                            content_hash = EXCLUDED.content_hash,
+                            updated_at = CURRENT_TIMESTAMP
+                    """, [
+                        # float32 arrays go over the wire as compact vector literals
+                        (message_id, np.asarray(embedding, dtype=np.float32), psycopg2.Binary(h))
+                        for message_id, embedding, h in rows
+                    ], page_size=500)
+                if done_queue_ids:
+                    cur.execute("DELETE FROM embedding_queue WHERE id = ANY(%s)", (done_queue_ids,))
+                if failed_queue_ids:
                     cur.execute("""
-                        SELECT eq.id, eq.message_id, m.content
-                        FROM embedding_queue eq
-                        JOIN messages m ON m.message_id = eq.message_id
-                        WHERE eq.attempts < 3
-                        ORDER BY eq.priority ASC, eq.created_at ASC
-                        LIMIT %s
-                    """, (limit,))
-                    queue_items = cur.fetchall()
+                        UPDATE embedding_queue
+                        SET attempts = attempts + 1,
+                            last_error = 'Failed to generate embedding'
+                        WHERE id = ANY(%s)
+                    """, (failed_queue_ids,))
+
+    async def _process_embedding_batch(self, limit: int) -> Tuple[int, int]:
+        """One queue batch. Returns (rows fetched, embeddings stored)."""
+        if not self.enabled:
+            return 0, 0
 
+        try:
+            queue_items = await asyncio.to_thread(self._fetch_embedding_queue, limit)
             if not queue_items:
-                return 0
+                return 0, 0
+
+            # Ingestion policy: low-information and bot messages leave the queue unembedded
+            done_ids = []
+            candidates = []
+            for item in queue_items:
+                reason = self.embedding_policy.skip_reason(item['content'], item['user_id'])
+                if reason:
+                    done_ids.append(item['id'])
+                    self.ingest_stats['skipped_' + reason] += 1
+                else:
+                    candidates.append((item, content_hash(item['content'])))
+
+            # Dedup: content already embedded in the same channel (or earlier in this batch)
+            # is represented by that vector
+            seen = set()
+            if candidates:
+                seen = await asyncio.to_thread(
+                    self._embedded_hashes, list({(item['channel_id'], h) for item, h in candidates})
+                )
+            to_embed = []
+            for item, h in candidates:
+                if (item['channel_id'], h) in seen:
+                    done_ids.append(item['id'])
+                    self.ingest_stats['deduplicated'] += 1
+                else:
+                    seen.add((item['channel_id'], h))
+                    to_embed.append((item, h))
 
-            logger.info("Processing %d messages for embedding...", len(queue_items))
+            logger.info("Processing %d messages for embedding (%d skipped or duplicate)...",
+                        len(to_embed), len(queue_items) - len(to_embed))
 
-            # Generate embeddings in batch
-            texts = [item['content'] for item in queue_items]
-            embeddings = await self.generate_embeddings_batch(texts)
+            # Generate embeddings in batch (the embedding cache dedups identical texts)
+            embeddings = await self.generate_embeddings_batch([item['content'] for item, _ in to_embed])
 
-            # Separate successes and failures
-            successful = []  # [(message_id, embedding, queue_id)]
+            rows = []        # [(message_id, embedding, content_hash)]
             failed_ids = []  # [queue_id]
-
-            for item, embedding in zip(queue_items, embeddings):
+            for (item, h), embedding in zip(to_embed, embeddings):
                 if embedding:
-                    successful.append((item['message_id'], embedding, item['id']))
+                    rows.append((item['message_id'], embedding, h))
+                    done_ids.append(item['id'])
                 else:
                     failed_ids.append(item['id'])
 
-            # Batch store embeddings + delete from queue in a single transaction
-            success_count = 0
-            if successful:
-                def _batch_store_and_remove():
-                    count = 0
-                    with self.db.get_connection() as conn:
-                        register_vector(conn)
-                        with conn.cursor() as cur:
-                            # Batch insert/upsert embeddings
-                            for message_id, embedding, queue_id in successful:
-                                try:
-                                    cur.execute("""
-                                        INSERT INTO message_embeddings (message_id, embedding)
-                                        VALUES (%s, %s)
-                                        ON CONFLICT (message_id) DO UPDATE
-                                        SET embedding = EXCLUDED.embedding,
-                                            updated_at = CURRENT_TIMESTAMP
-                                    """, (message_id, embedding))
-                                    count += 1
-                                except Exception as e:
-                                    logger.warning("Failed to store embedding for message %s: %s", message_id, e)
-
-                            # Batch delete successfully processed queue items
-                            success_queue_ids = [qid for _, _, qid in successful[:count]]
-                            if success_queue_ids:
-                                cur.execute(
-                                    "DELETE FROM embedding_queue WHERE id = ANY(%s)",
-                                    (success_queue_ids,)
-                                )
-                        conn.commit()
-                    return count
-
-                success_count = await asyncio.to_thread(_batch_store_and_remove)
-
-            # Batch update failed items in a single transaction
-            if failed_ids:
-                def _batch_update_failures():
-                    with self.db.get_connection() as conn:
-                        with conn.cursor() as cur:
-                            cur.execute("""
-                                UPDATE embedding_queue
-                                SET attempts = attempts + 1,
-                                    last_error = 'Failed to generate embedding'
-                                WHERE id = ANY(%s)
-                            """, (failed_ids,))
-                        conn.commit()
+            await asyncio.to_thread(self._store_embeddings, rows, done_ids, failed_ids)
+            self.ingest_stats['embedded'] += len(rows)
+            self.ingest_stats['failed'] += len(failed_ids)
 
-                await asyncio.to_thread(_batch_update_failures)
+            # Keep resident local-index channels current (no-op for cold channels)
+            if self.local_index is not None and rows:
+                items_by_id = {item['message_id']: item for item, _ in to_embed}
+                self.local_index.add([
+                    {**items_by_id[message_id], 'embedding': embedding}
+                    for message_id, embedding, _ in rows
+                ])
 
-            logger.info("Generated %d/%d embeddings", success_count, len(queue_items))
-            return success_count
+            logger.info("Generated %d/%d embeddings", len(rows), len(to_embed))
+            return len(queue_items), len(rows)
 
         except Exception as e:
             logger.error("Error processing embedding queue: %s", e)
+            return 0, 0
+
+    async def convert_embedding_storage(self, batch_size: int = 2000) -> int:
+        """Move vectors stored in the other layout into the EMBEDDING_STORAGE one.
+
+        Runs after each embedding batch, converting up to EMBED_CONVERT_ROWS rows per run
+        in short transactions. Until it finishes, semantic search also queries the old
+        layout's index, so nothing drops out of retrieval mid-conversion.
+
+        Returns:
+            Number of rows converted
+        """
+        if not self.enabled or not self._storage_pending:
             return 0
+        caps = await asyncio.to_thread(self._get_vector_search_caps)
+        if not caps['halfvec']:
+            self._storage_pending = False
+            return 0
+
+        converted = 0
+        try:
+            while converted < self.storage_convert_rows:
+                limit = min(batch_size, self.storage_convert_rows - converted)
+                moved = await asyncio.to_thread(self._convert_embedding_batch, caps['storage'], limit)
+                converted += moved
+                if moved < limit:
+                    self._storage_pending = False
+                    logger.info("Embedding storage conversion to %s complete", caps['storage'])
+                    break
+        except Exception as e:
+            logger.error("Error converting embedding storage: %s", e)
+        self.storage_stats['converted'] += converted
+        return converted
+
+    def _convert_embedding_batch(self, storage: str, limit: int) -> int:
+        """Convert up to `limit` rows to the given layout in one transaction (worker thread)."""
+        if storage == 'vector':
+            target, source, cast = 'embedding', 'embedding_half', 'vector'
+        else:
+            target, source, cast = 'embedding_half', 'embedding', f'halfvec({self.embedding_dimension})'
+        with self.db.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    UPDATE message_embeddings
+                    SET {target} = {source}::{cast},
+                        {source} = NULL
+                    WHERE id IN (
+                        SELECT id FROM message_embeddings
+                        WHERE {source} IS NOT NULL
+                        LIMIT %s
+                    )
+                """, (limit,))
+                return cur.rowcount
+
+    def _get_vector_search_caps(self) -> Dict:
+        """Probe (once) for the denormalized filter columns, the HNSW index and pgvector's version.
+
+        Lets semantic_search use the filtered-ANN query only once migration 18 has run,
+        enable iterative index scans only on pgvector >= 0.8, and use a compact
+        EMBEDDING_STORAGE mode only once migration 23 has added `embedding_half`.
+        """
+        if self._vector_caps is not None:
+            return self._vector_caps
+        caps = {'filter_columns': False, 'hnsw': False, 'iterative_scan': False,
+                'halfvec': False, 'storage': 'vector'}
+        try:
+            with self.db.get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        SELECT
+                            EXISTS (SELECT 1 FROM information_schema.columns
+                                    WHERE table_name = 'message_embeddings' AND column_name = 'channel_id'),
+                            EXISTS (SELECT 1 FROM pg_indexes
+                                    WHERE tablename = 'message_embeddings' AND indexdef ILIKE '%using hnsw%'),
+                            (SELECT extversion FROM pg_extension WHERE extname = 'vector'),
+                            EXISTS (SELECT 1 FROM information_schema.columns
+                                    WHERE table_name = 'message_embeddings' AND column_name = 'embedding_half')
+                    """)
+                    has_columns, has_hnsw, version, has_half = cur.fetchone()
+            caps['filter_columns'] = bool(has_columns)
+            caps['hnsw'] = bool(has_hnsw)
+            caps['halfvec'] = bool(has_half)
+            if self.embedding_storage != 'vector':
+                if caps['halfvec'] and caps['filter_columns']:
+                    caps['storage'] = self.embedding_storage
+                else:
+                    logger.warning("EMBEDDING_STORAGE=%s needs migration 23 (pgvector >= 0.7), "
+                                   "keeping float32 vectors", self.embedding_storage)
+            try:
+                version_tuple = tuple(int(p) for p in (version or '0').split('.')[:2])
+            except ValueError:
+                version_tuple = (0,)
+            caps['iterative_scan'] = caps['hnsw'] and version_tuple >= (0, 8)
+            logger.info("Vector search: filter_columns=%s hnsw=%s iterative_scan=%s storage=%s (pgvector %s)",
+                        caps['filter_columns'], caps['hnsw'], caps['iterative_scan'], caps['storage'], version)
+        except Exception as e:
+            logger.warning("Could not probe vector search capabilities, using legacy query: %s", e)
+        self._vector_caps = caps
+        return caps
+
+    def _embedding_columns(self) -> Tuple[str, str]:
+        """(column new vectors are written to, SET fragment clearing the other layout)."""
+        caps = self._get_vector_search_caps()
+        if caps['storage'] != 'vector':
+            return 'embedding_half', '\n                            embedding = NULL,'
+        if caps['halfvec']:
+            return 'embedding', '\n                            embedding_half = NULL,'
+        return 'embedding', ''
+
+    def _ann_leg(self, storage: str, where_clause: str) -> str:
+        """Nearest-neighbour subquery over one storage layout (named params: q, limit, candidates)."""
+        half = f"%(q)s::vector::halfvec({self.embedding_dimension})"
+        if storage == 'vector':
+            column, query = "me.embedding", "%(q)s::vector"
+        elif storage == 'halfvec':
+            column, query = "me.embedding_half", half
+        else:
+            # Hamming distance over the binary-quantized index picks candidates; the
+            # halfvec distance re-ranks them
+            bits = f"bit({self.embedding_dimension})"
+            return f"""
+                    SELECT b.message_id, b.user_id, b.timestamp,
+                           (1 - (b.embedding_half <=> {half})) AS similarity
+                    FROM (
+                        SELECT me.message_id, me.user_id, me."timestamp" AS timestamp, me.embedding_half
+                        FROM message_embeddings me
+                        {where_clause}
+                        ORDER BY binary_quantize(me.embedding_half)::{bits} <~> binary_quantize({half})::{bits}
+                        LIMIT %(candidates)s
+                    ) b
+                    ORDER BY b.embedding_half <=> {half}
+                    LIMIT %(limit)s"""
+        return f"""
+                    SELECT me.message_id, me.user_id, me."timestamp" AS timestamp,
+                           (1 - ({column} <=> {query})) AS similarity
+                    FROM message_embeddings me
+                    {where_clause}
+                    ORDER BY {column} <=> {query}
+                    LIMIT %(limit)s"""
+
+    def _vector_search_sync(self, query_embedding, channel_id, guild_id, user_id,
+                            cutoff_date, fetch_limit, ef_search, caps, before_date=None) -> List[Dict]:
+        """Run one nearest-neighbour query (in a worker thread). Returns rows nearest-first."""
+        params = [query_embedding]
+        where_clauses = []
+
+        # SAFETY: where_clauses only contains hardcoded SQL fragments defined here; all
+        # values go through parameterized %s placeholders.
+        if caps['filter_columns']:
+            # Filters on message_embeddings itself, so they apply inside the index scan
+            named = {'q': np.asarray(query_embedding, dtype=np.float32), 'limit': fetch_limit,
+                     'candidates': fetch_limit * self.binary_rerank_factor}
+            if channel_id:
+                where_clauses.append("me.channel_id = %(channel_id)s")
+                named['channel_id'] = channel_id
+            if guild_id:
+                where_clauses.append("me.guild_id = %(guild_id)s")
+                named['guild_id'] = guild_id
+            if user_id:
+                where_clauses.append("me.user_id = %(user_id)s")
+                named['user_id'] = user_id
+            if cutoff_date:
+                where_clauses.append('me."timestamp" >= %(cutoff_date)s')
+                named['cutoff_date'] = cutoff_date
+            if before_date:
+                where_clauses.append('me."timestamp" < %(before_date)s')
+                named['before_date'] = before_date
+            params = named
+
+            def where(column):
+                # Once migration 23 has run, a row's vector lives in one of two columns
+                clauses = where_clauses + [f"me.{column} IS NOT NULL"] if caps['halfvec'] else where_clauses
+                return "WHERE " + " AND ".join(clauses) if clauses else ""
+
+            storage = caps['storage']
+            column = 'embedding' if storage == 'vector' else 'embedding_half'
+            legs = [self._ann_leg(storage, where(column))]
+            if caps['halfvec'] and self._storage_pending:
+                # Rows not yet converted to this layout are searched in their own index
+                other = 'embedding_half' if storage == 'vector' else 'embedding'
+                legs.append(self._ann_leg('halfvec' if storage == 'vector' else 'vector', where(other)))
+            if storage == 'binary':
+                ef_search = min(max(ef_search, named['candidates']), 1000)
+            candidates = "\n                    UNION ALL\n".join(f"({leg}\n                    )" for leg in legs)
+            sql = f"""
+                SELECT c.message_id, c.user_id, m.username, m.content, c.timestamp, c.similarity
+                FROM (
+                    {candidates}
+                ) c
+                JOIN messages m ON m.message_id = c.message_id
+                ORDER BY c.similarity DESC
+                LIMIT %(limit)s
+            """
+        else:
+            # Pre-migration layout: filter columns only exist on messages
+            if channel_id:
+                where_clauses.append("m.channel_id = %s")
+                params.append(channel_id)
+            if guild_id:
+                where_clauses.append("m.guild_id = %s")
+                params.append(guild_id)
+            if user_id:
+                where_clauses.append("m.user_id = %s")
+                params.append(user_id)
+            if cutoff_date:
+                where_clauses.append("m.timestamp >= %s")
+                params.append(cutoff_date)
+            if before_date:
+                where_clauses.append("m.timestamp < %s")
+                params.append(before_date)
+            where_clause = " AND " + " AND ".join(where_clauses) if where_clauses else ""
+            params.extend([query_embedding, fetch_limit])
+            sql = f"""
+                SELECT
+                    m.message_id,
+                    m.user_id,
+                    m.username,
+                    m.content,
+                    m.timestamp,
+                    (1 - (me.embedding <=> %s::vector)) as similarity
+                FROM message_embeddings me
+                JOIN messages m ON m.message_id = me.message_id
+                {where_clause}
+                ORDER BY me.embedding <=> %s::vector
+                LIMIT %s
+            """
+
+        with self.db.get_connection() as conn:
+            register_vector(conn)
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                if caps['hnsw']:
+                    # Transaction-scoped, so pooled connections keep the server defaults
+                    cur.execute("SELECT set_config('hnsw.ef_search', %s, true)", (str(ef_search),))
+                    if caps['iterative_scan']:
+                        # pgvector >= 0.8: keep walking the graph until LIMIT rows pass the filters
+                        cur.execute("SELECT set_config('hnsw.iterative_scan', 'relaxed_order', true)")
+                cur.execute(sql, params)
+                return [dict(r) for r in cur.fetchall()]
+
+    def _load_local_channel_sync(self, channel_id: int) -> int:
+        """Load a channel's in-window embeddings into the local vector tier (worker thread)."""
+        index = self.local_index
+        covered_since = datetime.now() - timedelta(days=index.window_days)
+        if self._get_vector_search_caps()['halfvec']:
+            embedding = "COALESCE(me.embedding, me.embedding_half::vector)"
+        else:
+            embedding = "me.embedding"
+        with self.db.get_connection() as conn:
+            register_vector(conn)
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(f"""
+                    SELECT m.message_id, m.user_id, m.guild_id, m.username, m.content,
+                           m.timestamp, {embedding} AS embedding
+                    FROM messages m
+                    JOIN message_embeddings me ON me.message_id = m.message_id
+                    WHERE m.channel_id = %s AND m.timestamp >= %s
+                    ORDER BY m.timestamp DESC
+                    LIMIT %s
+                """, (channel_id, covered_since, index.max_per_channel))
+                rows = cur.fetchall()
+        rows.reverse()
+        index.load_channel(channel_id, rows, covered_since)
+        return len(rows)
+
+    async def _load_local_channel(self, channel_id: int):
+        try:
+            count = await asyncio.to_thread(self._load_local_channel_sync, channel_id)
+            logger.debug("Local vector index loaded channel %s (%d vectors)", channel_id, count)
+        except Exception as e:
+            logger.warning("Failed to load channel %s into local vector index: %s", channel_id, e)
+        finally:
+            self._local_loading.discard(channel_id)
+
+    def _schedule_local_load(self, channel_id: int):
+        """Load a cold channel in the background; this search is answered by pgvector."""
+        if channel_id in self._local_loading:
+            return
+        self._local_loading.add(channel_id)
+        asyncio.create_task(self._load_local_channel(channel_id))
+
+    async def warm_local_index(self):
+        """Warm-start the local vector tier with the most active channels in its window.
+
+        Stops early once the memory cap starts evicting, so the busiest channels stay resident.
+        """
+        if not self.enabled or self.local_index is None:
+            return
+        index = self.local_index
+
+        def _hot_channels():
+            cutoff = datetime.now() - timedelta(days=index.window_days)
+            with self.db.get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        SELECT channel_id
+                        FROM messages
+                        WHERE timestamp >= %s
+                        GROUP BY channel_id
+                        ORDER BY COUNT(*) DESC
+                        LIMIT %s
+                    """, (cutoff, index.warm_channels))
+                    return [row[0] for row in cur.fetchall()]
+
+        try:
+            channels = await asyncio.to_thread(_hot_channels)
+            evictions = index.stats['evictions']
+            for channel_id in channels:
+                if channel_id in self._local_loading:
+                    continue
+                self._local_loading.add(channel_id)
+                await self._load_local_channel(channel_id)
+                if index.stats['evictions'] > evictions:
+                    break
+            logger.info("Local vector index warm start: %s", index.get_stats())
+        except Exception as e:
+            logger.error("Error warming local vector index: %s", e)
 
     async def semantic_search(
         self,
@@ -258,17 +769,26 @@ class RAGSystem:
         channel_id: Optional[int] = None,
         user_id: Optional[int] = None,
         limit: int = 5,
-        max_age_days: Optional[int] = 90
+        max_age_days: Optional[int] = 90,
+        guild_id: Optional[int] = None
     ) -> List[Dict]:
         """
         Search for semantically similar messages
 
+        Uses the HNSW index with filters pushed into message_embeddings. If the filters or
+        the similarity threshold leave fewer than `limit` matches, the search is re-run
+        with a doubled ef_search (up to RAG_HNSW_EF_SEARCH_MAX) to widen the candidate set.
+
+        When the local vector tier holds the channel, recent history is answered from
+        memory and pgvector is only queried for messages older than the local window.
+
         Args:
             query: Search query
             channel_id: Limit to specific channel
             user_id: Limit to specific user
             limit: Maximum results
             max_age_days: Maximum age of messages in days
+            guild_id: Limit to specific guild
 
         Returns:
             List of relevant messages with similarity scores
@@ -282,61 +802,52 @@ class RAGSystem:
             if not query_embedding:
                 return []
 
-            # Build search query - params order: query_embedding, WHERE values, query_embedding, limit
-            params = [query_embedding]
-            where_clauses = []
-
-            if channel_id:
-                where_clauses.append("m.channel_id = %s")
-                params.append(channel_id)
-
-            if user_id:
-                where_clauses.append("m.user_id = %s")
-                params.append(user_id)
-
-            if max_age_days:
-                cutoff_date = datetime.now() - timedelta(days=max_age_days)
-                where_clauses.append("m.timestamp >= %s")
-                params.append(cutoff_date)
-
-            # Add query_embedding again for ORDER BY and limit at the end
-            params.extend([query_embedding, limit])
-
-            # SAFETY: where_clauses only contains hardcoded SQL fragments defined above
-            # (e.g., "m.channel_id = %s", "m.user_id = %s", "m.timestamp >= %s").
-            # No user input is ever interpolated into the clause structure itself;
-            # all user-supplied values are passed via parameterized %s placeholders
-            # in the params list, which are handled safely by psycopg2.
-            where_clause = " AND " + " AND ".join(where_clauses) if where_clauses else ""
-
-            # Perform vector similarity search
-            with self.db.get_connection() as conn:
-                register_vector(conn)
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    # Use cosine similarity - cast parameters to vector type
-                    cur.execute(f"""
-                        SELECT
-                            m.message_id,
-                            m.user_id,
-                            m.username,
-                            m.content,
-                            m.timestamp,
-                            (1 - (me.embedding <=> %s::vector)) as similarity
-                        FROM message_embeddings me
-                        JOIN messages m ON m.message_id = me.message_id
-                        {where_clause}
-                        ORDER BY me.embedding <=> %s::vector
-                        LIMIT %s
-                    """, params)
-                    results = cur.fetchall()
-
-            # Filter by similarity threshold
-            filtered_results = [
-                dict(r) for r in results
-                if r['similarity'] >= self.similarity_threshold
-            ]
+            cutoff_date = datetime.now() - timedelta(days=max_age_days) if max_age_days else None
 
-            return filtered_results
+            local_results = None
+            before_date = None
+            if self.local_index is not None and channel_id:
+                local = await asyncio.to_thread(
+                    self.local_index.search, query_embedding, channel_id, limit,
+                    user_id, guild_id, cutoff_date, self.similarity_threshold
+                )
+                if local is None:
+                    self._schedule_local_load(channel_id)
+                else:
+                    local_results, covered_since = local
+                    if len(local_results) >= limit or (cutoff_date and cutoff_date >= covered_since):
+                        return local_results[:limit]
+                    # Only older history is left for pgvector
+                    before_date = covered_since
+
+            caps = await asyncio.to_thread(self._get_vector_search_caps)
+            # Over-fetch so threshold filtering still leaves `limit` rows in the common case
+            fetch_limit = limit * self.search_overfetch
+            ef_search = max(self.hnsw_ef_search, fetch_limit)
+
+            while True:
+                results = await asyncio.to_thread(
+                    self._vector_search_sync, query_embedding, channel_id, guild_id,
+                    user_id, cutoff_date, fetch_limit, ef_search, caps, before_date
+                )
+                filtered_results = [r for r in results if r['similarity'] >= self.similarity_threshold]
+                if len(filtered_results) >= limit or not caps['hnsw'] or ef_search >= self.hnsw_ef_search_max:
+                    break
+                # Widen only when more candidates could plausibly add matches: the filters
+                # exhausted the ef_search candidate list before LIMIT (no iterative scan),
+                # or the tail of the result set is still close to the threshold.
+                underfilled = len(results) < fetch_limit and not caps['iterative_scan']
+                near_threshold = bool(results) and results[-1]['similarity'] >= self.similarity_threshold - 0.05
+                if not (underfilled or near_threshold):
+                    break
+                ef_search = min(ef_search * 2, self.hnsw_ef_search_max)
+                logger.debug("Widening semantic search: %d/%d matches, ef_search -> %d",
+                             len(filtered_results), limit, ef_search)
+
+            if local_results:
+                filtered_results = sorted(local_results + filtered_results,
+                                          key=lambda r: r['similarity'], reverse=True)
+            return filtered_results[:limit]
 
         except Exception as e:
             logger.error("Error in semantic search: %s", e)
@@ -367,7 +878,7 @@ class RAGSystem:
         try:
             # Get messages in time range
             with self.db.get_connection() as conn:
-                with conn.cursor() as cur:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
                     if user_id:
                         cur.execute("""
                             SELECT username, content, timestamp
@@ -406,14 +917,13 @@ Conversation:
 Summary:"""
 
             # Use LLM to generate summary
-            summary = await asyncio.to_thread(
-                self.llm.generate_response,
+            summary = (await self.llm.asimple_completion(
                 summary_prompt,
-                [],  # No history needed for summarization
-                None,  # No user context
-                None,  # No additional context
-                temperature=0.3  # Lower temperature for factual summary
-            )
+                temperature=0.3,  # Lower temperature for factual summary
+                cost_request_type="conversation_summary",
+            )).strip()
+            if not summary:
+                return None
 
             # Store summary
             with self.db.get_connection() as conn:
@@ -463,13 +973,10 @@ Example: "uses PostgreSQL database, learning RAG systems, having Docker issues"
 
 Facts:"""
 
-            response = await asyncio.to_thread(
-                self.llm.generate_response,
+            response = await self.llm.asimple_completion(
                 extraction_prompt,
-                [],
-                None,
-                None,
-                temperature=0.2
+                temperature=0.2,
+                cost_request_type="fact_extraction",
             )
 
             # Parse response
@@ -498,7 +1005,7 @@ Facts:"""
                                     SET mention_count = mention_count + 1,
                                         last_confirmed = CURRENT_TIMESTAMP
                                     WHERE id = %s
-                                """, (existing['id'],))
+                                """, (existing[0],))
                             else:
                                 # Insert new fact
                                 cur.execute("""
@@ -511,6 +1018,8 @@ Facts:"""
                 except Exception as e:
                     logger.warning("Error storing fact: %s", e)
 
+            if facts:
+                await rebuild_card(self.db, user_id)
             return facts
 
         except Exception as e:
@@ -521,7 +1030,7 @@ Facts:"""
         self,
         query: str,
         channel_id: int,
-        user_id: int,
+        user_id: Optional[int],
         limit: int = 3
     ) -> Dict[str, any]:
         """
@@ -530,30 +1039,60 @@ Facts:"""
         Args:
             query: User's query/message
             channel_id: Channel ID
-            user_id: User ID
+            user_id: User whose facts to include, or None when the caller already has
+                them (the mention path gets them on the user card, see user_card.py)
             limit: Max number of relevant messages
 
         Returns:
-            Dict with semantic_matches, user_facts, recent_summary
+            Dict with semantic_matches, user_facts, recent_summary. Parts that miss the
+            RAG_CONTEXT_BUDGET are left empty.
         """
+        context = {
+            'semantic_matches': [],
+            'user_facts': [],
+            'recent_summary': None
+        }
         if not self.enabled:
-            return {
-                'semantic_matches': [],
-                'user_facts': [],
-                'recent_summary': None
-            }
-
-        try:
-            # 1. Semantic search for relevant past messages
-            semantic_matches = await self.semantic_search(
-                query,
-                channel_id=channel_id,
-                limit=limit
-            )
-
-            # 2. Get user facts
-            with self.db.get_connection() as conn:
-                with conn.cursor() as cur:
+            return context
+
+        # Retrieval plan: the query embedding + vector search and the facts/summary lookup
+        # run concurrently, neither on the event loop. The lookup shares one pooled
+        # connection. Whatever isn't back within the budget is left out of this reply.
+        search = asyncio.ensure_future(self.semantic_search(query, channel_id=channel_id, limit=limit))
+        lookup = asyncio.ensure_future(asyncio.to_thread(self._context_rows_sync, channel_id, user_id))
+        done, pending = await asyncio.wait((search, lookup), timeout=self.context_budget)
+        self.context_stats['requests'] += 1
+
+        if search in done:
+            context['semantic_matches'] = search.result()  # semantic_search logs its own errors
+        else:
+            self.context_stats['search_timeouts'] += 1
+
+        if lookup in done:
+            try:
+                context['user_facts'], context['recent_summary'] = lookup.result()
+            except Exception as e:
+                logger.error("Error getting user facts/summary: %s", e)
+        else:
+            self.context_stats['lookup_timeouts'] += 1
+
+        if pending:
+            self.context_stats['partial'] += 1
+            logger.warning("RAG context exceeded %.1fs budget; continuing without %s", self.context_budget,
+                           " and ".join("semantic matches" if t is search else "facts/summary" for t in pending))
+            for task in pending:
+                # Let the slow leg finish in the background (it still fills the embedding
+                # cache and returns its connection); only its result is dropped
+                task.add_done_callback(_discard_result)
+
+        return context
+
+    def _context_rows_sync(self, channel_id: int, user_id: Optional[int]) -> Tuple[List[Dict], Optional[str]]:
+        """User facts and the channel's rolling summary digest, on one pooled connection (worker thread)."""
+        user_facts = []
+        with self.db.get_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                if user_id is not None:
                     cur.execute("""
                         SELECT fact, confidence, mention_count
                         FROM user_facts
@@ -561,38 +1100,11 @@ Facts:"""
                         ORDER BY confidence DESC, mention_count DESC
                         LIMIT 10
                     """, (user_id,))
-                    user_facts = cur.fetchall()
-
-            # 3. Get recent conversation summary (if exists)
-            recent_summary = None
-            cutoff_time = datetime.now() - timedelta(hours=24)
-            with self.db.get_connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        SELECT summary
-                        FROM conversation_summaries
-                        WHERE channel_id = %s
-                          AND start_timestamp >= %s
-                        ORDER BY end_timestamp DESC
-                        LIMIT 1
-                    """, (channel_id, cutoff_time))
-                    summary_row = cur.fetchone()
-                    if summary_row:
-                        recent_summary = summary_row['summary']
-
-            return {
-                'semantic_matches': semantic_matches,
-                'user_facts': [dict(f) for f in user_facts] if user_facts else [],
-                'recent_summary': recent_summary
-            }
+                    user_facts = [dict(f) for f in cur.fetchall()]
 
-        except Exception as e:
-            logger.error("Error getting relevant context: %s", e)
-            return {
-                'semantic_matches': [],
-                'user_facts': [],
-                'recent_summary': None
-            }
+                # Week/day/hour summaries of the channel (if any)
+                summary = fetch_digest(cur, channel_id)
+        return user_facts, summary
 
     # ============================================================
     # Explicit User Facts (user-initiated "remember this" storage)
@@ -640,7 +1152,9 @@ Facts:"""
                     conn.commit()
                 return True
 
-            return await asyncio.to_thread(_store)
+            stored = await asyncio.to_thread(_store)
+            await rebuild_card(self.db, user_id)
+            return stored
         except Exception as e:
             logger.error("Error storing explicit fact: %s", e)
             return False
@@ -696,7 +1210,10 @@ Facts:"""
                     conn.commit()
                     return deleted
 
-            return await asyncio.to_thread(_delete)
+            deleted = await asyncio.to_thread(_delete)
+            if deleted:
+                await rebuild_card(self.db, user_id)
+            return deleted
         except Exception as e:
             logger.error("Error deleting explicit fact: %s", e)
             return False
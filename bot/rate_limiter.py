@@ -0,0 +1,357 @@
+"""
+Per-user rate limits: hourly token budgets and per-feature cooldowns / hourly / daily caps.
+
+Database.check_rate_limit used to SUM(tokens_used) over `rate_limits`, and
+check_feature_rate_limit ran up to three COUNT/MAX queries over `feature_rate_limits`,
+each inside a pooled transaction, followed by an INSERT per use. Limits now live in Redis
+and every check or record is one atomic Lua script call (one round-trip):
+
+- Token budgets are a GCRA bucket: each token pushes the key's "theoretical arrival time"
+  forward by HOURLY_TOKEN_LIMIT/hour, so usage drains continuously instead of dropping off
+  an hour after each request. A request fits while the backlog plus the request is within
+  the hourly limit.
+- Feature limits keep a sorted set of the last 24 hours of uses per user and feature;
+  the cooldown, hourly and daily checks are evaluated in the same script.
+
+Without Redis (or when a call to it fails) the same algorithms run in-process, so limits
+still hold per bot instance but reset on restart. Every recorded use is also queued for
+`rate_limits` / `feature_rate_limits` and written in batches by flush_audit() (the
+flush_rate_limit_audit job), keeping the tables as an audit trail off the request path.
+All checks fail open.
+"""
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PERIOD = 3600             # seconds: HOURLY_TOKEN_LIMIT refills over this period
+FEATURE_RETENTION = 86400       # seconds of feature-use history kept (longest window)
+
+# KEYS[1]=bucket  ARGV: now_ms, tokens, limit, period_ms, consume(0/1)
+# Returns {tokens still in the bucket before this call, ms until it drains}
+_TOKEN_SCRIPT = """
+local now = tonumber(ARGV[1])
+local cost = tonumber(ARGV[2])
+local interval = tonumber(ARGV[4]) / tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+local used = math.ceil((tat - now) / interval)
+if ARGV[5] == '1' and cost > 0 then
+    tat = math.floor(tat + cost * interval)
+    redis.call('SET', KEYS[1], tat, 'PX', math.max(1, tat - now))
+end
+return {used, math.floor(tat - now)}
+"""
+
+# KEYS[1]=uses (sorted set, score = ms)  ARGV: now_ms, cooldown_ms, hourly, daily, retain_ms
+# Returns {0, 0} allowed | {1, wait_ms} cooldown | {2, count} hourly | {3, count} daily
+_FEATURE_CHECK_SCRIPT = """
+local now = tonumber(ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', '(' .. (now - tonumber(ARGV[5])))
+local cooldown = tonumber(ARGV[2])
+if cooldown > 0 then
+    local last = redis.call('ZREVRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    if last[2] then
+        local wait = cooldown - (now - tonumber(last[2]))
+        if wait > 0 then return {1, wait} end
+    end
+end
+local hourly = tonumber(ARGV[3])
+if hourly > 0 then
+    local count = redis.call('ZCOUNT', KEYS[1], now - 3600000, '+inf')
+    if count >= hourly then return {2, count} end
+end
+local daily = tonumber(ARGV[4])
+if daily > 0 then
+    local count = redis.call('ZCOUNT', KEYS[1], now - 86400000, '+inf')
+    if count >= daily then return {3, count} end
+end
+return {0, 0}
+"""
+
+# KEYS[1]=uses  ARGV: now_ms, member, retain_ms
+_FEATURE_RECORD_SCRIPT = """
+local now = tonumber(ARGV[1])
+local retain = tonumber(ARGV[3])
+redis.call('ZADD', KEYS[1], now, ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', '(' .. (now - retain))
+redis.call('PEXPIRE', KEYS[1], retain)
+return 1
+"""
+
+_REASONS = {1: 'cooldown', 2: 'hourly_limit', 3: 'daily_limit'}
+
+
+class _LocalLimits:
+    """In-process versions of the Lua scripts (same arguments and results)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}   # key -> theoretical arrival time (ms)
+        self._uses = {}      # key -> deque of use times (ms), oldest first
+
+    def token(self, key, now, cost, limit, period, consume):
+        interval = period / limit
+        with self._lock:
+            tat = max(self._buckets.get(key, now), now)
+            used = -(-(tat - now) // interval)  # ceil
+            if consume and cost > 0:
+                tat = int(tat + cost * interval)
+                self._buckets[key] = tat
+            self._prune(now)
+            return int(used), int(tat - now)
+
+    def feature_check(self, key, now, cooldown, hourly, daily, retain):
+        with self._lock:
+            uses = self._trimmed(key, now, retain)
+            if cooldown > 0 and uses:
+                wait = cooldown - (now - uses[-1])
+                if wait > 0:
+                    return 1, int(wait)
+            if hourly > 0:
+                count = sum(1 for t in uses if t >= now - 3_600_000)
+                if count >= hourly:
+                    return 2, count
+            if daily > 0:
+                count = sum(1 for t in uses if t >= now - 86_400_000)
+                if count >= daily:
+                    return 3, count
+            return 0, 0
+
+    def feature_record(self, key, now, retain):
+        with self._lock:
+            self._trimmed(key, now, retain).append(now)
+            self._prune(now)
+
+    def _trimmed(self, key, now, retain):
+        uses = self._uses.get(key)
+        if uses is None:
+            uses = self._uses[key] = deque()
+        while uses and uses[0] < now - retain:
+            uses.popleft()
+        return uses
+
+    def _prune(self, now):
+        # Drop drained buckets / empty histories once the maps get large
+        if len(self._buckets) > 10000:
+            self._buckets = {k: tat for k, tat in self._buckets.items() if tat > now}
+        if len(self._uses) > 10000:
+            self._uses = {k: uses for k, uses in self._uses.items()
+                          if uses and uses[-1] >= now - FEATURE_RETENTION * 1000}
+
+
+class RateLimiter:
+    """Token budgets and feature limits in Redis (in-process fallback), audited to Postgres."""
+
+    def __init__(self, audit_db=None, cache=None, clock=time.time):
+        self.audit_db = audit_db
+        self._cache = cache
+        self._clock = clock
+        self._scripts = None
+        self._local = _LocalLimits()
+        self._member_seq = itertools.count()
+        self.hourly_token_limit = int(os.getenv('HOURLY_TOKEN_LIMIT', '10000'))
+        audit_max = int(os.getenv('RATE_LIMIT_AUDIT_MAX_PENDING', '10000'))
+        self._audit_tokens = deque(maxlen=audit_max)
+        self._audit_features = deque(maxlen=audit_max)
+        self._stats_lock = threading.Lock()
+        self._stats = {'checks': 0, 'denied': 0, 'records': 0, 'redis_errors': 0,
+                       'audit_rows_written': 0, 'audit_errors': 0}
+
+    # ===== Backend =====
+
+    def _redis_scripts(self):
+        """Registered Lua scripts, or None to use the in-process limits."""
+        if self._scripts is None:
+            if self._cache is None:
+                from redis_cache import get_cache
+                self._cache = get_cache()
+            token = self._cache.register_script(_TOKEN_SCRIPT)
+            check = self._cache.register_script(_FEATURE_CHECK_SCRIPT)
+            record = self._cache.register_script(_FEATURE_RECORD_SCRIPT)
+            self._scripts = (token, check, record) if token and check and record else ()
+        return self._scripts or None
+
+    def _run(self, index, keys, args, local_fn):
+        scripts = self._redis_scripts()
+        if scripts:
+            try:
+                return [int(v) for v in scripts[index](keys=keys, args=args)]
+            except Exception as e:
+                self._count('redis_errors')
+                logger.warning("Rate limit script failed, using in-process limits: %s", e)
+        return local_fn()
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def _now_ms(self):
+        return int(self._clock() * 1000)
+
+    # ===== Token budget =====
+
+    def check_tokens(self, user_id, tokens_requested, hourly_limit=None):
+        """Would `tokens_requested` more tokens fit in the user's hourly budget?
+
+        Returns:
+            dict with 'allowed' (bool), 'tokens_used' (int), 'tokens_requested',
+            'limit' (int), 'reset_seconds' (int: until the request would fit, or until
+            the budget is fully restored when it already fits)
+        """
+        limit = hourly_limit or self.hourly_token_limit
+        try:
+            key = f"rl:tokens:{user_id}"
+            now = self._now_ms()
+            args = [now, 0, limit, TOKEN_PERIOD * 1000, 0]
+            used, drain_ms = self._run(0, [key], args,
+                                       lambda: self._local.token(key, *args[:4], False))
+            allowed = used + tokens_requested <= limit
+            if allowed:
+                reset_seconds = drain_ms // 1000
+            else:
+                reset_seconds = int((used + tokens_requested - limit) * TOKEN_PERIOD / limit) + 1
+            self._count('checks')
+            if not allowed:
+                self._count('denied')
+            return {
+                'allowed': allowed,
+                'tokens_used': used,
+                'tokens_requested': tokens_requested,
+                'limit': limit,
+                'reset_seconds': reset_seconds
+            }
+        except Exception as e:
+            logger.error("Error checking rate limit: %s", e)
+            # Fail open
+            return {
+                'allowed': True,
+                'tokens_used': 0,
+                'tokens_requested': tokens_requested,
+                'limit': limit,
+                'reset_seconds': TOKEN_PERIOD
+            }
+
+    def record_tokens(self, user_id, username, tokens_used, hourly_limit=None):
+        """Charge tokens to the user's budget and queue the audit row."""
+        limit = hourly_limit or self.hourly_token_limit
+        try:
+            key = f"rl:tokens:{user_id}"
+            now = self._now_ms()
+            args = [now, int(tokens_used), limit, TOKEN_PERIOD * 1000, 1]
+            self._run(0, [key], args, lambda: self._local.token(key, *args[:4], True))
+            self._count('records')
+        except Exception as e:
+            logger.error("Error recording token usage: %s", e)
+        self._audit_tokens.append((user_id, username, int(tokens_used), _utc_now()))
+
+    # ===== Feature limits =====
+
+    def check_feature(self, user_id, feature_type, cooldown_seconds=None, hourly_limit=None, daily_limit=None):
+        """Check a feature's cooldown / hourly / daily limits for a user.
+
+        Returns:
+            dict with 'allowed' (bool), 'reason' (str), 'wait_seconds' (int) for a cooldown,
+            or 'count' / 'limit' for the hourly and daily caps
+        """
+        if not (cooldown_seconds or hourly_limit or daily_limit):
+            return {'allowed': True}
+        try:
+            key = f"rl:feature:{feature_type}:{user_id}"
+            now = self._now_ms()
+            args = [now, int((cooldown_seconds or 0) * 1000), int(hourly_limit or 0),
+                    int(daily_limit or 0), FEATURE_RETENTION * 1000]
+            code, value = self._run(1, [key], args, lambda: self._local.feature_check(key, *args))
+            self._count('checks')
+            if not code:
+                return {'allowed': True}
+            self._count('denied')
+            if code == 1:
+                return {'allowed': False, 'reason': 'cooldown', 'wait_seconds': -(-value // 1000)}
+            return {
+                'allowed': False,
+                'reason': _REASONS[code],
+                'count': value,
+                'limit': hourly_limit if code == 2 else daily_limit
+            }
+        except Exception as e:
+            logger.error("Error checking feature rate limit: %s", e)
+            # Fail open
+            return {'allowed': True}
+
+    def record_feature(self, user_id, feature_type):
+        """Record one use of a feature and queue the audit row."""
+        try:
+            key = f"rl:feature:{feature_type}:{user_id}"
+            now = self._now_ms()
+            member = f"{now}:{os.getpid()}:{next(self._member_seq)}"
+            self._run(2, [key], [now, member, FEATURE_RETENTION * 1000],
+                      lambda: self._local.feature_record(key, now, FEATURE_RETENTION * 1000))
+            self._count('records')
+        except Exception as e:
+            logger.error("Error recording feature usage: %s", e)
+        self._audit_features.append((user_id, feature_type, _utc_now()))
+
+    # ===== Audit trail =====
+
+    def flush_audit(self) -> int:
+        """Write queued uses to rate_limits / feature_rate_limits. Blocking.
+
+        Returns:
+            Number of rows written
+        """
+        if self.audit_db is None:
+            return 0
+        tokens = _drain(self._audit_tokens)
+        features = _drain(self._audit_features)
+        if not tokens and not features:
+            return 0
+        try:
+            from psycopg2.extras import execute_values
+
+            with self.audit_db.get_connection() as conn:
+                with conn.cursor() as cur:
+                    if tokens:
+                        execute_values(cur, """
+                            INSERT INTO rate_limits (user_id, username, tokens_used, request_timestamp)
+                            VALUES %s
+                        """, tokens, page_size=1000)
+                    if features:
+                        execute_values(cur, """
+                            INSERT INTO feature_rate_limits (user_id, feature_type, request_timestamp)
+                            VALUES %s
+                        """, features, page_size=1000)
+        except Exception as e:
+            self._count('audit_errors')
+            logger.error("Error writing rate limit audit rows (%s dropped): %s",
+                         len(tokens) + len(features), e)
+            return 0
+        self._count('audit_rows_written', len(tokens) + len(features))
+        return len(tokens) + len(features)
+
+    def get_stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['backend'] = 'redis' if self._scripts else ('local' if self._scripts == () else 'unused')
+        stats['audit_pending'] = len(self._audit_tokens) + len(self._audit_features)
+        return stats
+
+
+def _utc_now():
+    # Naive UTC, like the request_timestamp column defaults compare against
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _drain(queue: deque) -> list:
+    rows = []
+    while queue:
+        try:
+            rows.append(queue.popleft())
+        except IndexError:
+            break
+    return rows
@@ -2,13 +2,55 @@
 Redis Cache Utility
 Provides in-memory caching for frequently accessed data to reduce database load.
 Falls back gracefully if Redis is unavailable.
+
+Coroutines should use the async methods (aget/aset/amget/aset_many/...): they run on a
+redis.asyncio connection pool bound to the bot's event loop, so a slow Redis delays
+only the awaiting task instead of blocking every guild for a socket timeout. The sync
+methods remain for worker threads. Values are JSON, encoded with orjson when installed.
+An optional process-local L1 (REDIS_L1_TTL seconds, off by default, holding the
+encoded values) answers repeat reads of stored values without a round-trip.
 """
 
+import asyncio
 import os
 import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
 from typing import Any, Optional
 from datetime import timedelta
 
+from single_flight import get_flight
+
+try:
+    import orjson
+except ImportError:  # optional: stdlib json produces the same encoding, just slower
+    orjson = None
+
+
+def _dumps(value: Any):
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass  # e.g. ints beyond 64 bits; json handles them
+    return json.dumps(value)
+
+
+def _loads(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+# Delete a lock only if it still holds the caller's token (it may have expired and
+# been taken by someone else)
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
 
 class RedisCache:
     """Redis-based caching with graceful fallback"""
@@ -16,7 +58,19 @@ class RedisCache:
     def __init__(self):
         """Initialize Redis connection"""
         self._client = None
+        self._raw_client = None  # decode_responses=False client for binary values
+        self._async_client = None  # redis.asyncio clients, created on the first awaited call
+        self._async_raw_client = None
+        self._async_loop = None
         self._enabled = False
+        self.async_timeout = float(os.getenv('REDIS_ASYNC_TIMEOUT', '1.0'))
+        self.async_max_connections = int(os.getenv('REDIS_ASYNC_MAX_CONNECTIONS', '20'))
+        self.l1_ttl = float(os.getenv('REDIS_L1_TTL', '0'))
+        self.l1_max_entries = int(os.getenv('REDIS_L1_MAX_ENTRIES', '2048'))
+        self._l1 = OrderedDict()  # key -> (expires_at, encoded value)
+        self._l1_lock = threading.Lock()
+        self.l1_stats = {'hits': 0, 'misses': 0}
+        self._flight = get_flight('redis_cache', self)
         self._connect()
 
     def _connect(self):
@@ -66,11 +120,14 @@ class RedisCache:
         if not self._enabled:
             return None
 
+        found, value = self._l1_get(key)
+        if found:
+            return value
+
         try:
-            value = self._client.get(key)
-            if value:
-                return json.loads(value)
-            return None
+            data = self._client.get(key)
+            self._l1_put(key, data)
+            return _loads(data) if data else None
         except Exception as e:
             print(f"⚠️  Redis get error: {e}")
             return None
@@ -91,9 +148,12 @@ class RedisCache:
             return False
 
         try:
-            self._client.setex(key, ttl, json.dumps(value))
+            data = _dumps(value)
+            self._client.setex(key, ttl, data)
+            self._l1_put(key, data, ttl)
             return True
         except Exception as e:
+            self._l1_discard([key])
             print(f"⚠️  Redis set error: {e}")
             return False
 
@@ -110,6 +170,7 @@ class RedisCache:
         if not self._enabled:
             return False
 
+        self._l1_discard([key])
         try:
             self._client.delete(key)
             return True
@@ -117,6 +178,57 @@ class RedisCache:
             print(f"⚠️  Redis delete error: {e}")
             return False
 
+    def mget(self, keys: list) -> list:
+        """
+        Get several values in one round-trip
+
+        Args:
+            keys: Cache keys
+
+        Returns:
+            List of cached values (None per missing key); all None if disabled/error
+        """
+        if not self._enabled or not keys:
+            return [None] * len(keys)
+
+        results, missing = self._l1_get_many(keys)
+        if missing:
+            try:
+                data = self._client.mget([keys[i] for i in missing])
+            except Exception as e:
+                print(f"⚠️  Redis mget error: {e}")
+                return results
+            self._fill(keys, results, missing, data)
+        return results
+
+    def set_many(self, mapping: dict, ttl: int = 300) -> bool:
+        """
+        Set several values (pipelined, one round-trip)
+
+        Args:
+            mapping: {key: JSON-serializable value}
+            ttl: Time-to-live in seconds
+
+        Returns:
+            True if successful
+        """
+        if not self._enabled or not mapping:
+            return False
+
+        encoded = {key: _dumps(value) for key, value in mapping.items()}
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            for key, data in encoded.items():
+                pipe.setex(key, ttl, data)
+            pipe.execute()
+        except Exception as e:
+            self._l1_discard(list(encoded))
+            print(f"⚠️  Redis set_many error: {e}")
+            return False
+        for key, data in encoded.items():
+            self._l1_put(key, data, ttl)
+        return True
+
     def get_or_set(self, key: str, fallback_fn, ttl: int = 300) -> Any:
         """
         Get from cache, or compute and cache if missing
@@ -156,18 +268,24 @@ class RedisCache:
             Cached or computed value
         """
         # Try cache first
-        cached = self.get(key)
+        cached = await self.aget(key)
         if cached is not None:
             return cached
 
-        # Cache miss - compute value
-        value = await fallback_fn()
+        # Cache miss - compute value once for all concurrent callers of this key
+        async def compute():
+            value = await fallback_fn()
+            # Cache the result
+            if value is not None:
+                await self.aset(key, value, ttl)
+            return value
 
-        # Cache the result
-        if value is not None:
-            self.set(key, value, ttl)
+        return await self._flight.do(key, compute, recheck=lambda: self._recheck(key))
 
-        return value
+    async def _recheck(self, key):
+        """Read key from Redis, skipping the L1"""
+        self._l1_discard([key])
+        return await self.aget(key)
 
     def increment(self, key: str, amount: int = 1, ttl: int = 3600) -> int:
         """
@@ -214,6 +332,304 @@ class RedisCache:
             print(f"⚠️  Redis get_counter error: {e}")
             return 0
 
+    def register_script(self, source: str):
+        """
+        Register a Lua script (run atomically server-side, loaded by SHA on first call)
+
+        Args:
+            source: Lua source
+
+        Returns:
+            Callable redis Script taking keys= and args=, or None if disabled/error
+        """
+        if not self._enabled:
+            return None
+
+        try:
+            return self._client.register_script(source)
+        except Exception as e:
+            print(f"⚠️  Redis register_script error: {e}")
+            return None
+
+    def _get_raw_client(self):
+        """Lazily create a client that returns bytes (the main client decodes to str,
+        which corrupts packed binary values)."""
+        if self._raw_client is None:
+            import redis
+            self._raw_client = redis.Redis(
+                host=os.getenv('REDIS_HOST'),
+                port=int(os.getenv('REDIS_PORT', '6379')),
+                password=os.getenv('REDIS_PASSWORD'),
+                decode_responses=False,
+                socket_connect_timeout=5,
+                socket_timeout=5
+            )
+        return self._raw_client
+
+    def mget_bytes(self, keys: list) -> list:
+        """
+        Get several binary values in one round-trip
+
+        Args:
+            keys: Cache keys
+
+        Returns:
+            List of bytes (or None per missing key); all None if disabled/error
+        """
+        if not self._enabled or not keys:
+            return [None] * len(keys)
+
+        try:
+            return self._get_raw_client().mget(keys)
+        except Exception as e:
+            print(f"⚠️  Redis mget_bytes error: {e}")
+            return [None] * len(keys)
+
+    def set_many_bytes(self, mapping: dict, ttl: int = 300) -> bool:
+        """
+        Set several binary values (pipelined, one round-trip)
+
+        Args:
+            mapping: {key: bytes}
+            ttl: Time-to-live in seconds
+
+        Returns:
+            True if successful
+        """
+        if not self._enabled or not mapping:
+            return False
+
+        try:
+            pipe = self._get_raw_client().pipeline(transaction=False)
+            for key, value in mapping.items():
+                pipe.setex(key, ttl, value)
+            pipe.execute()
+            return True
+        except Exception as e:
+            print(f"⚠️  Redis set_many_bytes error: {e}")
+            return False
+
+    # ===== Async API (redis.asyncio on the bot's event loop) =====
+
+    def _get_async_clients(self):
+        """(client, raw client) bound to the running loop, or None when called from any
+        other loop (e.g. asyncio.run in a worker thread) - callers then use the sync
+        client in a thread, since an asyncio pool cannot be shared across loops."""
+        loop = asyncio.get_running_loop()
+        if self._async_loop is None:
+            import redis.asyncio as aioredis
+            options = dict(
+                host=os.getenv('REDIS_HOST'),
+                port=int(os.getenv('REDIS_PORT', '6379')),
+                password=os.getenv('REDIS_PASSWORD'),
+                max_connections=self.async_max_connections,
+                socket_connect_timeout=self.async_timeout,
+                socket_timeout=self.async_timeout,
+            )
+            self._async_client = aioredis.Redis(
+                connection_pool=aioredis.BlockingConnectionPool(decode_responses=True, **options))
+            self._async_raw_client = aioredis.Redis(
+                connection_pool=aioredis.BlockingConnectionPool(decode_responses=False, **options))
+            self._async_loop = loop
+        if loop is not self._async_loop:
+            return None
+        return self._async_client, self._async_raw_client
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """Async version of get"""
+        return (await self.amget([key]))[0]
+
+    async def aset(self, key: str, value: Any, ttl: int = 300) -> bool:
+        """Async version of set"""
+        return await self.aset_many({key: value}, ttl)
+
+    async def adelete(self, key: str) -> bool:
+        """Async version of delete"""
+        if not self._enabled:
+            return False
+
+        self._l1_discard([key])
+        try:
+            clients = self._get_async_clients()
+            if clients is None:
+                return await asyncio.to_thread(self.delete, key)
+            await clients[0].delete(key)
+            return True
+        except Exception as e:
+            print(f"⚠️  Redis delete error: {e}")
+            return False
+
+    async def amget(self, keys: list) -> list:
+        """Async version of mget (L1 first, then one MGET for the rest)"""
+        if not self._enabled or not keys:
+            return [None] * len(keys)
+
+        results, missing = self._l1_get_many(keys)
+        if missing:
+            try:
+                clients = self._get_async_clients()
+                if clients is None:
+                    return await asyncio.to_thread(self.mget, keys)
+                data = await clients[0].mget([keys[i] for i in missing])
+            except Exception as e:
+                print(f"⚠️  Redis mget error: {e}")
+                return results
+            self._fill(keys, results, missing, data)
+        return results
+
+    async def aset_many(self, mapping: dict, ttl: int = 300) -> bool:
+        """Async version of set_many (one pipelined round-trip)"""
+        if not self._enabled or not mapping:
+            return False
+
+        encoded = {key: _dumps(value) for key, value in mapping.items()}
+        try:
+            clients = self._get_async_clients()
+            if clients is None:
+                return await asyncio.to_thread(self.set_many, mapping, ttl)
+            async with clients[0].pipeline(transaction=False) as pipe:
+                for key, data in encoded.items():
+                    pipe.setex(key, ttl, data)
+                await pipe.execute()
+        except Exception as e:
+            self._l1_discard(list(encoded))
+            print(f"⚠️  Redis set_many error: {e}")
+            return False
+        for key, data in encoded.items():
+            self._l1_put(key, data, ttl)
+        return True
+
+    async def amget_bytes(self, keys: list) -> list:
+        """Async version of mget_bytes"""
+        if not self._enabled or not keys:
+            return [None] * len(keys)
+
+        try:
+            clients = self._get_async_clients()
+            if clients is None:
+                return await asyncio.to_thread(self.mget_bytes, keys)
+            return await clients[1].mget(keys)
+        except Exception as e:
+            print(f"⚠️  Redis mget_bytes error: {e}")
+            return [None] * len(keys)
+
+    async def aset_many_bytes(self, mapping: dict, ttl: int = 300) -> bool:
+        """Async version of set_many_bytes"""
+        if not self._enabled or not mapping:
+            return False
+
+        try:
+            clients = self._get_async_clients()
+            if clients is None:
+                return await asyncio.to_thread(self.set_many_bytes, mapping, ttl)
+            async with clients[1].pipeline(transaction=False) as pipe:
+                for key, value in mapping.items():
+                    pipe.setex(key, ttl, value)
+                await pipe.execute()
+            return True
+        except Exception as e:
+            print(f"⚠️  Redis set_many_bytes error: {e}")
+            return False
+
+    async def aacquire_lock(self, key: str, ttl: float):
+        """
+        Try to take a short-lived lock (SET NX PX with a random token)
+
+        Args:
+            key: Lock key
+            ttl: Seconds before the lock expires on its own
+
+        Returns:
+            Token (str) if acquired, False if held elsewhere, None if disabled/error
+        """
+        if not self._enabled:
+            return None
+
+        token = uuid.uuid4().hex
+        try:
+            clients = self._get_async_clients()
+            if clients is None:
+                return None
+            acquired = await clients[0].set(key, token, nx=True, px=int(ttl * 1000))
+            return token if acquired else False
+        except Exception as e:
+            print(f"⚠️  Redis lock error: {e}")
+            return None
+
+    async def arelease_lock(self, key: str, token: str) -> bool:
+        """Release a lock taken by aacquire_lock (only if it still holds our token)"""
+        if not self._enabled or not token:
+            return False
+
+        try:
+            clients = self._get_async_clients()
+            if clients is None:
+                return False
+            return bool(await clients[0].eval(_RELEASE_LOCK_SCRIPT, 1, key, token))
+        except Exception as e:
+            print(f"⚠️  Redis unlock error: {e}")
+            return False
+
+    async def aclose(self):
+        """Close the async connection pools (bot shutdown)"""
+        clients = (self._async_client, self._async_raw_client)
+        self._async_client = self._async_raw_client = self._async_loop = None
+        for client in clients:
+            if client is not None:
+                try:
+                    await client.aclose()
+                except Exception as e:
+                    print(f"⚠️  Redis close error: {e}")
+
+    # ===== L1 (process-local, short TTL, encoded values) =====
+
+    def _l1_get(self, key):
+        """(found, value). Values are decoded per hit so callers never share objects."""
+        if self.l1_ttl <= 0:
+            return False, None
+        with self._l1_lock:
+            entry = self._l1.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self.l1_stats['misses'] += 1
+                return False, None
+            self._l1.move_to_end(key)
+            self.l1_stats['hits'] += 1
+        return True, (_loads(entry[1]) if entry[1] else None)
+
+    def _l1_get_many(self, keys):
+        """Values found in L1 and the indexes of keys still to fetch"""
+        results = [None] * len(keys)
+        missing = []
+        for i, key in enumerate(keys):
+            found, value = self._l1_get(key)
+            if found:
+                results[i] = value
+            else:
+                missing.append(i)
+        return results, missing
+
+    def _fill(self, keys, results, missing, data):
+        for i, raw in zip(missing, data):
+            self._l1_put(keys[i], raw)
+            results[i] = _loads(raw) if raw else None
+
+    def _l1_put(self, key, data, ttl=None):
+        # Misses aren't remembered: a key written elsewhere (another replica, a script)
+        # must be visible on the next read
+        if self.l1_ttl <= 0 or data is None:
+            return
+        expires = time.monotonic() + min(self.l1_ttl, ttl or self.l1_ttl)
+        with self._l1_lock:
+            self._l1[key] = (expires, data)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self.l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_discard(self, keys):
+        with self._l1_lock:
+            for key in keys:
+                self._l1.pop(key, None)
+
     # Convenience methods for common cache keys
 
     def cache_user_facts(self, user_id: int, guild_id: int, facts: list, ttl: int = 600):
@@ -269,7 +685,10 @@ class RedisCache:
                 'enabled': True,
                 'used_memory': info.get('used_memory_human', 'unknown'),
                 'max_memory': info.get('maxmemory_human', 'unknown'),
-                'keys': self._client.dbsize()
+                'keys': self._client.dbsize(),
+                'l1_entries': len(self._l1),
+                'l1_hits': self.l1_stats['hits'],
+                'l1_misses': self.l1_stats['misses']
             }
         except Exception as e:
             return {'enabled': True, 'error': str(e)}
@@ -0,0 +1,335 @@
+"""
+Circuit breakers and adaptive concurrency limits for outbound providers.
+
+When OpenRouter, Tavily or another API degrades, every call used to wait out its full
+timeout (and retries) while holding a worker thread and a channel semaphore slot, so one
+slow provider could stall the whole bot. Each provider now gets a guard with two parts:
+
+- A circuit breaker (closed -> open -> half-open). It opens after a run of consecutive
+  failures or a high error rate over a rolling window. While open, calls fail immediately
+  with ProviderUnavailable. After a cooldown a single probe call is let through: success
+  closes the breaker, failure re-opens it with a longer cooldown.
+- An AIMD concurrency limit. Fast successes raise the limit additively; errors and
+  responses slower than the provider's latency target cut it multiplicatively. Calls over
+  the limit fail fast instead of queueing behind a degraded provider.
+
+ProviderUnavailable.user_message is a friendly explanation the conversation handler can
+send as-is. Guards are thread-safe and never block, so the same guard works from worker
+threads (requests) and from event loops (httpx, aiohttp).
+
+Usage:
+    with get_provider('tavily', display_name='Web search').guard() as call:
+        response = do_request()
+        if response.status_code >= 500:
+            call.failed()
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Status codes that mean "provider is struggling" (not "bad request")
+FAILURE_STATUSES = (429, 500, 502, 503, 504)
+
+
+class ProviderUnavailable(Exception):
+    """Raised instead of calling a provider whose breaker is open or whose limit is full."""
+
+    def __init__(self, provider, display_name, reason=OPEN, retry_after=0.0):
+        self.provider = provider
+        self.display_name = display_name
+        self.reason = reason  # 'open' or 'busy'
+        self.retry_after = retry_after
+        super().__init__(f"{provider} unavailable ({reason}, retry in {retry_after:.0f}s)")
+
+    @property
+    def user_message(self):
+        if self.reason == 'busy':
+            return f"⏳ {self.display_name} is overloaded right now. Give it a few seconds and try again."
+        wait = max(5, int(round(self.retry_after)))
+        return (f"⚠️ {self.display_name} is having trouble right now, so I'm holding off for a bit. "
+                f"Try again in about {wait}s.")
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker over consecutive failures and a rolling error rate.
+
+    Not thread-safe on its own; Provider serializes access.
+    """
+
+    def __init__(self, failure_threshold=5, error_rate=0.5, min_calls=10,
+                 window_seconds=60.0, open_seconds=30.0, max_open_seconds=300.0):
+        self.failure_threshold = failure_threshold
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.base_open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+
+        self.state = CLOSED
+        self.open_seconds = open_seconds
+        self._opened_at = 0.0
+        self._consecutive_failures = 0
+        self._outcomes = deque()  # (monotonic time, ok)
+        self._probe_in_flight = False
+
+    def before_call(self, now):
+        """Admit a call. Returns (allowed, is_probe, retry_after_seconds)."""
+        if self.state == CLOSED:
+            return True, False, 0.0
+        remaining = self._opened_at + self.open_seconds - now
+        if self.state == OPEN and remaining <= 0:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True, True, 0.0
+        return False, False, max(remaining, 1.0)
+
+    def record(self, ok, is_probe, now):
+        """Record a finished call. Returns the new state if it changed, else None."""
+        if is_probe:
+            self._probe_in_flight = False
+            if ok:
+                self._close()
+                return CLOSED
+            self.open_seconds = min(self.open_seconds * 2, self.max_open_seconds)
+            self._trip(now)
+            return OPEN
+        if self.state != CLOSED:
+            # Stragglers admitted before the breaker opened don't move it
+            return None
+
+        self._outcomes.append((now, ok))
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            self._outcomes.popleft()
+        if ok:
+            self._consecutive_failures = 0
+            return None
+
+        self._consecutive_failures += 1
+        failures = sum(1 for _, success in self._outcomes if not success)
+        if (self._consecutive_failures >= self.failure_threshold
+                or (len(self._outcomes) >= self.min_calls
+                    and failures / len(self._outcomes) >= self.error_rate)):
+            self._trip(now)
+            return OPEN
+        return None
+
+    def release_probe(self):
+        """A probe ended without an outcome (cancelled): let the next call probe instead."""
+        self._probe_in_flight = False
+
+    def _trip(self, now):
+        self.state = OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+        self._consecutive_failures = 0
+
+    def _close(self):
+        self.state = CLOSED
+        self.open_seconds = self.base_open_seconds
+        self._outcomes.clear()
+        self._consecutive_failures = 0
+
+
+class AdaptiveConcurrencyLimit:
+    """AIMD concurrency limit driven by latency and errors.
+
+    Not thread-safe on its own; Provider serializes access.
+    """
+
+    def __init__(self, initial, min_limit, max_limit, latency_target,
+                 error_backoff=0.5, latency_backoff=0.9):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.error_backoff = error_backoff
+        self.latency_backoff = latency_backoff
+        self.in_flight = 0
+        self._last_decrease = 0.0
+
+    def try_acquire(self):
+        if self.in_flight >= int(self.limit):
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self, ok, started, latency):
+        """Release a slot and adapt. `ok=None` (cancelled) releases without adapting."""
+        self.in_flight -= 1
+        if ok is None:
+            return
+        if not ok or latency > self.latency_target:
+            # Calls that started before the last cut saw the old, higher limit: one
+            # congestion event should only shrink the limit once
+            if started >= self._last_decrease:
+                factor = self.error_backoff if not ok else self.latency_backoff
+                self.limit = max(float(self.min_limit), self.limit * factor)
+                self._last_decrease = time.monotonic()
+        elif self.in_flight + 1 >= self.limit / 2:
+            # Only grow while the limit is actually being exercised
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+
+
+class _Call:
+    __slots__ = ('ok', 'is_probe', 'started')
+
+    def __init__(self, is_probe, started):
+        self.ok = True
+        self.is_probe = is_probe
+        self.started = started
+
+    def failed(self):
+        """Mark this call as a provider failure (e.g. a 5xx/429 response)."""
+        self.ok = False
+
+
+class Provider:
+    """Circuit breaker + adaptive concurrency limit for one outbound provider."""
+
+    def __init__(self, name, display_name=None, latency_target=None, max_concurrency=None):
+        self.name = name
+        self.display_name = display_name or name
+        self.enabled = os.getenv('CIRCUIT_BREAKER_ENABLED', 'true').lower() == 'true'
+        max_limit = max_concurrency or int(os.getenv('PROVIDER_MAX_CONCURRENCY', '64'))
+        self.breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv('CIRCUIT_BREAKER_FAILURES', '5')),
+            error_rate=float(os.getenv('CIRCUIT_BREAKER_ERROR_RATE', '0.5')),
+            min_calls=int(os.getenv('CIRCUIT_BREAKER_MIN_CALLS', '10')),
+            window_seconds=float(os.getenv('CIRCUIT_BREAKER_WINDOW_SECONDS', '60')),
+            open_seconds=float(os.getenv('CIRCUIT_BREAKER_OPEN_SECONDS', '30')),
+            max_open_seconds=float(os.getenv('CIRCUIT_BREAKER_MAX_OPEN_SECONDS', '300')),
+        )
+        self.limiter = AdaptiveConcurrencyLimit(
+            initial=max(1, max_limit // 2),
+            min_limit=int(os.getenv('PROVIDER_MIN_CONCURRENCY', '2')),
+            max_limit=max_limit,
+            latency_target=latency_target or float(os.getenv('PROVIDER_LATENCY_TARGET', '10')),
+        )
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'failures': 0, 'rejected_open': 0, 'rejected_busy': 0, 'trips': 0}
+
+    def _admit(self):
+        now = time.monotonic()
+        with self._lock:
+            allowed, is_probe, retry_after = self.breaker.before_call(now)
+            if not allowed:
+                self.stats['rejected_open'] += 1
+                raise ProviderUnavailable(self.name, self.display_name, OPEN, retry_after)
+            if not self.limiter.try_acquire():
+                if is_probe:
+                    self.breaker.release_probe()
+                self.stats['rejected_busy'] += 1
+                raise ProviderUnavailable(self.name, self.display_name, 'busy', 1.0)
+            self.stats['calls'] += 1
+        return _Call(is_probe, now)
+
+    def _finish(self, call, ok):
+        now = time.monotonic()
+        with self._lock:
+            self.limiter.release(ok, call.started, now - call.started)
+            if ok is None:
+                if call.is_probe:
+                    self.breaker.release_probe()
+                return
+            if not ok:
+                self.stats['failures'] += 1
+            transition = self.breaker.record(ok, call.is_probe, now)
+            if transition == OPEN:
+                self.stats['trips'] += 1
+        if transition == OPEN:
+            logger.warning("Circuit breaker OPEN for %s (retry in %.0fs)", self.name, self.breaker.open_seconds)
+        elif transition == CLOSED:
+            logger.info("Circuit breaker CLOSED for %s", self.name)
+
+    @contextmanager
+    def guard(self, ignore=()):
+        """Guard one outbound call. Raises ProviderUnavailable without calling out when
+        the breaker is open or the concurrency limit is full. Exceptions raised inside
+        count as failures unless they are instances of `ignore` (e.g. an auth refresh);
+        cancellation counts as neither."""
+        if not self.enabled:
+            yield _Call(False, time.monotonic())
+            return
+        call = self._admit()
+        outcome = None
+        try:
+            yield call
+            outcome = call.ok
+        except Exception as e:
+            outcome = call.ok if isinstance(e, ignore) else False
+            raise
+        finally:
+            self._finish(call, outcome)
+
+    def is_open(self):
+        with self._lock:
+            return self.enabled and self.breaker.state != CLOSED
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                **self.stats,
+                'state': self.breaker.state,
+                'concurrency_limit': round(self.limiter.limit, 1),
+                'in_flight': self.limiter.in_flight,
+            }
+
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def get_provider(name, display_name=None, latency_target=None, max_concurrency=None):
+    """Shared Provider guard for `name` (created on first use with the given settings)."""
+    with _providers_lock:
+        provider = _providers.get(name)
+        if provider is None:
+            provider = Provider(name, display_name, latency_target, max_concurrency)
+            _providers[name] = provider
+        return provider
+
+
+def get_stats():
+    """Per-provider breaker/limiter stats (for the health endpoint)."""
+    with _providers_lock:
+        providers = list(_providers.values())
+    return {p.name: p.get_stats() for p in providers}
+
+
+class ResilientSession(requests.Session):
+    """requests.Session that routes every request through a provider guard.
+
+    The provider is fixed (`provider=`) or, for clients that talk to many APIs like
+    ToolExecutor, derived from each request's hostname. 429/5xx responses count as
+    failures; ProviderUnavailable is raised instead of making the request.
+    """
+
+    def __init__(self, provider=None, display_name=None, latency_target=None,
+                 failure_statuses=FAILURE_STATUSES):
+        super().__init__()
+        self._provider = provider
+        self._display_name = display_name
+        self._latency_target = latency_target
+        self._failure_statuses = failure_statuses
+
+    def request(self, method, url, *args, **kwargs):
+        name = self._provider or (urlsplit(url).hostname or 'unknown')
+        provider = get_provider(name, self._display_name, self._latency_target)
+        with provider.guard() as call:
+            response = super().request(method, url, *args, **kwargs)
+            if response.status_code in self._failure_statuses:
+                call.failed()
+            return response
@@ -0,0 +1,296 @@
+"""
+Rolling channel summaries.
+
+Each channel gets hour, day and week summaries (channel_summaries, migration 24). They
+are updated incrementally, by folding a delta into the existing text:
+- messages newer than the hour row's `covered_until` are folded into their hour,
+- a finished hour is folded into its day, and a finished day into its week.
+
+No window is ever re-summarized from its raw messages, so each update is one short LLM
+call whatever the channel's volume. get_relevant_context returns the layered digest
+(week, then unfinished days and hours) as `recent_summary`, and llm.py shortens the
+raw history window to SUMMARY_HISTORY_MESSAGES when one is present.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from psycopg2.extras import RealDictCursor
+
+logger = logging.getLogger(__name__)
+
+PARENT = {'hour': 'day', 'day': 'week'}
+# Summary length per level; the digest stays a few hundred tokens
+MAX_WORDS = {'hour': 60, 'day': 90, 'week': 120}
+
+
+def period_start(ts: datetime, granularity: str) -> datetime:
+    """Start of the hour, day or ISO week (Monday) containing `ts`."""
+    if granularity == 'hour':
+        return ts.replace(minute=0, second=0, microsecond=0)
+    day = ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == 'day':
+        return day
+    return day - timedelta(days=day.weekday())
+
+
+def period_end(start: datetime, granularity: str) -> datetime:
+    return start + {'hour': timedelta(hours=1), 'day': timedelta(days=1), 'week': timedelta(weeks=1)}[granularity]
+
+
+def fold_prompt(granularity: str, previous: Optional[str], delta: str) -> str:
+    """Prompt that folds `delta` into a level's existing summary."""
+    words = MAX_WORDS[granularity]
+    if granularity == 'hour':
+        source = "New messages"
+    else:
+        source = f"Summary of the {'hour' if granularity == 'day' else 'day'} that just ended"
+    if not previous:
+        return f"""Summarize this Discord conversation in at most {words} words. Keep topics, decisions, plans, open questions and who said what when it matters. No preamble.
+
+{source}:
+{delta}
+
+Summary:"""
+    return f"""Update the running summary of this {granularity} of a Discord conversation with the new material below. Keep it at most {words} words: merge, compress older details, and keep topics, decisions, plans, open questions and who said what when it matters. No preamble.
+
+Current summary:
+{previous}
+
+{source}:
+{delta}
+
+Updated summary:"""
+
+
+def format_digest(rows: List[Dict]) -> Optional[str]:
+    """Layered text from the newest rows: last week summary, then unrolled days and hours.
+
+    Args:
+        rows: channel_summaries rows (granularity, period_start, summary), newest first
+    """
+    picked = {'week': [], 'day': [], 'hour': []}
+    limits = {'week': 1, 'day': 2, 'hour': 3}
+    for row in rows:
+        level = picked[row['granularity']]
+        if len(level) < limits[row['granularity']]:
+            level.append(row)
+    lines = []
+    for row in picked['week']:
+        lines.append(f"Week of {row['period_start']:%b %d}: {row['summary']}")
+    for row in reversed(picked['day']):
+        lines.append(f"{row['period_start']:%a %b %d}: {row['summary']}")
+    for row in reversed(picked['hour']):
+        lines.append(f"{row['period_start']:%H:00}: {row['summary']}")
+    return "\n".join(lines) or None
+
+
+def fetch_digest(cur, channel_id: int, now: Optional[datetime] = None) -> Optional[str]:
+    """Channel digest on an open RealDictCursor (see format_digest).
+
+    Hours and days already folded into their parent are left out, so each message is
+    represented once.
+    """
+    since = (now or datetime.now()) - timedelta(days=14)
+    cur.execute("""
+        SELECT granularity, period_start, summary
+        FROM channel_summaries
+        WHERE channel_id = %s AND period_start >= %s
+          AND (granularity = 'week' OR NOT rolled_up)
+        ORDER BY period_start DESC
+        LIMIT 12
+    """, (channel_id, since))
+    return format_digest(cur.fetchall())
+
+
+class RollingSummaries:
+    """Incremental hour/day/week channel summaries (see module docstring)."""
+
+    def __init__(self, database, llm_client):
+        self.db = database
+        self.llm = llm_client
+        self.min_new_messages = int(os.getenv('SUMMARY_MIN_NEW_MESSAGES', '8'))
+        self.max_delta_messages = int(os.getenv('SUMMARY_MAX_DELTA_MESSAGES', '200'))
+        self.channels_per_run = int(os.getenv('SUMMARY_CHANNELS_PER_RUN', '20'))
+        self.max_folds_per_run = int(os.getenv('SUMMARY_MAX_FOLDS_PER_RUN', '60'))
+        self.backfill_hours = int(os.getenv('SUMMARY_BACKFILL_HOURS', '24'))
+        self.stats = {'message_folds': 0, 'rollups': 0, 'failed': 0}
+
+    async def run(self) -> int:
+        """Fold pending messages into hour summaries, then roll finished periods upward.
+
+        Returns:
+            Number of summaries updated
+        """
+        now = datetime.now()
+        budget = self.max_folds_per_run
+        updated = 0
+
+        channels = await asyncio.to_thread(self._pending_channels_sync, now)
+        for channel_id in channels:
+            if budget <= 0:
+                break
+            messages = await asyncio.to_thread(self._delta_messages_sync, channel_id, now)
+            by_hour = {}
+            for msg in messages:
+                by_hour.setdefault(period_start(msg['timestamp'], 'hour'), []).append(msg)
+            for hour, batch in sorted(by_hour.items()):
+                if budget <= 0:
+                    break
+                budget -= 1
+                delta = "\n".join(f"{m['username']}: {m['content'][:500]}" for m in batch)
+                if await self._fold(channel_id, 'hour', hour, delta, len(batch), batch[-1]['timestamp']):
+                    self.stats['message_folds'] += 1
+                    updated += 1
+
+        for granularity in ('hour', 'day'):
+            parent = PARENT[granularity]
+            finished = await asyncio.to_thread(self._finished_periods_sync, granularity, now, budget)
+            for row in finished:
+                budget -= 1
+                start = period_start(row['period_start'], parent)
+                end = period_end(row['period_start'], granularity)
+                if await self._fold(row['channel_id'], parent, start, row['summary'],
+                                    row['message_count'], end, rolled=(granularity, row['period_start'])):
+                    self.stats['rollups'] += 1
+                    updated += 1
+
+        await asyncio.to_thread(self._prune_sync, now)
+        return updated
+
+    async def _fold(self, channel_id, granularity, start, delta, count, covered_until, rolled=None) -> bool:
+        """Fold one delta into a summary row; `rolled` marks the child row it came from."""
+        try:
+            previous = await asyncio.to_thread(self._summary_sync, channel_id, granularity, start)
+            summary = await self.llm.asimple_completion(
+                fold_prompt(granularity, previous, delta),
+                max_tokens=MAX_WORDS[granularity] * 3,
+                temperature=0.3,
+                cost_request_type="channel_summary",
+            )
+            if not summary or not summary.strip():
+                raise ValueError("empty summary")
+            await asyncio.to_thread(self._store_sync, channel_id, granularity, start,
+                                    summary.strip(), count, covered_until, rolled)
+            return True
+        except Exception as e:
+            self.stats['failed'] += 1
+            logger.error("Error folding %s summary for channel %s: %s", granularity, channel_id, e)
+            return False
+
+    def _pending_channels_sync(self, now: datetime) -> List[int]:
+        """Channels with enough unsummarized messages, or whose pending messages' hour has ended (worker thread).
+
+        Counts the same messages _delta_messages_sync folds, so a channel whose pending
+        messages are all from opted-out users isn't picked (and given a slot) every run.
+        """
+        with self.db.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    WITH covered AS (
+                        SELECT channel_id, MAX(covered_until) AS until
+                        FROM channel_summaries
+                        WHERE granularity = 'hour'
+                        GROUP BY channel_id
+                    )
+                    SELECT m.channel_id
+                    FROM messages m
+                    LEFT JOIN covered c ON c.channel_id = m.channel_id
+                    LEFT JOIN user_profiles up ON up.user_id = m.user_id
+                    WHERE m.timestamp > %s
+                      AND m.timestamp > COALESCE(c.until, '-infinity'::timestamp)
+                      AND m.content IS NOT NULL AND m.content <> ''
+                      AND COALESCE(m.opted_out, FALSE) = FALSE
+                      AND COALESCE(up.opted_out, FALSE) = FALSE
+                    GROUP BY m.channel_id
+                    HAVING COUNT(*) >= %s OR MIN(m.timestamp) < %s
+                    ORDER BY COUNT(*) DESC
+                    LIMIT %s
+                """, (now - timedelta(hours=self.backfill_hours), self.min_new_messages,
+                      period_start(now, 'hour'), self.channels_per_run))
+                return [row[0] for row in cur.fetchall()]
+
+    def _delta_messages_sync(self, channel_id: int, now: datetime) -> List[Dict]:
+        """Oldest unsummarized messages of a channel, opted-out users excluded (worker thread)."""
+        with self.db.get_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("""
+                    SELECT m.username, m.content, m.timestamp
+                    FROM messages m
+                    LEFT JOIN user_profiles up ON up.user_id = m.user_id
+                    WHERE m.channel_id = %s
+                      AND m.timestamp > GREATEST(%s, COALESCE((
+                          SELECT MAX(covered_until) FROM channel_summaries
+                          WHERE channel_id = %s AND granularity = 'hour'
+                      ), '-infinity'::timestamp))
+                      AND m.content IS NOT NULL AND m.content <> ''
+                      AND COALESCE(m.opted_out, FALSE) = FALSE
+                      AND COALESCE(up.opted_out, FALSE) = FALSE
+                    ORDER BY m.timestamp ASC
+                    LIMIT %s
+                """, (channel_id, now - timedelta(hours=self.backfill_hours), channel_id,
+                      self.max_delta_messages))
+                return cur.fetchall()
+
+    def _finished_periods_sync(self, granularity: str, now: datetime, limit: int) -> List[Dict]:
+        """Ended hour or day rows not yet folded into their parent, oldest first (worker thread)."""
+        if limit <= 0:
+            return []
+        # A day waits an extra hour so its last hour is folded in before it moves up
+        ended = {'hour': timedelta(hours=1), 'day': timedelta(days=1, hours=1)}[granularity]
+        with self.db.get_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("""
+                    SELECT channel_id, period_start, summary, message_count
+                    FROM channel_summaries
+                    WHERE granularity = %s AND NOT rolled_up AND period_start <= %s
+                    ORDER BY period_start ASC
+                    LIMIT %s
+                """, (granularity, now - ended, limit))
+                return cur.fetchall()
+
+    def _summary_sync(self, channel_id: int, granularity: str, start: datetime) -> Optional[str]:
+        with self.db.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT summary FROM channel_summaries
+                    WHERE channel_id = %s AND granularity = %s AND period_start = %s
+                """, (channel_id, granularity, start))
+                row = cur.fetchone()
+        return row[0] if row else None
+
+    def _store_sync(self, channel_id, granularity, start, summary, count, covered_until, rolled):
+        """Upsert the folded summary and mark its source row rolled up, in one transaction (worker thread)."""
+        with self.db.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO channel_summaries
+                        (channel_id, granularity, period_start, summary, message_count, covered_until)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    ON CONFLICT (channel_id, granularity, period_start) DO UPDATE
+                    SET summary = EXCLUDED.summary,
+                        message_count = channel_summaries.message_count + EXCLUDED.message_count,
+                        covered_until = GREATEST(channel_summaries.covered_until, EXCLUDED.covered_until),
+                        -- late messages re-open a period already folded into its parent
+                        rolled_up = FALSE,
+                        updated_at = CURRENT_TIMESTAMP
+                """, (channel_id, granularity, start, summary, count, covered_until))
+                if rolled:
+                    cur.execute("""
+                        UPDATE channel_summaries SET rolled_up = TRUE
+                        WHERE channel_id = %s AND granularity = %s AND period_start = %s
+                    """, (channel_id, *rolled))
+
+    def _prune_sync(self, now: datetime):
+        """Drop hours and days whose content lives on in their parent (worker thread)."""
+        with self.db.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    DELETE FROM channel_summaries
+                    WHERE rolled_up
+                      AND ((granularity = 'hour' AND period_start < %s)
+                           OR (granularity = 'day' AND period_start < %s))
+                """, (now - max(timedelta(days=2), timedelta(hours=self.backfill_hours + 1)),
+                      now - timedelta(days=30)))
@@ -0,0 +1,139 @@
+"""
+Measure how much recall the compact embedding storage modes give up.
+
+Samples stored embeddings, uses some of them as queries against the rest and compares
+each mode's top-k with the exact float32 cosine top-k:
+
+    halfvec  vectors rounded to half precision (EMBEDDING_STORAGE=halfvec)
+    binary   Hamming candidates over sign bits, re-ranked in half precision
+             (EMBEDDING_STORAGE=binary with RAG_BINARY_RERANK_FACTOR)
+
+Run inside the bot container:
+
+    docker-compose exec bot python -m bot.scripts.embedding_recall
+
+Optional flags:
+    --sample N      Embeddings to sample (default: 20000)
+    --queries N     Sampled embeddings used as queries (default: 200)
+    --k N           Neighbours compared per query (default: 10)
+    --rerank N      Binary candidates per result (default: RAG_BINARY_RERANK_FACTOR or 4)
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from typing import Dict
+
+import numpy as np
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores per row (unordered)."""
+    k = min(k, scores.shape[1])
+    return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+
+def recall_at_k(corpus: np.ndarray, queries: np.ndarray, k: int = 10,
+                mode: str = 'halfvec', rerank_factor: int = 4) -> float:
+    """Fraction of the exact float32 cosine top-k that a storage mode also returns.
+
+    Args:
+        corpus: (n, dims) stored vectors
+        queries: (q, dims) query vectors
+        k: Neighbours per query
+        mode: 'halfvec' or 'binary'
+        rerank_factor: Binary mode candidates per result
+
+    Returns:
+        Mean recall@k over the queries (1.0 = identical result sets)
+    """
+    corpus = _normalize(np.asarray(corpus, dtype=np.float32))
+    queries = _normalize(np.asarray(queries, dtype=np.float32))
+    exact = _top_k(queries @ corpus.T, k)
+
+    half = corpus.astype(np.float16).astype(np.float32)
+    half_queries = queries.astype(np.float16).astype(np.float32)
+    if mode == 'halfvec':
+        found = _top_k(half_queries @ half.T, k)
+    elif mode == 'binary':
+        bits = corpus > 0
+        query_bits = queries > 0
+        # Hamming distance = dims - matching bits
+        matches = query_bits.astype(np.float32) @ bits.T.astype(np.float32)
+        matches += (~query_bits).astype(np.float32) @ (~bits).T.astype(np.float32)
+        candidates = _top_k(matches, k * rerank_factor)
+        reranked = np.einsum('qd,qcd->qc', half_queries, half[candidates])
+        found = np.take_along_axis(candidates, _top_k(reranked, k), axis=1)
+    else:
+        raise ValueError(f"unknown mode: {mode}")
+
+    hits = sum(len(set(e) & set(f)) for e, f in zip(exact.tolist(), found.tolist()))
+    return hits / exact.size
+
+
+def index_bytes(dims: int) -> Dict[str, int]:
+    """Bytes per vector in each mode's HNSW index, before graph overhead.
+
+    Binary mode still stores halfvec rows for the re-rank; only its index is 1 bit per dimension.
+    """
+    return {'vector': 4 * dims + 8, 'halfvec': 2 * dims + 8, 'binary': dims // 8 + 8}
+
+
+def _sample_embeddings(sample: int) -> np.ndarray:
+    from pgvector.psycopg2 import register_vector
+    from database import Database
+
+    db = Database()
+    with db.get_connection() as conn:
+        register_vector(conn)
+        with conn.cursor() as cur:
+            cur.execute("SELECT reltuples FROM pg_class WHERE relname = 'message_embeddings'")
+            estimate = cur.fetchone()[0] or 0
+            # Sample a bit more than needed so LIMIT, not the sample, decides the size
+            percent = min(100.0, 150.0 * sample / max(estimate, 1))
+            cur.execute("""
+                SELECT COALESCE(embedding, embedding_half::vector)
+                FROM message_embeddings TABLESAMPLE SYSTEM (%s)
+                WHERE embedding IS NOT NULL OR embedding_half IS NOT NULL
+                LIMIT %s
+            """, (percent, sample))
+            rows = cur.fetchall()
+    return np.array([row[0].to_numpy() if hasattr(row[0], 'to_numpy') else row[0] for row in rows],
+                    dtype=np.float32)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sample', type=int, default=20000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--rerank', type=int, default=int(os.getenv('RAG_BINARY_RERANK_FACTOR', '4')))
+    args = parser.parse_args(argv)
+
+    vectors = _sample_embeddings(args.sample)
+    if len(vectors) <= args.queries + args.k:
+        print(f"Only {len(vectors)} embeddings sampled; need more than {args.queries + args.k}")
+        return 1
+
+    rng = np.random.default_rng(0)
+    rng.shuffle(vectors)
+    queries, corpus = vectors[:args.queries], vectors[args.queries:]
+    sizes = index_bytes(vectors.shape[1])
+
+    print(f"{len(corpus)} vectors, {len(queries)} queries, recall@{args.k} against exact cosine")
+    print(f"  vector   recall 1.000  {sizes['vector']:>6} index bytes/vector")
+    for mode in ('halfvec', 'binary'):
+        recall = recall_at_k(corpus, queries, args.k, mode, args.rerank)
+        print(f"  {mode:<8} recall {recall:.3f}  {sizes[mode]:>6} index bytes/vector")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
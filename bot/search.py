@@ -5,6 +5,8 @@ import re
 import requests
 from tavily import TavilyClient
 
+from resilience import ProviderUnavailable, ResilientSession, get_provider
+
 logger = logging.getLogger(__name__)
 
 class SearchEngine:
@@ -23,7 +25,9 @@ class SearchEngine:
             self.tavily_client = TavilyClient(api_key=os.getenv('TAVILY_API_KEY'))
 
         # Reusable HTTP session for connection pooling (avoids redundant TCP+TLS handshakes)
-        self.session = requests.Session()
+        # and a circuit breaker so a search outage fails fast instead of stalling replies
+        self.session = ResilientSession('google_search', display_name='Web search', latency_target=5)
+        self._tavily = get_provider('tavily', display_name='Web search', latency_target=8)
 
         logger.info("Search provider: %s", self.provider.upper())
 
@@ -90,6 +94,9 @@ class SearchEngine:
             logger.info("Found %d Google results", len(results))
             return results
 
+        except ProviderUnavailable as e:
+            logger.warning("Google Search skipped: %s", e)
+            return []
         except requests.exceptions.RequestException as e:
             logger.error("Google Search error: %s: %s", type(e).__name__, e)
             return []
@@ -101,11 +108,12 @@ class SearchEngine:
         """Search using Tavily (fallback/default)"""
         try:
             logger.info("Tavily Search: %s", query)
-            response = self.tavily_client.search(
-                query=query,
-                search_depth="advanced",
-                max_results=max_results
-            )
+            with self._tavily.guard():
+                response = self.tavily_client.search(
+                    query=query,
+                    search_depth="advanced",
+                    max_results=max_results
+                )
 
             results = []
             if response and 'results' in response:
@@ -119,6 +127,9 @@ class SearchEngine:
 
             logger.info("Found %d Tavily results", len(results))
             return results
+        except ProviderUnavailable as e:
+            logger.warning("Tavily search skipped: %s", e)
+            return []
         except Exception as e:
             logger.error("Tavily search error: %s: %s", type(e).__name__, e)
             return []
@@ -0,0 +1,132 @@
+"""
+Single-flight coalescing for cache misses.
+
+Cache misses used to be computed by every caller that hit them: ten people running
+/iracing_meta for the same series at once launched ten identical subsession fan-outs
+against the rate-limited iRacing API, and concurrent tool calls repeated the same
+upstream request. A SingleFlight group runs one computation per key; concurrent callers
+for that key await the same task. The task is shielded, so a caller that gives up (or
+is cancelled) doesn't cancel the work the others are waiting on.
+
+refresh() starts a background computation for a key unless one is already running.
+Caches use it for stale-while-revalidate: an expired entry is served immediately while
+a single refresh replaces it.
+
+Across bot replicas (SINGLE_FLIGHT_DISTRIBUTED=true, needs Redis) the computation also
+takes a short Redis lock. A replica that finds the lock held polls `recheck` - normally
+a read of the shared cache - until the leader's value appears, and computes itself only
+if the lock is released without one or SINGLE_FLIGHT_LOCK_WAIT runs out.
+
+Usage:
+    flight = get_flight('iracing_meta')
+    meta = await flight.do(cache_key, lambda: compute_meta(series_id))
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Per-key coalescing of concurrent async computations on one event loop."""
+
+    def __init__(self, name, cache=None):
+        self.name = name
+        self.cache = cache  # RedisCache for the optional cross-replica lock
+        self.distributed = os.getenv('SINGLE_FLIGHT_DISTRIBUTED', 'false').lower() == 'true'
+        self.lock_ttl = float(os.getenv('SINGLE_FLIGHT_LOCK_TTL', '30'))
+        self.lock_wait = float(os.getenv('SINGLE_FLIGHT_LOCK_WAIT', '15'))
+        self.poll_interval = 0.25
+        self._inflight = {}  # key -> asyncio.Task
+        self.stats = {'leaders': 0, 'coalesced': 0, 'refreshes': 0, 'remote_waits': 0, 'errors': 0}
+
+    async def do(self, key, fn, recheck=None):
+        """Run `fn()` once for all concurrent callers of `key` and return its result.
+
+        Args:
+            key: Coalescing key (the cache key of the value being computed)
+            fn: Zero-argument coroutine function computing the value
+            recheck: Optional zero-argument coroutine function returning the value from a
+                shared cache, or None - enables the cross-replica lock when configured
+
+        Exceptions from `fn` propagate to every waiting caller.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._start(key, fn, recheck)
+        else:
+            self.stats['coalesced'] += 1
+        return await asyncio.shield(task)
+
+    def refresh(self, key, fn, recheck=None):
+        """Recompute `key` in the background unless a computation is already running."""
+        if key not in self._inflight:
+            self.stats['refreshes'] += 1
+            self._start(key, fn, recheck)
+
+    def in_flight(self, key) -> bool:
+        return key in self._inflight
+
+    def _start(self, key, fn, recheck):
+        self.stats['leaders'] += 1
+        task = asyncio.ensure_future(self._run(key, fn, recheck))
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._finished(key, t))
+        return task
+
+    def _finished(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            # Retrieved here so a refresh nobody awaits doesn't log "never retrieved"
+            self.stats['errors'] += 1
+            logger.debug("Single-flight %s:%s failed: %s", self.name, key, task.exception())
+
+    async def _run(self, key, fn, recheck):
+        if recheck is None or not self.distributed or self.cache is None or not self.cache.enabled:
+            return await fn()
+
+        lock_key = f"sf:{self.name}:{key}"
+        deadline = time.monotonic() + self.lock_wait
+        token = await self.cache.aacquire_lock(lock_key, self.lock_ttl)
+        while token is False and time.monotonic() < deadline:
+            # Another replica is computing this key: wait for its result
+            self.stats['remote_waits'] += 1
+            await asyncio.sleep(self.poll_interval)
+            value = await recheck()
+            if value is not None:
+                return value
+            token = await self.cache.aacquire_lock(lock_key, self.lock_ttl)
+
+        try:
+            return await fn()
+        finally:
+            if token:
+                await self.cache.arelease_lock(lock_key, token)
+
+    def get_stats(self) -> dict:
+        return {**self.stats, 'in_flight': len(self._inflight)}
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def get_flight(name, cache=None) -> SingleFlight:
+    """Shared SingleFlight group by name (created on first use)."""
+    with _flights_lock:
+        flight = _flights.get(name)
+        if flight is None:
+            flight = _flights[name] = SingleFlight(name, cache)
+        elif cache is not None and flight.cache is None:
+            flight.cache = cache
+        return flight
+
+
+def get_stats():
+    """Per-group coalescing counters (for /health)."""
+    with _flights_lock:
+        return {name: flight.get_stats() for name, flight in _flights.items()}
@@ -11,6 +11,8 @@ from typing import List, Tuple
 from discord.ext import tasks
 import discord
 
+from user_card import rebuild_card
+
 logger = logging.getLogger(__name__)
 
 
@@ -286,61 +288,64 @@ def register_tasks(bot, db, llm, rag, chat_stats, iracing, iracing_popularity_ca
 
                 # Common time ranges to pre-compute
                 time_ranges = [7, 30]  # 7 days, 30 days
+                end_date = datetime.now()
 
-                for days in time_ranges:
-                    start_date = datetime.now() - timedelta(days=days)
-                    end_date = datetime.now()
-
-                    # Get messages once for this time range
-                    messages = chat_stats.get_messages_for_analysis(None, start_date, end_date, exclude_opted_out=True)
+                # Topics and expertise still need message text: stream this guild's longest
+                # window once (server-side cursor, no row cap) and slice the shorter one from it
+                corpus = await asyncio.to_thread(
+                    chat_stats.collect_topic_corpus, end_date - timedelta(days=max(time_ranges)),
+                    end_date, guild_id
+                )
 
-                    if not messages:
-                        continue
-
-                    logger.info("Computing stats for guild %s, last %s days (%s messages)...", guild_id, days, len(messages))
+                for days in time_ranges:
+                    start_date = end_date - timedelta(days=days)
+                    scope = f"server:{guild_id}"
 
-                    # 1. Network stats
+                    # 1-3. Network, primetime and engagement come from the hourly rollups
+                    # (falling back to a message scan while they are still backfilling)
                     try:
-                        scope = f"server:{guild_id}"
-                        network = chat_stats.build_network_graph(messages)
-                        chat_stats.cache_stats('network', scope, start_date, end_date, network, cache_hours=2)
-                        logger.info("Network stats cached (last %s days)", days)
+                        network = await asyncio.to_thread(chat_stats.get_network, guild_id, start_date, end_date)
+                        if network:
+                            chat_stats.cache_stats('network', scope, start_date, end_date, network, cache_hours=2)
+                            logger.info("Network stats cached for guild %s (last %s days)", guild_id, days)
                     except Exception as e:
                         logger.error("Network stats failed: %s", e)
 
-                    # 2. Topic trends
                     try:
-                        scope = f"server:{guild_id}"
-                        topics = chat_stats.extract_topics_tfidf(messages, top_n=15)
-                        if topics:
-                            chat_stats.cache_stats('topics', scope, start_date, end_date, topics, cache_hours=2)
-                            logger.info("Topic trends cached (last %s days)", days)
+                        primetime = await asyncio.to_thread(chat_stats.get_primetime, guild_id, start_date, end_date)
+                        if primetime:
+                            chat_stats.cache_stats('primetime', scope, start_date, end_date, primetime, cache_hours=2)
+                            logger.info("Primetime stats cached for guild %s (last %s days)", guild_id, days)
                     except Exception as e:
-                        logger.error("Topic trends failed: %s", e)
+                        logger.error("Primetime stats failed: %s", e)
 
-                    # 3. Primetime (server-wide)
                     try:
-                        scope = f"server:{guild_id}"
-                        primetime = chat_stats.calculate_primetime(messages)
-                        chat_stats.cache_stats('primetime', scope, start_date, end_date, primetime, cache_hours=2)
-                        logger.info("Primetime stats cached (last %s days)", days)
+                        engagement = await asyncio.to_thread(chat_stats.get_engagement, guild_id, start_date, end_date)
+                        if engagement:
+                            chat_stats.cache_stats('engagement', f"server_engagement:{guild_id}",
+                                                   start_date, end_date, engagement, cache_hours=2)
+                            logger.info("Engagement stats cached for guild %s (last %s days)", guild_id, days)
                     except Exception as e:
-                        logger.error("Primetime stats failed: %s", e)
+                        logger.error("Engagement stats failed: %s", e)
+
+                    window = corpus if days == max(time_ranges) else corpus.since(start_date)
+                    if not window.texts:
+                        continue
 
-                    # 4. Engagement (server-wide)
+                    # 4. Topic trends
                     try:
-                        scope = f"server_engagement:{guild_id}"
-                        engagement = chat_stats.calculate_engagement(messages)
-                        chat_stats.cache_stats('engagement', scope, start_date, end_date, engagement, cache_hours=2)
-                        logger.info("Engagement stats cached (last %s days)", days)
+                        topics = await asyncio.to_thread(chat_stats.extract_topics_tfidf, window, 15)
+                        if topics:
+                            chat_stats.cache_stats('topics', scope, start_date, end_date, topics, cache_hours=2)
+                            logger.info("Topic trends cached for guild %s (last %s days, %s messages)", guild_id, days, len(window.texts))
                     except Exception as e:
-                        logger.error("Engagement stats failed: %s", e)
+                        logger.error("Topic trends failed: %s", e)
 
                     # 5. User topic expertise (only for 30-day range to avoid redundant work)
                     if days == 30:
                         try:
-                            expertise_entries = chat_stats.compute_user_topic_expertise(
-                                messages, guild_id, min_messages=5, top_n=10
+                            expertise_entries = await asyncio.to_thread(
+                                chat_stats.compute_user_topic_expertise, corpus, guild_id, 5, 10
                             )
                             if expertise_entries:
                                 db.batch_upsert_topic_expertise(expertise_entries)
@@ -362,6 +367,58 @@ def register_tasks(bot, db, llm, rag, chat_stats, iracing, iracing_popularity_ca
         await bot.wait_until_ready()
         logger.info("Background stats computation task started")
 
+    @tasks.loop(minutes=10)
+    async def update_stats_rollups():
+        """Fold newly stored messages into the hourly stats rollups (watermark-driven)"""
+        if not chat_stats.rollups.enabled:
+            return
+
+        try:
+            count = await asyncio.to_thread(chat_stats.rollups.update)
+            if count:
+                logger.info("Stats rollups updated (%s messages)", count)
+        except Exception as e:
+            logger.error("Error updating stats rollups: %s", e)
+
+    @update_stats_rollups.before_loop
+    async def before_update_stats_rollups():
+        """Wait for bot to be ready before starting rollup maintenance"""
+        await bot.wait_until_ready()
+        logger.info("Stats rollup task started (runs every 10 min)")
+
+    @tasks.loop(minutes=30)
+    async def update_topic_models():
+        """Fold newly stored messages into the per-guild topic document frequencies"""
+        if not chat_stats.topic_models.enabled:
+            return
+
+        try:
+            count = await asyncio.to_thread(chat_stats.topic_models.update)
+            if count:
+                logger.info("Topic models updated (%s messages)", count)
+        except Exception as e:
+            logger.error("Error updating topic models: %s", e)
+
+    @update_topic_models.before_loop
+    async def before_update_topic_models():
+        """Wait for bot to be ready before starting topic model maintenance"""
+        await bot.wait_until_ready()
+        logger.info("Topic model task started (runs every 30 min)")
+
+    @tasks.loop(seconds=30)
+    async def flush_rate_limit_audit():
+        """Write queued token/feature uses to the rate limit audit tables"""
+        try:
+            await asyncio.to_thread(db.rate_limiter.flush_audit)
+        except Exception as e:
+            logger.error("Error flushing rate limit audit rows: %s", e)
+
+    @flush_rate_limit_audit.before_loop
+    async def before_flush_rate_limit_audit():
+        """Wait for bot to be ready before starting the audit flush"""
+        await bot.wait_until_ready()
+        logger.info("Rate limit audit flush started (runs every 30 sec)")
+
     # Background task for checking reminders
     @tasks.loop(minutes=1)  # Check every minute
     async def check_reminders():
@@ -539,6 +596,9 @@ def register_tasks(bot, db, llm, rag, chat_stats, iracing, iracing_popularity_ca
             deletions_processed = privacy_manager.process_scheduled_deletions()
             if deletions_processed > 0:
                 logger.info("Processed %s scheduled user deletions", deletions_processed)
+                # Deleted users' messages may be cached in the local vector tier
+                if rag.local_index is not None:
+                    rag.local_index.clear()
 
             # Clean up old data based on retention policies
             cleanup_counts = privacy_manager.cleanup_old_data()
@@ -621,6 +681,7 @@ def register_tasks(bot, db, llm, rag, chat_stats, iracing, iracing_popularity_ca
                         period_start,
                         period_end
                     )
+                    await rebuild_card(db, user['user_id'])
                     analyzed_count += 1
 
                     # Rate limit to avoid overwhelming the API
@@ -652,12 +713,17 @@ def register_tasks(bot, db, llm, rag, chat_stats, iracing, iracing_popularity_ca
             return
 
         try:
-            # Process up to 100 messages per run
-            count = await rag.process_embedding_queue(limit=100)
+            # Batch size grows with the queue depth (see RAGSystem.drain_embedding_queue)
+            count = await rag.drain_embedding_queue()
 
             if count > 0:
                 logger.info("Processed %s message embeddings", count)
 
+            # Moves existing vectors into the EMBEDDING_STORAGE layout (no-op once done)
+            converted = await rag.convert_embedding_storage()
+            if converted > 0:
+                logger.info("Converted %s embeddings to %s storage", converted, rag.embedding_storage)
+
             if db:
                 db.update_job_last_run("process_embeddings")
 
@@ -669,7 +735,36 @@ def register_tasks(bot, db, llm, rag, chat_stats, iracing, iracing_popularity_ca
         """Wait for bot to be ready before starting embedding processing"""
         await bot.wait_until_ready()
         if rag.enabled:
+            rag.embedding_policy.bot_user_id = bot.user.id
             logger.info("Message embedding task started (runs every 5 min)")
+            if rag.local_index is not None:
+                asyncio.create_task(rag.warm_local_index())
+
+    @tasks.loop(minutes=15)
+    async def update_channel_summaries():
+        """Fold new messages into rolling hour/day/week channel summaries"""
+        if not rag.enabled:
+            return
+
+        if not await _job_guard("update_channel_summaries", timedelta(minutes=15), jitter_seconds=60):
+            return
+
+        try:
+            updated = await rag.summaries.run()
+            if updated > 0:
+                logger.info("Updated %s rolling channel summaries", updated)
+
+            if db:
+                db.update_job_last_run("update_channel_summaries")
+
+        except Exception as e:
+            logger.error("Error updating channel summaries: %s", e)
+
+    @update_channel_summaries.before_loop
+    async def before_update_channel_summaries():
+        await bot.wait_until_ready()
+        if rag.enabled:
+            logger.info("Rolling channel summary task started (runs every 15 min)")
 
     # Background task for team event reminders
     @tasks.loop(minutes=15)
@@ -1097,12 +1192,16 @@ def register_tasks(bot, db, llm, rag, chat_stats, iracing, iracing_popularity_ca
         'update_iracing_popularity': update_iracing_popularity,
         'snapshot_participation_data': snapshot_participation_data,
         'precompute_stats': precompute_stats,
+        'update_stats_rollups': update_stats_rollups,
+        'update_topic_models': update_topic_models,
+        'flush_rate_limit_audit': flush_rate_limit_audit,
         'check_reminders': check_reminders,
         'check_event_reminders': check_event_reminders,
         'check_team_event_reminders': check_team_event_reminders,
         'gdpr_cleanup': gdpr_cleanup,
         'analyze_user_behavior': analyze_user_behavior,
-        'process_embeddings': process_embeddings
+        'process_embeddings': process_embeddings,
+        'update_channel_summaries': update_channel_summaries
     }
 
     if poll_system:
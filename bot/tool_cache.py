@@ -0,0 +1,165 @@
+"""
+Tool Result Cache
+Caches LLM tool results by tool and normalized arguments, with a TTL per tool.
+
+The agent loop often calls the same lookup several times in one conversation (the
+same definition, exchange rate or score), and each call used to reach the external
+API unless its handler happened to cache it. ToolExecutor declares a policy per
+cacheable tool, a TTL and a key function, and execute_tool answers repeats from
+here before dispatching to the handler. Key functions normalize per argument:
+identifiers (tickers, units, language codes, words) go through ident_part(), so case and
+spacing don't split the cache; free text and queries go through text_part() and are kept
+exactly as given, since case and spacing can change the result.
+
+Results are stored in Redis (orjson-encoded, under a short hashed key). When Redis is
+disabled or a write fails, they go to a bounded in-process LRU instead. Only successful
+results are cached, so a failed lookup is retried on the next call.
+
+Per-tool counters (hits, misses, hit ratio, average upstream latency and the estimated
+latency saved) appear under `tool_cache` in the /health response.
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from redis_cache import get_cache
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+# (ttl_seconds, key_fn): key_fn maps the tool arguments to the already-normalized
+# parts (ident_part/text_part) that identify the result, or returns None to bypass the cache
+CachePolicy = Tuple[int, Callable[[Dict[str, Any]], Optional[tuple]]]
+
+
+def ident_part(value: Any) -> str:
+    """Key part for an identifier: case-folded, whitespace collapsed."""
+    return _WHITESPACE.sub(" ", text_part(value)).strip().casefold()
+
+
+def text_part(value: Any) -> str:
+    """Key part for free text or a query: kept exactly as given."""
+    return "" if value is None else str(value)
+
+
+class ToolResultCache:
+    """TTL cache for tool results: Redis first, in-process LRU as the fallback"""
+
+    def __init__(self, cache=None):
+        self.cache = cache if cache is not None else get_cache()
+        self.enabled = os.getenv('TOOL_CACHE_ENABLED', 'true').lower() == 'true'
+        self.max_local_entries = int(os.getenv('TOOL_CACHE_LOCAL_MAX_ENTRIES', '1024'))
+        self._local = OrderedDict()  # key -> (expires_monotonic, result)
+        self._lock = threading.Lock()
+        self._stats = {}  # tool -> counters
+
+    def make_key(self, tool: str, policy: CachePolicy, args: Dict[str, Any]) -> Optional[str]:
+        """Cache key for a call, or None when the tool isn't cached for these arguments."""
+        if not self.enabled:
+            return None
+        try:
+            parts = policy[1](args)
+        except (KeyError, TypeError, AttributeError, ValueError):
+            return None  # malformed arguments: let the handler report the error
+        if parts is None:
+            return None
+        raw = "\x1f".join(text_part(p) for p in parts)
+        digest = hashlib.sha256(raw.encode()).hexdigest()[:32]
+        return f"tool:{tool}:{digest}"
+
+    async def get(self, tool: str, key: str) -> Optional[Dict[str, Any]]:
+        """Cached result for `key`, counting the hit or miss against `tool`."""
+        result = self._local_get(key)
+        if result is None and self.cache.enabled:
+            result = await self.cache.aget(key)
+        stats = self._tool_stats(tool)
+        if result is None:
+            stats['misses'] += 1
+            return None
+        stats['hits'] += 1
+        logger.debug("Tool cache hit: %s", tool)
+        return dict(result)
+
+    async def compute(self, tool: str, key: str, ttl: int, fn) -> Dict[str, Any]:
+        """Run the handler coroutine `fn()`, timing it and caching a successful result."""
+        started = time.monotonic()
+        result = await fn()
+        stats = self._tool_stats(tool)
+        stats['computed'] += 1
+        stats['compute_seconds'] += time.monotonic() - started
+
+        if isinstance(result, dict) and result.get("success"):
+            stored = await self.cache.aset(key, result, ttl=ttl) if self.cache.enabled else False
+            if not stored:
+                self._local_set(key, result, ttl)
+        return result
+
+    def _local_get(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return entry[1]
+
+    def _local_set(self, key, result, ttl):
+        with self._lock:
+            self._local[key] = (time.monotonic() + ttl, result)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_local_entries:
+                self._local.popitem(last=False)
+
+    def _tool_stats(self, tool):
+        stats = self._stats.get(tool)
+        if stats is None:
+            stats = self._stats[tool] = {'hits': 0, 'misses': 0, 'computed': 0, 'compute_seconds': 0.0}
+        return stats
+
+    def get_stats(self) -> dict:
+        tools = {}
+        for tool, s in sorted(self._stats.items()):
+            lookups = s['hits'] + s['misses']
+            avg = s['compute_seconds'] / s['computed'] if s['computed'] else 0.0
+            tools[tool] = {
+                'hits': s['hits'],
+                'misses': s['misses'],
+                'hit_ratio': round(s['hits'] / lookups, 3) if lookups else 0.0,
+                'avg_latency_ms': round(avg * 1000, 1),
+                # Each hit skipped one upstream call of about the average latency
+                'saved_seconds': round(s['hits'] * avg, 2),
+            }
+        with self._lock:
+            local_entries = len(self._local)
+        return {
+            'enabled': self.enabled,
+            'backend': 'redis' if self.cache.enabled else 'local',
+            'local_entries': local_entries,
+            'tools': tools,
+        }
+
+
+_tool_cache = None
+_tool_cache_lock = threading.Lock()
+
+
+def get_tool_cache() -> ToolResultCache:
+    """Shared tool result cache (created on first use)."""
+    global _tool_cache
+    with _tool_cache_lock:
+        if _tool_cache is None:
+            _tool_cache = ToolResultCache()
+        return _tool_cache
+
+
+def get_stats():
+    """Per-tool hit ratios and latency saved (for /health)."""
+    return get_tool_cache().get_stats()
@@ -17,6 +17,9 @@ import pytz
 import requests
 from bs4 import BeautifulSoup
 from redis_cache import get_cache
+from resilience import ResilientSession
+from single_flight import get_flight
+from tool_cache import get_tool_cache, ident_part, text_part
 from constants import TIMEZONE_ALIASES, LANGUAGE_CODES, STOCK_TICKERS, CRYPTO_TICKERS
 
 logger = logging.getLogger(__name__)
@@ -50,7 +53,8 @@ class ToolExecutor:
         self.cache = get_cache()
 
         # Reusable HTTP session for connection pooling (avoids redundant TCP+TLS handshakes)
-        self.session = requests.Session()
+        # with a circuit breaker + concurrency limit per API host (see resilience.py)
+        self.session = ResilientSession()
         self.session.headers.update({"User-Agent": "WompBot/1.0"})
 
         # Common timezone aliases (centralised in constants.py)
@@ -92,6 +96,29 @@ class ToolExecutor:
             "user_stats":             (self._user_stats, ("channel_id", "user_id", "guild_id")),
         }
 
+        # Result cache policies: maps function name to (ttl_seconds, key_fn)
+        # key_fn picks the arguments that identify a result; execute_tool answers repeat
+        # calls from the tool cache before dispatching (see tool_cache.py)
+        self._cache_policies = {
+            # ident_part: case/spacing-insensitive identifiers; text_part: free text kept as given
+            "define_word":            (7 * 86400, lambda a: (ident_part(a["word"]),)),
+            "translate":              (7 * 86400, lambda a: (text_part(a["text"]), ident_part(a["target_language"]), ident_part(a.get("source_language")))),
+            "movie_info":             (86400, lambda a: (ident_part(a["title"]), ident_part(a.get("year")))),
+            "web_search":             (7200, lambda a: (text_part(a["query"]),)),
+            "wolfram_query":          (3600, lambda a: (text_part(a["query"]),)),
+            "wikipedia":              (3600, lambda a: (text_part(a["query"]),)),
+            "youtube_search":         (3600, lambda a: (text_part(a["query"]), ident_part(a.get("max_results", 3)))),
+            "currency_convert":       (3600, lambda a: (ident_part(a["amount"]), ident_part(a["from_currency"]), ident_part(a["to_currency"]))),
+            "sports_scores":          (60, lambda a: (ident_part(a["sport"]), ident_part(a.get("league")), ident_part(a.get("team")))),
+            "stock_price":            (30, lambda a: (ident_part(a["symbol"]),)),
+        }
+        self.tool_cache = get_tool_cache()
+
+        # Identical concurrent calls (same arguments and context) share one upstream
+        # request instead of each missing the cache (see single_flight.py)
+        self._coalesced_tools = set(self._cache_policies) | {"get_weather_forecast"}
+        self._flight = get_flight('tools')
+
     def _cache_key(self, prefix: str, *args) -> str:
         """Generate a deterministic cache key from a prefix and arguments."""
         raw = f"{prefix}:{':'.join(str(a).lower().strip() for a in args)}"
@@ -154,7 +181,22 @@ class ToolExecutor:
                     "guild_id": guild_id,
                 }
                 call_args = [arguments] + [context_map[k] for k in extra_keys]
-                return await handler(*call_args)
+                run = lambda: handler(*call_args)
+
+                policy = self._cache_policies.get(function_name)
+                result_key = policy and self.tool_cache.make_key(function_name, policy, arguments)
+                if result_key:
+                    cached = await self.tool_cache.get(function_name, result_key)
+                    if cached is not None:
+                        return cached
+                    handler_run = run
+                    run = lambda: self.tool_cache.compute(function_name, result_key, policy[0], handler_run)
+
+                if function_name in self._coalesced_tools:
+                    flight_key = result_key or self._cache_key(function_name, json.dumps(call_args, sort_keys=True, default=str))
+                    result = await self._flight.do(flight_key, run)
+                    return dict(result)  # callers may annotate their copy
+                return await run()
             else:
                 return {
                     "success": False,
@@ -328,19 +370,12 @@ class ToolExecutor:
     # ========== Computational Tools ==========
 
     async def _wolfram_query(self, args: Dict[str, Any]) -> Dict[str, Any]:
-        """Execute Wolfram Alpha query with both metric and imperial units (cached 1 hour)"""
+        """Execute Wolfram Alpha query with both metric and imperial units"""
         if not self.wolfram:
             return {"success": False, "error": "Wolfram Alpha not configured"}
 
         query = args["query"]
 
-        # Check cache first (1-hour TTL)
-        cache_key = self._cache_key("wolfram", query)
-        cached = self.cache.get(cache_key)
-        if cached:
-            logger.debug("Wolfram cache hit: %s", query)
-            return cached
-
         # Query with both metric and imperial units (run in threads to not block event loop)
         import asyncio
         metric_result, imperial_result = await asyncio.gather(
@@ -361,7 +396,6 @@ class ToolExecutor:
             # Answers are the same or imperial failed - just show metric
             result = {"success": True, "type": "text", "text": metric_result["answer"], "description": f"Wolfram Alpha: {query}"}
 
-        self.cache.set(cache_key, result, ttl=3600)  # 1 hour
         return result
 
     async def _get_weather(self, args: Dict[str, Any], user_id: Optional[int] = None) -> Dict[str, Any]:
@@ -392,14 +426,14 @@ class ToolExecutor:
 
         # Cache the raw weather API data (30-min TTL) to avoid repeated API calls
         cache_key = self._cache_key("weather", location, units)
-        cached_data = self.cache.get(cache_key)
+        cached_data = await self.cache.aget(cache_key)
         if cached_data:
             logger.debug("Weather cache hit: %s", location)
             result = cached_data
         else:
             result = await asyncio.to_thread(self.weather.get_current_weather, location, units)
             if result.get("success"):
-                self.cache.set(cache_key, result, ttl=1800)  # 30 minutes
+                await self.cache.aset(cache_key, result, ttl=1800)  # 30 minutes
 
         if result["success"]:
             # Extract temperatures and convert for dual unit display
@@ -483,7 +517,7 @@ class ToolExecutor:
 
         # Cache forecast data (30-min TTL)
         cache_key = self._cache_key("forecast", location, units, days)
-        cached = self.cache.get(cache_key)
+        cached = await self.cache.aget(cache_key)
         if cached:
             logger.debug("Forecast cache hit: %s", location)
             return cached
@@ -492,13 +526,13 @@ class ToolExecutor:
 
         if result["success"]:
             response = {"success": True, "type": "text", "text": result["summary"], "description": f"{days}-day forecast for {location}"}
-            self.cache.set(cache_key, response, ttl=1800)  # 30 minutes
+            await self.cache.aset(cache_key, response, ttl=1800)  # 30 minutes
             return response
         else:
             return {"success": False, "error": result.get("error", "Forecast query failed")}
 
     async def _web_search(self, args: Dict[str, Any]) -> Dict[str, Any]:
-        """Perform web search and return formatted results (cached 2 hours)"""
+        """Perform web search and return formatted results"""
         import asyncio
 
         if not self.search:
@@ -506,13 +540,6 @@ class ToolExecutor:
 
         query = args["query"]
 
-        # Check cache first (2-hour TTL)
-        cache_key = self._cache_key("search", query)
-        cached = self.cache.get(cache_key)
-        if cached:
-            logger.debug("Search cache hit: %s", query)
-            return cached
-
         try:
             # Run search in thread pool (search.search() is blocking)
             search_results_raw = await asyncio.to_thread(self.search.search, query)
@@ -529,7 +556,6 @@ class ToolExecutor:
                 "text": search_results,
                 "description": f"Web search: {query}"
             }
-            self.cache.set(cache_key, result, ttl=7200)  # 2 hours
             return result
         except Exception as e:
             return {"success": False, "error": f"Search failed: {str(e)}"}
@@ -694,18 +720,11 @@ class ToolExecutor:
         return {"success": False, "error": "Translation service unavailable. Try again later."}
 
     async def _wikipedia(self, args: Dict[str, Any]) -> Dict[str, Any]:
-        """Look up information on Wikipedia (cached 1 hour)"""
+        """Look up information on Wikipedia"""
         import asyncio
 
         query = args["query"]
 
-        # Check cache first (1-hour TTL — Wikipedia content is stable)
-        cache_key = self._cache_key("wiki", query)
-        cached = self.cache.get(cache_key)
-        if cached:
-            logger.debug("Wikipedia cache hit: %s", query)
-            return cached
-
         try:
             headers = {'User-Agent': 'WompBot/1.0 (Discord Bot; educational project)'}
 
@@ -756,7 +775,6 @@ class ToolExecutor:
                 "text": text,
                 "description": f"Wikipedia: {title}"
             }
-            self.cache.set(cache_key, result, ttl=3600)  # 1 hour
             return result
 
         except Exception as e:
@@ -1211,19 +1229,12 @@ class ToolExecutor:
             return {"success": False, "error": f"Failed to create reminder: {str(e)}"}
 
     async def _stock_price(self, args: Dict[str, Any]) -> Dict[str, Any]:
-        """Get stock or crypto price using Finnhub (stocks) and CoinGecko (crypto) (cached 5 min)"""
+        """Get stock or crypto price using Finnhub (stocks) and CoinGecko (crypto)"""
         import asyncio
         import os
 
         query = args["symbol"].upper()
 
-        # Check cache first (5-min TTL — prices change but not second-by-second for Discord)
-        cache_key = self._cache_key("stock", query)
-        cached = self.cache.get(cache_key)
-        if cached:
-            logger.debug("Stock cache hit: %s", query)
-            return cached
-
         # Check if it's a crypto (centralised in constants.py)
         coingecko_id = CRYPTO_TICKERS.get(query)
         if coingecko_id:
@@ -1271,7 +1282,6 @@ class ToolExecutor:
                 "text": text,
                 "description": f"Stock price: {symbol}"
             }
-            self.cache.set(cache_key, result, ttl=300)  # 5 minutes
             return result
 
         except Exception as e:
@@ -1380,16 +1390,9 @@ class ToolExecutor:
             return {"success": False, "error": f"Stock history lookup failed: {str(e)}"}
 
     async def _fetch_crypto_price_tool(self, coingecko_id: str, display_symbol: str) -> Dict[str, Any]:
-        """Fetch crypto price from CoinGecko for tool executor (cached 5 min)"""
+        """Fetch crypto price from CoinGecko for tool executor"""
         import asyncio
 
-        # Check cache (shares the stock cache namespace with 5-min TTL)
-        cache_key = self._cache_key("stock", display_symbol)
-        cached = self.cache.get(cache_key)
-        if cached:
-            logger.debug("Crypto cache hit: %s", display_symbol)
-            return cached
-
         try:
             def fetch():
                 url = f"https://api.coingecko.com/api/v3/simple/price?ids={coingecko_id}&vs_currencies=usd&include_24hr_change=true&include_market_cap=true"
@@ -1422,27 +1425,19 @@ class ToolExecutor:
                 "text": text,
                 "description": f"Crypto price: {display_symbol}"
             }
-            self.cache.set(cache_key, result, ttl=300)  # 5 minutes
             return result
 
         except Exception as e:
             return {"success": False, "error": f"Crypto lookup failed: {str(e)}"}
 
     async def _movie_info(self, args: Dict[str, Any]) -> Dict[str, Any]:
-        """Get movie/TV show info from OMDB (cached 24 hours)"""
+        """Get movie/TV show info from OMDB"""
         import asyncio
         import os
 
         title = args["title"]
         year = args.get("year")
 
-        # Check cache (24-hour TTL — movie data is very stable)
-        cache_key = self._cache_key("movie", title, year or "")
-        cached = self.cache.get(cache_key)
-        if cached:
-            logger.debug("Movie cache hit: %s", title)
-            return cached
-
         omdb_key = os.getenv("OMDB_API_KEY")
         if not omdb_key:
             # Try web search as fallback
@@ -1475,25 +1470,17 @@ class ToolExecutor:
                 "text": text,
                 "description": f"Movie info: {title}"
             }
-            self.cache.set(cache_key, result, ttl=86400)  # 24 hours
             return result
 
         except Exception as e:
             return {"success": False, "error": f"Movie lookup failed: {str(e)}"}
 
     async def _define_word(self, args: Dict[str, Any]) -> Dict[str, Any]:
-        """Get dictionary definition (cached 24 hours)"""
+        """Get dictionary definition"""
         import asyncio
 
         word = args["word"].lower().strip()
 
-        # Check cache (24-hour TTL — definitions don't change)
-        cache_key = self._cache_key("define", word)
-        cached = self.cache.get(cache_key)
-        if cached:
-            logger.debug("Definition cache hit: %s", word)
-            return cached
-
         try:
             def do_fetch():
                 from urllib.parse import quote
@@ -1544,7 +1531,6 @@ class ToolExecutor:
                 "text": result.strip(),
                 "description": f"Definition: {word}"
             }
-            self.cache.set(cache_key, response, ttl=86400)  # 24 hours
             return response
 
         except Exception as e:
@@ -1587,13 +1573,6 @@ class ToolExecutor:
         from_curr = currency_aliases.get(from_curr, from_curr)
         to_curr = currency_aliases.get(to_curr, to_curr)
 
-        # Check cache first (30-min TTL)
-        cache_key = self._cache_key("currency", from_curr, to_curr, str(amount))
-        cached = self.cache.get(cache_key)
-        if cached:
-            logger.debug("Currency cache hit: %s->%s", from_curr, to_curr)
-            return cached
-
         try:
             def do_convert():
                 # Frankfurter API - free, no key required. Pass params via dict so requests
@@ -1638,27 +1617,19 @@ class ToolExecutor:
                 "text": text,
                 "description": f"Currency: {from_curr} to {to_curr}"
             }
-            self.cache.set(cache_key, result, ttl=1800)  # 30 minutes
             return result
 
         except Exception as e:
             return {"success": False, "error": f"Currency conversion failed: {str(e)}"}
 
     async def _sports_scores(self, args: Dict[str, Any]) -> Dict[str, Any]:
-        """Get sports scores from ESPN API (no key needed, cached 5 min)"""
+        """Get sports scores from ESPN API (no key needed)"""
         import asyncio
 
         sport = args["sport"].lower()
         league = args.get("league", "")
         team_filter = args.get("team", "").lower()
 
-        # Check cache (5-min TTL — scores change but not second-by-second)
-        cache_key = self._cache_key("sports", sport, league, team_filter)
-        cached = self.cache.get(cache_key)
-        if cached:
-            logger.debug("Sports cache hit: %s %s", sport, team_filter)
-            return cached
-
         # Map sport to ESPN API endpoint
         sport_endpoints = {
             "nfl": "football/nfl",
@@ -1773,7 +1744,6 @@ class ToolExecutor:
                 "text": result_text,
                 "description": f"{sport.upper()} scores"
             }
-            self.cache.set(cache_key, result, ttl=300)  # 5 minutes
             return result
 
         except Exception as e:
@@ -0,0 +1,110 @@
+"""
+Pre-rendered user context cards.
+
+A mention used to fetch the user's profile and latest behavior analysis (cached in
+Redis for an hour), read their facts in the RAG lookup, and then format both into
+prompt text on every call. The card is that text, rendered once with its token count
+and stored in Redis under one key (`user_card:{user_id}`, USER_CARD_TTL):
+
+    {'text': "\\n\\n## HISTORICAL USER CONTEXT for ...", 'tokens': 142}
+
+Cards are rebuilt when their inputs change. That happens when analyze_user_behavior
+stores an analysis or an explicit fact is stored or deleted. RAGSystem.extract_user_facts
+rebuilds it too, though nothing on the message path calls that yet. A missing card
+(expired, evicted, Redis down) is built on the mention that needs it. Profiles,
+behavior and facts aren't scoped to a guild in this schema, so there is one card per
+user.
+
+Build and hit counters appear under `user_cards` in the /health response.
+"""
+import asyncio
+import logging
+import os
+from typing import Dict, List, Optional
+
+from psycopg2.extras import RealDictCursor
+
+from prompt_builder import count_tokens, format_user_context
+from redis_cache import get_cache
+
+logger = logging.getLogger(__name__)
+
+CARD_TTL = int(os.getenv('USER_CARD_TTL', '86400'))
+CARD_FACTS = int(os.getenv('USER_CARD_FACTS', '10'))
+
+_stats = {'hits': 0, 'builds': 0, 'rebuilds': 0, 'errors': 0}
+
+
+def card_key(user_id: int) -> str:
+    return f"user_card:{user_id}"
+
+
+def render_card(profile: Optional[Dict], behavior: Optional[Dict], facts: List[Dict]) -> str:
+    """System-prompt block for a user: behavior profile, then their strongest facts."""
+    text = format_user_context(profile, behavior) if profile and behavior else ""
+    if facts:
+        text += "\n**Known Facts About User:**\n"
+        for fact in facts[:CARD_FACTS]:
+            confidence = float(fact.get('confidence') or 0.8)
+            text += f"- {fact['fact']} (confidence: {confidence:.0%})\n"
+    return text
+
+
+def build_card_sync(db, user_id: int) -> Dict:
+    """Render a user's card from the database (worker thread)."""
+    with db.get_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("SELECT * FROM user_profiles WHERE user_id = %s", (user_id,))
+            profile = cur.fetchone()
+            cur.execute("""
+                SELECT * FROM user_behavior
+                WHERE user_id = %s
+                ORDER BY analyzed_at DESC
+                LIMIT 1
+            """, (user_id,))
+            behavior = cur.fetchone()
+            cur.execute("""
+                SELECT fact, confidence, mention_count
+                FROM user_facts
+                WHERE user_id = %s
+                ORDER BY confidence DESC, mention_count DESC
+                LIMIT %s
+            """, (user_id, CARD_FACTS))
+            facts = cur.fetchall()
+    text = render_card(profile, behavior, facts)
+    return {'text': text, 'tokens': count_tokens(text)}
+
+
+async def get_card(db, user_id: int, cached: Optional[Dict] = None) -> Optional[Dict]:
+    """A user's card: `cached` (from a batched cache lookup) if given, else built and stored."""
+    if cached is not None:
+        _stats['hits'] += 1
+        return cached
+    try:
+        card = await asyncio.to_thread(build_card_sync, db, user_id)
+    except Exception as e:
+        _stats['errors'] += 1
+        logger.error("Error building user card for %s: %s", user_id, e)
+        return None
+    _stats['builds'] += 1
+    await get_cache().aset(card_key(user_id), card, ttl=CARD_TTL)
+    return card
+
+
+async def rebuild_card(db, user_id: int):
+    """Re-render a user's card after its inputs changed (fails open: the stale card is dropped)."""
+    cache = get_cache()
+    try:
+        card = await asyncio.to_thread(build_card_sync, db, user_id)
+        await cache.aset(card_key(user_id), card, ttl=CARD_TTL)
+        _stats['rebuilds'] += 1
+    except Exception as e:
+        _stats['errors'] += 1
+        logger.warning("Error rebuilding user card for %s: %s", user_id, e)
+        await cache.adelete(card_key(user_id))
+
+
+def get_stats() -> Dict:
+    """Card cache counters (for /health)."""
+    lookups = _stats['hits'] + _stats['builds']
+    return {**_stats, 'hit_ratio': round(_stats['hits'] / lookups, 3) if lookups else 0.0}
@@ -6,6 +6,8 @@ import requests
 from typing import Optional, Dict, Any
 from datetime import datetime
 
+from resilience import ProviderUnavailable, ResilientSession
+
 
 class Weather:
     """
@@ -30,7 +32,8 @@ class Weather:
         self.geo_url = "https://api.openweathermap.org/geo/1.0"
 
         # Reusable HTTP session for connection pooling (avoids redundant TCP+TLS handshakes)
-        self.session = requests.Session()
+        # and a circuit breaker so an OpenWeatherMap outage fails fast
+        self.session = ResilientSession('openweathermap', display_name='The weather service', latency_target=5)
 
         # US state abbreviations for location normalization
         self.us_states = {
@@ -227,6 +230,12 @@ class Weather:
 
             return weather_info
 
+        except ProviderUnavailable as e:
+            return {
+                'success': False,
+                'error': e.user_message,
+                'location': location
+            }
         except requests.Timeout:
             return {
                 'success': False,
@@ -325,6 +334,12 @@ class Weather:
                 'summary': summary.strip()
             }
 
+        except ProviderUnavailable as e:
+            return {
+                'success': False,
+                'error': e.user_message,
+                'location': location
+            }
         except requests.Timeout:
             return {
                 'success': False,
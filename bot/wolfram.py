@@ -6,6 +6,8 @@ import requests
 from typing import Optional, Dict, Any
 import urllib.parse
 
+from resilience import ProviderUnavailable, ResilientSession
+
 
 class WolframAlpha:
     """
@@ -30,7 +32,8 @@ class WolframAlpha:
         self.simple_api_url = "https://api.wolframalpha.com/v1/simple"
 
         # Reusable HTTP session for connection pooling (avoids redundant TCP+TLS handshakes)
-        self.session = requests.Session()
+        # and a circuit breaker so a Wolfram outage fails fast (501 = "not understood", not a failure)
+        self.session = ResilientSession('wolfram', display_name='Wolfram Alpha', latency_target=8)
 
     def query(self, question: str, units: str = "metric") -> Dict[str, Any]:
         """
@@ -80,6 +83,12 @@ class WolframAlpha:
                     'query': question
                 }
 
+        except ProviderUnavailable as e:
+            return {
+                'success': False,
+                'error': e.user_message,
+                'query': question
+            }
         except requests.Timeout:
             return {
                 'success': False,
@@ -0,0 +1,132 @@
+"""Streaming message windows: named-cursor batches, TopicCorpus and MessageColumns.concat."""
+import re
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from features.chat_stats import ChatStatistics, MessageColumns, TopicCorpus  # noqa: E402
+
+COLUMNS = ['message_id', 'user_id', 'username', 'content', 'timestamp', 'channel_id', 'guild_id']
+T0 = datetime(2026, 2, 2, 12, 0)
+
+
+class FakeNamedCursor:
+    def __init__(self, rows, log):
+        self.rows = list(rows)
+        self.log = log
+        self.description = [(name,) for name in COLUMNS]
+        self.itersize = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.log.append('closed')
+
+    def execute(self, query, params):
+        self.log.append((query, params))
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        self.log.append(('fetch', size, self.itersize))
+        return batch
+
+
+class FakeDB:
+    bot_user_id = None
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.log = []
+        self.cursor_names = []
+
+    @contextmanager
+    def get_connection(self):
+        db = self
+
+        class Conn:
+            def cursor(self, name=None):
+                db.cursor_names.append(name)
+                return FakeNamedCursor(db.rows, db.log)
+
+        yield Conn()
+
+
+def make_rows(count):
+    contents = ['ok', 'this is about the race setup', 'https://x.y check this lap time out',
+                '<@5> tuning the gearbox ratios', '   short   ']
+    return [
+        (i, 100 + i % 4, f'user{i % 4}', contents[i % len(contents)],
+         T0 + timedelta(minutes=7 * i), 10 + i % 2, 1)
+        for i in range(count)
+    ]
+
+
+def test_batches_come_from_a_named_cursor_without_a_row_cap(monkeypatch):
+    monkeypatch.setenv('STATS_STREAM_BATCH_SIZE', '100')
+    db = FakeDB(make_rows(250))
+    stats = ChatStatistics(db)
+
+    batches = list(stats.iter_message_batches(None, T0, T0 + timedelta(days=30), guild_id=1))
+
+    assert [len(b) for b in batches] == [100, 100, 50]
+    assert batches[0][0] == dict(zip(COLUMNS, make_rows(1)[0]))
+    assert db.cursor_names == ['chat_stats_messages']
+    query, params = db.log[0]
+    assert 'LIMIT' not in query and params[-1] == 1
+    assert ('fetch', 100, 100) in db.log and db.log[-1] == 'closed'
+
+    # The list API keeps its cap (applied in SQL) and flattens the batches
+    start = len(db.log)
+    messages = stats.get_messages_for_analysis(None, T0, T0, max_messages=40, guild_id=1)
+    query, params = db.log[start]
+    assert 'LIMIT %s' in query and params[-1] == 40
+    assert messages == [m for batch in batches for m in batch]
+
+
+def test_corpus_fed_in_batches_matches_whole_list():
+    messages = [dict(zip(COLUMNS, row)) for row in make_rows(60)]
+    whole = TopicCorpus()
+    whole.add(messages)
+    streamed = TopicCorpus()
+    for i in range(0, len(messages), 7):
+        streamed.add(messages[i:i + 7])
+
+    assert streamed.__dict__ == whole.__dict__
+    assert whole.message_count == 60
+    # Messages under three words after cleaning carry no topic text
+    assert len(whole.texts) == 36
+    assert all('<@' not in t and 'https' not in t for t in whole.texts)
+    # Per-user counters cover messages over 10 characters: [count, total length, with links]
+    assert whole.user_stats[100] == [9, sum(len(m['content']) for m in messages
+                                            if m['user_id'] == 100 and len(m['content'].strip()) > 10),
+                                     sum('http' in m['content'] for m in messages if m['user_id'] == 100)]
+
+
+def test_since_keeps_the_later_texts():
+    corpus = TopicCorpus()
+    corpus.add(dict(zip(COLUMNS, row)) for row in make_rows(60))
+    cutoff = T0 + timedelta(minutes=7 * 30)
+    recent = corpus.since(cutoff)
+    assert recent.texts == [t for t, ts in zip(corpus.texts, corpus.timestamps) if ts >= cutoff]
+    assert recent.user_stats == {}
+
+
+def test_concatenated_columns_match_one_window():
+    rows = [
+        (100 + i % 3, f'user{i % 3}', 10 + i % 2, i * 60_000_000, i % 17,
+         re.findall(r'<@!?(\d+)>', f'<@{i % 5}> hi <@!{i % 3}>' if i % 4 == 0 else 'plain'))
+        for i in range(90)
+    ]
+    whole = MessageColumns.from_rows(rows)
+    joined = MessageColumns.concat([MessageColumns.from_rows(rows[i:i + 25]) for i in range(0, 90, 25)])
+
+    stats = ChatStatistics(FakeDB([]))
+    assert joined.size == whole.size == 90
+    assert stats.build_network_graph(joined) == stats.build_network_graph(whole)
+    assert stats.calculate_engagement(joined) == stats.calculate_engagement(whole)
+    assert stats.calculate_primetime(joined) == stats.calculate_primetime(whole)
+    assert MessageColumns.concat([]).size == 0
@@ -0,0 +1,169 @@
+"""Vectorized ChatStatistics must reproduce the original per-message loop outputs.
+
+The reference implementations below are the pre-vectorization loops (with a tiny
+insertion-ordered stand-in for networkx.DiGraph, which has the same node/edge ordering).
+Needs numpy (skipped in the minimal CI job if it isn't installed).
+"""
+import random
+import re
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from features.chat_stats import ChatStatistics, MessageColumns  # noqa: E402
+
+BOT_ID = 999
+
+
+class FakeDB:
+    bot_user_id = BOT_ID
+
+    def get_connection(self):
+        raise RuntimeError("no database in tests")
+
+
+def reference_primetime(messages):
+    hourly = Counter()
+    daily = Counter()
+    for msg in messages:
+        hourly[msg['timestamp'].hour] += 1
+        daily[msg['timestamp'].weekday()] += 1
+    return {
+        'hourly': dict(hourly),
+        'daily': dict(daily),
+        'peak_hour': hourly.most_common(1)[0][0] if hourly else 0,
+        'peak_day': daily.most_common(1)[0][0] if daily else 0,
+        'total_messages': len(messages),
+    }
+
+
+def reference_engagement(messages, bot_user_id):
+    total_length = sum(len(msg.get('content', '')) for msg in messages)
+    unique_users = len(set(m['user_id'] for m in messages if not (bot_user_id and m['user_id'] == bot_user_id)))
+    user_responses = Counter()
+    bot_responses = 0
+    for i in range(1, len(messages)):
+        current, previous = messages[i], messages[i - 1]
+        if (current['channel_id'] == previous['channel_id'] and
+                current['user_id'] != previous['user_id'] and
+                (current['timestamp'] - previous['timestamp']).total_seconds() < 300):
+            if bot_user_id and current['user_id'] == bot_user_id:
+                bot_responses += 1
+            else:
+                user_responses[current['username']] += 1
+    return {
+        'avg_message_length': total_length / len(messages) if messages else 0,
+        'total_messages': len(messages),
+        'unique_users': unique_users,
+        'avg_messages_per_user': len(messages) / unique_users if unique_users > 0 else 0,
+        'top_responders': user_responses.most_common(10),
+        'bot_responses': bot_responses if bot_user_id else None,
+    }
+
+
+def reference_network(messages, bot_user_id):
+    nodes = {}   # node -> attrs, insertion ordered like DiGraph._node
+    adj = {}     # src -> {dst: weight}, insertion ordered like DiGraph._succ
+
+    def add_edge(u, v, w):
+        for node in (u, v):
+            if node not in nodes:
+                nodes[node] = {}
+                adj[node] = {}
+        adj[u][v] = adj[u].get(v, 0) + w
+
+    user_messages = Counter()
+    for i, msg in enumerate(messages):
+        user_id = msg['user_id']
+        user_messages[user_id] += 1
+        if user_id not in nodes:
+            nodes[user_id] = {'username': msg['username']}
+            adj[user_id] = {}
+        for mentioned in re.findall(r'<@!?(\d+)>', msg.get('content', '')):
+            add_edge(user_id, int(mentioned), 1)
+        for j in range(i - min(i, 3), i):
+            if messages[j]['channel_id'] == msg['channel_id'] and messages[j]['user_id'] != user_id:
+                add_edge(user_id, messages[j]['user_id'], 0.5)
+
+    degree = Counter()
+    for u, targets in adj.items():
+        for v in targets:
+            degree[u] += 1
+            degree[v] += 1
+    result_nodes = {}
+    bot_stats = None
+    for node, attrs in nodes.items():
+        data = {'username': attrs.get('username') or f'User {node}',
+                'degree': degree[node], 'messages': user_messages[node]}
+        if bot_user_id and node == bot_user_id:
+            bot_stats = {'user_id': node, **data}
+        else:
+            result_nodes[node] = data
+    edges = [(u, v, w) for u, targets in adj.items() for v, w in targets.items()]
+    return {'edges': edges, 'nodes': result_nodes, 'bot_stats': bot_stats}
+
+
+def make_messages(seed, count):
+    rng = random.Random(seed)
+    users = [101, 102, 103, 104, 105, BOT_ID]
+    t = datetime(2026, 1, 5, 0, 0)
+    messages = []
+    for i in range(count):
+        t += timedelta(seconds=rng.choice([5, 30, 120, 299, 300, 301, 900, 4000]))
+        user = rng.choice(users)
+        words = ['hey', 'that', 'is', 'wild', 'ok']
+        if rng.random() < 0.3:
+            words.insert(rng.randrange(len(words)), f"<@{rng.choice(users + [555])}>")
+        if rng.random() < 0.1:
+            words.append(f"<@!{user}>")  # self mention
+        messages.append({
+            'message_id': i,
+            'user_id': user,
+            'username': f'user{user}' if user != BOT_ID else 'WompBot',
+            'content': ' '.join(words),
+            'timestamp': t,
+            'channel_id': rng.choice([1, 1, 2]),
+        })
+    return messages
+
+
+@pytest.mark.parametrize("seed,count", [(0, 0), (1, 1), (2, 7), (3, 400), (4, 2500)])
+def test_matches_reference_outputs(seed, count):
+    stats = ChatStatistics(FakeDB())
+    messages = make_messages(seed, count)
+
+    primetime = stats.calculate_primetime(messages)
+    expected = reference_primetime(messages)
+    assert primetime == expected
+    assert list(primetime['hourly']) == list(expected['hourly'])
+
+    assert stats.calculate_engagement(messages) == reference_engagement(messages, BOT_ID)
+    assert stats.calculate_engagement(messages, exclude_from_ranking=False) == reference_engagement(messages, None)
+
+    network = stats.build_network_graph(messages)
+    expected_network = reference_network(messages, BOT_ID)
+    assert network['edges'] == expected_network['edges']
+    assert list(network['nodes'].items()) == list(expected_network['nodes'].items())
+    assert network['bot_stats'] == expected_network['bot_stats']
+
+
+def test_database_columns_match_message_dicts():
+    """get_message_columns rows (epoch micros, length, mention ids from SQL) give the same stats."""
+    stats = ChatStatistics(FakeDB())
+    messages = make_messages(6, 800)
+    epoch = datetime(1970, 1, 1)
+    rows = [
+        (m['user_id'], m['username'], m['channel_id'],
+         (m['timestamp'] - epoch) // timedelta(microseconds=1), len(m['content']),
+         re.findall(r'<@!?(\d+)>', m['content']))
+        for m in messages
+    ]
+    columns = MessageColumns.from_rows(rows)
+
+    assert stats.calculate_primetime(columns) == stats.calculate_primetime(messages)
+    assert stats.calculate_engagement(columns) == stats.calculate_engagement(messages)
+    assert stats.build_network_graph(columns) == stats.build_network_graph(messages)
+    assert MessageColumns.from_rows([]).size == 0
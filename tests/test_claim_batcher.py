@@ -0,0 +1,80 @@
+"""Cross-channel micro-batching of claim verification calls."""
+import asyncio
+
+import pytest
+
+from features.claim_batcher import ClaimBatcher
+
+
+class FakeAnalyzer:
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    async def __call__(self, messages):
+        self.calls.append(list(messages))
+        await asyncio.sleep(0)
+        if self.fail:
+            raise RuntimeError("provider down")
+        return [{'claim_text': m} if m.startswith('claim') else None for m in messages]
+
+
+@pytest.fixture
+def batcher_env(monkeypatch):
+    monkeypatch.setenv('CLAIM_BATCH_WINDOW_MS', '20')
+    monkeypatch.setenv('CLAIM_BATCH_SIZE', '3')
+
+
+def test_concurrent_candidates_share_calls_and_get_their_own_verdicts(batcher_env):
+    analyzer = FakeAnalyzer()
+
+    async def run():
+        batcher = ClaimBatcher(analyzer)
+        messages = ['claim a', 'chat b', 'claim c', 'chat d', 'claim e']
+        return batcher, await asyncio.gather(*(batcher.submit(m) for m in messages))
+
+    batcher, results = asyncio.run(run())
+    assert results == [{'claim_text': 'claim a'}, None, {'claim_text': 'claim c'}, None, {'claim_text': 'claim e'}]
+    # Full batch flushed immediately, the remainder when the window closed
+    assert [len(c) for c in analyzer.calls] == [3, 2]
+    assert batcher.get_stats()['llm_calls'] == 2
+
+
+def test_lone_candidate_goes_as_single_call(batcher_env):
+    analyzer = FakeAnalyzer()
+
+    async def run():
+        batcher = ClaimBatcher(analyzer)
+        return batcher, await batcher.submit('claim solo')
+
+    batcher, result = asyncio.run(run())
+    assert result == {'claim_text': 'claim solo'}
+    assert analyzer.calls == [['claim solo']]
+    assert batcher.get_stats()['single_calls'] == 1
+
+
+def test_failed_batch_resolves_as_no_claim(batcher_env):
+    analyzer = FakeAnalyzer(fail=True)
+
+    async def run():
+        batcher = ClaimBatcher(analyzer)
+        return batcher, await asyncio.gather(batcher.submit('claim a'), batcher.submit('claim b'))
+
+    batcher, results = asyncio.run(run())
+    assert results == [None, None]
+    assert batcher.get_stats()['failed_calls'] == 1
+
+
+def test_stop_flushes_pending(monkeypatch):
+    monkeypatch.setenv('CLAIM_BATCH_WINDOW_MS', '60000')
+    analyzer = FakeAnalyzer()
+
+    async def run():
+        batcher = ClaimBatcher(analyzer)
+        waiter = asyncio.ensure_future(batcher.submit('claim late'))
+        await asyncio.sleep(0)
+        await batcher.stop()
+        return await waiter
+
+    assert asyncio.run(run()) == {'claim_text': 'claim late'}
+    assert analyzer.calls == [['claim late']]
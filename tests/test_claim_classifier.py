@@ -0,0 +1,90 @@
+"""Local claim classifier: the tier between the keyword pre-filter and the LLM.
+
+Needs numpy (skipped in the minimal CI job if it isn't installed).
+"""
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from features.claim_classifier import ClaimClassifier, hashed_features  # noqa: E402
+
+CLAIMS = [
+    "bitcoin will hit {n}k by the end of next year, guaranteed",
+    "the lakers will win the title by {n} games, mark my words",
+    "tesla stock is going to {n} dollars before summer, no doubt",
+    "every single study shows {n}% of people are lactose intolerant",
+    "I will never buy a car that costs more than {n} grand",
+]
+REJECTS = [
+    "all of the pizza places near me are closed after {n} pm lol",
+    "no way I'm doing the dishes, it's been {n} days already",
+    "literally everyone is at the party, there are like {n} people",
+    "the best part of the movie was the ending, {n}/10 would watch",
+    "always forget my keys, happened {n} times this week",
+]
+
+
+def _dataset(count=40):
+    texts, labels = [], []
+    for n in range(count):
+        for template in CLAIMS:
+            texts.append(template.format(n=n * 7 + 3))
+            labels.append(1)
+        for template in REJECTS:
+            texts.append(template.format(n=n * 5 + 2))
+            labels.append(0)
+    return texts, labels
+
+
+def test_hashed_features_are_stable_and_bounded():
+    a = hashed_features("Bitcoin will hit 100k", bits=12)
+    b = hashed_features("bitcoin   WILL hit 100k", bits=12)
+    assert np.array_equal(a, b)
+    assert a.max() < 2 ** 12
+    assert len(a) == len(set(a.tolist()))
+
+
+def test_untrained_forwards_everything():
+    clf = ClaimClassifier()
+    assert clf.should_forward("anything at all") == (True, None)
+
+
+def test_not_enough_labels_keeps_untrained():
+    clf = ClaimClassifier()
+    assert clf.train(["x will happen"] * 5, [1] * 5) is None
+    assert not clf.ready
+
+
+def test_trained_classifier_separates_and_meets_recall(monkeypatch):
+    monkeypatch.setenv('CLAIM_CLASSIFIER_BITS', '14')
+    clf = ClaimClassifier()
+    texts, labels = _dataset()
+    metrics = clf.train(texts, labels)
+    assert metrics is not None and clf.ready
+    assert metrics['holdout_recall'] >= 0.9
+    assert metrics['holdout_negatives_forwarded'] < 0.5
+
+    assert clf.should_forward("dogecoin will hit 500k by the end of next year, guaranteed")[0]
+    forward, probability = clf.should_forward("always forget my umbrella, happened 4 times this week")
+    assert not forward and probability < clf.threshold
+
+
+def test_only_llm_verdicts_are_recorded_as_labels(monkeypatch):
+    pytest.importorskip("discord")
+    import asyncio
+    from types import SimpleNamespace
+
+    from features.claims import ClaimsTracker
+
+    tracker = ClaimsTracker(db=None, llm=None)
+    messages = [SimpleNamespace(id=i, author=SimpleNamespace(id=100 + i), content=f"msg {i}") for i in range(3)]
+
+    async def batch(msgs):
+        return [{'claim_text': "msg 0"}, False, None]  # trackable, rejected, no verdict
+    monkeypatch.setattr(tracker, '_analyze_batch', batch)
+    stored = []
+    monkeypatch.setattr(tracker, '_store_verdicts_sync', stored.extend)
+
+    results = asyncio.run(tracker.analyze_candidates(messages))
+    assert results == [{'claim_text': "msg 0"}, None, None]
+    assert stored == [(0, 100, True), (1, 101, False)]
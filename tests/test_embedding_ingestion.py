@@ -0,0 +1,130 @@
+"""Embedding ingestion: skip policy, per-channel content dedup and backlog-aware batch sizes."""
+import asyncio
+
+import pytest
+
+pytest.importorskip("numpy")
+from embedding_policy import EmbeddingPolicy, content_hash, token_entropy  # noqa: E402
+
+
+@pytest.fixture
+def policy(monkeypatch):
+    for name in ('EMBED_MIN_TOKENS', 'EMBED_MIN_ENTROPY', 'EMBED_BOT_MESSAGES'):
+        monkeypatch.delenv(name, raising=False)
+    policy = EmbeddingPolicy()
+    policy.bot_user_id = 99
+    return policy
+
+
+@pytest.mark.parametrize("content,reason", [
+    ("lol", 'short'),
+    ("😂😂😂", 'short'),
+    ("<:pog:1234567890> <@123456789> https://example.com/clip", 'short'),
+    ("ha ha ha ha ha", 'repetitive'),
+    ("no no no way", 'repetitive'),
+    ("anyone racing spa tonight?", None),
+    ("The GT3 setup from last week is way faster in sector 2", None),
+])
+def test_skip_policy(policy, content, reason):
+    assert policy.skip_reason(content, user_id=1) == reason
+
+
+def test_bot_messages_are_skipped_unless_enabled(policy, monkeypatch):
+    reply = "Spa-Francorchamps is about seven kilometres long"
+    assert policy.skip_reason(reply, user_id=99) == 'bot'
+    monkeypatch.setenv('EMBED_BOT_MESSAGES', 'true')
+    enabled = EmbeddingPolicy()
+    enabled.bot_user_id = 99
+    assert enabled.skip_reason(reply, user_id=99) is None
+
+
+def test_entropy_and_hash():
+    assert token_entropy([]) == 0.0
+    assert token_entropy(["a", "b", "c", "d"]) == pytest.approx(2.0)
+    assert content_hash("Anyone  racing Spa?") == content_hash(" anyone racing spa? ")
+    assert content_hash("anyone racing spa?") != content_hash("anyone racing monza?")
+
+
+@pytest.fixture
+def rag_system(policy):
+    pytest.importorskip("openai")
+    pytest.importorskip("pgvector")
+    import rag
+
+    system = rag.RAGSystem.__new__(rag.RAGSystem)
+    system.enabled = True
+    system.local_index = None
+    system.embedding_policy = policy
+    system.embed_batch_size = 2
+    system.embed_batch_max = 4
+    system.embed_drain_rounds = 3
+    system.ingest_stats = {'embedded': 0, 'failed': 0, 'deduplicated': 0,
+                           'skipped_bot': 0, 'skipped_short': 0, 'skipped_repetitive': 0}
+    system.stored = []
+    system.embedded_texts = []
+
+    def item(queue_id, content, channel_id=1, user_id=1):
+        return {'id': queue_id, 'message_id': 1000 + queue_id, 'content': content,
+                'channel_id': channel_id, 'user_id': user_id}
+    system.item = item
+
+    async def generate_embeddings_batch(texts):
+        system.embedded_texts.extend(texts)
+        return [None if "fail" in t else [0.1, 0.2] for t in texts]
+    system.generate_embeddings_batch = generate_embeddings_batch
+    system.looked_up = []
+
+    def embedded_hashes(pairs):
+        system.looked_up.extend(pairs)
+        return {(1, content_hash("already embedded here"))}
+    system._embedded_hashes = embedded_hashes
+    system._store_embeddings = lambda rows, done, failed: system.stored.append((rows, sorted(done), sorted(failed)))
+    return system
+
+
+def test_batch_skips_dedups_and_writes_once(rag_system):
+    item = rag_system.item
+    queue = [
+        item(1, "lol"),
+        item(2, "anyone racing spa tonight?"),
+        item(3, "Anyone racing Spa tonight?"),            # same content, same channel
+        item(4, "anyone racing spa tonight?", channel_id=2),
+        item(5, "already embedded here"),
+        item(6, "this one will fail to embed"),
+        item(7, "Spa is about seven kilometres long", user_id=99),
+    ]
+    rag_system._fetch_embedding_queue = lambda limit: queue
+
+    fetched, embedded = asyncio.run(rag_system._process_embedding_batch(10))
+
+    assert (fetched, embedded) == (7, 2)
+    assert rag_system.embedded_texts == ["anyone racing spa tonight?", "anyone racing spa tonight?",
+                                         "this one will fail to embed"]
+    [(rows, done, failed)] = rag_system.stored  # one transaction for the whole batch
+    assert [r[0] for r in rows] == [1002, 1004]
+    # Existing embeddings are looked up by (channel, hash) pair, matching the index
+    assert sorted(rag_system.looked_up) == sorted({(i['channel_id'], content_hash(i['content'])) for i in queue[1:6]})
+    assert done == [1, 2, 3, 4, 5, 7] and failed == [6]
+    assert rag_system.ingest_stats == {'embedded': 2, 'failed': 1, 'deduplicated': 2,
+                                       'skipped_bot': 1, 'skipped_short': 1, 'skipped_repetitive': 0}
+
+
+def test_drain_scales_batches_with_queue_depth(rag_system):
+    pending = [rag_system.item(i, f"distinct message number {i} here") for i in range(10)]
+    batches = []
+
+    def fetch(limit):
+        batches.append(limit)
+        taken = pending[:limit]
+        del pending[:limit]
+        return taken
+    rag_system._fetch_embedding_queue = fetch
+    rag_system._embedding_queue_depth = lambda cap: min(cap, len(pending))
+
+    assert asyncio.run(rag_system.drain_embedding_queue()) == 10
+    assert batches == [4, 4, 4]
+
+    pending.extend(rag_system.item(i, f"another distinct message {i} here") for i in range(20, 21))
+    batches.clear()
+    assert asyncio.run(rag_system.drain_embedding_queue()) == 1
+    assert batches == [2]  # shallow queue: the base batch size
@@ -0,0 +1,134 @@
+"""Compact embedding storage: recall of the halfvec/binary modes, search SQL per layout and conversion."""
+import asyncio
+
+import pytest
+
+np = pytest.importorskip("numpy")
+from scripts.embedding_recall import index_bytes, recall_at_k  # noqa: E402
+
+
+def _clustered(rng, n, queries, dims=256, clusters=50):
+    """Corpus and queries drawn around the same topic centers, like chat embeddings."""
+    centers = rng.normal(size=(clusters, dims))
+    points = centers[rng.integers(0, clusters, n + queries)] + 0.5 * rng.normal(size=(n + queries, dims))
+    return points[:n], points[n:]
+
+
+def test_recall_against_exact_cosine():
+    rng = np.random.default_rng(7)
+    corpus, queries = _clustered(rng, 3000, 50)
+
+    assert recall_at_k(corpus, queries, k=10, mode='halfvec') > 0.98
+    reranked = recall_at_k(corpus, queries, k=10, mode='binary', rerank_factor=4)
+    assert reranked > 0.75
+    assert reranked > recall_at_k(corpus, queries, k=10, mode='binary', rerank_factor=1)
+    assert index_bytes(1536)['binary'] * 10 < index_bytes(1536)['halfvec'] < index_bytes(1536)['vector']
+
+
+@pytest.fixture
+def rag_system():
+    pytest.importorskip("openai")
+    pytest.importorskip("pgvector")
+    import rag
+
+    system = rag.RAGSystem.__new__(rag.RAGSystem)
+    system.enabled = True
+    system.embedding_dimension = 1536
+    system.binary_rerank_factor = 4
+    system.storage_convert_rows = 5
+    system._storage_pending = True
+    system.storage_stats = {'converted': 0}
+    return system
+
+
+def _caps(storage, halfvec=True):
+    return {'filter_columns': True, 'hnsw': True, 'iterative_scan': False,
+            'halfvec': halfvec, 'storage': storage}
+
+
+@pytest.fixture
+def executed(monkeypatch, rag_system):
+    calls = []
+
+    class Cursor:
+        def execute(self, sql, params=None):
+            calls.append((sql, params))
+
+        def fetchall(self):
+            return []
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            pass
+
+    class Connection:
+        def cursor(self, cursor_factory=None):
+            return Cursor()
+
+    class Database:
+        def get_connection(self):
+            class _Ctx:
+                def __enter__(self):
+                    return Connection()
+
+                def __exit__(self, *exc):
+                    pass
+            return _Ctx()
+
+    import rag
+    monkeypatch.setattr(rag, 'register_vector', lambda conn: None)
+    rag_system.db = Database()
+    return calls
+
+
+def _search(system, caps):
+    return system._vector_search_sync([0.1] * 1536, 7, None, None, None, 15, 40, caps)
+
+
+def test_search_sql_per_layout(rag_system, executed):
+    rag_system._storage_pending = False
+    _search(rag_system, _caps('vector', halfvec=False))
+    sql, params = executed[-1]
+    assert "me.embedding <=>" in sql and "UNION ALL" not in sql and "IS NOT NULL" not in sql
+    assert params['channel_id'] == 7 and params['limit'] == 15
+
+    _search(rag_system, _caps('halfvec'))
+    sql, _ = executed[-1]
+    assert "me.embedding_half <=>" in sql and "me.embedding_half IS NOT NULL" in sql
+    assert "UNION ALL" not in sql
+
+    _search(rag_system, _caps('binary'))
+    ef_search, (sql, params) = executed[-2][1], executed[-1]
+    assert "binary_quantize(me.embedding_half)::bit(1536) <~>" in sql
+    assert "ORDER BY b.embedding_half <=>" in sql and params['candidates'] == 60
+    assert ef_search == ('60',)  # the candidate list covers the re-rank pool
+
+
+def test_unconverted_rows_stay_searchable(rag_system, executed):
+    _search(rag_system, _caps('halfvec'))
+    sql, _ = executed[-1]
+    assert "UNION ALL" in sql
+    assert "me.embedding_half <=>" in sql and "me.embedding <=>" in sql
+
+
+def test_conversion_runs_until_a_short_batch(rag_system):
+    moved = iter([2, 2, 1])
+    calls = []
+    rag_system._get_vector_search_caps = lambda: _caps('halfvec')
+
+    def convert(storage, limit):
+        calls.append((storage, limit))
+        return next(moved)
+    rag_system._convert_embedding_batch = convert
+
+    assert asyncio.run(rag_system.convert_embedding_storage(batch_size=2)) == 5
+    assert calls == [('halfvec', 2), ('halfvec', 2), ('halfvec', 1)]
+    assert rag_system._storage_pending  # hit EMBED_CONVERT_ROWS, more may remain
+
+    moved = iter([1])
+    assert asyncio.run(rag_system.convert_embedding_storage(batch_size=2)) == 1
+    assert not rag_system._storage_pending
+    assert asyncio.run(rag_system.convert_embedding_storage(batch_size=2)) == 0
+    assert rag_system.storage_stats == {'converted': 6}
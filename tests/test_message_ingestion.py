@@ -0,0 +1,98 @@
+"""Coalescing rules for the write-behind message ingestion queue.
+
+A flushed batch must leave the database in the same state as storing each message
+individually via Database.store_message, in order. message_ingestion.py imports only
+stdlib (asyncpg is optional in async_database), so this runs in the fast CI job.
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from message_ingestion import MessageIngestionQueue, coalesce_rows, message_row
+
+T0 = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def _row(message_id, user_id, minutes=0, content="hi", opted_out=False, username=None):
+    return (message_id, user_id, username or f"user{user_id}", 10, "general",
+            content, T0 + timedelta(minutes=minutes), 1, opted_out)
+
+
+def test_message_row_snapshots_fields_and_redacts_opted_out():
+    msg = SimpleNamespace(
+        id=5,
+        author=SimpleNamespace(id=7),
+        channel=SimpleNamespace(id=10, name="general"),
+        content="hello",
+        created_at=T0.replace(tzinfo=timezone.utc),
+        guild=SimpleNamespace(id=1),
+    )
+    row = message_row(msg, opted_out=True, content_override="edited")
+    assert row[0] == 5 and row[1] == 7
+    assert row[2] == "[redacted]"
+    assert row[5] == "edited"
+    assert row[6] == T0 and row[6].tzinfo is None  # naive UTC for TIMESTAMP columns
+    assert row[8] is True
+
+
+def test_duplicate_message_id_keeps_last_content():
+    messages, _ = coalesce_rows([_row(1, 7, content="🤔 Thinking..."), _row(1, 7, content="final")])
+    assert len(messages) == 1
+    assert messages[0][5] == "final"
+
+
+def test_profile_increments_fold_to_one_row_per_user():
+    rows = [_row(1, 7, 0), _row(2, 8, 1), _row(3, 7, 5, username="renamed"), _row(4, 7, 2)]
+    messages, profiles = coalesce_rows(rows)
+    assert [m[0] for m in messages] == [1, 2, 3, 4]
+    by_user = {p[0]: p for p in profiles}
+    assert set(by_user) == {7, 8}
+    user_id, username, count, first_seen, last_seen, opted_out = by_user[7]
+    assert count == 3
+    assert username == "user7"  # last row wins, as with sequential upserts
+    assert first_seen == T0
+    assert last_seen == T0 + timedelta(minutes=5)
+    assert opted_out is False
+
+
+def test_opted_out_rows_store_no_message_and_do_not_count():
+    rows = [_row(1, 7, 0), _row(2, 7, 3, opted_out=True, username="[redacted]")]
+    messages, profiles = coalesce_rows(rows)
+    assert [m[0] for m in messages] == [1]
+    (_, username, count, _, last_seen, opted_out), = profiles
+    assert count == 1
+    assert last_seen == T0  # only opted-in rows advance last_seen
+    assert username == "[redacted]" and opted_out is True
+
+
+class _RecordingDB:
+    def __init__(self):
+        self.batches = []
+
+    def store_messages_batch(self, message_rows, profile_rows):
+        self.batches.append((message_rows, profile_rows))
+        return True
+
+
+def test_queue_coalesces_burst_into_one_flush_and_drains_on_stop():
+    db = _RecordingDB()
+
+    async def scenario():
+        queue = MessageIngestionQueue(db)
+        queue.flush_interval = 0.05
+        queue.start()
+        for i in range(20):
+            msg = SimpleNamespace(
+                id=i, author=SimpleNamespace(id=i % 3), channel=SimpleNamespace(id=10, name="g"),
+                content="x", created_at=T0, guild=None,
+            )
+            queue.submit(msg)
+        await queue.stop()
+        return queue.get_stats()
+
+    stats = asyncio.run(scenario())
+    assert len(db.batches) == 1
+    messages, profiles = db.batches[0]
+    assert len(messages) == 20
+    assert sorted(p[2] for p in profiles) == [6, 7, 7]
+    assert stats['flushed_rows'] == 20 and stats['depth'] == 0 and not stats['running']
@@ -0,0 +1,96 @@
+"""Prompt assembly: cached token counts, prefix-sum trimming and the prefix-stable layout."""
+from datetime import datetime
+
+import prompt_builder
+from llm import LLMClient
+from prompt_builder import TokenCounter, format_user_context, trim_count
+
+
+class FakeEncoding:
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, text):
+        self.encoded.append(text)
+        return text.split()
+
+
+def test_token_counts_are_cached_per_message_and_content():
+    encoding = FakeEncoding()
+    counter = TokenCounter(encoding, max_entries=2)
+
+    assert counter.count("alice: hello there", message_id=1) == 3
+    assert counter.count("alice: hello there", message_id=1) == 3
+    assert counter.count("alice: hello there, edited", message_id=1) == 4  # edit: new hash
+    assert counter.count("") == 0
+    assert len(encoding.encoded) == 2
+
+    counter.count("bob: hi", message_id=2)  # evicts message 1's original content
+    counter.count("alice: hello there", message_id=1)
+    assert len(encoding.encoded) == 4
+    assert counter.get_stats() == {'entries': 2, 'hits': 1, 'misses': 4, 'hit_ratio': 0.2}
+
+
+def test_trim_count_finds_the_smallest_drop_for_both_budgets():
+    tokens = [10, 20, 30, 40]
+    chars = [40, 80, 120, 160]
+    assert trim_count(tokens, chars, 50, 200, max_tokens=200, max_chars=1000) == 0
+    assert trim_count(tokens, chars, 50, 200, max_tokens=120, max_chars=1000) == 2
+    assert trim_count(tokens, chars, 50, 200, max_tokens=1000, max_chars=400) == 3
+    assert trim_count(tokens, chars, 50, 200, max_tokens=10, max_chars=10) == 3  # keeps the newest
+    assert trim_count([], [], 50, 200, max_tokens=10, max_chars=10) == 0
+
+
+def test_user_context_block_is_memoized():
+    profile = {"username": "wompie"}
+    behavior = {"conversation_style": "dry", "profanity_score": 0, "message_count": 12}
+    before = prompt_builder._format_user_context.cache_info().hits
+
+    block = format_user_context(profile, behavior)
+    assert format_user_context(profile, dict(behavior)) == block
+    assert prompt_builder._format_user_context.cache_info().hits == before + 1
+    assert "## HISTORICAL USER CONTEXT for wompie:" in block
+    assert "- Profanity level: 0/10" in block and "- Message count in recent period: 12" in block
+    assert "Typical Tone" not in block
+
+
+class NoCompression:
+    def is_enabled(self):
+        return False
+
+
+def _client():
+    llm = LLMClient.__new__(LLMClient)
+    llm.compressor = NoCompression()
+    llm.system_prompt_default = "You are WompBot."
+    llm.model = "text-model"
+    llm.vision_model = "vision-model"
+    return llm
+
+
+def test_payload_keeps_per_query_context_after_the_history(monkeypatch):
+    monkeypatch.setenv('MAX_CONTEXT_TOKENS', '60')
+    history = [
+        {"message_id": i, "user_id": 1, "username": "alice", "content": f"message number {i} " + "x" * 40}
+        for i in range(6)
+    ]
+    rag = {
+        "recent_summary": "talked about spa",
+        "semantic_matches": [{"timestamp": datetime(2026, 1, 2), "similarity": 0.9,
+                              "username": "bob", "content": "spa is great"}],
+    }
+
+    payload, model, estimated = _client()._build_chat_payload(
+        "what about monza?", history, rag_context=rag, search_results="monza results",
+    )
+    messages = payload["messages"]
+
+    assert model == "text-model"
+    assert messages[0] == {"role": "system", "content": "You are WompBot."}
+    assert messages[1]["content"].startswith("[CONVERSATION HISTORY")
+    assert messages[2]["content"].startswith("[Note: 5 earlier messages were omitted")
+    assert messages[3]["content"].startswith("alice: message number 5")
+    latest = messages[-1]["content"]
+    assert latest.startswith("[RELEVANT HISTORICAL CONTEXT (RAG)")
+    assert latest.index("talked about spa") < latest.index("what about monza?") < latest.index("monza results")
+    assert estimated == sum(len(m["content"]) // 4 for m in messages)
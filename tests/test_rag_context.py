@@ -0,0 +1,121 @@
+"""RAG retrieval planner: concurrent legs, one connection for facts + summary digest, partial context on budget."""
+import asyncio
+import time
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("pgvector")
+rag = pytest.importorskip("rag")
+
+
+class FakeCursor:
+    def __init__(self, results):
+        self.results = results
+        self.queries = []
+
+    def execute(self, sql, params=None):
+        self.queries.append(sql)
+
+    def fetchall(self):
+        return self.results.pop(0)
+
+    def fetchone(self):
+        rows = self.results.pop(0)
+        return rows[0] if rows else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self, cursor_factory=None):
+        return self._cursor
+
+
+class FakeDatabase:
+    def __init__(self, results):
+        self.cursor = FakeCursor(results)
+        self.connections = 0
+
+    def get_connection(self):
+        db = self
+
+        class _Ctx:
+            def __enter__(self):
+                db.connections += 1
+                return FakeConnection(db.cursor)
+
+            def __exit__(self, *exc):
+                pass
+        return _Ctx()
+
+
+def _system(db, search_delay=0.0, lookup_delay=0.0, budget=1.0):
+    system = rag.RAGSystem.__new__(rag.RAGSystem)
+    system.enabled = True
+    system.db = db
+    system.context_budget = budget
+    system.context_stats = {'requests': 0, 'partial': 0, 'search_timeouts': 0, 'lookup_timeouts': 0}
+
+    async def semantic_search(query, channel_id=None, limit=5):
+        await asyncio.sleep(search_delay)
+        return [{'content': 'spa is great', 'similarity': 0.8}]
+    system.semantic_search = semantic_search
+
+    if lookup_delay:
+        real_lookup = system._context_rows_sync
+
+        def slow_lookup(channel_id, user_id):
+            time.sleep(lookup_delay)
+            return real_lookup(channel_id, user_id)
+        system._context_rows_sync = slow_lookup
+    return system
+
+
+def _db():
+    facts = [{'fact': 'drives a GT3', 'confidence': 0.9, 'mention_count': 2}]
+    digest = [{'granularity': 'hour', 'period_start': datetime(2026, 10, 16, 14), 'summary': 'talked about spa'}]
+    return FakeDatabase([facts, digest])
+
+
+def test_all_legs_in_budget_share_one_connection():
+    db = _db()
+    system = _system(db)
+    context = asyncio.run(system.get_relevant_context("spa?", 1, 2))
+
+    assert context == {
+        'semantic_matches': [{'content': 'spa is great', 'similarity': 0.8}],
+        'user_facts': [{'fact': 'drives a GT3', 'confidence': 0.9, 'mention_count': 2}],
+        'recent_summary': '14:00: talked about spa',
+    }
+    assert db.connections == 1 and len(db.cursor.queries) == 2
+    assert system.context_stats['partial'] == 0
+
+
+def test_slow_leg_is_dropped_at_the_budget():
+    system = _system(_db(), search_delay=0.5, budget=0.05)
+
+    async def run():
+        started = time.monotonic()
+        context = await system.get_relevant_context("spa?", 1, 2)
+        return context, time.monotonic() - started
+
+    context, elapsed = asyncio.run(run())
+    assert elapsed < 0.4
+    assert context['semantic_matches'] == [] and context['recent_summary'] == '14:00: talked about spa'
+    assert system.context_stats == {'requests': 1, 'partial': 1, 'search_timeouts': 1, 'lookup_timeouts': 0}
+
+
+def test_slow_lookup_keeps_semantic_matches():
+    system = _system(_db(), lookup_delay=0.3, budget=0.05)
+    context = asyncio.run(system.get_relevant_context("spa?", 1, 2))
+    assert context['semantic_matches'] and context['user_facts'] == []
+    assert system.context_stats['lookup_timeouts'] == 1
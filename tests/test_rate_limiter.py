@@ -0,0 +1,146 @@
+"""Rate limiter: GCRA token budgets, feature cooldown/hourly/daily caps and the batched audit trail."""
+from contextlib import contextmanager
+
+import pytest
+
+from rate_limiter import RateLimiter
+
+
+class Clock:
+    def __init__(self, t=1_800_000_000.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+class NoRedis:
+    def register_script(self, source):
+        return None
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def limiter(clock, monkeypatch):
+    monkeypatch.setenv('HOURLY_TOKEN_LIMIT', '3600')
+    return RateLimiter(cache=NoRedis(), clock=clock)
+
+
+def test_token_budget_refills_gradually(limiter, clock):
+    assert limiter.check_tokens(1, 3600)['allowed']
+    limiter.record_tokens(1, 'u', 3000)
+
+    check = limiter.check_tokens(1, 1000)
+    assert not check['allowed']
+    assert (check['tokens_used'], check['limit']) == (3000, 3600)
+    # 400 tokens over the limit at one token per second
+    assert check['reset_seconds'] == 401
+    assert limiter.check_tokens(1, 600)['allowed']
+    assert limiter.check_tokens(2, 1000)['allowed']  # per user
+
+    clock.t += 400
+    assert limiter.check_tokens(1, 1000) == {
+        'allowed': True, 'tokens_used': 2600, 'tokens_requested': 1000,
+        'limit': 3600, 'reset_seconds': 2600,
+    }
+    clock.t += 5000
+    assert limiter.check_tokens(1, 0)['tokens_used'] == 0
+
+
+def test_feature_cooldown_then_caps(limiter, clock):
+    assert limiter.check_feature(1, 'search') == {'allowed': True}
+    limiter.record_feature(1, 'search')
+    assert limiter.check_feature(1, 'search', cooldown_seconds=300) == {
+        'allowed': False, 'reason': 'cooldown', 'wait_seconds': 300}
+    clock.t += 299.5
+    assert limiter.check_feature(1, 'search', cooldown_seconds=300)['wait_seconds'] == 1
+    clock.t += 1
+    assert limiter.check_feature(1, 'search', cooldown_seconds=300) == {'allowed': True}
+    assert limiter.check_feature(1, 'fact_check', cooldown_seconds=300) == {'allowed': True}
+
+    for _ in range(4):
+        limiter.record_feature(1, 'search')
+    assert limiter.check_feature(1, 'search', hourly_limit=5, daily_limit=20) == {
+        'allowed': False, 'reason': 'hourly_limit', 'count': 5, 'limit': 5}
+
+    clock.t += 3600
+    assert limiter.check_feature(1, 'search', hourly_limit=5, daily_limit=20) == {'allowed': True}
+    assert limiter.check_feature(1, 'search', hourly_limit=5, daily_limit=5)['reason'] == 'daily_limit'
+    clock.t += 86400
+    assert limiter.check_feature(1, 'search', daily_limit=1) == {'allowed': True}
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, query, params=None):
+        if self.db.fail:
+            raise RuntimeError("database down")
+        self.db.statements.append((query, params))
+
+
+class FakeDB:
+    def __init__(self):
+        self.statements = []
+        self.fail = False
+
+    @contextmanager
+    def get_connection(self):
+        db = self
+
+        class Conn:
+            def cursor(self):
+                return FakeCursor(db)
+
+        yield Conn()
+
+
+def test_audit_rows_are_batched_and_failures_do_not_block(clock, monkeypatch):
+    extras = pytest.importorskip("psycopg2.extras")
+    monkeypatch.setattr(extras, 'execute_values',
+                        lambda cur, query, rows, page_size: cur.execute(query, rows))
+    db = FakeDB()
+    limiter = RateLimiter(audit_db=db, cache=NoRedis(), clock=clock)
+    limiter.record_tokens(1, 'u1', 120)
+    limiter.record_tokens(2, 'u2', 80)
+    limiter.record_feature(1, 'search')
+    assert limiter.get_stats()['audit_pending'] == 3
+
+    assert limiter.flush_audit() == 3
+    assert len(db.statements) == 2  # one multi-row INSERT per table
+    assert 'rate_limits' in db.statements[0][0] and 'feature_rate_limits' in db.statements[1][0]
+    assert [row[:3] for row in db.statements[0][1]] == [(1, 'u1', 120), (2, 'u2', 80)]
+    assert [row[:2] for row in db.statements[1][1]] == [(1, 'search')]
+    assert limiter.flush_audit() == 0
+
+    db.fail = True
+    limiter.record_feature(2, 'wrapped')
+    assert limiter.flush_audit() == 0
+    stats = limiter.get_stats()
+    assert (stats['audit_pending'], stats['audit_errors'], stats['backend']) == (0, 1, 'local')
+
+
+def test_redis_errors_fall_back_to_local_limits(clock):
+    class BrokenScript:
+        def __call__(self, keys, args):
+            raise ConnectionError("redis went away")
+
+    class FlakyRedis:
+        def register_script(self, source):
+            return BrokenScript()
+
+    limiter = RateLimiter(cache=FlakyRedis(), clock=clock)
+    limiter.record_feature(1, 'game_start')
+    assert limiter.check_feature(1, 'game_start', cooldown_seconds=30)['reason'] == 'cooldown'
+    assert limiter.get_stats()['redis_errors'] == 2
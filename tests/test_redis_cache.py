@@ -0,0 +1,159 @@
+"""RedisCache batch/async APIs and the process-local L1, against in-memory fake clients."""
+import asyncio
+
+import pytest
+
+import redis_cache
+from redis_cache import RedisCache
+
+
+class FakeRedis:
+    """Just enough of the redis (sync and asyncio) client surface, counting round-trips."""
+
+    def __init__(self, store=None):
+        self.store = {} if store is None else store
+        self.calls = []
+
+    def get(self, key):
+        self.calls.append(('get', key))
+        return self.store.get(key)
+
+    def mget(self, keys):
+        self.calls.append(('mget', tuple(keys)))
+        return [self.store.get(k) for k in keys]
+
+    def setex(self, key, ttl, value):
+        self.store[key] = value
+
+    def delete(self, key):
+        self.store.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        self.calls.append(('pipeline',))
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.ops = []
+
+    def setex(self, key, ttl, value):
+        self.ops.append((key, value))
+
+    def execute(self):
+        for key, value in self.ops:
+            self.client.store[key] = value
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+
+class FakeAsyncRedis(FakeRedis):
+    async def mget(self, keys):
+        return FakeRedis.mget(self, keys)
+
+    async def delete(self, key):
+        FakeRedis.delete(self, key)
+
+    def pipeline(self, transaction=True):
+        pipe = FakeRedis.pipeline(self, transaction)
+        sync_execute = pipe.execute
+
+        async def execute():
+            sync_execute()
+        pipe.execute = execute
+        return pipe
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.delenv('REDIS_HOST', raising=False)
+    monkeypatch.setenv('REDIS_L1_TTL', '30')
+    cache = RedisCache()
+    cache._enabled = True
+    cache._client = FakeRedis()
+    return cache
+
+
+def test_values_round_trip_like_json(cache):
+    value = {'name': 'wompie', 'facts': ['likes spa'], 'score': 1.5, 7: None}
+    assert cache.set('k', value, ttl=60)
+    cache._l1.clear()
+    assert cache.get('k') == {'name': 'wompie', 'facts': ['likes spa'], 'score': 1.5, '7': None}
+    assert redis_cache._loads('{"legacy": [1, 2]}') == {'legacy': [1, 2]}  # old json.dumps values
+
+
+def test_l1_serves_repeat_reads_until_expiry(cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(redis_cache.time, 'monotonic', lambda: now[0])
+    cache.set('user_ctx:1', {'facts': ['a']}, ttl=3600)
+
+    first = cache.get('user_ctx:1')
+    first['facts'].append('mutated')
+    assert cache.get('user_ctx:1') == {'facts': ['a']}  # decoded per hit, never shared
+    assert cache.get('missing') is None and cache.get('missing') is None
+    assert cache._client.calls == [('get', 'missing')] * 2  # misses are not remembered
+
+    now[0] += 31
+    assert cache.get('user_ctx:1') == {'facts': ['a']}
+    assert cache._client.calls[-1] == ('get', 'user_ctx:1')
+
+    cache.delete('user_ctx:1')
+    assert cache.get('user_ctx:1') is None
+
+
+def test_l1_is_off_by_default(monkeypatch):
+    monkeypatch.delenv('REDIS_HOST', raising=False)
+    monkeypatch.delenv('REDIS_L1_TTL', raising=False)
+    cache = RedisCache()
+    cache._enabled = True
+    cache._client = FakeRedis()
+    cache.set('k', 'v')
+    assert cache.get('k') == 'v' and cache._l1 == {}
+    assert cache._client.calls == [('get', 'k')]
+
+
+def test_async_batches_use_one_round_trip(cache):
+    async def run():
+        client = FakeAsyncRedis(cache._client.store)
+        cache._async_loop = asyncio.get_running_loop()
+        cache._async_client = client
+
+        assert await cache.aset_many({'a': 1, 'b': [2]}, ttl=60)
+        cache._l1.pop('b')
+        results = await cache.amget(['a', 'b', 'c'])
+        assert results == [1, [2], None]
+        assert client.calls == [('pipeline',), ('mget', ('b', 'c'))]
+
+        assert await cache.aget('c') is None
+        assert len(client.calls) == 3  # the miss is fetched again
+        await cache.adelete('a')
+        assert 'a' not in cache._client.store
+        assert cache._client.calls == []  # the sync client was never touched
+
+    asyncio.run(run())
+
+
+def test_other_event_loops_fall_back_to_the_sync_client(cache):
+    cache.set('k', 'v')
+    cache._l1.clear()
+
+    async def bind():
+        cache._async_loop = asyncio.get_running_loop()
+        cache._async_client = FakeAsyncRedis()
+
+    asyncio.run(bind())
+    assert asyncio.run(cache.amget(['k'])) == ['v']
+    assert cache._client.calls == [('mget', ('k',))]
+
+
+def test_disabled_cache_is_a_no_op(monkeypatch):
+    monkeypatch.delenv('REDIS_HOST', raising=False)
+    cache = RedisCache()
+    assert asyncio.run(cache.amget(['a', 'b'])) == [None, None]
+    assert asyncio.run(cache.aset('a', 1)) is False
+    assert cache.set_many({'a': 1}) is False
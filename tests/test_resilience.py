@@ -0,0 +1,127 @@
+"""State transitions for the per-provider circuit breaker and AIMD concurrency limit.
+
+resilience.py imports only stdlib + requests, so this runs in the fast CI job.
+"""
+import pytest
+
+from resilience import (
+    CLOSED, HALF_OPEN, OPEN,
+    AdaptiveConcurrencyLimit, CircuitBreaker, Provider, ProviderUnavailable,
+)
+
+
+def _breaker(**kwargs):
+    defaults = dict(failure_threshold=3, error_rate=0.5, min_calls=10,
+                    window_seconds=60, open_seconds=30, max_open_seconds=120)
+    defaults.update(kwargs)
+    return CircuitBreaker(**defaults)
+
+
+def test_opens_after_consecutive_failures():
+    b = _breaker()
+    for t in range(2):
+        assert b.record(False, False, t) is None
+    assert b.record(False, False, 2) == OPEN
+    allowed, _, retry_after = b.before_call(3)
+    assert not allowed and retry_after == pytest.approx(29)
+
+
+def test_success_resets_consecutive_count():
+    b = _breaker()
+    b.record(False, False, 0)
+    b.record(False, False, 1)
+    b.record(True, False, 2)
+    b.record(False, False, 3)
+    assert b.state == CLOSED
+
+
+def test_opens_on_error_rate_over_window():
+    b = _breaker(failure_threshold=100, min_calls=4)
+    for t, ok in enumerate([True, False, True, False]):
+        transition = b.record(ok, False, t)
+    assert transition == OPEN
+
+
+def test_half_open_admits_single_probe_and_closes_on_success():
+    b = _breaker()
+    for t in range(3):
+        b.record(False, False, t)
+    allowed, probe, _ = b.before_call(40)
+    assert allowed and probe and b.state == HALF_OPEN
+    # Everyone else keeps failing fast while the probe is in flight
+    assert b.before_call(40)[0] is False
+    assert b.record(True, True, 41) == CLOSED
+    assert b.before_call(42) == (True, False, 0.0)
+
+
+def test_failed_probe_reopens_with_longer_cooldown():
+    b = _breaker()
+    for t in range(3):
+        b.record(False, False, t)
+    b.before_call(40)
+    assert b.record(False, True, 41) == OPEN
+    assert b.open_seconds == 60
+    assert b.before_call(41 + 59)[0] is False
+    assert b.before_call(41 + 61)[0] is True
+
+
+def test_stragglers_do_not_move_open_breaker():
+    b = _breaker()
+    for t in range(3):
+        b.record(False, False, t)
+    assert b.record(True, False, 4) is None
+    assert b.state == OPEN
+
+
+def test_aimd_cuts_once_per_congestion_event_and_grows_additively():
+    limit = AdaptiveConcurrencyLimit(initial=8, min_limit=2, max_limit=16, latency_target=1.0)
+    for _ in range(4):
+        assert limit.try_acquire()
+    # Two failures from calls issued before the cut only shrink the limit once
+    limit.release(False, started=0.0, latency=0.5)
+    limit.release(False, started=0.0, latency=0.5)
+    assert limit.limit == 4
+    limit.release(True, started=0.0, latency=0.1)
+    assert limit.limit == pytest.approx(4.25)
+    # Slow (but successful) responses back off gently
+    limit.try_acquire()
+    limit._last_decrease = 0.0
+    limit.release(True, started=1.0, latency=5.0)
+    assert limit.limit == pytest.approx(4.25 * 0.9)
+
+
+def test_aimd_rejects_over_limit():
+    limit = AdaptiveConcurrencyLimit(initial=2, min_limit=1, max_limit=4, latency_target=1.0)
+    assert limit.try_acquire() and limit.try_acquire()
+    assert not limit.try_acquire()
+
+
+def test_provider_guard_fast_fails_with_friendly_message(monkeypatch):
+    monkeypatch.setenv('CIRCUIT_BREAKER_FAILURES', '2')
+    provider = Provider('test', display_name='The test API')
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            with provider.guard():
+                raise RuntimeError("timeout")
+    assert provider.is_open()
+
+    called = []
+    with pytest.raises(ProviderUnavailable) as excinfo:
+        with provider.guard():
+            called.append(True)
+    assert not called
+    assert "The test API" in excinfo.value.user_message
+    assert provider.get_stats()['rejected_open'] == 1
+    assert provider.get_stats()['in_flight'] == 0
+
+
+def test_provider_guard_ignored_exceptions_are_not_failures(monkeypatch):
+    monkeypatch.setenv('CIRCUIT_BREAKER_FAILURES', '1')
+    provider = Provider('test-ignore')
+    with pytest.raises(KeyError):
+        with provider.guard(ignore=(KeyError,)):
+            raise KeyError("auth refresh")
+    assert not provider.is_open()
+    with provider.guard() as call:
+        call.failed()
+    assert provider.is_open()
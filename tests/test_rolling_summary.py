@@ -0,0 +1,114 @@
+"""Rolling channel summaries: period buckets, incremental folds, roll-ups and the layered digest."""
+import asyncio
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("psycopg2")
+from rolling_summary import RollingSummaries, fold_prompt, format_digest, period_start  # noqa: E402
+
+
+def test_period_buckets():
+    ts = datetime(2026, 10, 16, 14, 37, 12)  # a Friday
+    assert period_start(ts, 'hour') == datetime(2026, 10, 16, 14)
+    assert period_start(ts, 'day') == datetime(2026, 10, 16)
+    assert period_start(ts, 'week') == datetime(2026, 10, 12)
+
+
+def test_fold_prompt_carries_the_previous_summary():
+    first = fold_prompt('hour', None, "alice: spa tonight?")
+    assert "Current summary" not in first and "alice: spa tonight?" in first
+    update = fold_prompt('day', "Planned a Spa race.", "Race moved to 9pm.")
+    assert "Planned a Spa race." in update and "hour that just ended" in update
+
+
+def test_digest_layers_week_days_and_hours_oldest_first():
+    rows = [  # newest first, as fetch_digest returns them
+        {'granularity': 'hour', 'period_start': datetime(2026, 10, 16, 14), 'summary': 'h14'},
+        {'granularity': 'hour', 'period_start': datetime(2026, 10, 16, 13), 'summary': 'h13'},
+        {'granularity': 'day', 'period_start': datetime(2026, 10, 16), 'summary': 'today'},
+        {'granularity': 'week', 'period_start': datetime(2026, 10, 12), 'summary': 'this week'},
+        {'granularity': 'week', 'period_start': datetime(2026, 10, 5), 'summary': 'last week'},
+    ]
+    assert format_digest(rows) == (
+        "Week of Oct 12: this week\n"
+        "Fri Oct 16: today\n"
+        "13:00: h13\n"
+        "14:00: h14"
+    )
+    assert format_digest([]) is None
+
+
+class FakeLLM:
+    def __init__(self):
+        self.prompts = []
+
+    async def asimple_completion(self, prompt, max_tokens=500, temperature=0.3, cost_request_type=None):
+        assert cost_request_type == "channel_summary"
+        self.prompts.append(prompt)
+        return f"summary {len(self.prompts)}"
+
+
+@pytest.fixture
+def summaries():
+    system = RollingSummaries(database=None, llm_client=FakeLLM())
+    system.rows = {}  # (channel, granularity, start) -> (summary, count, covered_until, rolled_up)
+    system.pending = []
+    system.finished = {'hour': [], 'day': []}
+
+    system._pending_channels_sync = lambda now: [1] if system.pending else []
+    system._delta_messages_sync = lambda channel_id, now: system.pending
+    system._finished_periods_sync = lambda granularity, now, limit: system.finished[granularity][:limit]
+    system._summary_sync = lambda c, g, s: system.rows.get((c, g, s), (None,))[0]
+    system._prune_sync = lambda now: None
+
+    def store(channel_id, granularity, start, summary, count, covered_until, rolled):
+        _, old_count, _, _ = system.rows.get((channel_id, granularity, start), (None, 0, None, False))
+        system.rows[(channel_id, granularity, start)] = (summary, old_count + count, covered_until, False)
+        if rolled:
+            child = system.rows[(channel_id, *rolled)]
+            system.rows[(channel_id, *rolled)] = child[:3] + (True,)
+    system._store_sync = store
+    return system
+
+
+def test_messages_fold_into_their_hours(summaries):
+    summaries.pending = [
+        {'username': 'alice', 'content': 'spa tonight?', 'timestamp': datetime(2026, 10, 16, 13, 50)},
+        {'username': 'bob', 'content': 'yes, 9pm', 'timestamp': datetime(2026, 10, 16, 14, 5)},
+        {'username': 'alice', 'content': 'gt3?', 'timestamp': datetime(2026, 10, 16, 14, 6)},
+    ]
+    assert asyncio.run(summaries.run()) == 2
+    assert summaries.rows[(1, 'hour', datetime(2026, 10, 16, 13))][:3] == \
+        ('summary 1', 1, datetime(2026, 10, 16, 13, 50))
+    assert summaries.rows[(1, 'hour', datetime(2026, 10, 16, 14))][:3] == \
+        ('summary 2', 2, datetime(2026, 10, 16, 14, 6))
+
+    # The next delta is folded into the existing summary, not re-summarized from scratch
+    summaries.pending = [{'username': 'bob', 'content': 'bring the setup', 'timestamp': datetime(2026, 10, 16, 14, 30)}]
+    asyncio.run(summaries.run())
+    prompt = summaries.llm.prompts[-1]
+    assert "Current summary:\nsummary 2" in prompt and "bring the setup" in prompt and "spa tonight" not in prompt
+    assert summaries.rows[(1, 'hour', datetime(2026, 10, 16, 14))][1] == 3
+
+
+def test_finished_hours_roll_into_their_day(summaries):
+    hour = datetime(2026, 10, 16, 13)
+    summaries.rows[(1, 'hour', hour)] = ('raced spa', 4, datetime(2026, 10, 16, 13, 50), False)
+    summaries.finished['hour'] = [{'channel_id': 1, 'period_start': hour, 'summary': 'raced spa', 'message_count': 4}]
+
+    assert asyncio.run(summaries.run()) == 1
+    assert summaries.rows[(1, 'day', datetime(2026, 10, 16))][:3] == ('summary 1', 4, datetime(2026, 10, 16, 14))
+    assert summaries.rows[(1, 'hour', hour)][3] is True  # rolled up
+    assert "raced spa" in summaries.llm.prompts[-1]
+    assert summaries.stats == {'message_folds': 0, 'rollups': 1, 'failed': 0}
+
+
+def test_fold_budget_caps_llm_calls(summaries):
+    summaries.max_folds_per_run = 2
+    summaries.pending = [
+        {'username': 'alice', 'content': f'message {h}', 'timestamp': datetime(2026, 10, 16, h, 0)}
+        for h in range(5)
+    ]
+    asyncio.run(summaries.run())
+    assert len(summaries.llm.prompts) == 2
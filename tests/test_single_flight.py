@@ -0,0 +1,121 @@
+"""Single-flight coalescing: one computation per key, shared results/errors, SWR refresh, Redis lock."""
+import asyncio
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+class Counter:
+    def __init__(self, value='v', delay=0.01, error=None):
+        self.calls = 0
+        self.value = value
+        self.delay = delay
+        self.error = error
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return f"{self.value}{self.calls}"
+
+
+def test_concurrent_misses_share_one_computation():
+    async def run():
+        flight = SingleFlight('test')
+        compute = Counter()
+        results = await asyncio.gather(*(flight.do('k', compute) for _ in range(10)))
+        other = await flight.do('other', compute)
+        again = await flight.do('k', compute)  # nothing in flight any more: runs again
+        return flight, compute, results, other, again
+
+    flight, compute, results, other, again = asyncio.run(run())
+    assert results == ['v1'] * 10
+    assert (other, again, compute.calls) == ('v2', 'v3', 3)
+    assert flight.get_stats() == {'leaders': 3, 'coalesced': 9, 'refreshes': 0,
+                                  'remote_waits': 0, 'errors': 0, 'in_flight': 0}
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    async def run():
+        flight = SingleFlight('test')
+        failing = Counter(error=RuntimeError("iRacing API down"))
+        results = await asyncio.gather(*(flight.do('k', failing) for _ in range(3)),
+                                       return_exceptions=True)
+        return flight, failing, results, await flight.do('k', Counter())
+
+    flight, failing, results, recovered = asyncio.run(run())
+    assert failing.calls == 1
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert recovered == 'v1' and flight.stats['errors'] == 1
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_work():
+    async def run():
+        flight = SingleFlight('test')
+        compute = Counter(delay=0.05)
+        impatient = asyncio.ensure_future(flight.do('k', compute))
+        await asyncio.sleep(0.01)
+        impatient.cancel()
+        return await flight.do('k', compute), compute.calls, impatient.cancelled()
+
+    assert asyncio.run(run()) == ('v1', 1, True)
+
+
+def test_refresh_runs_in_the_background_once():
+    async def run():
+        flight = SingleFlight('test')
+        compute = Counter()
+        flight.refresh('k', compute)
+        flight.refresh('k', compute)
+        assert flight.in_flight('k')
+        coalesced = await flight.do('k', compute)
+        return coalesced, compute.calls, flight.stats['refreshes']
+
+    assert asyncio.run(run()) == ('v1', 1, 1)
+
+
+class FakeLockCache:
+    enabled = True
+
+    def __init__(self, held_for_polls):
+        self.held_for_polls = held_for_polls
+        self.acquired = []
+        self.released = []
+
+    async def aacquire_lock(self, key, ttl):
+        if self.held_for_polls > 0:
+            self.held_for_polls -= 1
+            return False
+        self.acquired.append(key)
+        return 'token'
+
+    async def arelease_lock(self, key, token):
+        self.released.append((key, token))
+        return True
+
+
+@pytest.mark.parametrize("remote_value,expected", [('from-replica', 'from-replica'), (None, 'v1')])
+def test_distributed_lock_waits_for_the_other_replica(monkeypatch, remote_value, expected):
+    monkeypatch.setenv('SINGLE_FLIGHT_DISTRIBUTED', 'true')
+
+    async def run():
+        cache = FakeLockCache(held_for_polls=2)
+        flight = SingleFlight('meta', cache)
+        flight.poll_interval = 0
+        compute = Counter()
+
+        async def recheck():
+            return remote_value if cache.held_for_polls == 0 else None
+
+        result = await flight.do('k', compute, recheck=recheck)
+        return result, compute.calls, cache
+
+    result, calls, cache = asyncio.run(run())
+    assert result == expected
+    if remote_value:
+        assert calls == 0 and cache.acquired == []
+    else:
+        # The lock was released without a value: this replica computes under the lock
+        assert calls == 1 and cache.released == [('sf:meta:k', 'token')]
@@ -0,0 +1,64 @@
+"""Incremental hourly rollups behind primetime/engagement/network stats."""
+from datetime import datetime, timedelta
+
+from features.stats_rollups import fold_messages
+
+GUILD = 1
+T0 = datetime(2026, 3, 2, 14, 50)  # a Monday
+
+
+def _row(user_id, minutes, content='hello there', channel_id=10):
+    return (GUILD, channel_id, user_id, T0 + timedelta(minutes=minutes), content)
+
+
+def test_counts_messages_chars_and_hour_buckets():
+    rows = [_row(100, 0, 'abc'), _row(100, 5, 'defgh'), _row(100, 12, 'xy')]
+    activity, _ = fold_messages(rows, {})
+    assert activity[(GUILD, T0.replace(minute=0), 10, 100)] == [2, 8, 0]
+    assert activity[(GUILD, T0.replace(hour=15, minute=0), 10, 100)] == [1, 2, 0]
+
+
+def test_responses_need_a_different_user_within_the_window():
+    rows = [_row(100, 0), _row(200, 1), _row(200, 2), _row(100, 20)]
+    activity, _ = fold_messages(rows, {})
+    hour = T0.replace(minute=0)
+    assert activity[(GUILD, hour, 10, 200)][2] == 1        # answered 100 after 1 minute
+    assert activity[(GUILD, T0.replace(hour=15, minute=0), 10, 100)][2] == 0  # 18 minutes later
+
+
+def test_reply_and_mention_edges():
+    rows = [_row(100, 0), _row(200, 1, 'hey <@100> and <@!300>'), _row(300, 2)]
+    _, edges = fold_messages(rows, {})
+    hour = T0.replace(minute=0)
+    assert edges[(GUILD, hour, 200, 100)] == [1, 1]   # mention + reply
+    assert edges[(GUILD, hour, 200, 300)] == [1, 0]
+    assert edges[(GUILD, hour, 300, 200)] == [0, 1]
+    assert edges[(GUILD, hour, 300, 100)] == [0, 1]   # still within the 3-message lookback
+
+
+def test_channels_do_not_link_and_tails_carry_across_batches():
+    tails = {}
+    fold_messages([_row(100, 0, channel_id=10), _row(200, 1, channel_id=11)], tails)
+    activity, edges = fold_messages([_row(300, 2, channel_id=10)], tails)
+    hour = T0.replace(minute=0)
+    assert set(edges) == {(GUILD, hour, 300, 100)}
+    assert activity[(GUILD, hour, 10, 300)][2] == 1
+    assert all(len(tail) <= 3 for tail in tails.values())
+
+
+def test_splitting_a_batch_gives_the_same_totals():
+    rows = [_row(u, i, f'msg <@{(u % 3) + 1}>') for i, u in enumerate([1, 2, 2, 3, 1, 1, 3, 2])]
+    whole = fold_messages(rows, {})
+    tails = {}
+    first = fold_messages(rows[:3], tails)
+    second = fold_messages(rows[3:], tails)
+
+    def merge(*parts):
+        merged = {}
+        for part in parts:
+            for key, counts in part.items():
+                merged[key] = [a + b for a, b in zip(merged.get(key, [0] * len(counts)), counts)]
+        return merged
+
+    assert merge(first[0], second[0]) == whole[0]
+    assert merge(first[1], second[1]) == whole[1]
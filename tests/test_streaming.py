@@ -0,0 +1,61 @@
+"""Chunking rules for progressively streamed Discord replies, and LLM streams cut off mid-reply."""
+from handlers.streaming import split_for_discord
+
+
+def test_short_text_is_one_chunk():
+    assert split_for_discord("hello") == ["hello"]
+
+
+def test_chunks_respect_limit_and_rejoin():
+    text = ("word " * 30 + "\n") * 40
+    chunks = split_for_discord(text, limit=200)
+    assert all(len(c) <= 200 for c in chunks)
+    assert "".join(chunks) == text
+
+
+def test_prefers_paragraph_break():
+    text = "a" * 120 + "\n\n" + "b" * 120
+    chunks = split_for_discord(text, limit=200)
+    assert chunks[0] == "a" * 120 + "\n\n"
+
+
+def test_full_chunks_are_stable_as_text_grows():
+    text = " ".join(f"token{i}" for i in range(300))
+    before = split_for_discord(text, limit=200)
+    after = split_for_discord(text + " more text appended", limit=200)
+    assert after[:len(before) - 1] == before[:-1]
+
+
+def test_unbroken_text_is_hard_split():
+    chunks = split_for_discord("x" * 450, limit=200)
+    assert [len(c) for c in chunks] == [200, 200, 50]
+
+
+def test_interrupted_stream_keeps_partial_text_and_records_its_cost(monkeypatch):
+    import asyncio
+
+    from llm import LLMClient
+
+    class BrokenStream:
+        async def aiter_lines(self):
+            yield 'data: {"choices": [{"delta": {"content": "Spa is seven "}}]}'
+            yield 'data: {"choices": [{"delta": {"content": "kilometres"}}]}'
+            raise ConnectionError("connection reset")
+
+        async def aclose(self):
+            pass
+
+    llm = LLMClient.__new__(LLMClient)
+    llm.api_key = "test"
+    monkeypatch.setattr('llm._HAS_TIKTOKEN', False)
+    llm._build_chat_payload = lambda *args, **kwargs: ({"messages": [], "max_tokens": 100}, "text-model", 250)
+
+    async def post(headers, payload, timeout=None, stream=False):
+        return BrokenStream()
+    llm._apost_with_retry = post
+    recorded = []
+    llm._record_costs_background = lambda *args: recorded.append(args)
+
+    text = asyncio.run(llm._agenerate_response_stream("how long is spa?", [], user_id=7, username="wompie"))
+    assert text == "Spa is seven kilometres"
+    assert recorded == [("text-model", 250, len(text) // 4, 'chat', 7, "wompie")]
@@ -0,0 +1,121 @@
+"""Tool result cache: normalized keys, success-only storage, LRU fallback and per-tool stats."""
+import asyncio
+
+import pytest
+
+from tool_cache import ToolResultCache, ident_part, text_part
+
+DEFINE = (7 * 86400, lambda a: (ident_part(a["word"]),))
+TRANSLATE = (7 * 86400, lambda a: (text_part(a["text"]), ident_part(a["target_language"])))
+
+
+class FakeCache:
+    """RedisCache stand-in with the async get/set surface the tool cache uses."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.store = {}
+
+    async def aget(self, key):
+        return self.store.get(key)
+
+    async def aset(self, key, value, ttl=300):
+        if not self.enabled:
+            return False
+        self.store[key] = value
+        return True
+
+
+class Handler:
+    def __init__(self, result=None):
+        self.calls = 0
+        self.result = result or {"success": True, "type": "text", "text": "a greeting"}
+
+    async def __call__(self):
+        self.calls += 1
+        return self.result
+
+
+async def lookup(tool_cache, args, handler, policy=DEFINE, tool="define_word"):
+    key = tool_cache.make_key(tool, policy, args)
+    cached = await tool_cache.get(tool, key)
+    if cached is not None:
+        return cached
+    return await tool_cache.compute(tool, key, policy[0], handler)
+
+
+@pytest.fixture(params=[True, False], ids=["redis", "local"])
+def tool_cache(request, monkeypatch):
+    monkeypatch.delenv('TOOL_CACHE_ENABLED', raising=False)
+    return ToolResultCache(FakeCache(enabled=request.param))
+
+
+def test_repeat_calls_hit_the_cache_with_normalized_keys(tool_cache):
+    handler = Handler()
+
+    async def run():
+        first = await lookup(tool_cache, {"word": "Hello"}, handler)
+        second = await lookup(tool_cache, {"word": "  hello "}, handler)
+        second["text"] = "mutated"
+        third = await lookup(tool_cache, {"word": "HELLO"}, handler)
+        return first, third
+
+    first, third = asyncio.run(run())
+    assert handler.calls == 1
+    assert first == third == handler.result
+
+    stats = tool_cache.get_stats()
+    assert stats['backend'] == ('redis' if tool_cache.cache.enabled else 'local')
+    assert stats['tools']['define_word']['hits'] == 2
+    assert stats['tools']['define_word']['hit_ratio'] == pytest.approx(2 / 3, abs=0.001)
+
+
+def test_free_text_keys_keep_case_and_spacing():
+    cache = ToolResultCache(FakeCache())
+    key = cache.make_key("translate", TRANSLATE, {"text": "Hello  World", "target_language": "ES"})
+    assert key == cache.make_key("translate", TRANSLATE, {"text": "Hello  World", "target_language": " es "})
+    assert key != cache.make_key("translate", TRANSLATE, {"text": "hello world", "target_language": "es"})
+    assert key != cache.make_key("translate", TRANSLATE, {"text": "Hello World", "target_language": "es"})
+
+
+def test_failed_results_are_not_cached(tool_cache):
+    handler = Handler({"success": False, "error": "Dictionary API down"})
+
+    async def run():
+        for _ in range(2):
+            await lookup(tool_cache, {"word": "hello"}, handler)
+
+    asyncio.run(run())
+    assert handler.calls == 2 and tool_cache.get_stats()['local_entries'] == 0
+
+
+def test_bad_arguments_and_disabled_cache_bypass(monkeypatch):
+    cache = ToolResultCache(FakeCache())
+    assert cache.make_key("define_word", DEFINE, {}) is None  # missing argument
+    assert cache.make_key("define_word", (60, lambda a: None), {"word": "x"}) is None
+
+    monkeypatch.setenv('TOOL_CACHE_ENABLED', 'false')
+    assert ToolResultCache(FakeCache()).make_key("define_word", DEFINE, {"word": "x"}) is None
+
+
+def test_local_fallback_expires_and_stays_bounded(monkeypatch):
+    monkeypatch.setenv('TOOL_CACHE_LOCAL_MAX_ENTRIES', '2')
+    now = [100.0]
+    monkeypatch.setattr('tool_cache.time.monotonic', lambda: now[0])
+    tool_cache = ToolResultCache(FakeCache(enabled=False))
+    stock = (30, lambda a: (ident_part(a["symbol"]),))
+    handler = Handler()
+
+    async def run():
+        for symbol in ("AAPL", "MSFT", "TSLA"):
+            await lookup(tool_cache, {"symbol": symbol}, handler, stock, "stock_price")
+        await lookup(tool_cache, {"symbol": "TSLA"}, handler, stock, "stock_price")
+        assert handler.calls == 3
+        await lookup(tool_cache, {"symbol": "AAPL"}, handler, stock, "stock_price")  # evicted
+        assert handler.calls == 4
+        now[0] += 31
+        await lookup(tool_cache, {"symbol": "TSLA"}, handler, stock, "stock_price")  # expired
+        assert handler.calls == 5
+
+    asyncio.run(run())
+    assert tool_cache.get_stats()['local_entries'] == 2
@@ -0,0 +1,145 @@
+"""Topic extraction from a shared sparse term matrix plus per-guild document frequencies."""
+import math
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from features.chat_stats import ChatStatistics, TopicCorpus  # noqa: E402
+from features.topic_model import HashedDocumentFrequencies, TermMatrix, analyze  # noqa: E402
+
+STOP = ChatStatistics._CHAT_STOPWORDS
+T0 = datetime(2026, 4, 6, 18, 0)
+
+
+class FakeDB:
+    bot_user_id = None
+
+    def get_connection(self):
+        raise RuntimeError("no database in tests")
+
+
+def reference_topics(texts, top_n):
+    """Dense restatement of the pruning/scoring rules for checking TermMatrix.topics()."""
+    if len(texts) < 3:
+        return []
+    docs = [Counter(analyze(t, STOP)) for t in texts]
+    n = len(docs)
+    df = Counter(term for doc in docs for term in doc)
+    totals = Counter()
+    for doc in docs:
+        totals.update(doc)
+    min_df = 2 if n >= 20 else 1
+    kept = [t for t in df if min_df <= df[t] <= 0.8 * n] or list(df)
+    kept = sorted(sorted(kept), key=lambda t: -totals[t])[:top_n * 3]
+    idf = {t: math.log((1 + n) / (1 + df[t])) + 1 for t in kept}
+    scores = Counter()
+    for doc in docs:
+        weights = {t: c * idf[t] for t, c in doc.items() if t in idf}
+        norm = math.sqrt(sum(w * w for w in weights.values()))
+        for t, w in weights.items():
+            scores[t] += w / norm / n
+    topics = [{'keyword': t, 'score': scores[t], 'count': sum(1 for d in docs if t in d)}
+              for t in sorted(kept) if not t.isdigit() and (len(t) > 2 or ' ' in t)]
+    topics.sort(key=lambda x: x['score'], reverse=True)
+    return topics[:top_n]
+
+
+TEXTS = [
+    "the new porsche setup at spa is fast",
+    "spa setup needs more rear wing",
+    "porsche rear wing at spa feels loose",
+    "dinner tonight is pizza again",
+    "pizza from the new place downtown",
+    "that pizza place downtown closes early",
+    "iracing season schedule dropped today",
+    "season schedule has spa twice",
+    "2026 season schedule 2026 spa",
+] * 3
+
+
+def assert_same_topics(actual, expected):
+    assert [t['keyword'] for t in actual] == [t['keyword'] for t in expected]
+    assert [t['count'] for t in actual] == [t['count'] for t in expected]
+    assert [t['score'] for t in actual] == pytest.approx([t['score'] for t in expected])
+
+
+def test_analyzer_drops_stopwords_before_bigrams():
+    assert analyze("The Porsche is REALLY fast at Spa", STOP) == [
+        'porsche', 'fast', 'spa', 'porsche fast', 'fast spa']
+
+
+def test_window_scoring_matches_reference():
+    matrix = TermMatrix(TEXTS, STOP)
+    assert_same_topics(matrix.topics(None, 10), reference_topics(TEXTS, 10))
+    assert matrix.topics([0, 1], 5) == []
+
+
+def test_row_subset_matches_a_fresh_matrix():
+    matrix = TermMatrix(TEXTS, STOP)
+    rows = [0, 1, 2, 9, 10, 11, 20]
+    subset = [TEXTS[i] for i in rows]
+    assert_same_topics(matrix.topics(rows, 5), TermMatrix(subset, STOP).topics(None, 5))
+    assert_same_topics(matrix.topics(np.arange(3, 6), 3), reference_topics(TEXTS[3:6], 3))
+
+
+def test_document_frequencies_fold_incrementally_and_round_trip():
+    whole = HashedDocumentFrequencies(1024)
+    whole.add(TermMatrix(TEXTS, STOP))
+    parts = HashedDocumentFrequencies(1024)
+    parts.add(TermMatrix(TEXTS[:10], STOP))
+    parts.add(TermMatrix(TEXTS[10:], STOP))
+    assert parts.doc_count == whole.doc_count == len(TEXTS)
+    assert np.array_equal(parts.doc_freq, whole.doc_freq)
+
+    restored = HashedDocumentFrequencies.from_bytes(whole.to_bytes(), 1024, whole.doc_count)
+    assert np.array_equal(restored.doc_freq, whole.doc_freq)
+    # A document counts once per bucket however often the term repeats
+    assert whole.doc_freq.max() <= len(TEXTS)
+
+
+def test_guild_frequencies_demote_terms_common_across_history():
+    stats = ChatStatistics(FakeDB())
+    history = HashedDocumentFrequencies(4096)
+    history.add(TermMatrix([f"pizza night number {i} with friends" for i in range(2000)], STOP))
+    window = [{'content': t, 'user_id': 1, 'guild_id': 7} for t in TEXTS]
+
+    local = stats.extract_topics_tfidf(window, top_n=20)
+    stats.topic_models.get = lambda guild_id: history if guild_id == 7 else None
+    with_history = stats.extract_topics_tfidf(window, top_n=20)
+
+    def rank(topics, keyword):
+        keywords = [t['keyword'] for t in topics]
+        return keywords.index(keyword) if keyword in keywords else len(keywords)
+
+    assert rank(local, 'pizza') < len(local)
+    assert rank(with_history, 'pizza') > rank(local, 'pizza')
+    assert rank(with_history, 'spa') <= rank(local, 'spa')
+
+
+def test_since_and_flow_score_slices_of_one_matrix():
+    stats = ChatStatistics(FakeDB())
+    messages = [
+        {'content': text, 'user_id': i % 3, 'username': f'u{i % 3}', 'guild_id': 1,
+         'timestamp': T0 + timedelta(minutes=i + 30 * (i // 9))}
+        for i, text in enumerate(TEXTS)
+    ]
+    corpus = TopicCorpus()
+    corpus.add(messages)
+    recent = corpus.since(messages[9]['timestamp'])
+    assert_same_topics(stats.extract_topics_tfidf(recent, top_n=5),
+                       stats.extract_topics_tfidf(messages[9:], top_n=5))
+    assert recent.matrix is None and corpus.matrix is not None  # reused, not rebuilt
+
+    # Three conversations on different subjects, 30+ minutes apart
+    for i, msg in enumerate(messages):
+        msg['content'] = TEXTS[(i // 9) * 3 + i % 3]
+    flow = stats.analyze_conversation_flow(messages, gap_minutes=10)
+    assert flow['segment_count'] == 3
+    segment_tops = [stats.extract_topics_tfidf(messages[i:i + 9], top_n=3)[0]['keyword']
+                    for i in (0, 9, 18)]
+    expected = Counter((a, b) for a, b in zip(segment_tops, segment_tops[1:]) if a != b)
+    assert len(expected) == 2
+    assert flow['transitions'] == [(a, b, c) for (a, b), c in expected.most_common(20)]
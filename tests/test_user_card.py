@@ -0,0 +1,152 @@
+"""User context cards: rendering, one-key lookups, rebuilds on write and the prompt's token budget."""
+import asyncio
+
+import pytest
+
+pytest.importorskip("psycopg2")
+import user_card  # noqa: E402
+
+
+class FakeCache:
+    def __init__(self):
+        self.store = {}
+
+    async def aset(self, key, value, ttl=300):
+        self.store[key] = value
+        return True
+
+    async def adelete(self, key):
+        self.store.pop(key, None)
+        return True
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = FakeCache()
+    monkeypatch.setattr(user_card, 'get_cache', lambda: cache)
+    monkeypatch.setattr(user_card, '_stats', {'hits': 0, 'builds': 0, 'rebuilds': 0, 'errors': 0})
+    return cache
+
+
+def test_card_renders_profile_behavior_and_facts():
+    profile = {"username": "wompie"}
+    behavior = {"conversation_style": "dry", "profanity_score": 2}
+    facts = [{"fact": "drives a GT3", "confidence": 0.9}, {"fact": "races at Spa", "confidence": None}]
+
+    text = user_card.render_card(profile, behavior, facts)
+    assert text.index("## HISTORICAL USER CONTEXT for wompie:") < text.index("**Known Facts About User:**")
+    assert "- drives a GT3 (confidence: 90%)" in text and "- races at Spa (confidence: 80%)" in text
+    assert user_card.render_card(None, None, facts).startswith("\n**Known Facts About User:**")
+    assert user_card.render_card(profile, None, []) == ""
+
+
+def test_cached_card_is_used_and_misses_are_built_once(cache, monkeypatch):
+    builds = []
+
+    def build(db, user_id):
+        builds.append(user_id)
+        return {'text': "card", 'tokens': 1}
+    monkeypatch.setattr(user_card, 'build_card_sync', build)
+
+    cached = {'text': "cached card", 'tokens': 2}
+    assert asyncio.run(user_card.get_card(None, 7, cached)) is cached
+    assert builds == []
+
+    assert asyncio.run(user_card.get_card(None, 7)) == {'text': "card", 'tokens': 1}
+    assert builds == [7] and cache.store == {"user_card:7": {'text': "card", 'tokens': 1}}
+    assert user_card.get_stats() == {'hits': 1, 'builds': 1, 'rebuilds': 0, 'errors': 0, 'hit_ratio': 0.5}
+
+
+def test_failed_rebuild_drops_the_stale_card(cache, monkeypatch):
+    cache.store["user_card:7"] = {'text': "stale", 'tokens': 1}
+
+    def broken(db, user_id):
+        raise RuntimeError("db down")
+    monkeypatch.setattr(user_card, 'build_card_sync', broken)
+
+    asyncio.run(user_card.rebuild_card(None, 7))
+    assert cache.store == {} and user_card.get_stats()['errors'] == 1
+
+
+def test_payload_uses_the_card_and_its_stored_token_count(monkeypatch):
+    from llm import LLMClient
+
+    class NoCompression:
+        def is_enabled(self):
+            return False
+
+    llm = LLMClient.__new__(LLMClient)
+    llm.compressor = NoCompression()
+    llm.system_prompt_default = "You are WompBot."
+    llm.model = llm.vision_model = "text-model"
+
+    monkeypatch.setattr('llm.count_tokens', lambda text, message_id=None: len(text) // 4)
+    card = {'text': "\n\n## HISTORICAL USER CONTEXT for wompie:\n- drives a GT3\n", 'tokens': 100}
+    payload, _, estimated = llm._build_chat_payload(
+        "spa tonight?", [], user_context={'card': card},
+    )
+    system = payload["messages"][0]["content"]
+    assert system == "You are WompBot." + card['text']
+    # The card's stored count is used instead of re-counting its text
+    assert estimated == len("You are WompBot.") // 4 + 100 + len(payload["messages"][-1]["content"]) // 4
+
+
+def test_extracted_facts_are_stored_and_rebuild_the_card(monkeypatch):
+    pytest.importorskip("openai")
+    pytest.importorskip("pgvector")
+    import rag
+
+    executed = []
+
+    class Cursor:
+        def execute(self, sql, params=None):
+            executed.append((" ".join(sql.split()), params))
+
+        def fetchone(self):
+            # "uses Python" is already known (row id 3); "races at Spa" is new
+            return (3, 1) if executed[-1][1] == (7, "uses Python") else None
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            pass
+
+    class Connection:
+        def cursor(self, cursor_factory=None):
+            return Cursor()
+
+        def commit(self):
+            pass
+
+    class Database:
+        def get_connection(self):
+            class _Ctx:
+                def __enter__(self):
+                    return Connection()
+
+                def __exit__(self, *exc):
+                    pass
+            return _Ctx()
+
+    class FakeLLM:
+        async def asimple_completion(self, prompt, temperature=0.3, cost_request_type=None, **kwargs):
+            assert temperature == 0.2 and cost_request_type == "fact_extraction"
+            return "uses Python, races at Spa"
+
+    rebuilt = []
+
+    async def rebuild(db, user_id):
+        rebuilt.append(user_id)
+    monkeypatch.setattr(rag, 'rebuild_card', rebuild)
+
+    system = rag.RAGSystem.__new__(rag.RAGSystem)
+    system.enabled = True
+    system.db = Database()
+    system.llm = FakeLLM()
+
+    facts = asyncio.run(system.extract_user_facts(7, "I use Python and race at Spa", 99))
+    assert facts == ["uses Python", "races at Spa"]
+    writes = [(sql.split()[0], params) for sql, params in executed if not sql.startswith("SELECT")]
+    assert writes == [("UPDATE", (3,)), ("INSERT", (7, 'general', "races at Spa", 99))]
+    assert rebuilt == [7]